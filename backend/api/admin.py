@@ -1,6 +1,9 @@
+import os
+
 from django.contrib import admin
 from .models import OcrDocument
-import json
+from . import codec
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from pygments import highlight
 from pygments.lexers.data import JsonLexer
@@ -17,15 +20,17 @@ class OcrDocumentAdmin(admin.ModelAdmin):
     search_fields = ('original_pdf_path', 'id')
     # --- 核心改动：修正了字段名 ---
     readonly_fields = ('id', 'created_at', 'original_pdf_path', 'mineru_json_path', 
+                       'raw_ocr_blob', 'raw_ocr_size', 'corrected_ls_blob', 'corrected_ls_size', 'page_paths',
                        'pretty_raw_ocr_json', 'pretty_corrected_label_studio_json')
 
     fieldsets = (
         (None, {
-            'fields': ('id', 'status', 'created_at')
+            'fields': ('id', 'status', 'created_at', 'page_paths')
         }),
         ('File Paths (Read-only)', {
             'classes': ('collapse',),
-            'fields': ('original_pdf_path', 'mineru_json_path')
+            'fields': ('original_pdf_path', 'mineru_json_path',
+                       'raw_ocr_blob', 'raw_ocr_size', 'corrected_ls_blob', 'corrected_ls_size')
         }),
         ('Stored JSON Data (Read-only)', {
             'classes': ('collapse',),
@@ -41,10 +46,15 @@ class OcrDocumentAdmin(admin.ModelAdmin):
         return "N/A"
     get_filename.short_description = 'Original Filename'
 
+    # 超过该大小的 JSON 只做转义显示：Pygments 着色多 MB 的文本需要数秒
+    HIGHLIGHT_MAX_BYTES = 512 * 1024
+
     def _format_json(self, obj_json):
         """Helper to format and colorize JSON for the admin view."""
         if obj_json:
-            formatted_json = json.dumps(obj_json, indent=2, ensure_ascii=False)
+            formatted_json = codec.dumps(obj_json, indent=True).decode('utf-8')
+            if len(formatted_json) > self.HIGHLIGHT_MAX_BYTES:
+                return format_html('<pre>{}</pre>', formatted_json)
             formatter = HtmlFormatter(style='colorful')
             style = "<style>" + formatter.get_style_defs() + "</style>"
             highlighted_json = highlight(formatted_json, JsonLexer(), formatter)
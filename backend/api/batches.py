@@ -0,0 +1,272 @@
+"""
+批量上传与批量导出。
+
+上传：一次请求中可以包含多个 PDF，或 zip / tar(.gz/.bz2/.xz) 归档。归档按成员
+流式展开（tar 以流模式读取，不需要随机访问），每个成员边写盘边计算 SHA-256
+并校验 %PDF- 文件头。页数用线程池并行读取，文档记录用 bulk_create 一次写入，
+处理任务作为一个 Celery group 投递。批次进度由所属文档的状态聚合得出。
+
+导出：把多个文档的 RAGFlow payload 或 Label Studio 任务打包为一个 zip，边生成边发送，
+末尾附带 manifest.json 记录各文件对应的文档、payload 版本以及被跳过的文档。
+"""
+import hashlib
+import logging
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import unidecode
+from celery import group
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from . import blob_storage, codec, corrections, events, label_studio_tasks, queues, ragflow
+from .models import DocumentBatch, OcrDocument
+from .tasks import process_pdf_with_mineru
+from .uploads import PDF_HEADER, READ_SIZE, UploadError
+
+logger = logging.getLogger(__name__)
+
+ZIP_MAGIC = b'PK\x03\x04'
+# 处理已经结束（不论成功与否）的状态
+DONE_STATUSES = ('processed', 'corrected', 'ingested', 'failed', 'cancelled')
+
+
+def _is_junk(name):
+    # macOS 归档工具附带的资源分支等
+    parts = Path(name).parts
+    return '__MACOSX' in parts or Path(name).name.startswith('._')
+
+
+def iter_members(uploaded):
+    """
+    把一个上传文件展开为 (name, fileobj)：PDF 原样返回；zip/tar 归档逐个返回
+    其中的普通文件。无法识别的文件抛出 UploadError。
+    """
+    head = uploaded.read(len(ZIP_MAGIC) + 1)
+    uploaded.seek(0)
+    if head.startswith(PDF_HEADER):
+        yield uploaded.name, uploaded
+        return
+
+    if head.startswith(ZIP_MAGIC):
+        with zipfile.ZipFile(uploaded) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or _is_junk(info.filename):
+                    continue
+                if info.file_size > settings.UPLOAD_MAX_SIZE:
+                    raise UploadError(f"{info.filename}: exceeds {settings.UPLOAD_MAX_SIZE} bytes.", status=413)
+                with archive.open(info) as member:
+                    yield info.filename, member
+        return
+
+    try:
+        archive = tarfile.open(fileobj=uploaded, mode='r|*')
+    except tarfile.TarError:
+        raise UploadError(f"{uploaded.name}: not a PDF, zip or tar archive.", status=415)
+    with archive:
+        for info in archive:
+            if not info.isfile() or _is_junk(info.name):
+                continue
+            yield info.name, archive.extractfile(info)
+
+
+def save_pdf(name, stream, upload_dir):
+    """
+    把 stream 写入 upload_dir 下一个不冲突的文件名，返回 (path, sha256)。
+    不是 PDF 或超过大小上限时删除已写部分并抛出 UploadError。
+    """
+    first = stream.read(READ_SIZE)
+    if not first.startswith(PDF_HEADER):
+        raise UploadError(f"{name}: not a PDF (missing %PDF- header).", status=415)
+
+    safe_filename = get_valid_filename(unidecode.unidecode(Path(name).name)) or 'document.pdf'
+    fs = FileSystemStorage(location=str(upload_dir))
+    while True:
+        path = fs.path(fs.get_available_name(safe_filename))
+        try:
+            f = open(path, 'xb')
+            break
+        except FileExistsError:
+            # 并发的批次占用了同一个名字
+            continue
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with f:
+            data = first
+            while data:
+                size += len(data)
+                if size > settings.UPLOAD_MAX_SIZE:
+                    raise UploadError(f"{name}: exceeds {settings.UPLOAD_MAX_SIZE} bytes.", status=413)
+                f.write(data)
+                hasher.update(data)
+                data = stream.read(READ_SIZE)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, hasher.hexdigest()
+
+
+def ingest(uploaded_files, upload_dir, name='', poppler_path=None):
+    """
+    保存上传的 PDF（含归档中的 PDF），批量创建文档并投递处理任务。
+    返回 (batch, documents)。
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    saved, rejected = [], []
+    for uploaded in uploaded_files:
+        try:
+            for member_name, stream in iter_members(uploaded):
+                if len(saved) >= settings.BATCH_MAX_FILES:
+                    rejected.append({"name": member_name, "error": f"Batch limit of {settings.BATCH_MAX_FILES} files reached."})
+                    continue
+                try:
+                    saved.append(save_pdf(member_name, stream, upload_dir))
+                except UploadError as e:
+                    rejected.append({"name": member_name, "error": str(e)})
+        except (UploadError, zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+            rejected.append({"name": uploaded.name, "error": str(e)})
+
+    paths = [path for path, _ in saved]
+    with ThreadPoolExecutor(max_workers=max(1, settings.BATCH_MEASURE_CONCURRENCY)) as pool:
+        page_counts = list(pool.map(lambda path: queues.measure_pages(path, poppler_path=poppler_path), paths))
+    routes = [queues.route(page_count) for page_count in page_counts]
+
+    queued_at = timezone.now()
+    with transaction.atomic():
+        batch = DocumentBatch.objects.create(name=name, total=len(saved), rejected=rejected)
+        documents = OcrDocument.objects.bulk_create([
+            OcrDocument(original_pdf_path=path, content_hash=content_hash, page_count=page_count,
+                        queue=queue, queued_at=queued_at, status='pending', batch=batch)
+            for (path, content_hash), page_count, (queue, _) in zip(saved, page_counts, routes)
+        ], batch_size=500)
+
+    if documents:
+        events.publish_statuses(documents)
+        result = group(
+            process_pdf_with_mineru.signature((doc.id,), queue=queue, priority=priority)
+            for doc, (queue, priority) in zip(documents, routes)
+        ).apply_async()
+        batch.group_id = result.id
+        batch.save(update_fields=['group_id'])
+    logger.info(f"Batch {batch.id}: {len(documents)} documents queued, {len(rejected)} rejected.")
+    return batch, documents
+
+
+def progress(batch):
+    """按状态聚合批次内文档的数量与页数。"""
+    rows = batch.documents.values('status').annotate(count=Count('id'), pages=Sum('page_count'))
+    counts = {row['status']: row['count'] for row in rows}
+    done = sum(counts.get(s, 0) for s in DONE_STATUSES)
+    total_pages = sum(row['pages'] or 0 for row in rows)
+    done_pages = sum(row['pages'] or 0 for row in rows if row['status'] in DONE_STATUSES)
+    return {
+        "counts": counts,
+        "done": done,
+        "failed": counts.get('failed', 0),
+        "fraction": done / batch.total if batch.total else 1.0,
+        "pages": {"total": total_pages, "done": done_pages},
+        "finished": done >= batch.total,
+    }
+
+
+class _ZipStream:
+    """只支持追加写入的文件对象，zipfile 写出的字节暂存于此，由生成器取走。"""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _Skip(Exception):
+    """该文档不写入归档，原因记入 manifest 的 skipped。"""
+
+
+def _iter_archive(doc_ids, export):
+    """
+    逐个文档写入 zip 并产出 zip 的字节块，末尾附带 manifest.json。
+    export(doc) 返回 (arcname, 打开源文件的函数, manifest 附加字段)，或抛出 _Skip。
+    """
+    stream = _ZipStream()
+    manifest = {"documents": [], "skipped": []}
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for doc_id in doc_ids:
+            doc = OcrDocument.objects.filter(pk=doc_id).first()
+            if doc is None:
+                manifest["skipped"].append({"id": doc_id, "reason": "not found"})
+                continue
+            try:
+                arcname, open_source, info = export(doc)
+            except _Skip as e:
+                manifest["skipped"].append({"id": doc_id, "reason": str(e)})
+                continue
+
+            with open_source() as source, archive.open(arcname, 'w', force_zip64=True) as target:
+                while data := source.read(READ_SIZE):
+                    target.write(data)
+                    chunk = stream.drain()
+                    if chunk:
+                        yield chunk
+            manifest["documents"].append({"id": doc.id, "file": arcname, **info})
+            yield stream.drain()
+
+        archive.writestr('manifest.json', codec.dumps(manifest, indent=True))
+    yield stream.drain()
+
+
+def _ragflow_export(doc):
+    if not corrections.has_corrections(doc):
+        raise _Skip("no corrections")
+    try:
+        doc = ragflow.get_or_build_payload(doc)
+    except Exception as e:
+        logger.error(f"Failed to build RAGFlow payload for Doc ID {doc.id} during export: {e}", exc_info=True)
+        raise _Skip(f"payload generation failed: {e}")
+    arcname = f"{doc.id}_{Path(doc.original_pdf_path).stem}_ragflow_payload.json"
+    return arcname, lambda: blob_storage.open_decompressed(doc.ragflow_blob), {"version": doc.ragflow_version}
+
+
+def _label_studio_export(doc):
+    try:
+        path = label_studio_tasks.get_or_build(doc)
+    except Exception as e:
+        logger.error(f"Failed to build Label Studio tasks for Doc ID {doc.id} during export: {e}", exc_info=True)
+        raise _Skip(f"task generation failed: {e}")
+    if path is None:
+        raise _Skip("no OCR result")
+    arcname = f"{doc.id}_{Path(doc.original_pdf_path).stem}_label_studio_tasks.json"
+    return arcname, lambda: open(path, 'rb'), {}
+
+
+def iter_ragflow_archive(doc_ids):
+    """
+    逐个文档生成（或复用）RAGFlow payload 并写入 zip，产出 zip 的字节块。
+    没有校对数据的文档记入 manifest 的 skipped。
+    """
+    return _iter_archive(doc_ids, _ragflow_export)
+
+
+def iter_label_studio_archive(doc_ids):
+    """
+    把多个文档预先生成的 Label Studio 任务打包为 zip（缺失或过期的先重新生成）。
+    还没有 OCR 结果的文档记入 manifest 的 skipped。
+    """
+    return _iter_archive(doc_ids, _label_studio_export)
@@ -0,0 +1,233 @@
+"""
+OCR JSON 的压缩旁路存储 (sidecar blob storage)。
+
+多 MB 的原始 OCR JSON 与校对 JSON 不再存放在 Postgres 行内，而是以
+压缩文件的形式写到 BLOB_STORAGE_ROOT 下，模型中只保留相对路径、
+压缩后大小和未压缩内容的 SHA-256。
+压缩格式优先使用 zstd（需安装 zstandard），否则退回到标准库 gzip；
+读取时按文件扩展名选择解码器，因此两种格式可以共存。
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from . import codec as json_codec
+
+try:
+    import zstandard
+except ImportError:  # zstd 是可选依赖
+    zstandard = None
+
+CODEC_EXTENSIONS = {'gzip': '.json.gz', 'zstd': '.json.zst'}
+
+
+def default_codec():
+    codec = settings.BLOB_STORAGE_CODEC
+    if codec == 'zstd' and zstandard is None:
+        return 'gzip'
+    return codec
+
+
+def codec_for_path(path):
+    return 'zstd' if str(path).endswith(CODEC_EXTENSIONS['zstd']) else 'gzip'
+
+
+def blob_root():
+    return Path(settings.BLOB_STORAGE_ROOT)
+
+
+def absolute_path(relative_path):
+    return blob_root() / relative_path
+
+
+def document_dir(doc_id):
+    return blob_root() / str(doc_id)
+
+
+def compress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=settings.BLOB_STORAGE_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=min(settings.BLOB_STORAGE_LEVEL, 9))
+
+
+def write_json(doc_id, name, obj, codec=None, versioned=False):
+    """
+    将 obj 序列化并压缩写入 <root>/<doc_id>/<name>.json.{gz,zst}；
+    versioned=True 时文件名带内容校验和 (<name>-<sha256 前 16 位>)，不会覆盖已有版本。
+    先写临时文件再原子替换，读者不会看到写了一半的文件。
+    返回 (relative_path, compressed_size, sha256)。
+    """
+    codec = codec or default_codec()
+    raw = json_codec.dumps(obj)
+    payload = compress(raw, codec)
+    checksum = hashlib.sha256(raw).hexdigest()
+    if versioned:
+        name = f"{name}-{checksum[:16]}"
+
+    relative_path = Path(str(doc_id)) / f"{name}{CODEC_EXTENSIONS[codec]}"
+    target = absolute_path(relative_path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{name}-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return relative_path.as_posix(), len(payload), checksum
+
+
+def open_decompressed(relative_path):
+    """返回解压后的二进制流，调用方负责关闭。"""
+    path = absolute_path(relative_path)
+    if codec_for_path(path) == 'zstd':
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return gzip.open(path, 'rb')
+
+
+def read_json(relative_path):
+    with open_decompressed(relative_path) as f:
+        return json_codec.load(f)
+
+
+def find_json(doc_id, name):
+    """查找 <doc_id>/<name>.json.* 的相对路径（任一压缩格式），不存在时返回 None。"""
+    for extension in CODEC_EXTENSIONS.values():
+        relative_path = f"{doc_id}/{name}{extension}"
+        if absolute_path(relative_path).exists():
+            return relative_path
+    return None
+
+
+def stored_versions(doc_id, name):
+    """
+    磁盘上 <doc_id>/<name> 的所有 blob 文件（固定文件名与带校验和的版本），按文件名排序。
+    替换后、旧版本在事务提交时删除之前，可能同时存在两个。
+    """
+    directory = document_dir(doc_id)
+    paths = []
+    for extension in CODEC_EXTENSIONS.values():
+        paths.extend(directory.glob(f"{name}{extension}"))
+        paths.extend(directory.glob(f"{name}-*{extension}"))
+    return sorted(paths)
+
+
+def versioned_paths(doc_id, name):
+    """磁盘上 <doc_id>/<name> 带校验和的版本文件（BlobJSON 写出的文件）。"""
+    directory = document_dir(doc_id)
+    paths = []
+    for extension in CODEC_EXTENSIONS.values():
+        paths.extend(directory.glob(f"{name}-*{extension}"))
+    return sorted(paths)
+
+
+def delete_document_blobs(doc_id):
+    shutil.rmtree(document_dir(doc_id), ignore_errors=True)
+
+
+def delete_blob(relative_path):
+    try:
+        absolute_path(relative_path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+class BlobJSON:
+    """
+    模型上的 JSON 属性描述符，数据实际保存在压缩 blob 中。
+
+    读取时按需从磁盘加载并缓存在实例上。赋值只记录新值，由模型的 save() 调用
+    write_pending 写出：新内容写到带校验和的新文件并更新 <prefix>_blob / <prefix>_size /
+    <prefix>_sha256 三个指针字段，旧文件在事务提交后才删除。因此保存失败或事务回滚时，
+    数据库中的指针仍指向完整的旧 blob。调用方照常用
+    save(update_fields=Model.<PREFIX>_FIELDS) 持久化指针。
+
+    新文件在行保存之前写出：保存本身失败时由模型立即删除；保存成功但外层事务随后回滚时
+    Django 没有回滚回调，这些不再被引用的版本由 janitor.reap_orphan_blobs 定期清理。
+    """
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.cache_attr = f"_{name}_cache"
+        self.pending_attr = f"_{name}_pending"
+
+    def fields(self):
+        return [f"{self.prefix}_blob", f"{self.prefix}_size", f"{self.prefix}_sha256"]
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if self.cache_attr not in instance.__dict__:
+            relative_path = getattr(instance, f"{self.prefix}_blob")
+            instance.__dict__[self.cache_attr] = read_json(relative_path) if relative_path else None
+        return instance.__dict__[self.cache_attr]
+
+    def __set__(self, instance, value):
+        if instance.pk is None:
+            raise ValueError(f"{self.name} can only be assigned after the document has been saved.")
+        instance.__dict__[self.cache_attr] = value
+        instance.__dict__[self.pending_attr] = value
+
+    def write_pending(self, instance, update_fields=None):
+        """
+        写出赋值后尚未保存的新值并更新指针字段（update_fields 不含这些字段时不处理）。
+        返回 (新写出的 blob 路径, 被替换的旧 blob 路径)，没有时为 None：行保存失败时调用方删除前者，
+        保存后用 delete_after_commit 清理后者。
+        """
+        if self.pending_attr not in instance.__dict__:
+            return None, None
+        if update_fields is not None and not set(self.fields()) & set(update_fields):
+            return None, None
+        value = instance.__dict__.pop(self.pending_attr)
+        previous = getattr(instance, f"{self.prefix}_blob")
+        if value is None:
+            relative_path, size, checksum = None, None, None
+        else:
+            relative_path, size, checksum = write_json(instance.pk, self.name, value, versioned=True)
+        setattr(instance, f"{self.prefix}_blob", relative_path)
+        setattr(instance, f"{self.prefix}_size", size)
+        setattr(instance, f"{self.prefix}_sha256", checksum)
+        if relative_path == previous:
+            # 内容未变，写到的就是当前引用的文件
+            return None, None
+        return relative_path, previous
+
+    @classmethod
+    def descriptors(cls, model):
+        return [attr for attr in vars(model).values() if isinstance(attr, cls)]
+
+    @classmethod
+    def write_all_pending(cls, instance, update_fields=None):
+        """
+        写出实例上所有 BlobJSON 属性的待保存值，返回 (新写出的 blob 路径列表, 被替换的旧 blob 路径列表)。
+        """
+        written, replaced = [], []
+        for descriptor in cls.descriptors(type(instance)):
+            new_path, old_path = descriptor.write_pending(instance, update_fields)
+            if new_path:
+                written.append(new_path)
+            if old_path:
+                replaced.append(old_path)
+        return written, replaced
+
+    @staticmethod
+    def delete_blobs(paths):
+        for path in paths:
+            delete_blob(path)
+
+    @staticmethod
+    def delete_after_commit(paths):
+        for path in paths:
+            transaction.on_commit(lambda path=path: delete_blob(path))
@@ -0,0 +1,67 @@
+"""
+文档处理的取消请求。
+
+取消接口把文档标记为 cancelling，并在 Redis 中写入取消标记；worker 中正在
+运行的 MinerU 进程与栅格化循环定期检查这个标记（一次 EXISTS，不访问数据库，
+分片线程中也可以安全调用），发现后终止进程组并抛出 Cancelled。
+尚未开始处理的文档由任务在启动时根据状态直接跳过。
+"""
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ocr:cancel:'
+KEY_TTL_SECONDS = 24 * 3600
+
+_client = None
+
+
+class Cancelled(Exception):
+    pass
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+    return _client
+
+
+def request(doc_id):
+    _get_client().set(f"{KEY_PREFIX}{doc_id}", 1, ex=KEY_TTL_SECONDS)
+
+
+def is_requested(doc_id):
+    try:
+        return bool(_get_client().exists(f"{KEY_PREFIX}{doc_id}"))
+    except Exception as e:
+        logger.warning(f"Could not check cancellation flag for Doc ID {doc_id}: {e}")
+        return False
+
+
+def clear(doc_id):
+    try:
+        _get_client().delete(f"{KEY_PREFIX}{doc_id}")
+    except Exception as e:
+        logger.warning(f"Could not clear cancellation flag for Doc ID {doc_id}: {e}")
+
+
+def checker(doc_id, interval=1.0):
+    """
+    返回一个检查函数：距上次检查超过 interval 秒时查询一次取消标记，
+    已请求取消则抛出 Cancelled。用于频繁调用的进度回调与读取循环。
+    """
+    last_checked = [0.0]
+
+    def check():
+        now = time.monotonic()
+        if now - last_checked[0] < interval:
+            return
+        last_checked[0] = now
+        if is_requested(doc_id):
+            raise Cancelled(f"Processing of Doc ID {doc_id} was cancelled.")
+    return check
@@ -0,0 +1,131 @@
+"""
+文档处理的断点与续跑。
+
+process_pdf_with_mineru 分为 ocr → persist_json → rasterize → finalize 四个幂等阶段，
+每完成一个阶段（栅格化为每批页面）就把进度写入 OcrDocument.checkpoint，例如：
+
+    {'work_dir': '/data/mineru_output/3f2a9c1d0b7e', 'attempts': 2,
+     'stage': 'persist_json', 'json_path': '...', 'pages_done': 120}
+
+worker 崩溃后任务消息被重新投递（acks_late + reject_on_worker_lost），或由 janitor
+重新入队、失败后经 retry 接口重试时，沿用同一个输出目录，从最后完成的阶段/页继续。
+MinerU 分片的结果本身也保留在输出目录中，已完成的分片不会重跑
+（见 mineru.run_mineru_sharded）。
+
+处理期间后台线程每 PROCESSING_HEARTBEAT_SECONDS 秒刷新 heartbeat_at；
+超过 PROCESSING_STALE_SECONDS 没有心跳的 processing 文档视为 worker 已退出。
+"""
+import logging
+import shutil
+import threading
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OcrDocument
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('ocr', 'persist_json', 'rasterize', 'finalize')
+
+
+def stale_cutoff(now=None):
+    return (now or timezone.now()) - timedelta(seconds=settings.PROCESSING_STALE_SECONDS)
+
+
+def stale_filter(cutoff):
+    """心跳已超时的文档；升级前开始处理、没有心跳的文档按 started_at 判断。"""
+    return Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+
+
+def claim(doc_id, task_id):
+    """
+    以条件更新把文档置为 processing 并记录任务 ID，返回是否认领成功。可以认领的情况：
+      - pending；
+      - processing 且任务 ID 相同：同一条消息在 worker 退出后被重新投递；
+      - processing 且心跳已超时。
+    已取消、已完成或正由另一个存活的 worker 处理的文档不会被认领，重复投递因此是无害的。
+    """
+    now = timezone.now()
+    orphaned = stale_filter(stale_cutoff(now))
+    if task_id:
+        orphaned |= Q(task_id=task_id)
+    return OcrDocument.objects.filter(Q(status='pending') | Q(status='processing') & orphaned, pk=doc_id) \
+        .update(status='processing', started_at=now, heartbeat_at=now, task_id=task_id or '') > 0
+
+
+def save(doc, **changes):
+    doc.checkpoint = {**(doc.checkpoint or {}), **changes}
+    doc.save(update_fields=['checkpoint'])
+
+
+def complete(doc, stage, **changes):
+    save(doc, stage=stage, **changes)
+
+
+def is_done(doc, stage):
+    done = (doc.checkpoint or {}).get('stage')
+    return done in STAGES and STAGES.index(done) >= STAGES.index(stage)
+
+
+def prepare(doc, base_dir):
+    """
+    返回本次运行的输出目录并累加尝试次数。断点记录的目录仍存在时沿用它，
+    否则（首次运行，或目录已被清理）新建目录并从头开始。
+    """
+    checkpoint = doc.checkpoint or {}
+    attempts = checkpoint.get('attempts', 0) + 1
+    work_dir = Path(checkpoint['work_dir']) if checkpoint.get('work_dir') else None
+    if work_dir is not None and work_dir.is_dir():
+        logger.info(f"Resuming Doc ID {doc.id} after stage '{checkpoint.get('stage') or 'none'}' "
+                    f"in {work_dir} (attempt {attempts}).")
+        save(doc, attempts=attempts)
+        return work_dir
+    if work_dir is not None:
+        logger.warning(f"Checkpoint output {work_dir} for Doc ID {doc.id} is gone; starting over.")
+    work_dir = Path(base_dir) / uuid.uuid4().hex[:12]
+    work_dir.mkdir(parents=True, exist_ok=True)
+    doc.checkpoint = {'work_dir': str(work_dir), 'attempts': attempts}
+    doc.save(update_fields=['checkpoint'])
+    return work_dir
+
+
+def discard(doc):
+    """删除断点记录的私有输出目录并清空断点（取消、命中缓存或要求从头重跑时）。"""
+    work_dir = (doc.checkpoint or {}).get('work_dir')
+    if work_dir and Path(work_dir).is_dir() and Path(work_dir).name != 'mineru_output':
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if doc.checkpoint:
+        doc.checkpoint = {}
+        doc.save(update_fields=['checkpoint'])
+
+
+class Heartbeat:
+    """后台线程定期刷新 heartbeat_at，直到 stop()；只更新仍在处理中的文档。"""
+    def __init__(self, doc_id, interval=None):
+        self.doc_id = doc_id
+        self.interval = interval or settings.PROCESSING_HEARTBEAT_SECONDS
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    OcrDocument.objects.filter(pk=self.doc_id, status__in=('processing', 'cancelling')) \
+                        .update(heartbeat_at=timezone.now())
+                except Exception as e:
+                    logger.warning(f"Heartbeat for Doc ID {self.doc_id} failed: {e}")
+        finally:
+            # 线程各自持有数据库连接，退出前关闭
+            connection.close()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
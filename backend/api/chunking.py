@@ -0,0 +1,195 @@
+"""
+面向 RAGFlow 导出的分块引擎。
+
+输入是按页排列的元素列表 [(label, text), ...]，label 来自 Label Studio 的
+rectanglelabels（即 _generate_ls_tasks 中 type_mapping 的 Title/Text/List/
+Table/Equation 等）。支持两种模式：
+
+  page     每页一个 chunk，等价于原先的实现；
+  section  以 Title 划分章节，按目标 token 数累积正文，块之间保留 overlap，
+           可以跨页延续；Table/Equation 作为不可拆分的整体，并附带章节标题，
+           避免标题、表格与上下文被拆开。
+
+token 计数默认使用离线的近似分词（中日韩字符各算一个 token，
+拉丁字母/数字连续串算一个，标点各算一个）；安装了 tiktoken 且
+配置 tokenizer='tiktoken' 时使用 tiktoken。
+"""
+import hashlib
+import json
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+_TOKEN_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]|[A-Za-z0-9_]+|[^\sA-Za-z0-9_]')
+
+ATOMIC_LABELS = ('Table', 'Equation')
+TITLE_LABEL = 'Title'
+
+DEFAULT_CONFIG = {
+    'mode': 'page',
+    'target_tokens': 512,
+    'max_tokens': 1024,
+    'overlap_tokens': 64,
+    'cross_page': True,
+    'skip_labels': ['Header', 'Footer'],
+    'tokenizer': 'simple',
+    'include_metadata': False,
+}
+
+
+def get_config(overrides=None):
+    config = {**DEFAULT_CONFIG, **getattr(settings, 'RAGFLOW_CHUNKING', {})}
+    if overrides:
+        config.update(overrides)
+    return config
+
+
+def config_fingerprint(config):
+    """配置的稳定摘要，参与产物版本判断：配置变化时 payload 需要重建。"""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def simple_token_count(text):
+    return len(_TOKEN_RE.findall(text))
+
+
+@lru_cache(maxsize=4)
+def get_tokenizer(name):
+    """返回 text -> token 数 的函数。"""
+    if name == 'tiktoken':
+        try:
+            import tiktoken
+        except ImportError:
+            return simple_token_count
+        encoding = tiktoken.get_encoding('cl100k_base')
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    return simple_token_count
+
+
+def task_elements(task):
+    """
+    从一个 Label Studio 任务中提取 (has_text_region, [(label, text), ...])。
+    标签通过区域 id 从 rectanglelabels 结果关联到 textarea 结果。
+    """
+    annotations = task.get('completions') or task.get('annotations')
+    if not annotations:
+        return False, []
+    results = annotations[0].get('result', [])
+    labels = {}
+    for item in results:
+        if item.get('type') in ('rectanglelabels', 'labels'):
+            value_labels = item.get('value', {}).get(item['type'], [])
+            if value_labels:
+                labels[item.get('id')] = value_labels[0]
+    has_text_region = False
+    elements = []
+    for item in results:
+        if item.get('type') == 'textarea':
+            has_text_region = True
+            text_list = item.get('value', {}).get('text', [])
+            if text_list:
+                elements.append((labels.get(item.get('id'), 'Text'), text_list[0]))
+    return has_text_region, elements
+
+
+def _chunk(parts, page_start, page_end, section, tokens, config):
+    chunk = {"content_ltxt": "\n".join(parts)}
+    if config['include_metadata']:
+        chunk["metadata"] = {"pages": [page_start, page_end], "section": section, "tokens": tokens}
+    return chunk
+
+
+def chunk_pages(pages, config=None):
+    """
+    pages: [(page_num, has_text_region, [(label, text), ...]), ...]，按页序排列。
+    返回 chunk 列表。
+    """
+    config = config or get_config()
+    if config['mode'] == 'page':
+        return [{"content_ltxt": "\n".join(text for _, text in elements)}
+                for _, has_text_region, elements in pages if has_text_region]
+    return _chunk_sections(pages, config)
+
+
+def _chunk_sections(pages, config):
+    count_tokens = get_tokenizer(config['tokenizer'])
+    target, max_tokens, overlap = config['target_tokens'], config['max_tokens'], config['overlap_tokens']
+    skip_labels = set(config['skip_labels'])
+
+    chunks = []
+    section, section_tokens = None, 0
+    # 当前缓冲区：[(text, tokens, page_num), ...]
+    buffer, buffered = [], 0
+    # 缓冲区中目前只有标题，尚未出现正文
+    heading_only = False
+
+    def emit(carry_overlap):
+        nonlocal buffer, buffered
+        if not buffer:
+            return
+        parts = [text for text, _, _ in buffer]
+        tokens = buffered
+        if section and parts[0] != section:
+            parts.insert(0, section)
+            tokens += section_tokens
+        chunks.append(_chunk(parts, buffer[0][2], buffer[-1][2], section, tokens, config))
+
+        # 以整条元素为单位，从尾部保留不超过 overlap 个 token 作为下一块的开头
+        kept, kept_tokens = [], 0
+        if carry_overlap and overlap > 0:
+            for item in reversed(buffer):
+                if kept_tokens + item[1] > overlap:
+                    break
+                kept.insert(0, item)
+                kept_tokens += item[1]
+            if len(kept) == len(buffer):
+                kept, kept_tokens = [], 0
+        buffer, buffered = kept, kept_tokens
+
+    previous_page = None
+    for page_num, _, elements in pages:
+        # 不跨页时在页边界结束当前块；只有标题时留给下一页的正文
+        if previous_page is not None and not config['cross_page'] and not heading_only:
+            emit(carry_overlap=False)
+        previous_page = page_num
+        for label, text in elements:
+            if label in skip_labels:
+                continue
+            text = text.strip()
+            if not text:
+                continue
+            tokens = count_tokens(text)
+
+            if label == TITLE_LABEL:
+                if heading_only and buffer:
+                    # 连续的标题行（多行标题或紧邻的多级标题）合并为同一个标题
+                    section = f"{section}\n{text}"
+                    section_tokens += tokens
+                    buffer, buffered = [(section, section_tokens, buffer[0][2])], section_tokens
+                    continue
+                # 新章节：结束上一块（不带 overlap 跨章节），标题作为后续块的上下文
+                emit(carry_overlap=False)
+                section, section_tokens = text, tokens
+                buffer, buffered = [(text, tokens, page_num)], tokens
+                heading_only = True
+                continue
+            heading_only = False
+
+            if label in ATOMIC_LABELS:
+                # 表格/公式不拆分：放不下时先结束当前块，再与标题一起单独成块
+                if buffered + tokens > max_tokens:
+                    emit(carry_overlap=False)
+                buffer.append((text, tokens, page_num))
+                buffered += tokens
+                if buffered >= target:
+                    emit(carry_overlap=True)
+                continue
+
+            if buffer and buffered + tokens > target:
+                emit(carry_overlap=True)
+            buffer.append((text, tokens, page_num))
+            buffered += tokens
+
+    emit(carry_overlap=False)
+    return chunks
@@ -0,0 +1,151 @@
+"""
+JSON 编解码层。
+
+安装了 orjson 时使用 orjson（比标准库快数倍，直接产出 UTF-8 bytes），否则退回
+标准库 json；两者的输出都是不转义非 ASCII 的 UTF-8，调用方不感知具体实现。
+orjson 不支持的值（超出 64 位的整数等）自动改用标准库编码。
+
+注意：参与校验和/指纹计算的序列化（corrections.result_checksum、
+chunking.config_fingerprint 等）仍使用标准库 json，保证已保存的值不变。
+
+iter_pages 流式读取 MinerU _middle.json：逐页解码 pdf_info 中的元素并只保留需要的
+字段，同一时刻只有一页在内存中，不构建整棵树。
+"""
+import codecs
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+READ_SIZE = 1024 * 1024
+
+DecodeError = json.JSONDecodeError  # orjson.JSONDecodeError 是它的子类
+
+
+def dumps(obj, indent=False, sort_keys=False, default=None):
+    """序列化为 UTF-8 bytes；indent 为 True 时两空格缩进。"""
+    if orjson is not None:
+        # 时间按 ISO 8601 输出、UTC 写作 Z，与 DRF 的 JSONEncoder 一致
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except orjson.JSONEncodeError:
+            pass
+    # 分隔符与 orjson 的输出一致（紧凑 / 缩进时冒号后留空格）
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None, sort_keys=sort_keys, default=default,
+                      separators=(',', ': ') if indent else (',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """data 为 bytes 或 str。"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load(fileobj):
+    """读取整个文件对象（文本或二进制）并解码。"""
+    return loads(fileobj.read())
+
+
+def load_path(path):
+    with open(path, 'rb') as f:
+        return load(f)
+
+
+def dump_path(obj, path):
+    with open(path, 'wb') as f:
+        f.write(dumps(obj))
+
+
+class _Stream:
+    """按需从二进制文件对象读取并解码为文本的缓冲区，供 raw_decode 逐个解析值。"""
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, minimum=READ_SIZE):
+        """丢弃已解析的部分并读入更多数据，已到末尾时返回 False。"""
+        if self.eof:
+            return False
+        data = self._file.read(max(minimum, READ_SIZE))
+        text = data if isinstance(data, str) else self._decoder.decode(data, final=not data)
+        self.eof = not data
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白并返回下一个字符，末尾返回 ''。"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise DecodeError(f"Expected {char!r}", self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self, decoder):
+        """解析下一个完整的 JSON 值；数据不够时按已缓冲长度成倍扩大读取，保持线性开销。"""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except DecodeError:
+                if not self.fill(len(self.buffer)):
+                    raise
+                continue
+            # 数字可能恰好在缓冲区末尾被截断
+            if end == len(self.buffer) and not self.eof and isinstance(value, (int, float)):
+                self.fill(len(self.buffer))
+                continue
+            self.pos = end
+            return value
+
+
+def iter_pages(fileobj, fields=('page_idx', 'page_size', 'para_blocks', 'preproc_blocks')):
+    """
+    流式读取 MinerU _middle.json 的 pdf_info，逐页产出只含 fields 的 dict（fields 为 None 时保留整页）。
+    fileobj 为二进制或文本文件对象，例如 open(path, 'rb') 或 blob_storage.open_decompressed()。
+    pdf_info 之外的顶层值照常解析后丢弃（都很小）。
+    """
+    decoder = json.JSONDecoder()
+    stream = _Stream(fileobj)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        key = stream.value(decoder)
+        stream.expect(':')
+        if key != 'pdf_info':
+            stream.value(decoder)
+        else:
+            stream.expect('[')
+            if stream.peek() == ']':
+                stream.pos += 1
+            else:
+                while True:
+                    page = stream.value(decoder)
+                    if not isinstance(page, dict):
+                        raise ValueError(f"pdf_info items must be objects, got {type(page).__name__}")
+                    yield page if fields is None else {name: page[name] for name in fields if name in page}
+                    if stream.peek() == ']':
+                        stream.pos += 1
+                        break
+                    stream.expect(',')
+        if stream.peek() == '}':
+            return
+        stream.expect(',')
@@ -0,0 +1,166 @@
+"""
+按页提交的校对增量与完整导出的按需合成。
+
+基线：最近一次整体上传的 Label Studio 导出；若没有，则由原始 OCR 预测生成
+（未修改的页面即视为接受预测结果）。
+增量：PageCorrection 每页一行，只保存该页校对后的 annotation result。
+完整导出只在需要时（下载、生成 RAGFlow payload）合成，不回写到文档行。
+
+页的标识是 0 起始的 PDF 页码 (page_idx，与 OcrPage 相同)，而不是任务序号：没有区域的页
+不生成任务，两者并不一致。任务的页码取自 data.page_idx；此前生成的任务没有该字段，
+按图片文件名 (page-0003.jpg) 推断，都没有时才退回任务序号。接口中的页码从 1 开始。
+"""
+import hashlib
+import json
+import re
+
+from django.db import IntegrityError, transaction
+
+from . import label_studio, label_studio_tasks
+from .label_studio import page_image_url
+from .models import PageCorrection
+
+_IMAGE_PAGE_RE = re.compile(r'page-(\d+)\.\w+$')
+
+
+class VersionConflict(Exception):
+    def __init__(self, current_version):
+        super().__init__(f"Page was modified concurrently (current version {current_version}).")
+        self.current_version = current_version
+
+
+def extract_result(payload):
+    """
+    从请求体中取出 annotation result。支持：
+      {"result": [...]}
+      单个 Label Studio 任务 {"annotations": [{"result": [...]}]}（或旧版的 "completions"）
+    """
+    if isinstance(payload, dict):
+        if isinstance(payload.get('result'), list):
+            return payload['result']
+        annotations = payload.get('annotations') or payload.get('completions')
+        if annotations and isinstance(annotations[0].get('result'), list):
+            return annotations[0]['result']
+    raise ValueError("Expected {'result': [...]} or a Label Studio task with annotations.")
+
+
+def result_checksum(result):
+    return hashlib.sha256(json.dumps(result, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def has_corrections(doc):
+    return bool(doc.corrected_ls_blob) or doc.page_corrections.exists()
+
+
+def apply_page(doc, page_index, result, expected_version=None):
+    """
+    写入一页的校对增量，返回 (PageCorrection, changed)。
+    内容与已保存版本相同时不写库；expected_version 不匹配时抛出 VersionConflict。
+    """
+    checksum = result_checksum(result)
+    with transaction.atomic():
+        page = PageCorrection.objects.select_for_update() \
+            .filter(document=doc, page_index=page_index).first()
+        current_version = page.version if page else 0
+        if expected_version is not None and expected_version != current_version:
+            raise VersionConflict(current_version)
+        if page is not None and page.checksum == checksum:
+            return page, False
+
+        if page is None:
+            try:
+                with transaction.atomic():
+                    page = PageCorrection.objects.create(document=doc, page_index=page_index,
+                                                         result=result, checksum=checksum)
+            except IntegrityError:
+                # 另一个请求同时创建了这一页
+                raise VersionConflict(PageCorrection.objects.get(document=doc, page_index=page_index).version)
+        else:
+            page.result = result
+            page.checksum = checksum
+            page.version += 1
+            page.save(update_fields=['result', 'checksum', 'version', 'updated_at'])
+    return page, True
+
+
+def clear_pages(doc):
+    """整体上传新的导出后，旧的按页增量已被取代。"""
+    doc.page_corrections.all().delete()
+
+
+def base_key(doc):
+    """基线的来源标识：整体导出的校验和，或原始 OCR 的校验和 + 输出目录 + 任务映射配置。"""
+    if doc.corrected_ls_blob:
+        return f"corrected:{doc.corrected_ls_sha256}"
+    if doc.raw_ocr_blob:
+        return f"raw:{doc.raw_ocr_sha256}:{doc.mineru_json_path}:{label_studio.config_fingerprint()}"
+    return "empty"
+
+
+def delta_checksums(doc):
+    """{page_idx: checksum}，只读取校验和列。"""
+    return dict(PageCorrection.objects.filter(document=doc).values_list('page_index', 'checksum'))
+
+
+def source_key(doc, deltas=None):
+    """完整导出的来源标识（基线 + 各页增量），不加载任何 JSON。"""
+    deltas = delta_checksums(doc) if deltas is None else deltas
+    digest = hashlib.sha256(base_key(doc).encode('utf-8'))
+    for page_idx in sorted(deltas):
+        digest.update(f"|{page_idx}:{deltas[page_idx]}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def task_page_idx(task, position):
+    """任务对应的 0 起始页码，见模块说明。"""
+    data = task.get('data') or {}
+    if isinstance(data.get('page_idx'), int):
+        return data['page_idx']
+    match = _IMAGE_PAGE_RE.search(str(data.get('image', '')))
+    if match:
+        return int(match.group(1)) - 1
+    return position
+
+
+def base_tasks(doc):
+    """完整导出的基线任务列表。"""
+    if doc.corrected_ls_blob:
+        return doc.corrected_label_studio_json
+    if doc.raw_ocr_blob and doc.mineru_json_path:
+        # 处理时预先生成的任务产物，缺失或来源已变化时重新生成
+        tasks = label_studio_tasks.load(doc)
+        for task in tasks:
+            task['annotations'] = [{'result': task['predictions'][0]['result']}]
+        return tasks
+    return []
+
+
+def base_pages(doc):
+    """基线任务按页码索引：{page_idx: task}，按页序排列。"""
+    pages = {}
+    for position, task in enumerate(base_tasks(doc)):
+        pages.setdefault(task_page_idx(task, position), task)
+    return dict(sorted(pages.items()))
+
+
+def pages(doc):
+    """
+    合并基线与按页增量：{page_idx: task}，按页序排列。
+    基线中没有任务的页（OCR 没有识别出区域）在校对后补出任务，图片按页码引用。
+    """
+    merged = base_pages(doc)
+    folder = label_studio_tasks.output_dir(doc)
+    for page in doc.page_corrections.order_by('page_index'):
+        if page.page_index in merged:
+            task = {key: value for key, value in merged[page.page_index].items() if key != 'completions'}
+        else:
+            image_url = page_image_url(page.page_index, folder.name) if folder is not None else None
+            task = {'data': {'page_idx': page.page_index, **({'image': image_url} if image_url else {})}}
+        task['annotations'] = [{'result': page.result, 'updated_at': page.updated_at.isoformat()}]
+        merged[page.page_index] = task
+    return dict(sorted(merged.items()))
+
+
+def materialize(doc):
+    """合成完整的 Label Studio 导出（任务列表），按页序排列。"""
+    return list(pages(doc).values())
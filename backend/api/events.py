@@ -0,0 +1,104 @@
+"""
+文档状态事件通道。
+
+Celery 任务和视图在状态流转 (pending → processing → processed/failed →
+corrected → ingested) 以及处理进度变化时，把事件发布到 Redis pub/sub；
+/api/events/ 以 Server-Sent Events 的形式把这些增量推送给前端，
+前端不再需要轮询文档列表。
+发布失败只记录警告，不会影响主流程。
+"""
+import logging
+import time
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from . import codec
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'ocr:documents'
+
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+    return _client
+
+
+def publish(event_type, doc_id, **data):
+    payload = {'type': event_type, 'id': doc_id, 'ts': time.time(), **data}
+    try:
+        _get_client().publish(CHANNEL, codec.dumps(payload))
+    except Exception as e:
+        logger.warning(f"Failed to publish {event_type} event for Doc ID {doc_id}: {e}")
+
+
+def publish_status(doc):
+    """发布文档的当前状态。"""
+    publish('status', doc.id, status=doc.status)
+
+
+def publish_statuses(docs):
+    """批量发布多个文档的状态，使用一次 pipeline 往返。"""
+    try:
+        pipe = _get_client().pipeline(transaction=False)
+        for doc in docs:
+            payload = {'type': 'status', 'id': doc.id, 'ts': time.time(), 'status': doc.status}
+            pipe.publish(CHANNEL, codec.dumps(payload))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to publish status events for {len(docs)} documents: {e}")
+
+
+def publish_progress(doc_id, stage, current=None, total=None):
+    """发布处理进度，例如 stage='rasterize', current=12, total=300。"""
+    publish('progress', doc_id, stage=stage, current=current, total=total)
+
+
+def _format_sse(event_type, data):
+    return f"event: {event_type}\ndata: {data}\n\n"
+
+
+async def _event_stream(doc_ids):
+    client = aioredis.Redis.from_url(settings.EVENTS_REDIS_URL)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(CHANNEL)
+    try:
+        # 先发送一个注释行，让代理和浏览器尽早建立连接
+        yield ": connected\n\n"
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True,
+                                               timeout=settings.EVENTS_HEARTBEAT_SECONDS)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            data = message['data'].decode('utf-8')
+            event = codec.loads(data)
+            if doc_ids and event.get('id') not in doc_ids:
+                continue
+            yield _format_sse(event.get('type', 'message'), data)
+    finally:
+        await pubsub.unsubscribe(CHANNEL)
+        await pubsub.aclose()
+        await client.aclose()
+
+
+async def document_events(request):
+    """
+    GET /api/events/?ids=1,2,3
+    Server-Sent Events 流；不带 ids 时推送所有文档的事件。
+    需要以 ASGI 方式运行（backend/asgi.py），否则每个连接会占用一个同步 worker。
+    """
+    ids_param = request.GET.get('ids', '')
+    doc_ids = {int(i) for i in ids_param.split(',') if i.strip().isdigit()}
+    response = StreamingHttpResponse(_event_stream(doc_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # 关闭 nginx 对该响应的缓冲，事件才能即时送达
+    response['X-Accel-Buffering'] = 'no'
+    return response
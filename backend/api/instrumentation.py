@@ -0,0 +1,119 @@
+"""
+处理流程的分阶段计时。
+
+Recorder 记录一次运行（一次 process_pdf_with_mineru 任务、一次 Label Studio
+转换或 RAGFlow payload 生成）中每个阶段的耗时、页数、字节数和峰值 RSS：
+
+    run = instrumentation.Recorder('process', doc)
+    with run.stage('mineru', pages=page_count) as stage:
+        ...
+        stage.nbytes = json_path.stat().st_size
+    run.finish('processed')
+
+结束时写入一条 ProcessingRun，并把各阶段计入 Prometheus 指标（见 metrics）。
+峰值 RSS 由后台线程按 RSS_SAMPLE_SECONDS 采样本进程得到；MinerU CLI 与 worker 池
+在其它进程中运行，其内存不计入。记录失败只记警告，不影响主流程。
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from django.utils import timezone
+
+from . import metrics
+from .models import ProcessingRun
+from .rasterize import current_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+RSS_SAMPLE_SECONDS = 0.25
+
+
+class Stage:
+    """阶段内可以补充 pages / nbytes（例如读完文件后才知道字节数）。"""
+    def __init__(self, name, pages=None, nbytes=None):
+        self.name = name
+        self.pages = pages
+        self.nbytes = nbytes
+
+
+class _RssSampler:
+    def __init__(self):
+        self.peak = current_rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, current_rss_bytes())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+        return self.peak
+
+
+class Recorder:
+    def __init__(self, kind, document, queue=None, queue_wait_seconds=None):
+        self.kind = kind
+        self.document = document
+        self.queue = queue or ''
+        self.queue_wait_seconds = queue_wait_seconds
+        self.started_at = timezone.now()
+        self._started = time.perf_counter()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, pages=None, nbytes=None):
+        """计时一个阶段；阶段内抛出异常时同样记录（便于定位失败前的耗时）。"""
+        current = Stage(name, pages, nbytes)
+        sampler = _RssSampler()
+        started = time.perf_counter()
+        try:
+            yield current
+        finally:
+            self.record(name, time.perf_counter() - started, current.pages, current.nbytes, sampler.stop())
+
+    def record(self, name, seconds, pages=None, nbytes=None, peak_rss_bytes=None):
+        """记录一个在别处计时的阶段（例如栅格化内部拆出的编码耗时）。"""
+        self.stages.append({
+            'name': name,
+            'seconds': round(seconds, 4),
+            'pages': pages,
+            'bytes': nbytes,
+            'peak_rss_bytes': peak_rss_bytes,
+        })
+
+    def finish(self, status, error=''):
+        """写入 ProcessingRun 并上报指标，返回该记录（写入失败时返回 None）。"""
+        duration = time.perf_counter() - self._started
+        peaks = [stage['peak_rss_bytes'] for stage in self.stages if stage['peak_rss_bytes']]
+        pages = max((stage['pages'] or 0 for stage in self.stages), default=0) or None
+        metrics.observe_stages(self.kind, self.stages + [{'name': 'total', 'seconds': duration, 'pages': pages}])
+        metrics.observe_run(self.kind, status)
+        stage_summary = ', '.join(f"{stage['name']}={stage['seconds']:.2f}s" for stage in self.stages)
+        logger.info(f"{self.kind} run for Doc ID {self.document.id} {status} in {duration:.2f}s ({stage_summary}).")
+        try:
+            return ProcessingRun.objects.create(
+                document=self.document,
+                kind=self.kind,
+                status=status,
+                worker=f"{socket.gethostname()}:{os.getpid()}",
+                queue=self.queue,
+                queue_wait_seconds=self.queue_wait_seconds,
+                started_at=self.started_at,
+                finished_at=timezone.now(),
+                duration_seconds=round(duration, 4),
+                pages=pages,
+                peak_rss_bytes=max(peaks) if peaks else None,
+                stages=self.stages,
+                error=str(error)[:2000],
+            )
+        except Exception as e:
+            logger.warning(f"Failed to save {self.kind} run for Doc ID {self.document.id}: {e}")
+            return None
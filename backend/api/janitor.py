@@ -0,0 +1,129 @@
+"""
+处理流程的清理：worker 崩溃后遗留的文档与输出目录。
+
+requeue_stale  心跳超时的 processing 文档重新入队（从断点继续），超过
+               PROCESSING_MAX_ATTEMPTS 次的标记为 failed；心跳超时的 cancelling
+               文档直接完成取消。
+reap_orphans   删除 mineru_output 下不被任何缓存条目、文档或断点引用的输出目录。
+reap_orphan_blobs
+               删除不被任何文档行引用的 BlobJSON 版本文件（保存所在事务回滚后遗留）。
+
+由 manage.py janitor 定期执行（见 docker-compose.yml）。
+"""
+import logging
+import shutil
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+
+from . import blob_storage, checkpoints, events, ocr_cache
+from .blob_storage import BlobJSON
+from .models import OcrCacheEntry, OcrDocument
+from .tasks import BASE_OUTPUT_DIR, requeue
+
+logger = logging.getLogger(__name__)
+
+
+def requeue_stale(dry_run=False):
+    """返回 [(doc, action)]，action 为 requeued / failed / cancelled。"""
+    results = []
+    cutoff = checkpoints.stale_cutoff()
+    stale = OcrDocument.objects.filter(checkpoints.stale_filter(cutoff), status__in=('processing', 'cancelling'))
+    for doc in stale.order_by('started_at'):
+        attempts = (doc.checkpoint or {}).get('attempts', 0)
+        if doc.status == 'cancelling':
+            action = 'cancelled'
+        elif attempts >= settings.PROCESSING_MAX_ATTEMPTS:
+            action = 'failed'
+        else:
+            action = 'requeued'
+        results.append((doc, action))
+        if dry_run:
+            continue
+
+        # 条件更新以心跳为准：判定后 worker 又恢复心跳的文档不动
+        previous = doc.status
+        expected = {'status': previous, 'heartbeat_at': doc.heartbeat_at}
+        if action == 'requeued':
+            done = requeue(doc, **expected)
+        else:
+            done = OcrDocument.objects.filter(pk=doc.pk, **expected).update(status=action) > 0
+            if done:
+                doc.status = action
+                if action == 'cancelled':
+                    checkpoints.discard(doc)
+                events.publish_status(doc)
+        if done:
+            logger.warning(f"Doc ID {doc.id} stopped sending heartbeats in {previous} "
+                           f"(attempt {attempts}); {action}.")
+        else:
+            results.pop()
+    return results
+
+
+def referenced_output_dirs():
+    """缓存条目、已处理文档与断点引用的输出目录。"""
+    referenced = set(OcrCacheEntry.objects.values_list('output_dir', flat=True))
+    for json_path in OcrDocument.objects.exclude(mineru_json_path__isnull=True) \
+            .exclude(mineru_json_path='').values_list('mineru_json_path', flat=True):
+        # <output_dir>/<stem>/auto/<stem>_middle.json
+        referenced.add(str(Path(json_path).parents[2]))
+    for checkpoint in OcrDocument.objects.exclude(checkpoint={}).values_list('checkpoint', flat=True):
+        if checkpoint.get('work_dir'):
+            referenced.add(checkpoint['work_dir'])
+    return {str(Path(path).resolve()) for path in referenced}
+
+
+def reap_orphans(min_age=None, dry_run=False):
+    """
+    删除不被引用、且超过 min_age（timedelta，默认 ORPHAN_OUTPUT_MIN_AGE_HOURS）
+    未修改的输出目录。年龄阈值避免误删刚创建、尚未写入断点的目录。返回 [(path, size_bytes)]。
+    """
+    if not BASE_OUTPUT_DIR.is_dir():
+        return []
+    min_age = min_age if min_age is not None else timedelta(hours=settings.ORPHAN_OUTPUT_MIN_AGE_HOURS)
+    referenced = referenced_output_dirs()
+    cutoff = time.time() - min_age.total_seconds()
+    reaped = []
+    for path in BASE_OUTPUT_DIR.iterdir():
+        if not path.is_dir() or str(path.resolve()) in referenced or path.stat().st_mtime > cutoff:
+            continue
+        size = ocr_cache.dir_size(path)
+        reaped.append((path, size))
+        if not dry_run:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Removed orphaned output directory {path} ({size / 1024 / 1024:.1f} MB).")
+    return reaped
+
+
+def reap_orphan_blobs(min_age=None, dry_run=False):
+    """
+    删除不被任何文档行引用、且超过 min_age（默认 ORPHAN_OUTPUT_MIN_AGE_HOURS）未修改的
+    BlobJSON 版本文件。新版本在行保存前写出，事务回滚后就不再被引用；年龄阈值避免误删
+    尚未提交的事务刚写出的版本。其它旁路文件（固定文件名）不处理。返回 [(path, size_bytes)]。
+    """
+    root = blob_storage.blob_root()
+    if not root.is_dir():
+        return []
+    min_age = min_age if min_age is not None else timedelta(hours=settings.ORPHAN_OUTPUT_MIN_AGE_HOURS)
+    descriptors = BlobJSON.descriptors(OcrDocument)
+    referenced = set()
+    for paths in OcrDocument.objects.values_list(*(descriptor.fields()[0] for descriptor in descriptors)):
+        referenced.update(str(blob_storage.absolute_path(path)) for path in paths if path)
+    cutoff = time.time() - min_age.total_seconds()
+    reaped = []
+    for directory in root.iterdir():
+        if not directory.is_dir() or not directory.name.isdigit():
+            continue
+        for descriptor in descriptors:
+            for path in blob_storage.versioned_paths(directory.name, descriptor.name):
+                stat = path.stat()
+                if str(path) in referenced or stat.st_mtime > cutoff:
+                    continue
+                reaped.append((path, stat.st_size))
+                if not dry_run:
+                    blob_storage.delete_blob(path.relative_to(root))
+                    logger.info(f"Removed unreferenced blob {path}.")
+    return reaped
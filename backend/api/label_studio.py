@@ -0,0 +1,130 @@
+"""
+MinerU _middle.json → Label Studio 任务的转换。
+
+每页先收集所有需要生成区域的 bbox，再用 NumPy 一次性完成相对 page_size 的
+百分比换算；区域 ID 由页码和页内序号直接拼出（ls_ + 10 位十六进制），
+无需逐个调用 uuid4，并且对同一份 OCR 结果总是稳定的。
+"""
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .rasterize import page_image_path
+
+logger = logging.getLogger(__name__)
+
+BASE_OUTPUT_DIR = settings.DATA_ROOT_PATH / 'data' / 'mineru_output'
+
+TYPE_MAPPING = {'text': 'Text', 'title': 'Title', 'list': 'List', 'figure': 'Figure', 'foot': 'Footer', 'head': 'Header', 'equation': 'Equation', 'table': 'Table'}
+LINE_BLOCK_TYPES = ('text', 'title', 'list', 'foot', 'head')
+# 任务格式版本：区域 ID、坐标换算、图片引用方式或 data 字段变化时加一，已生成的任务产物随之重建
+# 2: data.page_idx 记录任务对应的 0 起始 PDF 页码（没有区域的页不生成任务，任务序号不等于页码）
+TASK_FORMAT = 2
+
+
+def config_fingerprint():
+    """映射配置的稳定摘要，参与任务产物的来源标识。"""
+    config = {'format': TASK_FORMAT, 'types': TYPE_MAPPING, 'line_blocks': LINE_BLOCK_TYPES}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def _line_text(line):
+    return ''.join(s.get('content', '') for s in line.get('spans', []))
+
+
+def iter_page_regions(page_data):
+    """按原有的遍历顺序逐个产出一页上的区域：(block_type, bbox, label, text)，text 为 None 表示没有转写文本。"""
+    for block in page_data.get('para_blocks', []) + page_data.get('preproc_blocks', []):
+        block_type = block.get('type')
+        label = TYPE_MAPPING.get(block_type, 'Unknown')
+        if block_type == 'figure':
+            if 'bbox' in block:
+                yield block_type, block['bbox'], 'Figure', None
+            for line in block.get('lines', []):
+                if 'bbox' in line:
+                    yield block_type, line['bbox'], 'Text', _line_text(line)
+        elif block_type in LINE_BLOCK_TYPES:
+            for line in block.get('lines', []):
+                if 'bbox' in line:
+                    yield block_type, line['bbox'], label, _line_text(line)
+        elif 'bbox' in block:
+            yield block_type, block['bbox'], label, None
+
+
+def collect_page_regions(page_data):
+    """收集一页上的区域，返回 (bboxes, labels, texts)。"""
+    bboxes, labels, texts = [], [], []
+    for _, bbox, label, text in iter_page_regions(page_data):
+        bboxes.append(bbox); labels.append(label); texts.append(text)
+    return bboxes, labels, texts
+
+
+def build_page_results(bboxes, labels, texts, page_dims, page_index):
+    """批量把一页的 bbox 换算为 Label Studio 的百分比坐标并生成 result 列表。"""
+    if not bboxes:
+        return []
+    page_width, page_height = page_dims
+    boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    # 与逐个计算 (v / size) * 100 的运算顺序一致，结果逐位相同
+    x = (boxes[:, 0] / page_width) * 100
+    y = (boxes[:, 1] / page_height) * 100
+    width = ((boxes[:, 2] - boxes[:, 0]) / page_width) * 100
+    height = ((boxes[:, 3] - boxes[:, 1]) / page_height) * 100
+
+    results = []
+    append = results.append
+    # 区域 ID：页码 (4 位十六进制) + 页内序号 (6 位十六进制)
+    id_prefix = f"ls_{page_index:04x}"
+    for i, (rx, ry, rw, rh, label, text) in enumerate(zip(x.tolist(), y.tolist(), width.tolist(), height.tolist(), labels, texts)):
+        rid = f"{id_prefix}{i:06x}"
+        append({"id": rid, "from_name": "bbox", "to_name": "image", "type": "rectanglelabels", "value": {"x": rx, "y": ry, "width": rw, "height": rh, "rotation": 0, "rectanglelabels": [label]}})
+        if text:
+            text = text.strip()
+            if text:
+                append({"id": rid, "from_name": "transcription", "to_name": "image", "type": "textarea", "value": {"text": [text]}})
+    return results
+
+
+def page_image_url(page_index, unique_folder_name: str):
+    """一页图片的 Label Studio local-files 地址（优先缩小后的审阅图），找不到图片时返回 None。"""
+    task_output_dir = BASE_OUTPUT_DIR / unique_folder_name
+    # bbox 是百分比坐标，不受图片尺寸影响
+    pages_dir = task_output_dir / "pages"
+    image_path = page_image_path(pages_dir, page_index + 1, 'review') or page_image_path(pages_dir, page_index + 1)
+    if image_path is None:
+        return None
+    relative_image_path = Path('data') / 'mineru_output' / unique_folder_name / image_path.relative_to(task_output_dir)
+    return f"/data/local-files/?d={relative_image_path.as_posix()}"
+
+
+def page_task(page_index, page_size, regions, unique_folder_name: str):
+    """
+    一页的 Label Studio 任务，data.page_idx 为 0 起始页码。regions 为 collect_page_regions 的
+    (bboxes, labels, texts)；页面尺寸无效、找不到页面图片或没有区域时返回 None。
+    """
+    if not page_size or len(page_size) != 2 or page_size[0] == 0 or page_size[1] == 0:
+        logger.warning(f"Page size missing or invalid for page {page_index}. Skipping."); return None
+    page_dims = (page_size[0], page_size[1])
+    image_url = page_image_url(page_index, unique_folder_name)
+    if image_url is None:
+        logger.warning(f"Could not find image for page {page_index + 1} of {unique_folder_name}"); return None
+    bboxes, labels, texts = regions
+    result = build_page_results(bboxes, labels, texts, page_dims, page_index)
+    if not result:
+        return None
+    return {"data": {"image": image_url, "page_idx": page_index}, "predictions": [{"result": result}]}
+
+
+def generate_ls_tasks(mineru_data, unique_folder_name: str):
+    ls_tasks = []
+    pdf_info = mineru_data.get('pdf_info', [])
+    if not pdf_info: raise ValueError("Invalid MinerU JSON format: 'pdf_info' key missing.")
+    for position, page_data in enumerate(pdf_info):
+        task = page_task(page_data.get('page_idx', position), page_data.get('page_size'),
+                         collect_page_regions(page_data), unique_folder_name)
+        if task: ls_tasks.append(task)
+    return ls_tasks
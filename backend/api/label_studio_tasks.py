@@ -0,0 +1,98 @@
+"""
+预先生成的 Label Studio 任务产物。
+
+处理流水线的最后一个阶段把 OCR 预测转换为 Label Studio 任务（区域 ID 稳定，见
+label_studio.build_page_results），写到 MinerU 输出目录中 pages/ 旁边的
+label_studio_tasks.json，下载/导入接口直接发送该文件。旁边的 .key 文件记录生成时的
+来源标识：OCR 结果 (raw_ocr_sha256)、输出目录与映射配置 (label_studio.config_fingerprint)；
+来源未变化时不会重新生成。OCR 缓存命中的文档共享输出目录，也就共享这份产物。
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from . import codec, ocr_pages
+from .label_studio import config_fingerprint, generate_ls_tasks
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_NAME = 'label_studio_tasks.json'
+KEY_SUFFIX = '.key'
+
+
+def output_dir(doc):
+    # <output_dir>/<stem>/auto/<stem>_middle.json
+    return Path(doc.mineru_json_path).parents[2] if doc.mineru_json_path else None
+
+
+def artifact_path(doc):
+    directory = output_dir(doc)
+    return directory / ARTIFACT_NAME if directory is not None else None
+
+
+def source_key(doc):
+    digest = hashlib.sha256(f"{doc.raw_ocr_sha256}|{output_dir(doc).name}|{config_fingerprint()}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _key_path(path):
+    return path.with_name(path.name + KEY_SUFFIX)
+
+
+def current_path(doc):
+    """产物存在且来源未变化时返回其路径，否则返回 None。只读取一个小文件，不访问数据库。"""
+    path = artifact_path(doc)
+    if path is None or not doc.raw_ocr_blob:
+        return None
+    try:
+        stored_key = _key_path(path).read_text().strip()
+    except FileNotFoundError:
+        return None
+    return path if stored_key == source_key(doc) and path.is_file() else None
+
+
+def _atomic_write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def build(doc):
+    """生成任务并原子写入产物与来源标识，返回任务数。"""
+    folder = output_dir(doc).name
+    if ocr_pages.has_pages(doc.pk):
+        tasks = ocr_pages.ls_tasks(doc.pk, folder)
+    else:
+        tasks = generate_ls_tasks(doc.raw_ocr_json, folder)
+    path = artifact_path(doc)
+    # 同一输出目录可能被多个文档同时重建：先写临时文件再替换，读者不会看到半个文件
+    _atomic_write(path, codec.dumps(tasks))
+    _atomic_write(_key_path(path), source_key(doc).encode('utf-8'))
+    logger.info(f"Wrote {len(tasks)} Label Studio tasks for Doc ID {doc.pk} to {path}.")
+    return len(tasks)
+
+
+def get_or_build(doc):
+    """返回最新产物的路径；文档没有 OCR 结果时返回 None。"""
+    if not doc.raw_ocr_blob or not doc.mineru_json_path:
+        return None
+    path = current_path(doc)
+    if path is None:
+        build(doc)
+        path = artifact_path(doc)
+    return path
+
+
+def load(doc):
+    """读取最新的任务列表（产物不存在或已过期时先重建），没有 OCR 结果时返回 None。"""
+    path = get_or_build(doc)
+    if path is None:
+        return None
+    return codec.load_path(path)
@@ -0,0 +1,91 @@
+import gc
+import io
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import codec
+from api.management.commands.benchmark_ls_tasks import _synthetic_pdf_info
+
+
+def _best(fn, repeat):
+    # 与 timeit 一样计时期间关闭 GC，否则大量分配触发的回收会淹没解析本身的耗时
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _peak(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _drain(pages):
+    for _ in pages:
+        pass
+
+
+class Command(BaseCommand):
+    help = "对比标准库 json 与 codec (orjson) 在 MinerU _middle.json 上的解析/序列化耗时，以及流式逐页读取的内存峰值。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('middle_json', nargs='?', help="MinerU _middle.json 文件；不提供时使用合成数据")
+        parser.add_argument('--synthetic-pages', type=int, default=200)
+        parser.add_argument('--lines-per-page', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if options['middle_json']:
+            try:
+                with open(options['middle_json'], 'rb') as f:
+                    raw = f.read()
+                json.loads(raw)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['middle_json']}: {e}")
+        else:
+            data = {'pdf_info': _synthetic_pdf_info(options['synthetic_pages'], options['lines_per_page']),
+                    '_backend': 'pipeline', '_version_name': 'synthetic'}
+            raw = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        obj = json.loads(raw)
+        pages = len(obj.get('pdf_info', []))
+        self.stdout.write(f"{len(raw) / 1024 / 1024:.1f} MB, {pages} pages; codec backend: {codec.BACKEND}")
+
+        if codec.loads(raw) != obj or json.loads(codec.dumps(obj)) != obj:
+            raise CommandError("codec round trip differs from the standard library")
+        streamed = list(codec.iter_pages(io.BytesIO(raw), fields=None))
+        if streamed != obj.get('pdf_info', []):
+            raise CommandError("iter_pages output differs from pdf_info")
+        self.stdout.write("codec round trip and iter_pages: output identical")
+
+        cases = (
+            ('loads', lambda: json.loads(raw), lambda: codec.loads(raw)),
+            ('dumps', lambda: json.dumps(obj, ensure_ascii=False).encode('utf-8'), lambda: codec.dumps(obj)),
+            ('dumps indent', lambda: json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8'),
+             lambda: codec.dumps(obj, indent=True)),
+        )
+        for name, legacy, fast in cases:
+            legacy_s, fast_s = _best(legacy, options['repeat']), _best(fast, options['repeat'])
+            self.stdout.write(f"{name:>13}: json {legacy_s * 1000:9.1f} ms  codec {fast_s * 1000:9.1f} ms  "
+                              f"({legacy_s / fast_s:.2f}x)")
+
+        whole = _peak(lambda: codec.load(io.BytesIO(raw)))
+        stream = _peak(lambda: _drain(codec.iter_pages(io.BytesIO(raw))))
+        stream_s = _best(lambda: _drain(codec.iter_pages(io.BytesIO(raw))), options['repeat'])
+        self.stdout.write(f" iter_pages: {stream_s * 1000:9.1f} ms  ({pages / stream_s:,.0f} pages/s)")
+        self.stdout.write(self.style.SUCCESS(f"peak memory: load {whole / 1024 / 1024:.1f} MB, "
+                                             f"iter_pages {stream / 1024 / 1024:.1f} MB"))
@@ -0,0 +1,110 @@
+import json
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.label_studio import TYPE_MAPPING, build_page_results, collect_page_regions
+
+
+def _legacy_create_ls_region(bbox, page_dims, label, text_content=None):
+    # 原逐区域实现，仅作为基准与一致性校验的参照
+    page_width, page_height = page_dims
+    x1, y1, x2, y2 = bbox
+    if page_width == 0 or page_height == 0: return []
+    x = (x1 / page_width) * 100; y = (y1 / page_height) * 100
+    width = ((x2 - x1) / page_width) * 100; height = ((y2 - y1) / page_height) * 100
+    region_id = f"ls_{uuid.uuid4().hex[:10]}"
+    results = [{"id": region_id, "from_name": "bbox", "to_name": "image", "type": "rectanglelabels", "value": {"x": x, "y": y, "width": width, "height": height, "rotation": 0, "rectanglelabels": [label]}}]
+    if text_content and text_content.strip():
+        results.append({"id": region_id, "from_name": "transcription", "to_name": "image", "type": "textarea", "value": {"text": [text_content.strip()]}})
+    return results
+
+
+def _legacy_page_results(page_data, page_dims):
+    result = []
+    all_blocks = page_data.get('para_blocks', []) + page_data.get('preproc_blocks', [])
+    for block in all_blocks:
+        block_type = block.get('type')
+        label = TYPE_MAPPING.get(block_type, 'Unknown')
+        if block_type == 'figure':
+            if 'bbox' in block: result.extend(_legacy_create_ls_region(block['bbox'], page_dims, 'Figure'))
+            for line in block.get('lines', []):
+                if 'bbox' in line: result.extend(_legacy_create_ls_region(line['bbox'], page_dims, 'Text', ''.join(s.get('content', '') for s in line.get('spans', []))))
+        elif block_type in ['text', 'title', 'list', 'foot', 'head']:
+            for line in block.get('lines', []):
+                if 'bbox' in line: result.extend(_legacy_create_ls_region(line['bbox'], page_dims, label, ''.join(s.get('content', '') for s in line.get('spans', []))))
+        elif 'bbox' in block:
+            result.extend(_legacy_create_ls_region(block['bbox'], page_dims, label))
+    return result
+
+
+def _batched_page_results(page_data, page_dims):
+    bboxes, labels, texts = collect_page_regions(page_data)
+    return build_page_results(bboxes, labels, texts, page_dims, page_data.get('page_idx', 0))
+
+
+def _synthetic_pdf_info(pages, lines_per_page):
+    rng = random.Random(0)
+    pdf_info = []
+    for page_idx in range(pages):
+        blocks = []
+        for _ in range(lines_per_page // 10):
+            lines = []
+            for _ in range(10):
+                x1, y1 = rng.uniform(0, 500), rng.uniform(0, 800)
+                lines.append({"bbox": [x1, y1, x1 + rng.uniform(10, 90), y1 + rng.uniform(5, 15)],
+                              "spans": [{"content": "lorem ipsum "}, {"content": "dolor"}]})
+            blocks.append({"type": rng.choice(['text', 'title', 'list']), "bbox": [0, 0, 600, 900], "lines": lines})
+        blocks.append({"type": "table", "bbox": [10, 10, 300, 200]})
+        pdf_info.append({"page_idx": page_idx, "page_size": [612, 792], "para_blocks": blocks})
+    return pdf_info
+
+
+def _strip_ids(results):
+    return [{k: v for k, v in r.items() if k != 'id'} for r in results]
+
+
+class Command(BaseCommand):
+    help = "对比逐区域与批量 (NumPy) 的 Label Studio 区域生成耗时，并校验输出一致。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('middle_json', nargs='*', help="MinerU _middle.json 文件；不提供时使用合成数据")
+        parser.add_argument('--synthetic-pages', type=int, default=200)
+        parser.add_argument('--lines-per-page', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        pdf_info = []
+        for path in options['middle_json']:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    pdf_info.extend(json.load(f).get('pdf_info', []))
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {path}: {e}")
+        if not pdf_info:
+            pdf_info = _synthetic_pdf_info(options['synthetic_pages'], options['lines_per_page'])
+        pages = [(p, (p['page_size'][0], p['page_size'][1])) for p in pdf_info
+                 if p.get('page_size') and len(p['page_size']) == 2 and p['page_size'][0] and p['page_size'][1]]
+
+        regions = 0
+        for page_data, dims in pages:
+            legacy, batched = _legacy_page_results(page_data, dims), _batched_page_results(page_data, dims)
+            if _strip_ids(legacy) != _strip_ids(batched):
+                raise CommandError(f"Output mismatch on page {page_data.get('page_idx')}")
+            regions += len(batched)
+        self.stdout.write(f"{len(pages)} pages, {regions} results: outputs identical (ignoring region IDs)")
+
+        timings = {}
+        for name, fn in (('legacy', _legacy_page_results), ('batched', _batched_page_results)):
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                for page_data, dims in pages:
+                    fn(page_data, dims)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+            self.stdout.write(f"{name:>8}: {best * 1000:9.1f} ms  ({len(pages) / best:,.0f} pages/s)")
+        self.stdout.write(self.style.SUCCESS(f" speedup: {timings['legacy'] / timings['batched']:.2f}x"))
@@ -0,0 +1,45 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.mineru import get_page_count, run_mineru, run_mineru_sharded
+
+
+class Command(BaseCommand):
+    help = "比较单次执行与分片并行执行 MinerU 的耗时 (wall-clock)。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('pdf', help="用于测试的 PDF 文件路径")
+        parser.add_argument('--shard-pages', type=int, default=settings.MINERU_SHARD_PAGES)
+        parser.add_argument('--concurrency', type=int, default=settings.MINERU_SHARD_CONCURRENCY)
+        parser.add_argument('--skip-single', action='store_true', help="只运行分片模式")
+
+    def handle(self, *args, **options):
+        pdf_path = Path(options['pdf'])
+        if not pdf_path.exists():
+            raise CommandError(f"File not found: {pdf_path}")
+
+        page_count = get_page_count(pdf_path, poppler_path=os.getenv('POPPLER_PATH', None))
+        self.stdout.write(f"{pdf_path.name}: {page_count} pages")
+
+        timings = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            if not options['skip_single']:
+                start = time.perf_counter()
+                run_mineru(pdf_path, Path(tmp) / 'single')
+                timings['single'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            run_mineru_sharded(pdf_path, Path(tmp) / 'sharded', page_count,
+                               shard_pages=options['shard_pages'],
+                               concurrency=options['concurrency'])
+            timings['sharded'] = time.perf_counter() - start
+
+        for name, seconds in timings.items():
+            self.stdout.write(f"{name:>8}: {seconds:8.2f}s  ({page_count / seconds:.2f} pages/s)")
+        if 'single' in timings:
+            self.stdout.write(self.style.SUCCESS(f" speedup: {timings['single'] / timings['sharded']:.2f}x"))
@@ -0,0 +1,97 @@
+import multiprocessing
+import shutil
+import signal
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import mineru, mineru_pool
+
+
+def _serve_pool(**kwargs):
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    mineru_pool.serve(**kwargs)
+
+
+def _synthetic_pdf(path, pages):
+    from PIL import Image, ImageDraw
+
+    images = []
+    for index in range(pages):
+        image = Image.new('L', (612, 792), 255)
+        draw = ImageDraw.Draw(image)
+        draw.text((72, 72), f"Section {index + 1}", fill=0)
+        for line in range(20):
+            draw.text((72, 110 + 14 * line), f"Benchmark page {index + 1}, line {line + 1}.", fill=0)
+        images.append(image)
+    images[0].save(path, 'PDF', resolution=72, save_all=True, append_images=images[1:])
+    return path
+
+
+class Command(BaseCommand):
+    help = ("比较每次冷启动 MinerU CLI 与常驻 worker 池的单文档延迟。"
+            "池由本命令在临时 unix socket 上启动；默认使用合成的 PDF，"
+            "用 --pdf 指定真实文档时按页码区间截取前 N 页。"
+            "无模型环境可配合 MINERU_COMMAND='python fake_mineru.py'、"
+            "--engine fake_mineru.Engine 与 FAKE_MINERU_LOAD_SECONDS 使用。")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pdf', help="用于测试的 PDF，页数需不少于最大的 size")
+        parser.add_argument('--sizes', default='1,10,100', help="逗号分隔的页数")
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--engine', default=None, help="默认 MINERU_POOL_ENGINE")
+        parser.add_argument('--workers', type=int, default=1)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        tmp = Path(tempfile.mkdtemp(prefix='mineru-bench-'))
+        address = f"unix://{tmp / 'pool.sock'}"
+        pool = None
+        try:
+            if options['pdf']:
+                pdf_path = Path(options['pdf'])
+                available = mineru.get_page_count(pdf_path)
+                if available < max(sizes):
+                    raise CommandError(f"{pdf_path} has {available} pages; need at least {max(sizes)}.")
+            else:
+                pdf_path = _synthetic_pdf(tmp / 'benchmark.pdf', max(sizes))
+
+            started = time.perf_counter()
+            pool = multiprocessing.get_context('fork').Process(target=_serve_pool, kwargs=dict(
+                address=address, workers=options['workers'], engine=options['engine'],
+                max_jobs=sys.maxsize, max_rss_mb=0, warmup=True))
+            pool.start()
+            deadline = time.monotonic() + settings.MINERU_TIMEOUT
+            while True:
+                try:
+                    mineru_pool.ping(address, timeout=1)
+                    break
+                except mineru_pool.PoolUnavailable:
+                    if not pool.is_alive() or time.monotonic() > deadline:
+                        raise CommandError("MinerU pool did not become ready; see the log above.")
+                    time.sleep(0.2)
+            self.stdout.write(f"Pool ready in {time.perf_counter() - started:.2f}s (one-off model load and warm-up).")
+
+            self.stdout.write(f"{'pages':>6} {'cli median':>12} {'pool median':>12} {'speedup':>8}")
+            for size in sizes:
+                timings = {'cli': [], 'pool': []}
+                for run in range(options['repeat']):
+                    for mode, runner in (('cli', mineru.run_mineru_cli), ('pool', mineru_pool.run_job)):
+                        kwargs = {'address': address} if mode == 'pool' else {}
+                        output_dir = tmp / f"{mode}-{size}-{run}"
+                        t0 = time.perf_counter()
+                        runner(pdf_path, output_dir, start=0, end=size - 1, **kwargs)
+                        timings[mode].append(time.perf_counter() - t0)
+                        shutil.rmtree(output_dir, ignore_errors=True)
+                cli, warm = statistics.median(timings['cli']), statistics.median(timings['pool'])
+                self.stdout.write(f"{size:>6} {cli:>11.2f}s {warm:>11.2f}s {cli / warm:>7.1f}x")
+        finally:
+            if pool is not None and pool.is_alive():
+                pool.terminate()
+                pool.join()
+            shutil.rmtree(tmp, ignore_errors=True)
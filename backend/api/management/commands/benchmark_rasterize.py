@@ -0,0 +1,85 @@
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageDraw
+
+from api import rasterize
+
+
+def _synthetic_page(width, height, index):
+    # 白底文字行加灰色图块，压缩特性接近扫描/排版页面
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    line_height = max(12, height // 90)
+    for line in range(8, 80):
+        y = line * line_height
+        draw.text((width // 12, y), f"Page {index + 1} line {line}: " + "lorem ipsum dolor sit amet " * 6, fill=(20, 20, 20))
+    draw.rectangle((width // 8, height // 3, width // 2, height // 2), fill=(180, 190, 200))
+    return image
+
+
+class Command(BaseCommand):
+    help = ("测量页面栅格化吞吐量：按输出格式与编码线程数组合运行，报告渲染/编码耗时、"
+            "页/秒和每页各版本（全尺寸、审阅图、缩略图）的平均大小。"
+            "指定 --pdf 时走完整的 rasterize_pdf（需要 poppler），否则用合成页面只测编码。")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pdf', help="测试用 PDF；省略时只测编码")
+        parser.add_argument('--pages', type=int, default=20, help="页数（PDF 取前 N 页）")
+        parser.add_argument('--profile', default=None, help="栅格化档位，默认 RASTER_PROFILE")
+        parser.add_argument('--workers', default='1,2,4', help="逗号分隔的编码线程数")
+        parser.add_argument('--formats', default='jpeg,webp', help="逗号分隔的输出格式")
+
+    def handle(self, *args, **options):
+        workers_list = [int(w) for w in options['workers'].split(',') if w.strip()]
+        formats = [f.strip() for f in options['formats'].split(',') if f.strip()]
+        unknown = set(formats) - set(rasterize.FORMATS)
+        if unknown:
+            raise CommandError(f"Unknown formats: {', '.join(sorted(unknown))}")
+        dpi, quality = rasterize.get_profile(options['profile'])
+        widths = rasterize.rendition_widths()
+        pages = options['pages']
+        self.stdout.write(f"{pages} pages at {dpi} dpi, quality {quality}, renditions {widths or 'none'}"
+                          f"{'' if options['pdf'] else ' (synthetic pages, encode only)'}")
+        self.stdout.write(f"{'format':>6} {'workers':>7} {'render':>8} {'encode':>8} {'pages/s':>8} "
+                          f"{'full KB':>8} {'review KB':>9} {'thumb KB':>8}")
+
+        for fmt in formats:
+            for workers in workers_list:
+                out = Path(tempfile.mkdtemp(prefix='raster-bench-'))
+                try:
+                    if options['pdf']:
+                        stats = rasterize.rasterize_pdf(options['pdf'], out, pages, profile=options['profile'],
+                                                        fmt=fmt, encode_workers=workers)
+                    else:
+                        stats = self._encode_only(out, pages, dpi, quality, fmt, workers, widths)
+                finally:
+                    shutil.rmtree(out, ignore_errors=True)
+                total = stats['render_seconds'] + stats['encode_seconds']
+                per_page = {r: b / max(stats['pages'], 1) / 1024 for r, b in stats['bytes_by_rendition'].items()}
+                self.stdout.write(
+                    f"{fmt:>6} {workers:>7} {stats['render_seconds']:>7.2f}s {stats['encode_seconds']:>7.2f}s "
+                    f"{stats['pages'] / total if total else 0:>8.1f} {per_page.get('full', 0):>8.0f} "
+                    f"{per_page.get('review', 0):>9.0f} {per_page.get('thumb', 0):>8.0f}")
+
+    def _encode_only(self, out, pages, dpi, quality, fmt, workers, widths):
+        for rendition in widths:
+            (out / rasterize.RENDITION_DIRS[rendition]).mkdir(parents=True, exist_ok=True)
+        width, height = int(8.27 * dpi), int(11.69 * dpi)  # A4
+        images = [_synthetic_page(width, height, index) for index in range(pages)]
+        bytes_by_rendition = {}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for written in pool.map(
+                    lambda image, page: rasterize.encode_page(image, page, out, fmt, quality,
+                                                              settings.RASTER_PREVIEW_QUALITY, widths),
+                    images, range(1, pages + 1)):
+                for rendition, size in written.items():
+                    bytes_by_rendition[rendition] = bytes_by_rendition.get(rendition, 0) + size
+        return {'pages': pages, 'render_seconds': 0.0, 'encode_seconds': time.perf_counter() - started,
+                'bytes_by_rendition': bytes_by_rendition}
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import label_studio_tasks
+from api.models import OcrDocument
+
+
+class Command(BaseCommand):
+    help = ("为已处理的文档生成 Label Studio 任务产物。默认只重建缺失或来源已变化（OCR 结果、"
+            "映射配置）的产物，--force 时全部重建。")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--document', type=int, action='append', help="只处理指定文档，可重复")
+        parser.add_argument('--force', action='store_true', help="产物仍然有效时也重新生成")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        docs = OcrDocument.objects.exclude(raw_ocr_blob__isnull=True).exclude(raw_ocr_blob='') \
+            .exclude(mineru_json_path__isnull=True).exclude(mineru_json_path='').order_by('id')
+        if options['document']:
+            docs = docs.filter(id__in=options['document'])
+        built = current = 0
+        for doc in docs.iterator():
+            if not options['force'] and label_studio_tasks.current_path(doc) is not None:
+                current += 1
+                continue
+            try:
+                tasks = label_studio_tasks.build(doc)
+            except Exception as e:
+                self.stderr.write(f"Doc ID {doc.id}: {e}")
+                continue
+            built += 1
+            self.stdout.write(f"Doc ID {doc.id}: {tasks} tasks")
+        self.stdout.write(self.style.SUCCESS(f"{built} built, {current} already current in "
+                                             f"{time.perf_counter() - started:.1f}s"))
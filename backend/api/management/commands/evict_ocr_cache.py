@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import ocr_cache
+
+
+class Command(BaseCommand):
+    help = "按 LRU / 总容量回收不再被任何文档引用的 OCR 缓存条目。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-size-mb', type=int, default=settings.OCR_CACHE_MAX_SIZE_MB,
+                            help="缓存总容量上限 (MB)，超出时按最近最少使用回收")
+        parser.add_argument('--max-age-days', type=int, default=None,
+                            help="回收超过此天数未被使用的条目")
+        parser.add_argument('--dry-run', action='store_true', help="只列出将被回收的条目")
+
+    def handle(self, *args, **options):
+        max_age = timedelta(days=options['max_age_days']) if options['max_age_days'] else None
+        evicted = ocr_cache.evict(
+            max_bytes=options['max_size_mb'] * 1024 * 1024,
+            max_age=max_age,
+            dry_run=options['dry_run'],
+        )
+        for entry in evicted:
+            self.stdout.write(f"{'would evict' if options['dry_run'] else 'evicted'}: {entry} "
+                              f"{entry.size_bytes / 1024 / 1024:.1f} MB, last used {entry.last_used_at:%Y-%m-%d %H:%M}")
+        freed = sum(entry.size_bytes for entry in evicted)
+        self.stdout.write(self.style.SUCCESS(f"{len(evicted)} entries, {freed / 1024 / 1024:.1f} MB"))
@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import janitor
+
+
+class Command(BaseCommand):
+    help = ("清理 worker 崩溃后遗留的状态：心跳超时的 processing 文档重新入队并从断点继续，"
+            "删除不再被引用的 MinerU 输出目录与 OCR JSON blob 版本。--loop 时按间隔持续运行。")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="每 JANITOR_INTERVAL_SECONDS 秒运行一次，不退出")
+        parser.add_argument('--interval', type=int, default=settings.JANITOR_INTERVAL_SECONDS)
+        parser.add_argument('--min-age-hours', type=float, default=settings.ORPHAN_OUTPUT_MIN_AGE_HOURS,
+                            help="只删除超过此时长未修改的孤立输出目录与 blob")
+        parser.add_argument('--dry-run', action='store_true', help="只列出将要执行的操作")
+
+    def handle(self, *args, **options):
+        while True:
+            self._run_once(options)
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def _run_once(self, options):
+        prefix = 'would be ' if options['dry_run'] else ''
+        for doc, action in janitor.requeue_stale(dry_run=options['dry_run']):
+            self.stdout.write(f"Doc ID {doc.id}: {prefix}{action} (attempts so far: "
+                              f"{(doc.checkpoint or {}).get('attempts', 0)}, last heartbeat {doc.heartbeat_at})")
+        reaped = janitor.reap_orphans(min_age=timedelta(hours=options['min_age_hours']), dry_run=options['dry_run'])
+        for path, size in reaped:
+            self.stdout.write(f"{prefix}removed: {path} {size / 1024 / 1024:.1f} MB")
+        freed = sum(size for _, size in reaped)
+        self.stdout.write(self.style.SUCCESS(f"{len(reaped)} orphaned output directories, {freed / 1024 / 1024:.1f} MB"))
+        blobs = janitor.reap_orphan_blobs(min_age=timedelta(hours=options['min_age_hours']),
+                                          dry_run=options['dry_run'])
+        for path, size in blobs:
+            self.stdout.write(f"{prefix}removed: {path} {size / 1024 / 1024:.1f} MB")
+        freed = sum(size for _, size in blobs)
+        self.stdout.write(self.style.SUCCESS(f"{len(blobs)} unreferenced blobs, {freed / 1024 / 1024:.1f} MB"))
@@ -0,0 +1,45 @@
+import signal
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import mineru_pool
+
+
+class Command(BaseCommand):
+    help = ("启动常驻的 MinerU worker 池（每个 worker 只加载一次模型），"
+            "或用 --check 对正在运行的池做健康检查。")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', default=None, help="默认 MINERU_POOL_ADDRESS")
+        parser.add_argument('--workers', type=int, default=None, help="默认 MINERU_POOL_WORKERS")
+        parser.add_argument('--engine', default=None, help="引擎类的导入路径，默认 MINERU_POOL_ENGINE")
+        parser.add_argument('--max-jobs', type=int, default=None, help="默认 MINERU_POOL_MAX_JOBS")
+        parser.add_argument('--max-rss-mb', type=int, default=None, help="默认 MINERU_POOL_MAX_RSS_MB")
+        parser.add_argument('--no-warmup', action='store_true', help="不在启动时预热模型")
+        parser.add_argument('--check', action='store_true', help="只做健康检查，失败时以非 0 退出")
+
+    def handle(self, *args, **options):
+        address = options['address'] or settings.MINERU_POOL_ADDRESS
+        if not address:
+            raise CommandError("No pool address: set MINERU_POOL_ADDRESS or pass --address.")
+
+        if options['check']:
+            try:
+                reply = mineru_pool.ping(address)
+            except mineru_pool.PoolUnavailable as e:
+                raise CommandError(f"MinerU pool at {address} is unavailable: {e}")
+            self.stdout.write(f"MinerU pool at {address} is healthy: worker {reply.get('pid')}, "
+                              f"{reply.get('jobs')}/{reply.get('max_jobs')} jobs, "
+                              f"up {reply.get('uptime')}s, {reply.get('rss_mb')} MiB")
+            return
+
+        # docker stop 发送 SIGTERM：转为 SystemExit，让 serve 终止 worker 并清理 socket
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            mineru_pool.serve(address=address, workers=options['workers'], engine=options['engine'],
+                              max_jobs=options['max_jobs'], max_rss_mb=options['max_rss_mb'],
+                              warmup=False if options['no_warmup'] else None)
+        except KeyboardInterrupt:
+            sys.exit(0)
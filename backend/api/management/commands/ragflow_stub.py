@@ -0,0 +1,122 @@
+import collections
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class _StubState:
+    def __init__(self, fail_rate, latency):
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.keys = set()
+        self.requests = 0
+        self.chunks = 0
+        self.duplicates = 0
+        self.failures = 0
+        # 预先排好的响应 (status, body, headers)，按请求顺序依次返回，用于测试重试与错误处理
+        self.script = collections.deque()
+        # 收到的每个请求：(Idempotency-Key 请求头, 请求体)
+        self.received = []
+
+
+def _make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 支持 keep-alive，便于观察连接复用
+
+        def _reply(self, status, body, headers=None):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with state.lock:
+                state.received.append((self.headers.get('Idempotency-Key'), body))
+                scripted = state.script.popleft() if state.script else None
+            if scripted is not None:
+                return self._reply(*scripted)
+            if state.latency:
+                time.sleep(state.latency)
+            if random.random() < state.fail_rate:
+                with state.lock:
+                    state.failures += 1
+                return self._reply(503, {"code": 503, "message": "injected failure"})
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return self._reply(400, {"code": 400, "message": "invalid JSON"})
+
+            if isinstance(payload.get('chunks'), list):
+                items = [(c.get('idempotency_key'), c) for c in payload['chunks']]
+            else:
+                items = [(self.headers.get('Idempotency-Key'), payload)]
+            if any(not item.get('content') for _, item in items):
+                return self._reply(400, {"code": 400, "message": "content is required"})
+
+            with state.lock:
+                state.requests += 1
+                for key, _ in items:
+                    if key and key in state.keys:
+                        state.duplicates += 1
+                    else:
+                        state.keys.add(key)
+                        state.chunks += 1
+            self._reply(200, {"code": 0, "data": {"accepted": len(items)}})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def make_server(host='127.0.0.1', port=0, fail_rate=0.0, latency=0.0):
+    """创建桩服务（尚未启动）；port=0 时由系统分配端口。统计与脚本化响应在 server.state 上。"""
+    state = _StubState(fail_rate, latency)
+    server = ThreadingHTTPServer((host, port), _make_handler(state))
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+class Command(BaseCommand):
+    help = ("启动一个本地的 RAGFlow 兼容 chunk 接口桩，用于验证推送任务的并发、重试与幂等。"
+            "接受任意路径的 POST，按 Idempotency-Key 去重，可按比例注入 503。")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=9380)
+        parser.add_argument('--fail-rate', type=float, default=0.0, help="返回 503 的请求比例 (0-1)")
+        parser.add_argument('--latency', type=float, default=0.0, help="每个请求的模拟处理时间（秒）")
+        parser.add_argument('--report-every', type=float, default=5.0, help="统计输出间隔（秒）")
+
+    def handle(self, *args, **options):
+        server = make_server(options['host'], options['port'], options['fail_rate'], options['latency'])
+        state = server.state
+        self.stdout.write(f"RAGFlow stub listening on http://{options['host']}:{options['port']}/ "
+                          f"(fail rate {options['fail_rate']}, latency {options['latency']}s)")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        last_chunks, last_time = 0, time.perf_counter()
+        try:
+            while True:
+                time.sleep(options['report_every'])
+                now = time.perf_counter()
+                with state.lock:
+                    rate = (state.chunks - last_chunks) / (now - last_time)
+                    last_chunks, last_time = state.chunks, now
+                    self.stdout.write(f"requests={state.requests} chunks={state.chunks} "
+                                      f"duplicates={state.duplicates} injected_failures={state.failures} "
+                                      f"({rate:,.0f} chunks/s)")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
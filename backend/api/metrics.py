@@ -0,0 +1,170 @@
+"""
+Prometheus 指标。
+
+Celery worker 与 Web 进程分布在不同容器中，进程内的计数器无法被同一个
+/metrics 读到，因此直方图与计数器的原始值累加在 Redis 的一个 hash 中
+（HINCRBY / HINCRBYFLOAT，一次 pipeline 往返），抓取时再渲染为 Prometheus
+文本格式。队列积压等瞬时值在抓取时由 queues.metrics() 现算。
+写入失败只记录警告，不影响主流程。
+"""
+import logging
+import math
+
+import redis
+from django.conf import settings
+from django.http import HttpResponse
+
+from . import queues
+
+logger = logging.getLogger(__name__)
+
+KEY = 'ocr:metrics'
+SEP = '\x1f'
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+RATE_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'ocr_stage_duration_seconds': ('histogram', 'Duration of pipeline stages.', LATENCY_BUCKETS),
+    'ocr_stage_pages_per_second': ('histogram', 'Page throughput of page-based pipeline stages.', RATE_BUCKETS),
+    'ocr_queue_wait_seconds': ('histogram', 'Time documents spent queued before processing started.',
+                               LATENCY_BUCKETS),
+    'ocr_stage_pages_total': ('counter', 'Pages handled by pipeline stages.', None),
+    'ocr_stage_bytes_total': ('counter', 'Bytes read or written by pipeline stages.', None),
+    'ocr_runs_total': ('counter', 'Finished processing runs by outcome.', None),
+}
+
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+    return _client
+
+
+def _labels(labels):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped))
+
+
+def _bucket_index(value, buckets):
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            return str(index)
+    return 'inf'
+
+
+def _queue_histogram(pipe, name, value, labels):
+    buckets = METRICS[name][2]
+    prefix = f"{name}{SEP}{_labels(labels)}{SEP}"
+    pipe.hincrby(KEY, prefix + _bucket_index(value, buckets), 1)
+    pipe.hincrbyfloat(KEY, prefix + 'sum', value)
+
+
+def _queue_counter(pipe, name, amount, labels):
+    pipe.hincrbyfloat(KEY, f"{name}{SEP}{_labels(labels)}{SEP}", amount)
+
+
+def observe_stages(kind, stages):
+    """记录一次运行中各阶段的耗时、吞吐、页数与字节数。"""
+    try:
+        pipe = _get_client().pipeline(transaction=False)
+        for stage in stages:
+            labels = {'kind': kind, 'stage': stage['name']}
+            _queue_histogram(pipe, 'ocr_stage_duration_seconds', stage['seconds'], labels)
+            if stage.get('pages'):
+                _queue_counter(pipe, 'ocr_stage_pages_total', stage['pages'], labels)
+                if stage['seconds'] > 0:
+                    _queue_histogram(pipe, 'ocr_stage_pages_per_second', stage['pages'] / stage['seconds'], labels)
+            if stage.get('bytes'):
+                _queue_counter(pipe, 'ocr_stage_bytes_total', stage['bytes'], labels)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record {kind} stage metrics: {e}")
+
+
+def observe_run(kind, status):
+    try:
+        pipe = _get_client().pipeline(transaction=False)
+        _queue_counter(pipe, 'ocr_runs_total', 1, {'kind': kind, 'status': status})
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record {kind} run metric: {e}")
+
+
+def observe_queue_wait(queue, seconds):
+    try:
+        pipe = _get_client().pipeline(transaction=False)
+        _queue_histogram(pipe, 'ocr_queue_wait_seconds', seconds, {'queue': queue or 'unknown'})
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record queue wait metric: {e}")
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _render_histogram(lines, name, buckets, series):
+    for labels, fields in sorted(series.items()):
+        prefix = f"{labels}," if labels else ''
+        cumulative = 0
+        for index, bound in enumerate(buckets):
+            cumulative += int(float(fields.get(str(index), 0)))
+            lines.append(f'{name}_bucket{{{prefix}le="{_format_value(bound)}"}} {cumulative}')
+        cumulative += int(float(fields.get('inf', 0)))
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {_format_value(float(fields.get("sum", 0)))}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative}')
+
+
+def render(queue_metrics=None):
+    """渲染 Prometheus 文本格式（0.0.4）。queue_metrics 为 queues.metrics() 的结果。"""
+    lines = []
+    try:
+        raw = _get_client().hgetall(KEY)
+    except Exception as e:
+        logger.warning(f"Could not read metrics from Redis: {e}")
+        raw = {}
+        lines.append(f"# pipeline metrics unavailable: {e}")
+
+    # name -> labels -> suffix -> value
+    grouped = {}
+    for field, value in raw.items():
+        name, labels, suffix = field.decode('utf-8').split(SEP)
+        grouped.setdefault(name, {}).setdefault(labels, {})[suffix] = value.decode('utf-8')
+
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        series = grouped.get(name, {})
+        if metric_type == 'histogram':
+            _render_histogram(lines, name, buckets, series)
+        else:
+            for labels, fields in sorted(series.items()):
+                lines.append(f"{name}{{{labels}}} {_format_value(float(fields.get('', 0)))}")
+
+    if queue_metrics is not None:
+        gauges = (
+            ('ocr_queue_depth', 'depth', 'Messages waiting in the broker per queue.'),
+            ('ocr_queue_waiting_documents', 'waiting', 'Documents in pending state per queue.'),
+            ('ocr_queue_oldest_wait_seconds', 'oldest_wait_seconds', 'Age of the oldest pending document per queue.'),
+        )
+        for name, key, help_text in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for queue, values in queue_metrics.items():
+                if values.get(key) is not None:
+                    lines.append(f'{name}{{queue="{queue}"}} {_format_value(values[key])}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus 抓取端点：流水线各阶段的直方图与计数器，以及各处理队列的积压。"""
+    return HttpResponse(render(queue_metrics=queues.metrics()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_ocrdocument_corrected_label_studio_json_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ocrdocument',
+            index=models.Index(fields=['-created_at', '-id'], name='ocrdoc_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ocrdocument',
+            index=models.Index(fields=['status', '-created_at'], name='ocrdoc_status_created_idx'),
+        ),
+    ]
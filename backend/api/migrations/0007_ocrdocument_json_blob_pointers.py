@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_ocr_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='corrected_ls_blob',
+            field=models.CharField(blank=True, max_length=1024, null=True, verbose_name='校对后的JSON 文件'),
+        ),
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='corrected_ls_sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='corrected_ls_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='raw_ocr_blob',
+            field=models.CharField(blank=True, max_length=1024, null=True, verbose_name='原始OCR JSON 文件'),
+        ),
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='raw_ocr_sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='raw_ocr_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
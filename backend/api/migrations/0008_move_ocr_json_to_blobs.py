@@ -0,0 +1,86 @@
+# 将已有行内的 raw_ocr_json / corrected_label_studio_json 搬到压缩 blob 中。
+# 迁移不引用 api.blob_storage：下面是写作本迁移时 blob 格式（gzip，<doc_id>/<name>.json.gz）
+# 的冻结副本，之后 blob_storage 的改动不会改变迁移的行为。
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db import migrations
+
+
+def _blob_path(relative_path):
+    return Path(settings.BLOB_STORAGE_ROOT) / relative_path
+
+
+def write_json(doc_id, name, obj):
+    raw = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    payload = gzip.compress(raw, compresslevel=6)
+    relative_path = Path(str(doc_id)) / f"{name}.json.gz"
+    target = _blob_path(relative_path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{name}-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return relative_path.as_posix(), len(payload), hashlib.sha256(raw).hexdigest()
+
+
+def read_json(relative_path):
+    path = _blob_path(relative_path)
+    if str(path).endswith('.json.zst'):
+        # 迁移之后写出的 zstd blob（可选依赖）
+        import zstandard
+        with zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True) as f:
+            return json.load(f)
+    with gzip.open(path, 'rb') as f:
+        return json.load(f)
+
+
+def forwards(apps, schema_editor):
+    OcrDocument = apps.get_model('api', 'OcrDocument')
+    queryset = OcrDocument.objects.filter(raw_ocr_json__isnull=False) | \
+        OcrDocument.objects.filter(corrected_label_studio_json__isnull=False)
+    for doc in queryset.iterator(chunk_size=20):
+        update_fields = []
+        if doc.raw_ocr_json is not None:
+            doc.raw_ocr_blob, doc.raw_ocr_size, doc.raw_ocr_sha256 = \
+                write_json(doc.pk, 'raw_ocr_json', doc.raw_ocr_json)
+            update_fields += ['raw_ocr_blob', 'raw_ocr_size', 'raw_ocr_sha256']
+        if doc.corrected_label_studio_json is not None:
+            doc.corrected_ls_blob, doc.corrected_ls_size, doc.corrected_ls_sha256 = \
+                write_json(doc.pk, 'corrected_label_studio_json', doc.corrected_label_studio_json)
+            update_fields += ['corrected_ls_blob', 'corrected_ls_size', 'corrected_ls_sha256']
+        doc.save(update_fields=update_fields)
+
+
+def backwards(apps, schema_editor):
+    OcrDocument = apps.get_model('api', 'OcrDocument')
+    queryset = OcrDocument.objects.filter(raw_ocr_blob__isnull=False) | \
+        OcrDocument.objects.filter(corrected_ls_blob__isnull=False)
+    for doc in queryset.iterator(chunk_size=20):
+        if doc.raw_ocr_blob:
+            doc.raw_ocr_json = read_json(doc.raw_ocr_blob)
+        if doc.corrected_ls_blob:
+            doc.corrected_label_studio_json = read_json(doc.corrected_ls_blob)
+        doc.save(update_fields=['raw_ocr_json', 'corrected_label_studio_json'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_ocrdocument_json_blob_pointers'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
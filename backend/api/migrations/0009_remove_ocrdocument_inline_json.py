@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_move_ocr_json_to_blobs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='ocrdocument',
+            name='corrected_label_studio_json',
+        ),
+        migrations.RemoveField(
+            model_name='ocrdocument',
+            name='raw_ocr_json',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_ocrdocument_queue_routing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageCorrection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_index', models.IntegerField()),
+                ('result', models.JSONField()),
+                ('checksum', models.CharField(max_length=64)),
+                ('version', models.IntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_corrections', to='api.ocrdocument')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('document', 'page_index'), name='pagecorrection_doc_page_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_pagecorrection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='ingested_version',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='ragflow_blob',
+            field=models.CharField(blank=True, max_length=1024, null=True, verbose_name='RAGFlow payload 文件'),
+        ),
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='ragflow_sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='ragflow_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='ragflow_source_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='ragflow_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_documentbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32)),
+                ('status', models.CharField(max_length=50)),
+                ('worker', models.CharField(blank=True, max_length=255)),
+                ('queue', models.CharField(blank=True, max_length=50)),
+                ('queue_wait_seconds', models.FloatField(blank=True, null=True)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('duration_seconds', models.FloatField()),
+                ('pages', models.IntegerField(blank=True, null=True)),
+                ('peak_rss_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('stages', models.JSONField(default=list)),
+                ('error', models.TextField(blank=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='processing_runs', to='api.ocrdocument')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['document', '-started_at'], name='procrun_doc_started_idx'), models.Index(fields=['kind', '-started_at'], name='procrun_kind_started_idx')],
+            },
+        ),
+    ]
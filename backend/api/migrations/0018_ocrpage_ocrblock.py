@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_pagetext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcrBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_idx', models.IntegerField()),
+                ('seq', models.IntegerField()),
+                ('block_type', models.CharField(max_length=32)),
+                ('label', models.CharField(max_length=16)),
+                ('x0', models.FloatField()),
+                ('y0', models.FloatField()),
+                ('x1', models.FloatField()),
+                ('y1', models.FloatField()),
+                ('text', models.TextField(blank=True, null=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocr_blocks', to='api.ocrdocument')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('document', 'page_idx', 'seq'), name='ocrblock_doc_page_seq_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OcrPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_idx', models.IntegerField()),
+                ('width', models.FloatField(blank=True, null=True)),
+                ('height', models.FloatField(blank=True, null=True)),
+                ('block_count', models.IntegerField(default=0)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocr_pages', to='api.ocrdocument')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('document', 'page_idx'), name='ocrpage_doc_page_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_ocrpage_ocrblock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrdocument',
+            name='page_paths',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
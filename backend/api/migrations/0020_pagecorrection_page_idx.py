@@ -0,0 +1,50 @@
+# PageCorrection.page_index 原为 Label Studio 任务序号，改为 0 起始的 PDF 页码 (page_idx)。
+# 按文档当前的基线任务把已有的行从任务序号换算为页码；无法换算的行保持不变。
+
+import logging
+
+from django.db import IntegrityError, migrations, transaction
+
+from api import corrections
+
+logger = logging.getLogger(__name__)
+
+
+def forwards(apps, schema_editor):
+    OcrDocument = apps.get_model('api', 'OcrDocument')
+    PageCorrection = apps.get_model('api', 'PageCorrection')
+    # 基线任务由应用代码生成 (BlobJSON、任务产物)，用当前模型承载需要的指针字段
+    from api.models import OcrDocument as CurrentDocument
+
+    doc_ids = PageCorrection.objects.values_list('document_id', flat=True).distinct()
+    for row in OcrDocument.objects.filter(pk__in=list(doc_ids)).iterator(chunk_size=20):
+        doc = CurrentDocument(pk=row.pk, original_pdf_path=row.original_pdf_path,
+                              mineru_json_path=row.mineru_json_path, raw_ocr_blob=row.raw_ocr_blob,
+                              raw_ocr_sha256=row.raw_ocr_sha256, corrected_ls_blob=row.corrected_ls_blob)
+        try:
+            tasks = corrections.base_tasks(doc)
+        except Exception as e:
+            logger.warning(f"Cannot map page corrections of Doc ID {row.pk} to pages, keeping task indexes: {e}")
+            continue
+        page_idxs = [corrections.task_page_idx(task, position) for position, task in enumerate(tasks)]
+        # 页码不小于任务序号，从后往前改不会与尚未换算的行冲突
+        for correction in PageCorrection.objects.filter(document_id=row.pk).order_by('-page_index'):
+            if correction.page_index >= len(page_idxs) or page_idxs[correction.page_index] == correction.page_index:
+                continue
+            try:
+                with transaction.atomic():
+                    PageCorrection.objects.filter(pk=correction.pk).update(page_index=page_idxs[correction.page_index])
+            except IntegrityError:
+                logger.warning(f"Page correction {correction.pk} of Doc ID {row.pk} collides with page "
+                               f"{page_idxs[correction.page_index]}, keeping task index {correction.page_index}.")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_ocrdocument_page_paths'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,352 @@
+"""
+MinerU 调用相关的辅助函数。
+
+大文档会按页码区间切分为若干分片 (shard)，每个分片在独立的输出目录中
+并行运行一次 MinerU（利用 CLI 的 --start/--end 参数，无需物理拆分 PDF），
+最后再把各分片的 _middle.json 合并为一个 pdf_info，并将 page_idx
+重新映射回原文档的页码。文本层快速路径（见 text_layer）抽取的页不交给 MinerU，
+只有其余页按连续区间分片，合并时再按页码并入。
+
+配置了 MINERU_POOL_ADDRESS 时，每次执行优先交给常驻的 MinerU worker 池
+（见 mineru_pool），池不可达时回退到 CLI。
+"""
+import collections
+import itertools
+import logging
+import os
+import queue
+import re
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from pdf2image import pdfinfo_from_path
+
+from . import codec, mineru_pool
+
+logger = logging.getLogger(__name__)
+
+# tqdm 风格的进度行，例如 "Predict: 45%|████▌     | 9/20 [00:03<00:04, 2.50it/s]"
+PROGRESS_RE = re.compile(r'^\s*(?P<stage>[^:|]{1,60}?):\s*\d+%\|.*?\|\s*(?P<current>\d+)/(?P<total>\d+)')
+PROGRESS_MIN_INTERVAL = 0.5
+READ_POLL_SECONDS = 0.5
+TERMINATE_GRACE_SECONDS = 10
+OUTPUT_TAIL_LINES = 20
+
+
+def get_page_count(pdf_path, poppler_path=None):
+    """通过 pdfinfo 读取页数（只解析 PDF 元数据，不做渲染）。"""
+    info = pdfinfo_from_path(str(pdf_path), poppler_path=poppler_path)
+    return int(info.get('Pages', 0))
+
+
+def plan_shards(page_count, shard_pages, pages=None, max_gap=0):
+    """
+    将 [0, page_count) 切分为 (start, end) 闭区间列表，页码从 0 开始，
+    与 MinerU 的 --start/--end 语义一致。
+    pages 为只需处理的页码（例如文本层快速路径之外的页），不连续的页码先按连续区间
+    分段，每段再按 shard_pages 切分。相隔不超过 max_gap 页的区间合并为一段，
+    避免零散的页各自启动一次 MinerU。
+    """
+    if pages is None:
+        if shard_pages <= 0 or page_count <= shard_pages:
+            return [(0, max(page_count - 1, 0))]
+        runs = [(0, page_count - 1)]
+    else:
+        runs = []
+        for _, group in itertools.groupby(enumerate(sorted(set(pages))), key=lambda item: item[1] - item[0]):
+            group = [page for _, page in group]
+            if runs and group[0] - runs[-1][1] - 1 <= max_gap:
+                runs[-1] = (runs[-1][0], group[-1])
+            else:
+                runs.append((group[0], group[-1]))
+    if shard_pages <= 0:
+        return runs
+    return [
+        (start, min(start + shard_pages - 1, end))
+        for run_start, end in runs
+        for start in range(run_start, end + 1, shard_pages)
+    ]
+
+
+def shard_page_count(shards):
+    """分片覆盖的总页数。"""
+    return sum(end - start + 1 for start, end in shards)
+
+
+def shard_dir_name(start, end):
+    """
+    分片输出目录名包含页码区间：续跑时只复用区间完全相同的分片，MINERU_SHARD_PAGES
+    或需要 OCR 的页变化后，旧分片不会被当作另一个区间的结果合并。
+    """
+    return f"shard-{start:05d}-{end:05d}"
+
+
+def middle_json_path(output_dir, pdf_path):
+    """MinerU 输出 _middle.json 的约定路径。"""
+    pdf_path = Path(pdf_path)
+    return Path(output_dir) / pdf_path.stem / "auto" / f"{pdf_path.stem}_middle.json"
+
+
+def build_argv(pdf_path, output_dir, start=None, end=None):
+    """MINERU_COMMAND 可以包含参数（例如 "python fake_mineru.py"），按 shell 规则拆分，但不经过 shell 执行。"""
+    argv = [*shlex.split(settings.MINERU_COMMAND), '-p', str(pdf_path), '-o', str(output_dir)]
+    if start is not None:
+        argv += ['-s', str(start)]
+    if end is not None:
+        argv += ['-e', str(end)]
+    return argv
+
+
+def _pump(stream, lines):
+    # 文本模式下 \r 也被视为换行，tqdm 的原地刷新会逐条读出
+    with stream:
+        for line in stream:
+            lines.put(line)
+    lines.put(None)
+
+
+def terminate_process_group(process, label=''):
+    """先 SIGTERM 整个进程组（MinerU 会派生子进程），超时后 SIGKILL。"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        process.wait(timeout=TERMINATE_GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+        logger.warning(f"MinerU{label} did not exit after SIGTERM; sending SIGKILL.")
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+
+class ProgressReporter:
+    """
+    把 MinerU 的原始进度节流后转给 on_progress(stage, current, total)：
+    阶段切换与阶段完成时立即回调，其余至多每 PROGRESS_MIN_INTERVAL 秒一次。
+    """
+    def __init__(self, on_progress=None, label='', log_extra=None):
+        self.on_progress = on_progress
+        self.label = label
+        self.log_extra = log_extra or {}
+        self.last_stage = None
+        self.last_reported = 0.0
+
+    def __call__(self, stage, current, total):
+        now = time.monotonic()
+        if stage != self.last_stage:
+            logger.info(f"MinerU{self.label} stage: {stage} ({total} steps)", extra=self.log_extra)
+        if self.on_progress and (stage != self.last_stage or current == total
+                                 or now - self.last_reported >= PROGRESS_MIN_INTERVAL):
+            self.on_progress(stage, current, total)
+            self.last_reported = now
+        self.last_stage = stage
+
+
+def check_output(json_path):
+    """确认 MinerU 写出了非空的 _middle.json，返回其路径。"""
+    json_path = Path(json_path)
+    if not json_path.exists() or json_path.stat().st_size == 0:
+        raise FileNotFoundError(f"'_middle.json' not found at expected path: {json_path}. MinerU did not produce the expected output.")
+    return json_path
+
+
+def run_mineru(pdf_path, output_dir, start=None, end=None, label='', on_progress=None, check_cancelled=None):
+    """
+    执行一次 MinerU，返回生成的 _middle.json 路径。
+    start/end 为可选的 0 起始页码区间（含 end）。
+
+    配置了 worker 池时交给池处理，池不可达（未启动、socket 不存在、连接被拒）
+    时回退到 run_mineru_cli；两种方式的进度回调、取消与超时语义相同。
+    """
+    if settings.MINERU_POOL_ADDRESS:
+        try:
+            return mineru_pool.run_job(pdf_path, output_dir, start=start, end=end, label=label,
+                                       on_progress=on_progress, check_cancelled=check_cancelled)
+        except mineru_pool.PoolUnavailable as e:
+            logger.warning(f"MinerU pool unavailable{label} ({e}); falling back to the CLI.")
+    return run_mineru_cli(pdf_path, output_dir, start=start, end=end, label=label,
+                          on_progress=on_progress, check_cancelled=check_cancelled)
+
+
+def run_mineru_cli(pdf_path, output_dir, start=None, end=None, label='', on_progress=None, check_cancelled=None):
+    """
+    运行一次 MinerU CLI，返回生成的 _middle.json 路径。
+
+    输出逐行写入日志；识别到的进度行不逐条记录，而是经 ProgressReporter 节流后
+    回调 on_progress(stage, current, total)。
+    check_cancelled() 在读取循环中定期调用，抛出任何异常都会终止 MinerU 的整个进程组，
+    异常原样向上抛出。超过 MINERU_TIMEOUT 同样终止进程组。
+    """
+    argv = build_argv(pdf_path, output_dir, start, end)
+    logger.info(f"Executing command{label}: {shlex.join(argv)}")
+    process = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, encoding='utf-8', errors='replace', start_new_session=True)
+    lines = queue.Queue()
+    threading.Thread(target=_pump, args=(process.stdout, lines), daemon=True).start()
+
+    log_extra = {'mineru_pid': process.pid, 'mineru_label': label.strip()}
+    report = ProgressReporter(on_progress, label, log_extra)
+    deadline = time.monotonic() + settings.MINERU_TIMEOUT
+    tail = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+    try:
+        while True:
+            try:
+                line = lines.get(timeout=READ_POLL_SECONDS)
+            except queue.Empty:
+                line = ''
+            if line is None:
+                break
+            line = line.rstrip()
+            if line:
+                match = PROGRESS_RE.match(line)
+                if match is None:
+                    tail.append(line)
+                    logger.info(f"MinerU{label}: {line}", extra=log_extra)
+                else:
+                    report(match['stage'].strip(), int(match['current']), int(match['total']))
+            if check_cancelled:
+                check_cancelled()
+            if time.monotonic() > deadline:
+                raise subprocess.TimeoutExpired(argv, settings.MINERU_TIMEOUT)
+        returncode = process.wait(timeout=max(0.0, deadline - time.monotonic()))
+    except BaseException:
+        logger.info(f"Terminating MinerU{label} (pid {process.pid}).", extra=log_extra)
+        terminate_process_group(process, label)
+        raise
+
+    if returncode != 0:
+        raise RuntimeError(f"MinerU execution failed{label} with return code {returncode}. "
+                           f"Last output:\n" + "\n".join(tail))
+
+    # MinerU 在退出前写完输出文件，进程结束即可检查，无需额外等待
+    return check_output(middle_json_path(output_dir, pdf_path))
+
+
+def merge_middle_json(shard_results, extra_pages=None):
+    """
+    合并多个分片的 MinerU 输出。
+
+    shard_results: [(start_page, middle_json_dict), ...]
+    每个分片内部的 page_idx 都从 0 开始，这里加上分片起始页做偏移。
+    顶层的其它字段（如 _backend、_version_name）在合并页面之前取出，以起始页最小的分片为准，
+    该分片缺少的字段由后面的分片补上；分片的页全部被 extra_pages 取代时这些字段同样保留。
+    extra_pages 为不经 MinerU 得到的页（page_idx 已是原文档页码，见 text_layer），
+    与分片的页一起按 page_idx 排序；同一页两者都有时取 extra_pages 中的页。
+    """
+    shard_results = sorted(shard_results, key=lambda item: item[0])
+    merged = {}
+    for _, data in shard_results:
+        for key, value in data.items():
+            if key != 'pdf_info':
+                merged.setdefault(key, value)
+    merged['pdf_info'] = []
+    for start, data in shard_results:
+        for page in data.get('pdf_info', []):
+            page['page_idx'] = page.get('page_idx', 0) + start
+            merged['pdf_info'].append(page)
+    if extra_pages:
+        extra = {page.get('page_idx', 0): page for page in extra_pages}
+        pages = [page for page in merged['pdf_info'] if page.get('page_idx', 0) not in extra]
+        merged['pdf_info'] = sorted(pages + list(extra.values()), key=lambda page: page.get('page_idx', 0))
+    return merged
+
+
+class _ShardAborted(Exception):
+    pass
+
+
+def _load_finished_shard(json_path):
+    """读取上一次运行留下的分片结果；不存在或不完整（写到一半被中断）时返回 None。"""
+    if not json_path.exists():
+        return None
+    try:
+        return codec.load_path(json_path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Discarding incomplete shard output {json_path}: {e}")
+        return None
+
+
+def run_mineru_sharded(pdf_path, task_output_dir, page_count, shard_pages=None, concurrency=None, label='',
+                       on_progress=None, on_stage_progress=None, check_cancelled=None, pages=None, extra_pages=None):
+    """
+    按分片并行执行 MinerU，并将合并后的结果写到与单次执行相同的
+    <task_output_dir>/<stem>/auto/<stem>_middle.json 位置，
+    下游（mineru_json_path、删除逻辑等）无需感知是否分片。
+    on_progress(done_shards, total_shards) 在每个分片完成后调用；
+    on_stage_progress / check_cancelled 传给每次 run_mineru。
+    任一分片失败时，其余仍在运行的分片会被终止。
+    task_output_dir 中已有完整结果、且页码区间相同的分片（上一次运行中断前完成的）直接复用。
+    pages 为需要 MinerU 处理的页码（默认全部），extra_pages 为已由其它途径得到的页，
+    一并合并到输出中；pages 为空时不运行 MinerU。相隔不超过 MINERU_SHARD_MAX_GAP 页的
+    区间合并执行，其间的页仍取 extra_pages 中的结果。
+    """
+    shard_pages = shard_pages if shard_pages is not None else settings.MINERU_SHARD_PAGES
+    concurrency = concurrency if concurrency is not None else settings.MINERU_SHARD_CONCURRENCY
+    shards = plan_shards(page_count, shard_pages, pages, max_gap=settings.MINERU_SHARD_MAX_GAP)
+
+    if not extra_pages and shards == [(0, max(page_count - 1, 0))]:
+        return run_mineru(pdf_path, task_output_dir, label=label,
+                          on_progress=on_stage_progress, check_cancelled=check_cancelled)
+
+    if shards:
+        logger.info(f"Splitting {shard_page_count(shards)} of {page_count} pages into {len(shards)} shards{label} "
+                    f"(concurrency={concurrency}).")
+    shards_root = Path(task_output_dir) / "shards"
+    completed = itertools.count(1)
+    aborted = threading.Event()
+
+    def _check():
+        if aborted.is_set():
+            raise _ShardAborted()
+        if check_cancelled:
+            check_cancelled()
+
+    def _run_shard(index_and_range):
+        index, (start, end) = index_and_range
+        _check()  # 排队中的分片在已失败或已取消时不再启动
+        shard_dir = shards_root / shard_dir_name(start, end)
+        data = _load_finished_shard(middle_json_path(shard_dir, pdf_path))
+        if data is not None:
+            logger.info(f"Reusing finished shard {index} (pages {start}-{end}){label}.")
+            if on_progress:
+                on_progress(next(completed), len(shards))
+            return start, data
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            json_path = run_mineru(pdf_path, shard_dir, start=start, end=end,
+                                   label=f"{label} [shard {index}: pages {start}-{end}]",
+                                   on_progress=on_stage_progress, check_cancelled=_check)
+        except BaseException:
+            aborted.set()
+            raise
+        data = codec.load_path(json_path)
+        if on_progress:
+            on_progress(next(completed), len(shards))
+        return start, data
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(_run_shard, item) for item in enumerate(shards)]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        # 抛出最初的失败原因，而不是其它分片因此被终止的结果
+        raise next((e for e in errors if not isinstance(e, _ShardAborted)), errors[0])
+    shard_results = [future.result() for future in futures]
+
+    merged = merge_middle_json(shard_results, extra_pages)
+    json_path = middle_json_path(task_output_dir, pdf_path)
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    # 先写临时文件再改名，中断时不会留下半个 _middle.json
+    tmp_path = json_path.with_name(json_path.name + '.tmp')
+    codec.dump_path(merged, tmp_path)
+    os.replace(tmp_path, json_path)
+    logger.info(f"Merged {len(shards)} shards and {len(extra_pages or [])} extracted pages into {json_path}{label}.")
+    return json_path
@@ -0,0 +1,392 @@
+"""
+常驻的 MinerU worker 池。
+
+每次运行 MinerU CLI 都要重新导入框架并加载版面、公式、OCR 等模型，小文档的
+大部分耗时花在这里。worker 池（manage.py mineru_pool）由若干长期运行的进程组成，
+每个进程只加载一次模型，然后在本地 socket 上逐个接收任务：
+
+- 预派生：父进程绑定监听 socket 后 fork 出 MINERU_POOL_WORKERS 个 worker，各自
+  accept，每个 worker 同一时刻只处理一个连接；全部繁忙时新连接在 backlog 中排队。
+- 协议：一个连接一个请求，双方都发送 JSON 行。请求为 {"op": "parse", ...} 或
+  {"op": "ping"}；parse 的响应为若干 progress 事件，最后是 done 或 error。
+- 回收：worker 处理 MINERU_POOL_MAX_JOBS 个任务，或常驻内存超过
+  MINERU_POOL_MAX_RSS_MB 后退出，由父进程补齐，以限制长期运行中的内存增长。
+- 取消与超时：客户端关闭连接即可；worker 发现连接断开后立即退出进程
+  （进程内的推理无法安全中断），父进程随后补上一个新 worker。
+
+客户端 run_job 在连接失败时抛出 PoolUnavailable，由 mineru.run_mineru 回退到 CLI。
+"""
+import io
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import re
+import select
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from . import codec, mineru
+from .rasterize import current_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+LISTEN_BACKLOG = 64
+WATCH_INTERVAL_SECONDS = 0.5
+# 启动后很快就退出的 worker（例如模型加载失败）不立即重启，避免空转
+MIN_WORKER_LIFETIME_SECONDS = 5
+RESPAWN_BACKOFF_SECONDS = 5
+
+
+class PoolUnavailable(Exception):
+    pass
+
+
+class MineruEngine:
+    """
+    通过 MinerU 的 Python API 在进程内解析。模型在第一次解析时加载，之后缓存在
+    进程中（MinerU 内部的单例），这正是常驻 worker 的收益所在。
+    只写出下游使用的 _middle.json，路径与 CLI 的输出约定一致。
+    """
+    def load(self):
+        from mineru.cli.common import do_parse, read_fn
+        self._do_parse, self._read_fn = do_parse, read_fn
+
+    def parse(self, pdf_path, output_dir, start=None, end=None):
+        pdf_path = Path(pdf_path)
+        self._do_parse(
+            str(output_dir), [pdf_path.stem], [self._read_fn(pdf_path)], ['ch'],
+            backend='pipeline', parse_method='auto',
+            f_draw_layout_bbox=False, f_draw_span_bbox=False, f_dump_md=False, f_dump_middle_json=True,
+            f_dump_model_output=False, f_dump_orig_pdf=False, f_dump_content_list=False,
+            start_page_id=start or 0, end_page_id=end,
+        )
+        return mineru.middle_json_path(output_dir, pdf_path)
+
+
+def parse_address(address):
+    """'unix:///path/to.sock' 或 'tcp://host:port'，返回 (family, sockaddr)。"""
+    if address.startswith('unix://'):
+        return socket.AF_UNIX, address[len('unix://'):]
+    if address.startswith('tcp://'):
+        host, _, port = address[len('tcp://'):].rpartition(':')
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    raise ValueError(f"Unsupported MinerU pool address: {address!r} (expected unix:// or tcp://).")
+
+
+def _connect(address, timeout):
+    try:
+        family, sockaddr = parse_address(address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+    except (ValueError, OSError) as e:
+        raise PoolUnavailable(str(e))
+    sock.settimeout(timeout)
+    try:
+        sock.connect(sockaddr)
+    except OSError as e:
+        sock.close()
+        raise PoolUnavailable(f"cannot connect to {address}: {e}")
+    return sock
+
+
+def _send(sock, message):
+    sock.sendall(codec.dumps(message) + b'\n')
+
+
+def _iter_messages(sock, on_idle=None):
+    """逐条读取 JSON 行；读超时时调用 on_idle()（未提供则抛出超时）。连接被对端关闭时结束。"""
+    buffer = b''
+    while True:
+        try:
+            data = sock.recv(65536)
+        except socket.timeout:
+            if on_idle is None:
+                raise
+            on_idle()
+            continue
+        if not data:
+            return
+        buffer += data
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield codec.loads(line)
+            if on_idle:
+                on_idle()
+
+
+def ping(address=None, timeout=None):
+    """
+    健康检查：由某个空闲 worker 回复 pid、已处理任务数、运行时长与内存。
+    所有 worker 都在忙时会等到 timeout，此时抛出 PoolUnavailable。
+    """
+    address = address or settings.MINERU_POOL_ADDRESS
+    timeout = timeout if timeout is not None else settings.MINERU_POOL_CONNECT_TIMEOUT
+    with _connect(address, timeout) as sock:
+        try:
+            _send(sock, {"op": "ping"})
+            for message in _iter_messages(sock):
+                return message
+        except (OSError, ValueError) as e:
+            raise PoolUnavailable(f"no health-check reply from {address}: {e}")
+    raise PoolUnavailable(f"{address} closed the connection without replying.")
+
+
+def run_job(pdf_path, output_dir, start=None, end=None, label='', on_progress=None, check_cancelled=None,
+            address=None):
+    """
+    把一次解析交给 worker 池，返回 _middle.json 路径；参数与 mineru.run_mineru_cli 相同。
+    只有连接阶段的失败抛出 PoolUnavailable（可以回退到 CLI）；连接建立后 worker
+    中途退出、解析失败或超时都视为本次执行失败。
+    任务在池中排队的时间计入 MINERU_TIMEOUT。
+    """
+    address = address or settings.MINERU_POOL_ADDRESS
+    sock = _connect(address, settings.MINERU_POOL_CONNECT_TIMEOUT)
+    report = mineru.ProgressReporter(on_progress, label, {'mineru_label': label.strip()})
+    deadline = time.monotonic() + settings.MINERU_TIMEOUT
+
+    def _on_idle():
+        if check_cancelled:
+            check_cancelled()
+        if time.monotonic() > deadline:
+            raise subprocess.TimeoutExpired(['mineru-pool', str(pdf_path)], settings.MINERU_TIMEOUT)
+
+    # 异常离开 with 时连接被关闭，worker 随之终止正在执行的解析
+    with sock:
+        try:
+            _send(sock, {"op": "parse", "pdf_path": str(pdf_path), "output_dir": str(output_dir),
+                         "start": start, "end": end})
+        except OSError as e:
+            raise PoolUnavailable(f"cannot submit job to {address}: {e}")
+        logger.info(f"Submitted MinerU job{label} to pool at {address}.")
+        sock.settimeout(mineru.READ_POLL_SECONDS)
+        for message in _iter_messages(sock, on_idle=_on_idle):
+            event = message.get('event')
+            if event == 'progress':
+                report(message['stage'], message['current'], message['total'])
+            elif event == 'started':
+                logger.info(f"MinerU{label} running in pool worker pid {message.get('pid')}.")
+            elif event == 'done':
+                return mineru.check_output(message['json_path'])
+            elif event == 'error':
+                raise RuntimeError(f"MinerU execution failed{label} in pool worker: {message.get('message')}")
+    raise RuntimeError(f"MinerU pool worker closed the connection{label} before finishing the job.")
+
+
+class _ProgressStream(io.TextIOBase):
+    """
+    包装 worker 的 stderr：原样输出，同时把 tqdm 风格的进度行解析后交给 callback，
+    这样进程内的 MinerU 也能像 CLI 一样上报进度。
+    """
+    def __init__(self, stream):
+        self._stream = stream
+        self._buffer = ''
+        self.callback = None
+
+    def write(self, s):
+        self._stream.write(s)
+        self._buffer += s
+        *lines, self._buffer = re.split(r'[\r\n]', self._buffer)
+        callback = self.callback
+        if callback:
+            for line in lines:
+                match = mineru.PROGRESS_RE.match(line)
+                if match:
+                    callback(match['stage'].strip(), int(match['current']), int(match['total']))
+        return len(s)
+
+    def flush(self):
+        self._stream.flush()
+
+    def isatty(self):
+        return False
+
+    def fileno(self):
+        return self._stream.fileno()
+
+
+def _client_gone(conn):
+    # 客户端发送请求后不再写入，可读即意味着对端已关闭
+    try:
+        readable, _, _ = select.select([conn], [], [], 0)
+        return bool(readable) and conn.recv(1, socket.MSG_PEEK) == b''
+    except OSError:
+        return True
+
+
+def _watch_connection(conn, finished):
+    """客户端在任务结束前关闭连接（取消或超时）时立即退出 worker 进程。"""
+    while not finished.wait(WATCH_INTERVAL_SECONDS):
+        if _client_gone(conn) and not finished.is_set():
+            logger.warning(f"MinerU pool worker {os.getpid()}: client went away, abandoning job.")
+            os._exit(1)
+
+
+def _run_parse(conn, engine, request, progress_stream):
+    lock = threading.Lock()
+
+    def send(message):
+        with lock:
+            _send(conn, message)
+
+    finished = threading.Event()
+    threading.Thread(target=_watch_connection, args=(conn, finished), daemon=True).start()
+    def on_progress(stage, current, total):
+        # 在引擎写 stderr 的调用栈中执行，不能抛出；客户端断开由看门狗处理
+        try:
+            send({"event": "progress", "stage": stage, "current": current, "total": total})
+        except OSError:
+            pass
+
+    progress_stream.callback = on_progress
+    started = time.perf_counter()
+    try:
+        send({"event": "started", "pid": os.getpid()})
+        json_path = engine.parse(request['pdf_path'], request['output_dir'], request.get('start'), request.get('end'))
+        finished.set()
+        send({"event": "done", "json_path": str(json_path), "seconds": round(time.perf_counter() - started, 3)})
+    except Exception as e:
+        finished.set()
+        logger.error(f"MinerU pool worker {os.getpid()} failed on {request.get('pdf_path')}: {e}", exc_info=True)
+        send({"event": "error", "message": f"{type(e).__name__}: {e}"})
+    finally:
+        finished.set()
+        progress_stream.callback = None
+
+
+def _warm_up(engine):
+    """解析一页合成的 PDF，让模型在接收第一个任务之前就加载完毕。"""
+    from PIL import Image, ImageDraw
+
+    with tempfile.TemporaryDirectory(prefix='mineru-warmup-') as tmp:
+        pdf_path = Path(tmp) / 'warmup.pdf'
+        image = Image.new('RGB', (1240, 1754), 'white')
+        ImageDraw.Draw(image).text((120, 160), "MinerU worker warm-up page", fill='black')
+        image.save(pdf_path, 'PDF', resolution=150)
+        engine.parse(pdf_path, Path(tmp) / 'output', 0, 0)
+
+
+def _worker_main(listener, engine_path, max_jobs, max_rss_mb, warmup):
+    # SIGTERM 由父进程发送，直接退出；Ctrl-C 只由父进程处理
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    progress_stream = _ProgressStream(sys.stderr)
+    sys.stderr = progress_stream
+
+    pid, born = os.getpid(), time.monotonic()
+    engine = import_string(engine_path)()
+    engine.load()
+    if warmup:
+        _warm_up(engine)
+    logger.info(f"MinerU pool worker {pid} ready ({engine_path}, loaded in {time.monotonic() - born:.1f}s).")
+
+    jobs = 0
+    while True:
+        conn, _ = listener.accept()
+        with conn:
+            try:
+                with conn.makefile('rb') as reader:
+                    request = codec.loads(reader.readline() or b'{}')
+            except (OSError, ValueError) as e:
+                logger.warning(f"MinerU pool worker {pid}: bad request: {e}")
+                continue
+            if _client_gone(conn):
+                # 排队期间客户端已经放弃（取消、超时或健康检查超时）
+                logger.info(f"MinerU pool worker {pid}: skipping {request.get('op')} request from a departed client.")
+                continue
+            try:
+                if request.get('op') == 'ping':
+                    _send(conn, {"event": "pong", "pid": pid, "jobs": jobs, "max_jobs": max_jobs,
+                                 "uptime": round(time.monotonic() - born, 1),
+                                 "rss_mb": round(current_rss_bytes() / 2 ** 20, 1)})
+                    continue
+                if request.get('op') != 'parse':
+                    _send(conn, {"event": "error", "message": f"unknown op {request.get('op')!r}"})
+                    continue
+                jobs += 1
+                _run_parse(conn, engine, request, progress_stream)
+            except OSError as e:
+                logger.warning(f"MinerU pool worker {pid}: lost connection: {e}")
+
+        rss_mb = current_rss_bytes() / 2 ** 20
+        if jobs >= max_jobs or (max_rss_mb and rss_mb > max_rss_mb):
+            logger.info(f"MinerU pool worker {pid} recycling after {jobs} jobs ({rss_mb:.0f} MiB resident).")
+            return
+
+
+def _listen(address):
+    family, sockaddr = parse_address(address)
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    if family == socket.AF_UNIX:
+        Path(sockaddr).parent.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(sockaddr):
+            os.unlink(sockaddr)  # 上一次运行遗留的 socket 文件
+    else:
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(sockaddr)
+    listener.listen(LISTEN_BACKLOG)
+    return listener
+
+
+def serve(address=None, workers=None, engine=None, max_jobs=None, max_rss_mb=None, warmup=None):
+    """
+    运行 worker 池直到收到 SIGINT/SIGTERM（表现为 KeyboardInterrupt/SystemExit）。
+    worker 退出（回收、崩溃或因客户端断开而放弃任务）后按槽位补齐。
+    """
+    address = address or settings.MINERU_POOL_ADDRESS
+    workers = workers or settings.MINERU_POOL_WORKERS
+    engine = engine or settings.MINERU_POOL_ENGINE
+    max_jobs = max_jobs or settings.MINERU_POOL_MAX_JOBS
+    max_rss_mb = max_rss_mb if max_rss_mb is not None else settings.MINERU_POOL_MAX_RSS_MB
+    warmup = warmup if warmup is not None else settings.MINERU_POOL_WARMUP
+
+    listener = _listen(address)
+    # 父进程不加载模型，fork 出的 worker 各自加载，不共享推理框架的状态
+    context = multiprocessing.get_context('fork')
+    slots = {}
+
+    def spawn(slot):
+        connections.close_all()
+        process = context.Process(target=_worker_main, args=(listener, engine, max_jobs, max_rss_mb, warmup),
+                                  name=f"mineru-pool-{slot}")
+        process.start()
+        slots[slot] = (process, time.monotonic())
+
+    logger.info(f"MinerU pool listening on {address} with {workers} workers ({engine}, recycle after {max_jobs} jobs).")
+    try:
+        for slot in range(workers):
+            spawn(slot)
+        while True:
+            multiprocessing.connection.wait([process.sentinel for process, _ in slots.values()])
+            for slot, (process, started) in list(slots.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                lifetime = time.monotonic() - started
+                logger.info(f"MinerU pool worker {process.pid} exited with code {process.exitcode} after {lifetime:.0f}s.")
+                if process.exitcode and lifetime < MIN_WORKER_LIFETIME_SECONDS:
+                    time.sleep(RESPAWN_BACKOFF_SECONDS)
+                spawn(slot)
+    finally:
+        for process, _ in slots.values():
+            if process.is_alive():
+                process.terminate()
+        for process, _ in slots.values():
+            process.join(timeout=mineru.TERMINATE_GRACE_SECONDS)
+            if process.is_alive():
+                process.kill()
+        listener.close()
+        family, sockaddr = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(sockaddr):
+            os.unlink(sockaddr)
+        logger.info("MinerU pool stopped.")
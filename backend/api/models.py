@@ -1,6 +1,51 @@
 # api/models.py
+import uuid
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+from .blob_storage import BlobJSON
+
+
+class OcrCacheEntry(models.Model):
+    """
+    内容寻址的 OCR 结果缓存。
+
+    以 PDF 的 SHA-256 + MinerU 版本 + 栅格化参数为键，指向一份已生成的
+    MinerU 输出目录（_middle.json 与 pages/）。多个 OcrDocument 可以共享
+    同一条目，引用计数即指向它的文档数。
+    """
+    cache_key = models.CharField(max_length=64, unique=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    mineru_version = models.CharField(max_length=64)
+    raster_profile = models.CharField(max_length=64)
+    output_dir = models.CharField(max_length=1024)
+    json_path = models.CharField(max_length=1024)
+    size_bytes = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.mineru_version}, {self.raster_profile})"
+
+
+class DocumentBatch(models.Model):
+    """
+    一次批量上传（多个 PDF 或 zip/tar 归档）。进度由所属文档的状态汇总得出，
+    rejected 记录未被接收的条目（非 PDF、超过大小上限等）及原因。
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255, blank=True)
+    total = models.IntegerField(default=0)
+    rejected = models.JSONField(default=list, blank=True)
+    group_id = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name or self.id} ({self.total} documents)"
+
+
 class OcrDocument(models.Model):
     """
     Represents a single document processing workflow.
@@ -8,16 +53,248 @@ class OcrDocument(models.Model):
     original_pdf_path = models.CharField(max_length=1024)
     mineru_json_path = models.CharField(max_length=1024, blank=True, null=True)
 
-    # FIX: 添加此字段以存储来自 MinerU 的原始 OCR JSON。
-    # 这修复了 celery 任务中一个潜在的保存错误，并有助于调试。
-    raw_ocr_json = models.JSONField(null=True, blank=True, verbose_name="原始OCR JSON")
+    # 来自 MinerU 的原始 OCR JSON 与用户从 Label Studio 提交的校对 JSON
+    # 以压缩 blob 的形式存放在 BLOB_STORAGE_ROOT 下，行内只保留指针、压缩后大小和校验和。
+    # 通过 raw_ocr_json / corrected_label_studio_json 属性按需加载。
+    raw_ocr_blob = models.CharField(max_length=1024, null=True, blank=True, verbose_name="原始OCR JSON 文件")
+    raw_ocr_size = models.BigIntegerField(null=True, blank=True)
+    raw_ocr_sha256 = models.CharField(max_length=64, null=True, blank=True)
+
+    corrected_ls_blob = models.CharField(max_length=1024, null=True, blank=True, verbose_name="校对后的JSON 文件")
+    corrected_ls_size = models.BigIntegerField(null=True, blank=True)
+    corrected_ls_sha256 = models.CharField(max_length=64, null=True, blank=True)
+
+    # 最近一次生成的 RAGFlow payload（版本化产物）。source_key 标识生成时的校对数据，
+    # 未变化时下载直接返回该产物；ingested_version 记录显式入库时的版本。
+    ragflow_blob = models.CharField(max_length=1024, null=True, blank=True, verbose_name="RAGFlow payload 文件")
+    ragflow_size = models.BigIntegerField(null=True, blank=True)
+    ragflow_sha256 = models.CharField(max_length=64, null=True, blank=True)
+    ragflow_version = models.IntegerField(default=0)
+    ragflow_source_key = models.CharField(max_length=64, null=True, blank=True)
+    ingested_version = models.IntegerField(null=True, blank=True)
 
-    # NEW: 添加此字段以存储用户从 Label Studio 提交的、校对后的 JSON 数据。
-    corrected_label_studio_json = models.JSONField(null=True, blank=True, verbose_name="校对后的JSON")
+    raw_ocr_json = BlobJSON('raw_ocr')
+    corrected_label_studio_json = BlobJSON('corrected_ls')
+    ragflow_payload = BlobJSON('ragflow')
+
+    RAW_OCR_FIELDS = ['raw_ocr_blob', 'raw_ocr_size', 'raw_ocr_sha256']
+    CORRECTED_LS_FIELDS = ['corrected_ls_blob', 'corrected_ls_size', 'corrected_ls_sha256']
+    RAGFLOW_FIELDS = ['ragflow_blob', 'ragflow_size', 'ragflow_sha256', 'ragflow_version', 'ragflow_source_key']
 
     # UPDATED: 状态选项已更新，增加了 'corrected'。
     status = models.CharField(max_length=50, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # 上传时流式计算的 PDF SHA-256，以及命中/登记的共享 OCR 结果
+    content_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    cache_entry = models.ForeignKey(OcrCacheEntry, null=True, blank=True, on_delete=models.SET_NULL,
+                                    related_name='documents')
+
+    # 上传时测得的页数与分配到的处理队列，用于按大小分道和排队时间统计
+    page_count = models.IntegerField(null=True, blank=True)
+    queue = models.CharField(max_length=50, blank=True, null=True)
+    queued_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+
+    # 各页的处理路径（见 api.text_layer）：{'text_layer': n, 'ocr': m, 'ocr_reasons': {原因: 页数}}；
+    # 命中 OCR 缓存的文档按结果中的标记统计，没有 ocr_reasons
+    page_paths = models.JSONField(default=dict, blank=True)
+
+    # 断点续跑（见 api.checkpoints）：持有该文档的任务 ID、处理中的心跳，
+    # 以及输出目录与最后完成的阶段/页；处理完成或取消后清空
+    task_id = models.CharField(max_length=255, blank=True, default='')
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    checkpoint = models.JSONField(default=dict, blank=True)
+
+    # 通过批量接口上传时所属的批次
+    batch = models.ForeignKey(DocumentBatch, null=True, blank=True, on_delete=models.SET_NULL,
+                              related_name='documents')
+
+    class Meta:
+        indexes = [
+            # 支撑列表接口的游标分页 (created_at, id) 与按状态过滤
+            models.Index(fields=['-created_at', '-id'], name='ocrdoc_created_id_idx'),
+            models.Index(fields=['status', '-created_at'], name='ocrdoc_status_created_idx'),
+            models.Index(fields=['queue', 'status'], name='ocrdoc_queue_status_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # BlobJSON 属性的新值在这里才写盘，旧 blob 等事务提交后再删除
+        written, replaced = BlobJSON.write_all_pending(self, kwargs.get('update_fields'))
+        try:
+            super().save(*args, **kwargs)
+        except BaseException:
+            # 行没有保存，新写出的 blob 无人引用
+            BlobJSON.delete_blobs(written)
+            raise
+        BlobJSON.delete_after_commit(replaced)
+
     def __str__(self):
         return self.original_pdf_path
+
+
+class UploadSession(models.Model):
+    """
+    一次可续传的分块上传。received_bytes 是服务端已确认写盘的偏移量，
+    全部字节到齐后创建 document 并投递处理任务。
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    received_bytes = models.BigIntegerField(default=0)
+    # uploading / completed / aborted
+    status = models.CharField(max_length=20, default='uploading')
+    document = models.OneToOneField(OcrDocument, null=True, blank=True, on_delete=models.SET_NULL,
+                                    related_name='upload_session')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received_bytes}/{self.total_size})"
+
+
+class PageCorrection(models.Model):
+    """
+    单页的校对增量：保存某一页校对后的 annotation result，page_index 为 0 起始的 PDF 页码
+    （与 OcrPage.page_idx 相同，不是 Label Studio 任务序号）。
+    与基线（最近一次整体提交的导出，或原始 OCR 预测）合并后得到完整导出。
+    每页一行，不同审校者修改不同页面时互不覆盖；version 用于同页的乐观并发控制。
+    """
+    document = models.ForeignKey(OcrDocument, on_delete=models.CASCADE, related_name='page_corrections')
+    page_index = models.IntegerField()
+    result = models.JSONField()
+    checksum = models.CharField(max_length=64)
+    version = models.IntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'page_index'], name='pagecorrection_doc_page_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Doc {self.document_id} page {self.page_index} v{self.version}"
+
+
+class OcrPage(models.Model):
+    """
+    MinerU pdf_info 中的一页，入库时由 api.ocr_pages 拆出，按页读取时无需加载整份 raw_ocr_json。
+    page_idx 与 MinerU 一致（从 0 开始）；width/height 为 page_size，无效时为空。
+    """
+    document = models.ForeignKey(OcrDocument, on_delete=models.CASCADE, related_name='ocr_pages')
+    page_idx = models.IntegerField()
+    width = models.FloatField(null=True, blank=True)
+    height = models.FloatField(null=True, blank=True)
+    block_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'page_idx'], name='ocrpage_doc_page_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Doc {self.document_id} page {self.page_idx}"
+
+
+class OcrBlock(models.Model):
+    """
+    页面上的一个区域，与 Label Studio 任务中的区域一一对应（collect_page_regions 的顺序，即 seq）：
+    文本类块按行拆开，figure 为块本身加其中的文字行，其余块为块本身。
+    bbox 为 PDF 坐标 (x0, y0, x1, y1)；text 为空表示该区域没有转写文本。
+    """
+    document = models.ForeignKey(OcrDocument, on_delete=models.CASCADE, related_name='ocr_blocks')
+    page_idx = models.IntegerField()
+    seq = models.IntegerField()
+    block_type = models.CharField(max_length=32)
+    label = models.CharField(max_length=16)
+    x0 = models.FloatField()
+    y0 = models.FloatField()
+    x1 = models.FloatField()
+    y1 = models.FloatField()
+    text = models.TextField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'page_idx', 'seq'], name='ocrblock_doc_page_seq_uniq'),
+        ]
+
+    @property
+    def bbox(self):
+        return [self.x0, self.y0, self.x1, self.y1]
+
+    def __str__(self):
+        return f"Doc {self.document_id} page {self.page_idx} #{self.seq} ({self.label})"
+
+
+class PageText(models.Model):
+    """
+    全文检索索引：每页一行可检索的文本，由 api.search 在处理完成和提交校对后增量维护。
+    page_index 为 0 起始的 PDF 页码 (page_idx)。
+    有校对时取校对后的文本 (source='corrected')，否则取 OCR 文本 (source='ocr')；
+    checksum 未变化的页不会重写。search_vector 按 SEARCH_TEXT_CONFIG 计算（GIN 索引）。
+    """
+    document = models.ForeignKey(OcrDocument, on_delete=models.CASCADE, related_name='page_texts')
+    page_index = models.IntegerField()
+    source = models.CharField(max_length=16)
+    text = models.TextField()
+    checksum = models.CharField(max_length=64)
+    search_vector = SearchVectorField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'page_index'], name='pagetext_doc_page_uniq'),
+        ]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='pagetext_search_idx'),
+        ]
+
+    def __str__(self):
+        return f"Doc {self.document_id} page {self.page_index} ({self.source})"
+
+
+class SearchTerm(models.Model):
+    """
+    检索词表：PageText.search_vector 中出现过的词位（只增不删）。模糊查询先在这张
+    小表上用 pg_trgm 找出与查询词相近的词，再改写成 tsquery 走 search_vector 索引，
+    避免在整页文本上逐行计算相似度。
+    """
+    word = models.TextField(unique=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['word'], name='searchterm_word_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
+    def __str__(self):
+        return self.word
+
+
+class ProcessingRun(models.Model):
+    """
+    一次处理或转换运行的分阶段计时，由 api.instrumentation.Recorder 写入。
+    stages 为 [{"name", "seconds", "pages", "bytes", "peak_rss_bytes"}, ...]，按执行顺序排列。
+    """
+    document = models.ForeignKey(OcrDocument, on_delete=models.CASCADE, related_name='processing_runs')
+    # process / label_studio / ragflow
+    kind = models.CharField(max_length=32)
+    status = models.CharField(max_length=50)
+    worker = models.CharField(max_length=255, blank=True)
+    queue = models.CharField(max_length=50, blank=True)
+    queue_wait_seconds = models.FloatField(null=True, blank=True)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    duration_seconds = models.FloatField()
+    pages = models.IntegerField(null=True, blank=True)
+    peak_rss_bytes = models.BigIntegerField(null=True, blank=True)
+    stages = models.JSONField(default=list)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['document', '-started_at'], name='procrun_doc_started_idx'),
+            models.Index(fields=['kind', '-started_at'], name='procrun_kind_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"Doc {self.document_id} {self.kind} {self.status} ({self.duration_seconds:.1f}s)"
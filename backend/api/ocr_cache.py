@@ -0,0 +1,178 @@
+"""
+内容寻址的 OCR 结果缓存。
+
+上传时一边写盘一边计算 SHA-256；处理时若相同 PDF（且 MinerU 版本、栅格化
+参数一致）已有结果，则直接引用已有的输出目录，不再运行 MinerU。
+共享目录只有在最后一个引用它的文档被删除后才会被清理（或保留给
+evict_ocr_cache 命令按 LRU/容量回收）。
+
+并发：lookup / register 在锁住条目行 (select_for_update) 的同一事务中把文档挂到条目上，
+release / evict 同样先锁住条目行、在事务内重新确认没有文档引用后才删除目录，
+因此不会出现刚命中缓存的文档指向已被回收的输出。
+"""
+import hashlib
+import logging
+import shutil
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import text_layer
+from .models import OcrCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+class HashingFile(File):
+    """
+    包装上传文件，在 Storage 逐块写盘时顺便计算 SHA-256，避免二次读取。
+    """
+    def __init__(self, file, name=None):
+        super().__init__(file, name or getattr(file, 'name', None))
+        self.hasher = hashlib.sha256()
+
+    def chunks(self, chunk_size=None):
+        for chunk in super().chunks(chunk_size):
+            self.hasher.update(chunk)
+            yield chunk
+
+    @property
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+
+@lru_cache(maxsize=1)
+def mineru_version():
+    try:
+        return metadata.version('mineru')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+def build_cache_key(content_hash, raster_profile=None):
+    raster_profile = raster_profile or settings.RASTER_PROFILE
+    profile = settings.RASTER_PROFILES.get(raster_profile, {})
+    raw = f"{content_hash}:{mineru_version()}:{raster_profile}:{profile.get('dpi')}:{profile.get('quality')}"
+    # 输出目录中的图片格式与缩小版本同样取决于配置
+    raw += (f":{settings.RASTER_FORMAT}:{settings.RASTER_REVIEW_WIDTH}:{settings.RASTER_THUMBNAIL_WIDTH}"
+            f":{settings.RASTER_PREVIEW_QUALITY}")
+    # 启用文本层快速路径时结果同样取决于其配置；未启用时键与此前相同
+    if text_layer.fingerprint():
+        raw += f":{text_layer.fingerprint()}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def dir_size(path):
+    return sum(p.stat().st_size for p in Path(path).rglob('*') if p.is_file())
+
+
+def _attach(entry, document):
+    if document is not None:
+        document.cache_entry = entry
+        document.save(update_fields=['cache_entry'])
+
+
+def lookup(content_hash, document=None):
+    """
+    返回可复用的缓存条目；输出文件已丢失的条目会被清除。
+    给出 document 时在持有条目行锁的事务内把它挂到条目上，之后 evict 不会再回收该条目。
+    """
+    if not content_hash:
+        return None
+    with transaction.atomic():
+        entry = OcrCacheEntry.objects.select_for_update().filter(cache_key=build_cache_key(content_hash)).first()
+        if entry is None:
+            return None
+        if not Path(entry.json_path).exists():
+            logger.warning(f"OCR cache entry {entry.pk} points to missing output {entry.json_path}; dropping it.")
+            entry.delete()
+            return None
+        entry.last_used_at = timezone.now()
+        entry.save(update_fields=['last_used_at'])
+        _attach(entry, document)
+    return entry
+
+
+def register(content_hash, output_dir, json_path, document=None):
+    """
+    将一次成功的处理结果登记为缓存条目，给出 document 时在同一事务中挂到条目上。
+    若并发的相同上传已抢先登记，返回 None，调用方保留自己的私有输出。
+    """
+    if not content_hash:
+        return None
+    try:
+        with transaction.atomic():
+            entry = OcrCacheEntry.objects.create(
+                cache_key=build_cache_key(content_hash),
+                content_hash=content_hash,
+                mineru_version=mineru_version(),
+                raster_profile=settings.RASTER_PROFILE,
+                output_dir=str(output_dir),
+                json_path=str(json_path),
+                size_bytes=dir_size(output_dir),
+            )
+            _attach(entry, document)
+            return entry
+    except IntegrityError:
+        logger.info(f"OCR cache entry for {content_hash[:12]} already registered; keeping private output.")
+        return None
+
+
+def remove_entry(entry):
+    """删除缓存条目及其输出目录。"""
+    output_dir = Path(entry.output_dir)
+    if output_dir.is_dir() and output_dir.name != 'mineru_output':
+        shutil.rmtree(output_dir, ignore_errors=True)
+    entry.delete()
+
+
+def remove_if_unreferenced(entry_id):
+    """
+    锁住条目行并重新确认没有文档引用后删除条目及其输出，返回是否删除。
+    并发的 lookup 要么已挂上文档（这里看到引用而放弃），要么等到这里提交后找不到条目。
+    """
+    with transaction.atomic():
+        entry = OcrCacheEntry.objects.select_for_update().filter(pk=entry_id).first()
+        if entry is None or entry.documents.exists():
+            return False
+        remove_entry(entry)
+    return True
+
+
+def release(entry):
+    """
+    文档删除后调用：仍有其它文档引用时什么都不做；
+    引用归零时按 OCR_CACHE_RETAIN_UNREFERENCED 决定立即删除还是留作缓存。
+    返回是否删除了共享产物。
+    """
+    if settings.OCR_CACHE_RETAIN_UNREFERENCED:
+        return False
+    return remove_if_unreferenced(entry.pk)
+
+
+def evict(max_bytes=None, max_age=None, dry_run=False):
+    """
+    回收无引用的缓存条目：先回收超过 max_age（timedelta）未使用的，
+    再按最近最少使用的顺序回收，直到总体积不超过 max_bytes。
+    仍被文档引用的条目永远不会被回收。返回被回收的条目列表。
+    """
+    unreferenced = list(OcrCacheEntry.objects.filter(documents__isnull=True).order_by('last_used_at'))
+    total_bytes = sum(OcrCacheEntry.objects.values_list('size_bytes', flat=True))
+    cutoff = timezone.now() - max_age if max_age else None
+
+    evicted = []
+    for entry in unreferenced:
+        expired = cutoff is not None and entry.last_used_at < cutoff
+        over_size = max_bytes is not None and total_bytes > max_bytes
+        if not (expired or over_size):
+            continue
+        if not dry_run and not remove_if_unreferenced(entry.pk):
+            continue  # 列出候选之后又被新的文档引用
+        evicted.append(entry)
+        total_bytes -= entry.size_bytes
+    return evicted
@@ -0,0 +1,128 @@
+"""
+MinerU pdf_info 的规范化存储。
+
+入库时把每页拆成一行 OcrPage 和若干 OcrBlock（每个 Label Studio 区域一行，bbox 拆成
+x0/y0/x1/y1 四列），按 OCR_ROWS_BATCH_SIZE 分批 bulk_create。单页的任务、文本和
+bbox 查询只读取这一页的行，整份文档的 Label Studio 任务也由行生成，不再加载并解析
+整份 raw_ocr_json；完整 JSON 仍保存在 blob 中作为归档（下载、重新拆分）。
+从归档重新拆分时用 codec.iter_pages 流式读取，同一时刻只解码一页。
+"""
+import itertools
+import logging
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import blob_storage, codec
+from .label_studio import iter_page_regions, page_task
+from .models import OcrBlock, OcrPage
+
+logger = logging.getLogger(__name__)
+
+
+def _page_rows(doc, pdf_info, pages):
+    """逐个产出 OcrBlock；每页的区域产出完后把该页的 OcrPage 追加到 pages。"""
+    for position, page_data in enumerate(pdf_info):
+        page_idx = page_data.get('page_idx', position)
+        page_size = page_data.get('page_size') or []
+        width, height = page_size if len(page_size) == 2 else (None, None)
+        count = 0
+        for seq, (block_type, bbox, label, text) in enumerate(iter_page_regions(page_data)):
+            x0, y0, x1, y1 = (float(value) for value in bbox)
+            yield OcrBlock(document=doc, page_idx=page_idx, seq=seq, block_type=block_type or '', label=label,
+                           x0=x0, y0=y0, x1=x1, y1=y1, text=text)
+            count += 1
+        pages.append(OcrPage(document=doc, page_idx=page_idx, width=width, height=height, block_count=count))
+
+
+def store(doc, ocr_data):
+    """把 pdf_info 拆成 OcrPage/OcrBlock 行（替换文档已有的行），返回 {'pages', 'blocks'}。"""
+    return _store(doc, (ocr_data or {}).get('pdf_info', []))
+
+
+def store_archived(doc):
+    """从归档的 raw_ocr blob 流式拆分：逐页解码，不把整份 JSON 载入内存。"""
+    with blob_storage.open_decompressed(doc.raw_ocr_blob) as f:
+        return _store(doc, codec.iter_pages(f))
+
+
+def _store(doc, pdf_info):
+    batch_size = settings.OCR_ROWS_BATCH_SIZE
+    pages = []
+    blocks = _page_rows(doc, pdf_info, pages)
+    written = 0
+    with transaction.atomic():
+        OcrBlock.objects.filter(document=doc).delete()
+        OcrPage.objects.filter(document=doc).delete()
+        # 分批从生成器取出，内存中最多保留一批块对象
+        while batch := list(itertools.islice(blocks, batch_size)):
+            OcrBlock.objects.bulk_create(batch, batch_size=batch_size)
+            written += len(batch)
+        OcrPage.objects.bulk_create(pages, batch_size=batch_size)
+    return {'pages': len(pages), 'blocks': written}
+
+
+def has_pages(doc_id):
+    return OcrPage.objects.filter(document_id=doc_id).exists()
+
+
+def ensure(doc):
+    """升级前处理的文档还没有行时从归档 JSON 拆分一次。返回文档是否有可用的行。"""
+    if has_pages(doc.pk):
+        return True
+    if not doc.raw_ocr_blob:
+        return False
+    try:
+        stats = store_archived(doc)
+    except IntegrityError:
+        # 并发的请求已经完成拆分
+        return True
+    logger.info(f"Split archived OCR JSON of Doc ID {doc.pk} into {stats['pages']} pages, {stats['blocks']} blocks.")
+    return True
+
+
+def page_size(page):
+    return (page.width, page.height) if page.width is not None else None
+
+
+def page_text(regions):
+    _, _, texts = regions
+    return '\n'.join(text for text in texts if text)
+
+
+def _regions(rows):
+    bboxes, labels, texts = [], [], []
+    for _, x0, y0, x1, y1, label, text in rows:
+        bboxes.append((x0, y0, x1, y1)); labels.append(label); texts.append(text)
+    return bboxes, labels, texts
+
+
+def iter_pages(doc_id, page_idxs=None):
+    """
+    按页序产出 (OcrPage, (bboxes, labels, texts))，与 collect_page_regions 的结果一致。
+    page_idxs 限定只读取这些页的行。
+    """
+    pages = OcrPage.objects.filter(document_id=doc_id).order_by('page_idx')
+    blocks = OcrBlock.objects.filter(document_id=doc_id).order_by('page_idx', 'seq') \
+        .values_list('page_idx', 'x0', 'y0', 'x1', 'y1', 'label', 'text')
+    if page_idxs is not None:
+        pages = pages.filter(page_idx__in=page_idxs)
+        blocks = blocks.filter(page_idx__in=page_idxs)
+    grouped = itertools.groupby(blocks.iterator(chunk_size=settings.OCR_ROWS_BATCH_SIZE), key=itemgetter(0))
+    current = next(grouped, None)
+    for page in list(pages):
+        while current is not None and current[0] < page.page_idx:
+            current = next(grouped, None)
+        rows = list(current[1]) if current is not None and current[0] == page.page_idx else []
+        yield page, _regions(rows)
+
+
+def ls_tasks(doc_id, unique_folder_name, page_idxs=None):
+    """由行生成 Label Studio 任务列表，结果与 generate_ls_tasks(raw_ocr_json) 相同。"""
+    tasks = []
+    for page, regions in iter_pages(doc_id, page_idxs):
+        task = page_task(page.page_idx, page_size(page), regions, unique_folder_name)
+        if task:
+            tasks.append(task)
+    return tasks
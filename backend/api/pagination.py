@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DocumentCursorPagination(CursorPagination):
+    """
+    按 (-created_at, -id) 排序的游标分页。
+
+    DRF 的 CursorPagination 只在游标中记录第一个排序字段 (created_at) 的位置，
+    created_at 相同的文档再以偏移量区分，并不是严格的 (created_at, id) keyset；
+    id 只保证排序稳定。翻页成本不随页数增长，新文档上传时已翻过的页不会重复或遗漏。
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,103 @@
+"""
+按文档大小分道的 Celery 队列。
+
+上传时用 pdfinfo 读取页数（只解析 PDF 元数据），不超过
+OCR_SMALL_MAX_PAGES 页的文档进入 small 队列，其余进入 large 队列，
+两条队列由各自并发数的 worker 消费，几页的发票不会再排在几百页的书后面。
+同一队列内页数越少优先级越高（Redis 传输中数字越小优先级越高）。
+"""
+import logging
+
+import redis
+from django.conf import settings
+from django.db.models import Avg, F, Max
+from django.utils import timezone
+
+from .mineru import get_page_count
+
+logger = logging.getLogger(__name__)
+
+MAX_PRIORITY = 9
+
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    return _client
+
+
+def lanes():
+    return [settings.OCR_QUEUE_SMALL, settings.OCR_QUEUE_LARGE]
+
+
+def measure_pages(pdf_path, poppler_path=None):
+    """读取页数；PDF 无法解析时返回 None。"""
+    try:
+        return get_page_count(pdf_path, poppler_path=poppler_path)
+    except Exception as e:
+        logger.warning(f"Could not read page count for {pdf_path}: {e}")
+        return None
+
+
+def route(page_count):
+    """
+    返回 (queue, priority)。页数未知时按大文档处理，避免误占 small 通道。
+    """
+    if page_count is None:
+        return settings.OCR_QUEUE_LARGE, MAX_PRIORITY
+    if page_count <= settings.OCR_SMALL_MAX_PAGES:
+        step = max(1, settings.OCR_SMALL_MAX_PAGES // (MAX_PRIORITY + 1))
+        return settings.OCR_QUEUE_SMALL, min(MAX_PRIORITY, page_count // step)
+    step = max(1, settings.OCR_LARGE_PRIORITY_STEP_PAGES)
+    return settings.OCR_QUEUE_LARGE, min(MAX_PRIORITY, (page_count - settings.OCR_SMALL_MAX_PAGES) // step)
+
+
+def _queue_keys(queue):
+    # kombu 的 Redis 优先级实现：优先级 0 使用原队列名，其余为 "<queue><sep><priority>"
+    sep = settings.CELERY_BROKER_TRANSPORT_OPTIONS.get('sep', '\x06\x16')
+    steps = settings.CELERY_BROKER_TRANSPORT_OPTIONS.get('priority_steps', [0])
+    return [queue if step == 0 else f"{queue}{sep}{step}" for step in steps]
+
+
+def queue_depth(queue):
+    try:
+        client = _get_client()
+        return sum(client.llen(key) for key in _queue_keys(queue))
+    except Exception as e:
+        logger.warning(f"Could not read depth of queue {queue}: {e}")
+        return None
+
+
+def metrics(window_seconds=3600):
+    """
+    每条队列的积压与等待时间：
+      depth                 Broker 中尚未被取走的消息数
+      waiting               处于 pending 的文档数
+      oldest_wait_seconds   仍在排队的文档中最长的等待时间
+      avg_wait_seconds      窗口内已开始处理的文档的平均排队时间
+      max_wait_seconds      窗口内的最大排队时间
+    """
+    from .models import OcrDocument
+
+    now = timezone.now()
+    since = now - timezone.timedelta(seconds=window_seconds)
+    result = {}
+    for queue in lanes():
+        lane_docs = OcrDocument.objects.filter(queue=queue)
+        # 重新入队的文档保留了上一次的 started_at，排队时间从 queued_at 算起
+        oldest = lane_docs.filter(status='pending', queued_at__isnull=False) \
+            .order_by('queued_at').values_list('queued_at', flat=True).first()
+        started = lane_docs.filter(started_at__gte=since, queued_at__isnull=False) \
+            .annotate(wait=F('started_at') - F('queued_at')) \
+            .aggregate(avg_wait=Avg('wait'), max_wait=Max('wait'))
+        result[queue] = {
+            'depth': queue_depth(queue),
+            'waiting': lane_docs.filter(status='pending').count(),
+            'oldest_wait_seconds': (now - oldest).total_seconds() if oldest else 0,
+            'avg_wait_seconds': started['avg_wait'].total_seconds() if started['avg_wait'] else None,
+            'max_wait_seconds': started['max_wait'].total_seconds() if started['max_wait'] else None,
+        }
+    return result
@@ -0,0 +1,195 @@
+"""
+把 RAGFlow payload 中的 chunk 推送到 RAGFlow 兼容的 HTTP 接口。
+
+- 一个 requests.Session 复用 keep-alive 连接，连接池大小与并发数一致；
+  请求由有界线程池并发发出；
+- 每个 chunk 的幂等键由文档 ID、内容及相同内容的出现次序的 SHA-256 得出
+  （与位置无关，前面插入或删除 chunk 不会改变其余 chunk 的键），作为
+  Idempotency-Key 请求头（批量时放在每个 chunk 的 idempotency_key 字段）发送；
+- 连接错误、超时、429 和 5xx 按指数退避（带抖动，遵循 Retry-After）重试，
+  其余 4xx 视为永久失败；
+- 已确认写入的幂等键保存在文档的 ragflow_push_state 旁路文件中，
+  任务重试或重复触发时只发送尚未成功的 chunk；
+- 返回并保存发送数、重试次数、耗时与吞吐量。
+"""
+import hashlib
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import blob_storage, ragflow
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = 'ragflow_push_state'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_BACKOFF_SECONDS = 30
+
+
+class PushError(Exception):
+    pass
+
+
+def is_configured():
+    return bool(settings.RAGFLOW_PUSH_URL)
+
+
+def chunk_keys(doc_id, chunks):
+    """为每个 chunk 生成幂等键；内容相同的 chunk 以出现次序区分。"""
+    seen = {}
+    keys = []
+    for chunk in chunks:
+        content = chunk["content_ltxt"]
+        occurrence = seen.get(content, 0)
+        seen[content] = occurrence + 1
+        keys.append(hashlib.sha256(f"{doc_id}:{occurrence}:{content}".encode('utf-8')).hexdigest())
+    return keys
+
+
+def endpoint_url(doc, payload):
+    return settings.RAGFLOW_PUSH_URL.format(
+        doc_id=doc.pk, doc_name=payload.get('doc_id') or Path(doc.original_pdf_path).name,
+        kb_name=payload.get('kb_name', ''))
+
+
+def build_session(concurrency):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if settings.RAGFLOW_API_KEY:
+        session.headers['Authorization'] = f"Bearer {settings.RAGFLOW_API_KEY}"
+    return session
+
+
+def load_state(doc_id):
+    relative_path = blob_storage.find_json(doc_id, STATE_NAME)
+    if relative_path is None:
+        return {}
+    try:
+        return blob_storage.read_json(relative_path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable RAGFlow push state for Doc ID {doc_id}: {e}")
+        return {}
+
+
+def _chunk_body(chunk):
+    return {"content": chunk["content_ltxt"]}
+
+
+def _backoff(attempt, response=None):
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(MAX_BACKOFF_SECONDS, int(retry_after))
+    delay = settings.RAGFLOW_PUSH_BACKOFF_SECONDS * (2 ** attempt)
+    return min(MAX_BACKOFF_SECONDS, delay * random.uniform(0.5, 1.5))
+
+
+def send(session, url, items):
+    """
+    发送一批 [(key, chunk), ...]，返回 (重试次数, 请求体字节数)。
+    重试耗尽或遇到永久错误时抛出 PushError。
+    """
+    if len(items) == 1:
+        key, chunk = items[0]
+        body, headers = _chunk_body(chunk), {'Idempotency-Key': key}
+    else:
+        body = {"chunks": [{**_chunk_body(chunk), "idempotency_key": key} for key, chunk in items]}
+        headers = {'Idempotency-Key': hashlib.sha256(''.join(key for key, _ in items).encode()).hexdigest()}
+
+    request = requests.Request('POST', url, json=body, headers=headers)
+    prepared = session.prepare_request(request)
+    retries = 0
+    while True:
+        response = None
+        try:
+            response = session.send(prepared, timeout=settings.RAGFLOW_PUSH_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            if response.status_code < 400:
+                # RAGFlow 的业务错误以 HTTP 200 + {"code": 非 0} 返回
+                try:
+                    code = response.json().get('code', 0)
+                except (ValueError, AttributeError):
+                    code = 0
+                if not code:
+                    return retries, len(prepared.body or b'')
+                raise PushError(f"{url} rejected chunk: {response.text[:200]}")
+            if response.status_code not in RETRY_STATUSES:
+                raise PushError(f"{url} returned HTTP {response.status_code}: {response.text[:200]}")
+            error = f"HTTP {response.status_code}"
+
+        if retries >= settings.RAGFLOW_PUSH_MAX_RETRIES:
+            raise PushError(f"{url}: giving up after {retries} retries ({error})")
+        time.sleep(_backoff(retries, response))
+        retries += 1
+
+
+def push_document(doc, on_progress=None):
+    """
+    推送文档当前版本 payload 中尚未成功写入的 chunk，返回 (doc, 统计信息)。
+    有 chunk 最终失败时在保存进度后抛出 PushError。
+    """
+    if not is_configured():
+        raise PushError("RAGFLOW_PUSH_URL is not configured.")
+
+    doc = ragflow.get_or_build_payload(doc)
+    payload = doc.ragflow_payload
+    url = endpoint_url(doc, payload)
+
+    # 目标接口变化（例如换了知识库）时之前的推送记录不再适用
+    state = load_state(doc.pk)
+    pushed = set(state.get('pushed_keys', [])) if state.get('url') == url else set()
+    keyed = list(zip(chunk_keys(doc.pk, payload["chunks"]), payload["chunks"]))
+    pending = [(key, chunk) for key, chunk in keyed if key not in pushed]
+
+    batch_size = max(1, settings.RAGFLOW_PUSH_BATCH_SIZE)
+    concurrency = max(1, settings.RAGFLOW_PUSH_CONCURRENCY)
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    stats = {"version": doc.ragflow_version, "chunks": len(keyed), "skipped": len(keyed) - len(pending),
+             "sent": 0, "failed": 0, "retries": 0, "bytes": 0, "errors": []}
+    progress_every = max(1, len(batches) // 100)
+    started = time.perf_counter()
+    with build_session(concurrency) as session, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(send, session, url, batch): batch for batch in batches}
+        for completed, future in enumerate(as_completed(futures), start=1):
+            batch = futures[future]
+            try:
+                retries, sent_bytes = future.result()
+            except PushError as e:
+                stats["failed"] += len(batch)
+                if len(stats["errors"]) < 10:
+                    stats["errors"].append(str(e))
+            else:
+                stats["sent"] += len(batch)
+                stats["retries"] += retries
+                stats["bytes"] += sent_bytes
+                pushed.update(key for key, _ in batch)
+            if on_progress and (completed % progress_every == 0 or completed == len(batches)):
+                on_progress(stats["sent"] + stats["failed"], len(pending))
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["chunks_per_second"] = round(stats["sent"] / elapsed, 1) if elapsed > 0 else None
+    stats["finished_at"] = time.time()
+
+    current_keys = {key for key, _ in keyed}
+    blob_storage.write_json(doc.pk, STATE_NAME, {
+        "url": url,
+        "pushed_keys": sorted(pushed & current_keys),
+        "last_run": stats,
+    })
+    logger.info(f"Pushed {stats['sent']}/{len(pending)} pending chunks of Doc ID {doc.pk} to {url} "
+                f"in {elapsed:.2f}s ({stats['chunks_per_second']} chunks/s, {stats['retries']} retries, "
+                f"{stats['skipped']} already pushed).")
+    if stats["failed"]:
+        raise PushError(f"{stats['failed']} of {len(pending)} chunks failed: {stats['errors'][0]}")
+    return doc, stats
@@ -0,0 +1,203 @@
+"""
+PDF 页面栅格化。
+
+按页码窗口 (first_page/last_page) 分批调用 poppler，每批保存后立即释放，
+内存占用只与批大小相关，而与文档总页数无关。批大小会根据页面尺寸、DPI
+和 RASTER_MEMORY_LIMIT_MB 估算，并在运行中根据实际 RSS 自适应缩小。
+
+poppler 输出未压缩的 PPM，每批页面在 RASTER_ENCODE_WORKERS 个线程中并行编码
+（PIL 编码时释放 GIL）。同一次编码同时写出三种尺寸 (rendition)：
+
+    pages/page-NNNN.<ext>          全尺寸，按档位的 DPI 与质量
+    pages/review/page-NNNN.<ext>   审阅用，宽 RASTER_REVIEW_WIDTH，Label Studio 任务引用这一版本
+    pages/thumbs/page-NNNN.<ext>   缩略图，宽 RASTER_THUMBNAIL_WIDTH
+
+<ext> 由 RASTER_FORMAT 决定（jpeg → jpg，webp → webp）。宽度设为 0 即不生成该版本。
+"""
+import logging
+import os
+import re
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE_RE = re.compile(r'([\d.]+)\s*x\s*([\d.]+)\s*pts')
+
+# RASTER_FORMAT -> (PIL 格式名, 扩展名)
+FORMATS = {'jpeg': ('JPEG', 'jpg'), 'webp': ('WEBP', 'webp')}
+# 缩小版本所在的子目录；全尺寸图片直接位于 pages/ 下
+RENDITION_DIRS = {'review': 'review', 'thumb': 'thumbs'}
+
+
+def page_filename(page_num, ext='jpg'):
+    """1 起始页码对应的图片文件名。"""
+    return f"page-{str(page_num).zfill(4)}.{ext}"
+
+
+def image_format():
+    return settings.RASTER_FORMAT if settings.RASTER_FORMAT in FORMATS else 'jpeg'
+
+
+def rendition_widths():
+    """启用的缩小版本及其目标宽度（像素）。"""
+    widths = {'review': settings.RASTER_REVIEW_WIDTH, 'thumb': settings.RASTER_THUMBNAIL_WIDTH}
+    return {rendition: width for rendition, width in widths.items() if width > 0}
+
+
+def page_image_path(pages_dir, page_num, rendition='full'):
+    """
+    返回某页某一版本的图片路径，不存在时返回 None。
+    先按当前 RASTER_FORMAT 查找，再查找 .jpg，兼容此前只生成了全尺寸 JPEG 的输出目录。
+    """
+    directory = Path(pages_dir) if rendition == 'full' else Path(pages_dir) / RENDITION_DIRS[rendition]
+    for ext in dict.fromkeys((FORMATS[image_format()][1], 'jpg')):
+        path = directory / page_filename(page_num, ext)
+        if path.exists():
+            return path
+    return None
+
+
+def current_rss_bytes():
+    """当前进程的常驻内存；/proc 不可用时退回到进程生命周期内的峰值。"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_profile(name=None):
+    """返回 (dpi, jpeg_quality)，未知的档位名回退到 settings.RASTER_PROFILE。"""
+    profiles = settings.RASTER_PROFILES
+    name = name or settings.RASTER_PROFILE
+    profile = profiles.get(name) or profiles[settings.RASTER_PROFILE]
+    return profile['dpi'], profile['quality']
+
+
+def estimate_page_bytes(pdf_path, dpi, poppler_path=None):
+    """根据首页尺寸估算单页解码后 RGB 位图的字节数。"""
+    width_pts, height_pts = 612.0, 792.0  # Letter，pdfinfo 未给出尺寸时的保守默认值
+    try:
+        info = pdfinfo_from_path(str(pdf_path), poppler_path=poppler_path)
+        match = _PAGE_SIZE_RE.search(info.get('Page size', ''))
+        if match:
+            width_pts, height_pts = float(match.group(1)), float(match.group(2))
+    except Exception as e:
+        logger.warning(f"Could not read page size for {pdf_path}: {e}")
+    return int((width_pts / 72 * dpi) * (height_pts / 72 * dpi) * 3)
+
+
+def _save(image, path, fmt, quality):
+    image.save(path, FORMATS[fmt][0], quality=quality)
+    return path.stat().st_size
+
+
+def encode_page(image, page_num, pages_dir, fmt, quality, preview_quality, widths):
+    """
+    写出一页的全尺寸图片与各缩小版本，返回 {rendition: 字节数}，并关闭 image。
+    缩小版本从大到小依次由上一个版本缩放得到，减少重采样的像素量。可在线程池中并行调用。
+    """
+    pages_dir = Path(pages_dir)
+    ext = FORMATS[fmt][1]
+    written = {'full': _save(image, pages_dir / page_filename(page_num, ext), fmt, quality)}
+    opened = [image]
+    source = image
+    try:
+        for rendition, width in sorted(widths.items(), key=lambda item: -item[1]):
+            if source.width > width:
+                height = max(1, round(source.height * width / source.width))
+                source = source.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+                opened.append(source)
+            target = pages_dir / RENDITION_DIRS[rendition] / page_filename(page_num, ext)
+            written[rendition] = _save(source, target, fmt, preview_quality)
+    finally:
+        for opened_image in opened:
+            opened_image.close()
+    return written
+
+
+def rasterize_pdf(pdf_path, pages_dir, page_count, profile=None, poppler_path=None, label='', on_progress=None,
+                  fmt=None, encode_workers=None, start_page=1):
+    """
+    分批将 PDF 渲染为 pages_dir 下的全尺寸图片及缩小版本（见模块说明）。
+
+    返回统计信息：{'pages', 'dpi', 'quality', 'format', 'batch_pages', 'peak_rss_bytes',
+    'render_seconds', 'encode_seconds', 'bytes', 'bytes_by_rendition'}。
+    peak_rss_bytes 是本次栅格化过程中采样得到的最大 RSS；render_seconds 为 poppler
+    渲染耗时，encode_seconds 为（并行）编码写盘的墙钟耗时，bytes 为写出的图片总大小。
+    on_progress(done, total) 在每批完成后调用，done 为已完成的最大页码（此前的页面均已写盘）。
+    fmt / encode_workers 默认取自 RASTER_FORMAT / RASTER_ENCODE_WORKERS。
+    start_page 用于断点续跑：从该页（1 起始）开始渲染，之前的页面视为已完成，不计入统计。
+    """
+    dpi, quality = get_profile(profile)
+    fmt = fmt if fmt in FORMATS else image_format()
+    encode_workers = encode_workers or settings.RASTER_ENCODE_WORKERS
+    widths = rendition_widths()
+    memory_limit = settings.RASTER_MEMORY_LIMIT_MB * 1024 * 1024
+    baseline_rss = current_rss_bytes()
+    pages_dir = Path(pages_dir)
+    for rendition in widths:
+        (pages_dir / RENDITION_DIRS[rendition]).mkdir(parents=True, exist_ok=True)
+
+    # 留一半余量给 PIL 编码缓冲区、缩放副本和 poppler 自身
+    page_bytes = estimate_page_bytes(pdf_path, dpi, poppler_path=poppler_path)
+    batch_pages = max(1, min(settings.RASTER_BATCH_PAGES, (memory_limit // 2) // max(page_bytes, 1)))
+    peak_rss = baseline_rss
+    saved = 0
+    render_seconds = encode_seconds = 0.0
+    bytes_by_rendition = dict.fromkeys(['full', *widths], 0)
+
+    def _encode(image, page_num):
+        return encode_page(image, page_num, pages_dir, fmt, quality, settings.RASTER_PREVIEW_QUALITY, widths)
+
+    with ThreadPoolExecutor(max_workers=max(1, encode_workers)) as pool:
+        first_page = max(1, start_page)
+        while first_page <= page_count:
+            last_page = min(first_page + batch_pages - 1, page_count)
+            started = time.perf_counter()
+            # PPM 不经过有损压缩，解码也比 JPEG 快
+            images = convert_from_path(
+                pdf_path, dpi=dpi, first_page=first_page, last_page=last_page,
+                poppler_path=poppler_path, thread_count=settings.RASTER_THREAD_COUNT, fmt='ppm',
+            )
+            render_seconds += time.perf_counter() - started
+            peak_rss = max(peak_rss, current_rss_bytes())
+            started = time.perf_counter()
+            for written in pool.map(_encode, images, range(first_page, first_page + len(images))):
+                for rendition, size in written.items():
+                    bytes_by_rendition[rendition] += size
+            encode_seconds += time.perf_counter() - started
+            peak_rss = max(peak_rss, current_rss_bytes())
+            saved += len(images)
+            del images
+            if on_progress:
+                on_progress(last_page, page_count)
+
+            # 实际内存增长超过上限时，后续批次减半
+            if current_rss_bytes() - baseline_rss > memory_limit and batch_pages > 1:
+                batch_pages = max(1, batch_pages // 2)
+                logger.warning(f"RSS above raster memory limit{label}; reducing batch size to {batch_pages} pages.")
+            first_page = last_page + 1
+
+    stats = {
+        'pages': saved,
+        'dpi': dpi,
+        'quality': quality,
+        'format': fmt,
+        'batch_pages': batch_pages,
+        'peak_rss_bytes': peak_rss,
+        'render_seconds': render_seconds,
+        'encode_seconds': encode_seconds,
+        'bytes': sum(bytes_by_rendition.values()),
+        'bytes_by_rendition': bytes_by_rendition,
+    }
+    logger.info(f"Rasterized {saved} pages{label} at {dpi} dpi as {fmt} "
+                f"(render {render_seconds:.1f}s, encode {encode_seconds:.1f}s), peak RSS {peak_rss / 1024 / 1024:.1f} MB.")
+    return stats
@@ -0,0 +1,39 @@
+"""
+使用 api.codec 的 DRF 渲染器与解析器（见 settings.REST_FRAMEWORK）。
+
+未安装 orjson 时完全退回 DRF 自带的 JSONRenderer / JSONParser。orjson 无法处理的
+类型（Decimal、timedelta、惰性翻译字符串等）交给 DRF 的 JSONEncoder.default 转换。
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import codec
+
+_default = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if codec.orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        ret = codec.dumps(data, indent=bool(indent), default=_default)
+        # 与 JSONRenderer 一样转义 U+2028 / U+2029，保持输出是 JavaScript 的子集
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        if codec.orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return codec.load(stream)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,251 @@
+"""
+下载类接口使用的流式响应工具。
+
+- JSON 由 api.codec 编码：小对象用 orjson 一次编码；任务列表、pdf_info 等元素较多的列表
+  逐个元素用 orjson 编码后发送，内存中不会同时存在整份编码结果。没有 orjson 时通过
+  JSONEncoder.iterencode 增量编码。两种方式首字节都无需等待整体序列化完成；
+- 客户端接受 gzip 时可对流做增量压缩；磁盘上的压缩 blob 在编码匹配时原样发送；
+- ASGI 下同步生成器被包装为逐块在线程中读取的异步迭代器，避免被整体缓冲；
+- ETag 由 blob 文件的大小与修改时间得出，只需一次 stat，不访问数据库，
+  If-None-Match 命中时直接返回 304。
+"""
+import json
+import zlib
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
+
+from . import blob_storage, codec
+
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+STREAM_CHUNK_SIZE = 64 * 1024
+# 列表元素（页、任务）不超过该数量时整体一次编码，更多时逐个元素编码
+SINGLE_SHOT_MAX_ITEMS = 64
+
+
+def accepts_encoding(request, coding):
+    """Accept-Encoding 中是否包含 coding（忽略 q=0 的项）。"""
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = item.strip().partition(';')
+        if name.strip().lower() == coding and params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            return True
+    return False
+
+
+def _stream_key(obj):
+    """逐元素编码的对象：本身是列表时返回 None，否则返回元素最多的列表字段；不适合时返回 False。"""
+    if isinstance(obj, list):
+        return None if len(obj) > SINGLE_SHOT_MAX_ITEMS else False
+    if not isinstance(obj, dict) or not all(isinstance(key, str) for key in obj):
+        return False
+    lists = [(len(value), key) for key, value in obj.items() if isinstance(value, list)]
+    if not lists or max(lists)[0] <= SINGLE_SHOT_MAX_ITEMS:
+        return False
+    return max(lists)[1]
+
+
+def _encode(value, level, indent):
+    # orjson 的缩进固定为 2 个空格，嵌套在第 level 层时给每一行补上外层的缩进
+    data = codec.dumps(value, indent=indent)
+    if indent and level:
+        data = data.replace(b'\n', b'\n' + b'  ' * level)
+    return data
+
+
+def _iter_list(items, level, indent):
+    if not items:
+        yield b'[]'
+        return
+    pad = b'\n' + b'  ' * (level + 1) if indent else b''
+    yield b'['
+    for i, item in enumerate(items):
+        yield (b',' if i else b'') + pad + _encode(item, level + 1, indent)
+    yield (b'\n' + b'  ' * level if indent else b'') + b']'
+
+
+def _iter_pieces(obj, key, indent):
+    """与 codec.dumps(obj, indent) 逐字节相同的输出，列表字段 key（None 为 obj 本身）逐元素编码。"""
+    if key is None:
+        yield from _iter_list(obj, 0, indent)
+        return
+    yield b'{'
+    for i, (name, value) in enumerate(obj.items()):
+        head = (b',' if i else b'') + (b'\n  ' if indent else b'') + codec.dumps(name) + (b': ' if indent else b':')
+        if name == key:
+            yield head
+            yield from _iter_list(value, 1, indent)
+        else:
+            yield head + _encode(value, 1, indent)
+    yield (b'\n' if indent else b'') + b'}'
+
+
+def iter_json(obj, indent=2, chunk_size=STREAM_CHUNK_SIZE):
+    """编码 obj，按约 chunk_size 字节产出 UTF-8 字节块。"""
+    if codec.orjson is not None:
+        key = _stream_key(obj)
+        if key is False:
+            data = memoryview(codec.dumps(obj, indent=bool(indent)))
+            for start in range(0, len(data), chunk_size):
+                yield data[start:start + chunk_size]
+            return
+        buffer, buffered = [], 0
+        for piece in _iter_pieces(obj, key, bool(indent)):
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered >= chunk_size:
+                yield b''.join(buffer)
+                buffer, buffered = [], 0
+        if buffer:
+            yield b''.join(buffer)
+        return
+    encoder = json.JSONEncoder(indent=indent, ensure_ascii=False)
+    buffer, buffered = [], 0
+    for piece in encoder.iterencode(obj):
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, buffered = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def iter_file(fileobj, chunk_size=STREAM_CHUNK_SIZE):
+    with fileobj:
+        while chunk := fileobj.read(chunk_size):
+            yield chunk
+
+
+def gzip_stream(chunks, level=6):
+    """对字节块流做增量 gzip 压缩。"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def _async_stream(iterator):
+    iterator = iter(iterator)
+    sentinel = object()
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(iterator, sentinel)) is not sentinel:
+        yield chunk
+
+
+def streaming_content(request, iterator):
+    """
+    按运行方式返回合适的流式内容。ASGI 下 StreamingHttpResponse 会先把同步
+    迭代器整体读入内存再发送，因此包装为每次只在线程中取一块的异步迭代器；
+    WSGI 下原样返回。
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return _async_stream(iterator)
+    return iterator
+
+
+def file_response(request, fileobj, **kwargs):
+    """
+    FileResponse 的 ASGI 版本：FileResponse 的内容同样是同步迭代器，ASGI 下会被整体读入内存，
+    因此换成 streaming_content 的异步迭代器（Content-Length 等头部保留，文件仍在响应关闭时关闭）；
+    WSGI 下保持原样，可以走 wsgi.file_wrapper / sendfile。
+    """
+    response = FileResponse(fileobj, **kwargs)
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        response.streaming_content = streaming_content(request, response.streaming_content)
+    return response
+
+
+def _stat_parts(paths):
+    parts = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        parts.append(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+    return parts
+
+
+def blob_etag(doc_id, name, variant=''):
+    """
+    根据 <root>/<doc_id>/<name> 各版本 blob 的 stat 信息生成 ETag，不存在时返回 None。
+    blob 写入新文件后才替换指针，因此 (size, mtime) 足以识别内容变化。
+    """
+    parts = _stat_parts(blob_storage.stored_versions(doc_id, name))
+    if not parts:
+        return None
+    return f'"{variant}{doc_id}-{"-".join(parts)}"'
+
+
+def file_etag(path, variant=''):
+    """磁盘文件的 ETag（文件整体原子替换），不存在时返回 None。"""
+    try:
+        stat = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return f'"{variant}{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def not_modified(request, etag):
+    """If-None-Match 命中时返回 304 响应，否则返回 None。"""
+    if not etag:
+        return None
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    return None
+
+
+def _finalize(response, download_filename, etag):
+    response['Content-Disposition'] = f'attachment; filename="{download_filename}"'
+    response['Vary'] = 'Accept-Encoding'
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def json_download_response(request, obj, download_filename, etag=None):
+    """将 Python 对象以流式 JSON 附件返回，客户端接受时使用 gzip 编码。"""
+    chunks = iter_json(obj)
+    if accepts_encoding(request, 'gzip'):
+        response = StreamingHttpResponse(streaming_content(request, gzip_stream(chunks)),
+                                         content_type=JSON_CONTENT_TYPE)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(streaming_content(request, chunks), content_type=JSON_CONTENT_TYPE)
+    return _finalize(response, download_filename, etag)
+
+
+def blob_download_response(request, relative_path, download_filename, etag=None):
+    """
+    以附件形式返回一个 JSON blob。
+    客户端支持 blob 的压缩格式时直接发送磁盘文件（可走 sendfile），
+    否则边解压边发送。
+    """
+    codec = blob_storage.codec_for_path(relative_path)
+    if accepts_encoding(request, codec):
+        response = file_response(request, open(blob_storage.absolute_path(relative_path), 'rb'),
+                                 content_type=JSON_CONTENT_TYPE)
+        response['Content-Encoding'] = codec
+    else:
+        chunks = iter_file(blob_storage.open_decompressed(relative_path))
+        response = StreamingHttpResponse(streaming_content(request, chunks), content_type=JSON_CONTENT_TYPE)
+    return _finalize(response, download_filename, etag)
+
+
+def file_download_response(request, path, download_filename, etag=None):
+    """以附件形式返回磁盘上的 JSON 文件；客户端接受 gzip 时边读边压缩。"""
+    if accepts_encoding(request, 'gzip'):
+        chunks = gzip_stream(iter_file(open(path, 'rb')))
+        response = StreamingHttpResponse(streaming_content(request, chunks), content_type=JSON_CONTENT_TYPE)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = file_response(request, open(path, 'rb'), content_type=JSON_CONTENT_TYPE)
+    return _finalize(response, download_filename, etag)
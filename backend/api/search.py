@@ -0,0 +1,235 @@
+"""
+OCR 文本与校对文本的全文检索。
+
+索引：PageText 每页一行，以 0 起始的 PDF 页码 (page_idx，与 OcrPage、PageCorrection 相同)
+为键；文本取自校对结果（整体导出 + 按页增量），没有校对的页取 MinerU 原始 OCR。
+查询结果中的 page 从 1 开始，与 pages/<page>/ 接口一致。
+index_document 在处理完成和整体提交校对后重算整份文档，
+index_page 在按页校对后只重算这一页；两者都只写入 checksum 变化的页，
+tsvector 在数据库中按 SEARCH_TEXT_CONFIG 计算。
+
+查询：用 tsvector GIN 索引做全文匹配 (websearch_to_tsquery 语法：引号短语、OR、-排除)，
+按 ts_rank_cd 排序。没有命中时（拼写错误、中文等未分词的连续文本）退回模糊匹配：把查询
+分成词位，在 SearchTerm 词表上用 pg_trgm（word_similarity 与子串匹配，trigram GIN 索引）
+为每个词位找出最相近的 SEARCH_FUZZY_EXPANSIONS 个已索引的词，改写成
+('w1' | 'w2') & (...) 的 tsquery 后仍走 search_vector 索引，代价与全文匹配相当。
+命中页很多时只对前 SEARCH_RANK_CANDIDATES 个排序。
+摘要 (ts_headline) 只为当前页结果计算，命中词用 <mark> 标出，其余内容已做 HTML 转义。
+"""
+import hashlib
+import html
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery, SearchRank, SearchVector,
+                                            TrigramSimilarity, TrigramWordSimilarity)
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from . import chunking, corrections, ocr_pages
+from .label_studio import collect_page_regions
+from .models import PageText, SearchTerm
+
+logger = logging.getLogger(__name__)
+
+MODES = ('auto', 'fts', 'fuzzy')
+# 模糊查询最多处理的查询词位数
+MAX_FUZZY_LEXEMES = 8
+# ts_headline 的起止标记，转义后再替换为 <mark>
+_START, _STOP = '\x02', '\x03'
+
+
+def _clean(text):
+    # PostgreSQL 的 text 不能包含 NUL
+    return text.replace('\x00', '')
+
+
+def task_text(task):
+    _, elements = chunking.task_elements(task)
+    return _clean('\n'.join(text for _, text in elements))
+
+
+def ocr_page_text(page_data):
+    _, _, texts = collect_page_regions(page_data)
+    return _clean('\n'.join(text for text in texts if text))
+
+
+def ocr_page_texts(doc):
+    """各页的 OCR 文本：{page_idx: text}。"""
+    if ocr_pages.has_pages(doc.pk):
+        return {page.page_idx: _clean(ocr_pages.page_text(regions)) for page, regions in ocr_pages.iter_pages(doc.pk)}
+    if doc.raw_ocr_blob:
+        pdf_info = (doc.raw_ocr_json or {}).get('pdf_info', [])
+        return {page.get('page_idx', position): ocr_page_text(page) for position, page in enumerate(pdf_info)}
+    return {}
+
+
+def page_texts(doc):
+    """
+    文档当前的各页文本：{page_idx: (source, text)}。
+    有校对时以校对后的任务为准；没有任务的页（OCR 未识别出区域、整体导出中缺少）保留 OCR 文本。
+    """
+    pages = {page_idx: ('ocr', text) for page_idx, text in ocr_page_texts(doc).items()}
+    if corrections.has_corrections(doc):
+        corrected_pages = set(doc.page_corrections.values_list('page_index', flat=True))
+        for page_idx, task in corrections.pages(doc).items():
+            source = 'corrected' if doc.corrected_ls_blob or page_idx in corrected_pages else 'ocr'
+            pages[page_idx] = (source, task_text(task))
+    return pages
+
+
+def _checksum(source, text):
+    return hashlib.sha256(f"{source}\n{text}".encode('utf-8')).hexdigest()
+
+
+def _write_pages(doc, pages, prune=False):
+    """写入内容变化的页并重算其 tsvector；prune 时删除 pages 之外的旧页。返回写入的页数。"""
+    existing = dict(PageText.objects.filter(document=doc).values_list('page_index', 'checksum'))
+    changed = [
+        PageText(document=doc, page_index=page_index, source=source, text=text, checksum=_checksum(source, text))
+        for page_index, (source, text) in pages.items()
+        if existing.get(page_index) != _checksum(source, text)
+    ]
+    stale = [page_index for page_index in existing if page_index not in pages] if prune else []
+    with transaction.atomic():
+        if stale:
+            PageText.objects.filter(document=doc, page_index__in=stale).delete()
+        if changed:
+            PageText.objects.bulk_create(
+                changed, batch_size=500, update_conflicts=True, unique_fields=['document', 'page_index'],
+                update_fields=['source', 'text', 'checksum', 'updated_at'])
+            page_indexes = [page.page_index for page in changed]
+            PageText.objects.filter(document=doc, page_index__in=page_indexes) \
+                .update(search_vector=SearchVector('text', config=settings.SEARCH_TEXT_CONFIG))
+            _add_terms("document_id = %s AND page_index = ANY(%s)", [doc.pk, page_indexes])
+    return len(changed)
+
+
+def _add_terms(where, params):
+    """把符合条件的 PageText 行中的词位补入词表；按词排序插入，避免并发写入时互相死锁。"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SearchTerm._meta.db_table} (word) "
+            f"SELECT DISTINCT lexeme FROM {PageText._meta.db_table}, unnest(search_vector) "
+            f"WHERE {where} ORDER BY lexeme ON CONFLICT (word) DO NOTHING", params)
+
+
+def index_document(doc):
+    """按文档当前的 OCR/校对数据重建其索引，返回 {'pages', 'written'}。"""
+    pages = page_texts(doc)
+    written = _write_pages(doc, pages, prune=True)
+    logger.info(f"Indexed text of Doc ID {doc.pk}: {written} of {len(pages)} pages changed.")
+    return {'pages': len(pages), 'written': written}
+
+
+def index_page(doc, page_idx, result):
+    """按页校对后只更新这一页（page_idx 从 0 开始）。"""
+    return _write_pages(doc, {page_idx: ('corrected', task_text({'annotations': [{'result': result}]}))})
+
+
+def rebuild_vectors():
+    """SEARCH_TEXT_CONFIG 变化后重算全部 tsvector（文本不变）并重建词表，返回页数。"""
+    with transaction.atomic():
+        updated = PageText.objects.update(search_vector=SearchVector('text', config=settings.SEARCH_TEXT_CONFIG))
+        SearchTerm.objects.all().delete()
+        _add_terms("search_vector IS NOT NULL", [])
+    return updated
+
+
+def _mark(fragment):
+    return html.escape(fragment).replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def _base_queryset(document_ids=None, statuses=None):
+    pages = PageText.objects.all()
+    if document_ids:
+        pages = pages.filter(document_id__in=document_ids)
+    if statuses:
+        pages = pages.filter(document__status__in=statuses)
+    return pages
+
+
+def _full_text(ts_query, limit, offset, document_ids, statuses):
+    matches = _base_queryset(document_ids, statuses).filter(search_vector=ts_query)
+    if settings.SEARCH_RANK_CANDIDATES:
+        # 排序要读出每个命中页的 tsvector；常见词命中过多时只对前 N 个候选排序
+        matches = PageText.objects.filter(id__in=matches.values('id')[:settings.SEARCH_RANK_CANDIDATES])
+    hits = list(
+        matches
+        .annotate(rank=SearchRank(F('search_vector'), ts_query, cover_density=True))
+        .order_by('-rank', 'document_id', 'page_index')
+        .values('id', 'document_id', 'page_index', 'source', 'rank')[offset:offset + limit]
+    )
+    # 摘要只为当前页的结果计算
+    headlines = dict(
+        PageText.objects.filter(id__in=[hit['id'] for hit in hits])
+        .annotate(snippet=SearchHeadline('text', ts_query, config=settings.SEARCH_TEXT_CONFIG,
+                                         start_sel=_START, stop_sel=_STOP, max_words=35, min_words=15,
+                                         max_fragments=2, fragment_delimiter=' … '))
+        .values_list('id', 'snippet')
+    )
+    for hit in hits:
+        hit['snippet'] = _mark(headlines.get(hit['id'], ''))
+    return hits
+
+
+def _query_lexemes(query):
+    """查询按 SEARCH_TEXT_CONFIG 切分、归一化后的词位，保持原顺序。"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT lexeme FROM unnest(to_tsvector(%s::regconfig, %s)) ORDER BY positions[1]",
+                       [settings.SEARCH_TEXT_CONFIG, query])
+        return [row[0] for row in cursor.fetchall()][:MAX_FUZZY_LEXEMES]
+
+
+def expand_query(query):
+    """为每个查询词位找出词表中最相近的词：{lexeme: [word, ...]}，找不到相近词的词位不出现。"""
+    expansions = {}
+    with transaction.atomic():
+        # %> 运算符的阈值来自该 GUC；SET LOCAL 只作用于本事务
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL pg_trgm.word_similarity_threshold = %s", [settings.SEARCH_TRIGRAM_THRESHOLD])
+        for lexeme in _query_lexemes(query):
+            # 子串匹配 (LIKE '%q%') 同样由 trigram 索引支撑，覆盖中文等连续文本中的片段
+            words = list(
+                SearchTerm.objects.filter(Q(word__trigram_word_similar=lexeme) | Q(word__contains=lexeme))
+                .annotate(word_rank=TrigramWordSimilarity(lexeme, 'word'), rank=TrigramSimilarity('word', lexeme))
+                .order_by('-word_rank', '-rank', 'word')
+                .values_list('word', flat=True)[:settings.SEARCH_FUZZY_EXPANSIONS]
+            )
+            if words:
+                expansions[lexeme] = words
+    return expansions
+
+
+def _quote(word):
+    return "'" + word.replace('\\', '\\\\').replace("'", "''") + "'"
+
+
+def _fuzzy_query(expansions):
+    raw = ' & '.join('(' + ' | '.join(_quote(word) for word in words) + ')' for words in expansions.values())
+    # 词表中已是归一化后的词位，用 simple 解析，避免再次做词干化
+    return SearchQuery(raw, config='simple', search_type='raw')
+
+
+def search(query, mode='auto', limit=20, offset=0, document_ids=None, statuses=None):
+    """
+    返回 {'mode', 'results', 'took_ms'}；mode 为实际使用的匹配方式 (fts / fuzzy)，
+    fuzzy 时另有 expanded：{查询词位: [实际匹配的词, ...]}。
+    results 中每项为 {'document_id', 'page', 'source', 'rank', 'snippet'}。
+    """
+    started = time.perf_counter()
+    found = {'mode': 'fuzzy' if mode == 'fuzzy' else 'fts'}
+    hits = []
+    if mode != 'fuzzy':
+        ts_query = SearchQuery(query, config=settings.SEARCH_TEXT_CONFIG, search_type='websearch')
+        hits = _full_text(ts_query, limit, offset, document_ids, statuses)
+    if mode == 'fuzzy' or (mode == 'auto' and not hits and offset == 0):
+        found['mode'] = 'fuzzy'
+        found['expanded'] = expand_query(query)
+        if found['expanded']:
+            hits = _full_text(_fuzzy_query(found['expanded']), limit, offset, document_ids, statuses)
+    found['results'] = [{'document_id': hit['document_id'], 'page': hit['page_index'] + 1, 'source': hit['source'],
+                         'rank': round(float(hit['rank']), 6), 'snippet': hit['snippet']} for hit in hits]
+    found['took_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return found
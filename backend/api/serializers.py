@@ -1,12 +1,17 @@
 # api/serializers.py
 from rest_framework import serializers
-from .models import OcrDocument
+from . import batches
+from .models import DocumentBatch, OcrDocument, ProcessingRun, UploadSession
 
 class OcrDocumentSerializer(serializers.ModelSerializer):
     """
     Serializes the OcrDocument model to and from JSON format.
     Includes the new fields for raw and corrected JSON data.
     """
+    # 这两个字段存放在压缩 blob 中，按需加载，只读输出
+    raw_ocr_json = serializers.JSONField(read_only=True)
+    corrected_label_studio_json = serializers.JSONField(read_only=True)
+
     class Meta:
         model = OcrDocument
         # 确保所有需要的字段都包含在内，以便前端可以访问它们
@@ -16,6 +21,62 @@ class OcrDocumentSerializer(serializers.ModelSerializer):
             'mineru_json_path', 
             'status', 
             'created_at', 
+            'page_paths',
             'raw_ocr_json', 
             'corrected_label_studio_json'
         )
+
+
+class OcrDocumentSummarySerializer(serializers.ModelSerializer):
+    """
+    Lightweight serializer for list views.
+    Never touches the raw/corrected JSON columns, so the queryset can defer them.
+    """
+    class Meta:
+        model = OcrDocument
+        fields = (
+            'id',
+            'original_pdf_path',
+            'mineru_json_path',
+            'status',
+            'created_at',
+            'page_paths',
+        )
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+    Serializes a resumable upload session; 'offset' is where the next chunk must start.
+    """
+    offset = serializers.IntegerField(source='received_bytes', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'filename', 'total_size', 'offset', 'status', 'document', 'created_at')
+        read_only_fields = ('id', 'status', 'document', 'created_at')
+
+
+class DocumentBatchSerializer(serializers.ModelSerializer):
+    """
+    Serializes a batch upload with progress aggregated from its documents' statuses.
+    """
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DocumentBatch
+        fields = ('id', 'name', 'total', 'rejected', 'created_at', 'progress')
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        return batches.progress(obj)
+
+
+class ProcessingRunSerializer(serializers.ModelSerializer):
+    """
+    Serializes one timed processing run with its per-stage breakdown.
+    """
+    class Meta:
+        model = ProcessingRun
+        fields = ('id', 'kind', 'status', 'worker', 'queue', 'queue_wait_seconds', 'started_at', 'finished_at',
+                  'duration_seconds', 'pages', 'peak_rss_bytes', 'stages', 'error')
+        read_only_fields = fields
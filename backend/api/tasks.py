@@ -1,94 +1,266 @@
-import subprocess
 import os
-import time
-import uuid
-import json
 from celery import shared_task
 from .models import OcrDocument
 from django.conf import settings
+from django.utils import timezone
 from pathlib import Path
 import logging
-from pdf2image import convert_from_path
+from .mineru import get_page_count, run_mineru_sharded
+from .rasterize import rasterize_pdf
+from . import (cancellation, checkpoints, codec, events, instrumentation, label_studio_tasks, metrics, ocr_cache, ocr_pages,
+               queues, ragflow_push, search, text_layer)
 
 logger = logging.getLogger(__name__)
 
+CANCEL_STATUSES = ('cancelling', 'cancelled')
+
 DATA_ROOT = settings.DATA_ROOT_PATH
 BASE_OUTPUT_DIR = DATA_ROOT / 'data' / 'mineru_output'
 POPPLER_PATH = os.getenv('POPPLER_PATH', None)
-MINERU_COMMAND = 'mineru'
-@shared_task
-def process_pdf_with_mineru(doc_id):
+@shared_task(bind=True)
+def process_pdf_with_mineru(self, doc_id):
+    """
+    OCR 处理：ocr → persist_json → rasterize → finalize 四个幂等阶段，每个阶段完成后
+    写入断点（见 checkpoints）。消息重新投递或文档重新入队时从断点继续。
+    ocr 阶段先做文本层预处理（见 text_layer），自带可靠文本层的页不再交给 MinerU。
+    """
     doc = None
+    run = None
+    claimed = False
+    heartbeat = None
     try:
+        # 条件认领：排队期间已被取消、已处理完或正由存活 worker 处理的文档不再处理
+        claimed = checkpoints.claim(doc_id, self.request.id)
         doc = OcrDocument.objects.get(id=doc_id)
-        doc.status = 'processing'
-        doc.save(update_fields=['status'])
+        if not claimed:
+            if doc.status not in CANCEL_STATUSES:
+                logger.info(f"Doc ID {doc_id} is {doc.status}; ignoring duplicate delivery of task {self.request.id}.")
+                return "Skipped"
+            logger.info(f"Doc ID {doc_id} was cancelled before processing started.")
+            checkpoints.discard(doc)
+            if doc.status != 'cancelled':
+                doc.status = 'cancelled'
+                doc.save(update_fields=['status'])
+            events.publish_status(doc)
+            return "Cancelled"
+        heartbeat = checkpoints.Heartbeat(doc_id)
+        events.publish_status(doc)
+        check_cancelled = cancellation.checker(doc_id)
+        queue_wait = (doc.started_at - doc.queued_at).total_seconds() if doc.queued_at else None
+        if queue_wait is not None:
+            metrics.observe_queue_wait(doc.queue, queue_wait)
+        run = instrumentation.Recorder('process', doc, queue=doc.queue, queue_wait_seconds=queue_wait)
 
         pdf_path = Path(doc.original_pdf_path)
-        unique_folder_name = uuid.uuid4().hex[:12]
-        task_output_dir = BASE_OUTPUT_DIR / unique_folder_name
-        os.makedirs(task_output_dir, exist_ok=True)
-
-        command_str = f'"{MINERU_COMMAND}" -p "{str(pdf_path)}" -o "{str(task_output_dir)}"'
-
-        logger.info(f"Executing command: {command_str}")
-        result = subprocess.run(command_str, shell=True, capture_output=True, text=True, timeout=3600)
-
-        # ==================== 核心修改开始 ====================
-        
-        # 无论成功与否，都先记录 stdout 和 stderr，便于调试
-        if result.stdout:
-            logger.info(f"MinerU STDOUT for Doc ID {doc_id}:\n{result.stdout}")
-        if result.stderr:
-            # 将 stderr 记录为警告，即使命令没有失败
-            logger.warning(f"MinerU STDERR for Doc ID {doc_id}:\n{result.stderr}")
-
-        if result.returncode != 0:
-            # 如果返回码不为0，说明是明确的失败
-            raise RuntimeError(f"MinerU execution failed with return code {result.returncode}.")
-
-        mineru_created_dir = task_output_dir / pdf_path.stem
-        json_path = mineru_created_dir / "auto" / f"{pdf_path.stem}_middle.json"
-        
-        time.sleep(1)
-        
-        if not os.path.exists(json_path):
-            # 如果文件依然不存在，抛出错误，此时日志中已有详细的 stdout/stderr
-            raise FileNotFoundError(f"'_middle.json' not found at expected path: {json_path}. MinerU did not produce the expected output.")
-            
-        # ===================== 核心修改结束 =====================
-
-        logger.info(f"Found OCR JSON file at: {json_path}. Reading content.")
-        with open(json_path, 'r', encoding='utf-8') as f:
-            ocr_data = json.load(f)
-        
-        doc.raw_ocr_json = ocr_data
-        doc.save(update_fields=['raw_ocr_json'])
-        logger.info(f"Successfully saved raw_ocr_json to database for Doc ID {doc_id}.")
-        
-        logger.info(f"Converting PDF pages to images for Doc ID {doc_id}.")
-        pages_dir = task_output_dir / "pages"
-        os.makedirs(pages_dir, exist_ok=True)
-        
-        pil_images = convert_from_path(pdf_path, poppler_path=POPPLER_PATH, thread_count=4, fmt='jpeg')
-        for i, image in enumerate(pil_images):
-            page_num = i + 1
-            filename = f"page-{str(page_num).zfill(4)}.jpg"
-            image.save(pages_dir / filename, 'JPEG')
-        
-        logger.info(f"Successfully converted and saved {len(pil_images)} images.")
-
-        doc.mineru_json_path = str(json_path)
-        doc.status = 'processed'
-        doc.save(update_fields=['mineru_json_path', 'status'])
-        
+
+        # 相同内容的 PDF 已处理过：直接引用共享的输出目录，不再运行 MinerU
+        cache_entry = ocr_cache.lookup(doc.content_hash, document=doc)
+        if cache_entry is not None:
+            logger.info(f"OCR cache hit for Doc ID {doc_id}: reusing {cache_entry.output_dir}.")
+            checkpoints.discard(doc)
+            with run.stage('load_json', nbytes=os.path.getsize(cache_entry.json_path)):
+                ocr_data = codec.load_path(cache_entry.json_path)
+            with run.stage('save_raw_ocr') as stage:
+                doc.raw_ocr_json = ocr_data
+                doc.mineru_json_path = cache_entry.json_path
+                doc.cache_entry = cache_entry
+                doc.page_paths = text_layer.page_paths(ocr_data)
+                doc.status = 'processed'
+                doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS + ['mineru_json_path', 'cache_entry', 'page_paths',
+                                                                     'status'])
+                stage.nbytes = doc.raw_ocr_size
+            _store_pages(doc, ocr_data, run)
+            events.publish_status(doc)
+            _build_ls_tasks(doc, run)
+            _index_text(doc, run)
+            run.finish('cached')
+            return f"Success (cached): {cache_entry.json_path}"
+
+        task_output_dir = checkpoints.prepare(doc, BASE_OUTPUT_DIR)
+        page_count = doc.page_count or get_page_count(pdf_path, poppler_path=POPPLER_PATH)
+
+        # 阶段 ocr：先从文本层直接抽取 born-digital 页，其余页交给 MinerU；大文档按页码区间
+        # 分片并行执行，小文档仍是单次执行。中断前已完成的分片与文本层结果留在输出目录中，续跑时直接复用
+        json_path = Path(doc.checkpoint.get('json_path', ''))
+        if not (checkpoints.is_done(doc, 'ocr') and json_path.is_file()):
+            with run.stage('text_layer', pages=page_count):
+                extracted = text_layer.prepare(pdf_path, page_count, task_output_dir, poppler_path=POPPLER_PATH,
+                                               label=f" for Doc ID {doc_id}")
+            doc.page_paths = extracted['stats']
+            doc.save(update_fields=['page_paths'])
+            ocr_page_count = len(extracted['ocr_pages'])
+            events.publish_progress(doc_id, 'mineru', 0, ocr_page_count)
+            with run.stage('mineru', pages=ocr_page_count) as stage:
+                json_path = run_mineru_sharded(
+                    pdf_path, task_output_dir, page_count, label=f" for Doc ID {doc_id}",
+                    on_progress=lambda done, total: events.publish_progress(doc_id, 'mineru_shards', done, total),
+                    on_stage_progress=lambda name, done, total: events.publish_progress(doc_id, f'mineru:{name}', done, total),
+                    check_cancelled=check_cancelled,
+                    pages=extracted['ocr_pages'] if extracted['pages'] else None, extra_pages=extracted['pages'],
+                )
+                stage.nbytes = json_path.stat().st_size
+            checkpoints.complete(doc, 'ocr', json_path=str(json_path))
+
+        # 阶段 persist_json
+        if not (checkpoints.is_done(doc, 'persist_json') and doc.raw_ocr_blob):
+            logger.info(f"Found OCR JSON file at: {json_path}. Reading content.")
+            with run.stage('load_json', pages=page_count, nbytes=json_path.stat().st_size):
+                ocr_data = codec.load_path(json_path)
+
+            with run.stage('save_raw_ocr', pages=page_count) as stage:
+                doc.raw_ocr_json = ocr_data
+                doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+                stage.nbytes = doc.raw_ocr_size
+            _store_pages(doc, ocr_data, run)
+            checkpoints.complete(doc, 'persist_json')
+            logger.info(f"Successfully saved raw_ocr_json to blob storage for Doc ID {doc_id}.")
+
+        # 阶段 rasterize：每批页面写盘后记录已完成的页码，续跑时从下一页开始
+        pages_done = doc.checkpoint.get('pages_done', 0)
+        if not checkpoints.is_done(doc, 'rasterize') and pages_done < page_count:
+            logger.info(f"Converting PDF pages {pages_done + 1}-{page_count} to images for Doc ID {doc_id}.")
+            pages_dir = task_output_dir / "pages"
+            os.makedirs(pages_dir, exist_ok=True)
+
+            def on_raster_progress(done, total):
+                checkpoints.save(doc, pages_done=done)
+                check_cancelled()
+                events.publish_progress(doc_id, 'rasterize', done, total)
+
+            # 分批栅格化，内存占用与总页数无关；图片编码耗时作为其中的子阶段单独记录
+            with run.stage('rasterize', pages=page_count - pages_done) as stage:
+                raster_stats = rasterize_pdf(
+                    pdf_path, pages_dir, page_count, poppler_path=POPPLER_PATH, label=f" for Doc ID {doc_id}",
+                    on_progress=on_raster_progress, start_page=pages_done + 1,
+                )
+                stage.nbytes = raster_stats['bytes']
+            run.record('rasterize.encode', raster_stats['encode_seconds'], pages=raster_stats['pages'],
+                       nbytes=raster_stats['bytes'])
+            logger.info(f"Successfully converted and saved {raster_stats['pages']} images.")
+        checkpoints.complete(doc, 'rasterize')
+
+        # 阶段 finalize：登记缓存并标记完成，断点随之清空
+        with run.stage('register_cache'):
+            doc.mineru_json_path = str(json_path)
+            doc.cache_entry = ocr_cache.register(doc.content_hash, task_output_dir, json_path, document=doc)
+            doc.status = 'processed'
+            doc.checkpoint = {}
+            doc.save(update_fields=['mineru_json_path', 'cache_entry', 'status', 'checkpoint'])
+        events.publish_status(doc)
+        _build_ls_tasks(doc, run)
+        _index_text(doc, run)
+        run.finish('processed')
+
         logger.info(f"Celery Task fully succeeded for Doc ID {doc_id}.")
         return f"Success: {str(json_path)}"
 
+    except cancellation.Cancelled:
+        logger.info(f"Processing of Doc ID {doc_id} cancelled; MinerU process group terminated.")
+        # 未登记到缓存的私有输出目录不再有用
+        checkpoints.discard(doc)
+        doc.status = 'cancelled'
+        doc.save(update_fields=['status'])
+        events.publish_status(doc)
+        if run:
+            run.finish('cancelled')
+        return "Cancelled"
+
     except Exception as e:
         if doc:
             doc.status = 'failed'
             doc.save(update_fields=['status'])
+            events.publish_status(doc)
+            if doc.checkpoint.get('stage'):
+                logger.info(f"Doc ID {doc_id} can be retried from after stage '{doc.checkpoint['stage']}'.")
+        if run:
+            run.finish('failed', error=e)
         # 错误日志现在会包含更丰富的信息
         logger.error(f"Error in Celery task for doc ID {doc_id if 'doc_id' in locals() else 'unknown'}: {e}", exc_info=True)
-        raise e
\ No newline at end of file
+        raise e
+
+    finally:
+        if heartbeat is not None:
+            heartbeat.stop()
+        # 处理已结束，之后到达的取消请求没有意义
+        if claimed:
+            cancellation.clear(doc_id)
+
+
+def _store_pages(doc, ocr_data, run):
+    # 拆成按页读取的 OcrPage/OcrBlock 行，完整 JSON 只作归档
+    with run.stage('store_pages') as stage:
+        stats = ocr_pages.store(doc, ocr_data)
+        stage.pages = stats['pages']
+    logger.info(f"Stored {stats['pages']} pages / {stats['blocks']} blocks for Doc ID {doc.id}.")
+
+
+def _build_ls_tasks(doc, run):
+    # 预先生成 Label Studio 任务；共享输出目录中已有最新产物时跳过。失败时下载接口会按需生成
+    try:
+        if label_studio_tasks.current_path(doc) is None:
+            with run.stage('label_studio_tasks') as stage:
+                stage.pages = label_studio_tasks.build(doc)
+    except Exception as e:
+        logger.warning(f"Failed to build Label Studio tasks for Doc ID {doc.id}: {e}", exc_info=True)
+
+
+def _index_text(doc, run):
+    # 检索索引失败不影响处理结果，可用 rebuild_search_index 补建
+    try:
+        with run.stage('index_text') as stage:
+            stage.pages = search.index_document(doc)['pages']
+    except Exception as e:
+        logger.warning(f"Failed to index text of Doc ID {doc.id}: {e}", exc_info=True)
+
+
+@shared_task
+def index_document_text(doc_id):
+    """整体提交校对后重建文档的检索索引。"""
+    doc = OcrDocument.objects.filter(id=doc_id).first()
+    if doc is None:
+        return None
+    return search.index_document(doc)
+
+
+def requeue(doc, **expected):
+    """
+    把文档重新置为 pending 并按页数投递到 small/large 队列，断点保留，新任务从断点继续。
+    expected 为条件更新的附加过滤条件（例如要求仍是 failed）；
+    文档状态已被其它请求改变时不投递，返回 False。
+    """
+    queue, priority = queues.route(doc.page_count)
+    updated = OcrDocument.objects.filter(pk=doc.pk, **expected) \
+        .update(status='pending', queue=queue, queued_at=timezone.now(), task_id='')
+    if not updated:
+        return False
+    doc.refresh_from_db()
+    events.publish_status(doc)
+    process_pdf_with_mineru.apply_async(args=[doc.id], queue=queue, priority=priority)
+    return True
+
+
+@shared_task(bind=True, max_retries=3)
+def push_document_to_ragflow(self, doc_id):
+    """
+    把文档当前版本的 RAGFlow payload 推送到 RAGFLOW_PUSH_URL，成功后标记为已入库。
+    部分 chunk 失败时按退避重试任务；已成功的 chunk 由幂等键记录，重试时不再发送。
+    """
+    doc = OcrDocument.objects.get(id=doc_id)
+    events.publish('push', doc_id, state='started')
+    try:
+        doc, stats = ragflow_push.push_document(
+            doc, on_progress=lambda done, total: events.publish_progress(doc_id, 'ragflow_push', done, total))
+    except ragflow_push.PushError as e:
+        logger.error(f"RAGFlow push failed for Doc ID {doc_id} (attempt {self.request.retries + 1}): {e}")
+        events.publish('push', doc_id, state='failed', error=str(e))
+        if ragflow_push.is_configured() and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=30 * 2 ** self.request.retries)
+        raise
+
+    doc.status = 'ingested'
+    doc.ingested_version = stats['version']
+    doc.save(update_fields=['status', 'ingested_version'])
+    events.publish_status(doc)
+    events.publish('push', doc_id, state='finished', sent=stats['sent'], skipped=stats['skipped'],
+                   chunks_per_second=stats['chunks_per_second'])
+    return stats
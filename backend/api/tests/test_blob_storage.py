@@ -0,0 +1,128 @@
+"""OCR JSON 的 blob 存储：读写往返、描述符的延迟写出、替换与回滚后的清理。"""
+import importlib
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from api import blob_storage, janitor
+from api.models import OcrDocument
+
+DATA = {'pdf_info': [{'page_idx': 0, 'para_blocks': [{'content': '中文 😀', 'bbox': [1.5, 2, 3, 4]}]}]}
+migration = importlib.import_module('api.migrations.0008_move_ocr_json_to_blobs')
+
+
+class BlobRootMixin:
+    def setUp(self):
+        super().setUp()
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(BLOB_STORAGE_ROOT=self.root, BLOB_STORAGE_CODEC='gzip')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def files(self, doc):
+        return sorted(path.name for path in blob_storage.document_dir(doc.pk).glob('*'))
+
+
+class RoundTripTests(BlobRootMixin, TestCase):
+    def test_write_then_read(self):
+        relative_path, size, checksum = blob_storage.write_json(7, 'raw_ocr_json', DATA)
+        self.assertEqual(relative_path, '7/raw_ocr_json.json.gz')
+        self.assertEqual(size, (self.root / relative_path).stat().st_size)
+        self.assertEqual(blob_storage.read_json(relative_path), DATA)
+        self.assertEqual(blob_storage.find_json(7, 'raw_ocr_json'), relative_path)
+        self.assertIsNone(blob_storage.find_json(7, 'missing'))
+
+        versioned = blob_storage.write_json(7, 'raw_ocr_json', DATA, versioned=True)
+        self.assertEqual(versioned[0], f'7/raw_ocr_json-{checksum[:16]}.json.gz')
+        self.assertEqual(versioned[2], checksum)
+        self.assertEqual(len(blob_storage.stored_versions(7, 'raw_ocr_json')), 2)
+        self.assertEqual(len(blob_storage.versioned_paths(7, 'raw_ocr_json')), 1)
+
+    def test_migration_copy_reads_and_writes_the_same_format(self):
+        relative_path, _, checksum = migration.write_json(7, 'raw_ocr_json', DATA)
+        self.assertEqual(blob_storage.read_json(relative_path), DATA)
+        self.assertEqual(migration.read_json(blob_storage.write_json(8, 'raw_ocr_json', DATA)[0]), DATA)
+
+
+class BlobJSONTests(BlobRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.doc = OcrDocument.objects.create(original_pdf_path='/data/report.pdf')
+
+    def test_assignment_is_written_on_save(self):
+        with self.assertRaises(ValueError):
+            OcrDocument(original_pdf_path='/data/new.pdf').raw_ocr_json = DATA
+        self.doc.raw_ocr_json = DATA
+        self.assertEqual(self.files(self.doc), [])
+        # 不含指针字段的保存不写出
+        self.doc.save(update_fields=['status'])
+        self.assertEqual(self.files(self.doc), [])
+
+        self.doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        saved = OcrDocument.objects.get(pk=self.doc.pk)
+        self.assertEqual(saved.raw_ocr_json, DATA)
+        self.assertEqual(saved.raw_ocr_blob, f'{self.doc.pk}/{self.files(self.doc)[0]}')
+        self.assertIsNone(saved.corrected_label_studio_json)
+
+    def test_replaced_blob_is_deleted_after_commit(self):
+        self.doc.raw_ocr_json = DATA
+        self.doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        first = self.doc.raw_ocr_blob
+        # 内容相同：仍是同一个文件
+        self.doc.raw_ocr_json = DATA
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        self.assertEqual((self.doc.raw_ocr_blob, callbacks), (first, []))
+
+        self.doc.raw_ocr_json = {'pdf_info': []}
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        # 提交之前旧版本仍在，读者不会读到被删掉的文件
+        self.assertEqual(len(self.files(self.doc)), 2)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.files(self.doc), [Path(self.doc.raw_ocr_blob).name])
+
+        self.doc.raw_ocr_json = None
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        self.assertEqual((self.doc.raw_ocr_blob, self.files(self.doc)), (None, []))
+
+    def test_failed_save_removes_new_blob(self):
+        self.doc.raw_ocr_json = DATA
+        self.doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        self.doc.raw_ocr_json = {'pdf_info': []}
+        with mock.patch('django.db.models.Model.save', side_effect=RuntimeError('database is gone')):
+            with self.assertRaises(RuntimeError):
+                self.doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        saved = OcrDocument.objects.get(pk=self.doc.pk)
+        self.assertEqual(self.files(self.doc), [Path(saved.raw_ocr_blob).name])
+        self.assertEqual(saved.raw_ocr_json, DATA)
+
+    def test_rollback_keeps_old_blob_and_janitor_removes_new_one(self):
+        self.doc.raw_ocr_json = DATA
+        self.doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        # 其它旁路文件（固定文件名）不归 janitor 管
+        blob_storage.write_json(self.doc.pk, 'ragflow_page_cache', {})
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.doc.raw_ocr_json = {'pdf_info': []}
+            self.doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+            raise RuntimeError('later step failed')
+
+        saved = OcrDocument.objects.get(pk=self.doc.pk)
+        self.assertEqual(saved.raw_ocr_json, DATA)
+        self.assertEqual(len(self.files(self.doc)), 3)
+        orphan = self.root / self.doc.raw_ocr_blob
+        # 刚写出的版本可能属于尚未提交的事务
+        self.assertEqual(janitor.reap_orphan_blobs(min_age=timedelta(hours=1)), [])
+        self.assertEqual(janitor.reap_orphan_blobs(min_age=timedelta(0), dry_run=True),
+                         [(orphan, orphan.stat().st_size)])
+        self.assertEqual(len(janitor.reap_orphan_blobs(min_age=timedelta(0))), 1)
+        self.assertEqual(self.files(self.doc), sorted([Path(saved.raw_ocr_blob).name, 'ragflow_page_cache.json.gz']))
+        self.assertEqual(OcrDocument.objects.get(pk=self.doc.pk).raw_ocr_json, DATA)
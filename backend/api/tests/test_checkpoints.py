@@ -0,0 +1,231 @@
+"""断点续跑：条件认领、janitor 对心跳超时文档的处理、续跑时跳过已完成的阶段与页面。"""
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from api import checkpoints, janitor
+from api.models import OcrCacheEntry, OcrDocument
+from api.tasks import process_pdf_with_mineru
+
+STALE = timedelta(seconds=600)
+
+
+class QuietMixin:
+    """不连接 Redis：事件、指标与取消标记都替换掉。"""
+    def setUp(self):
+        super().setUp()
+        for target in ('api.tasks.events', 'api.janitor.events', 'api.tasks.metrics', 'api.instrumentation.metrics',
+                       'api.tasks.cancellation.clear'):
+            patcher = mock.patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('api.tasks.cancellation.is_requested', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+def _document(**fields):
+    return OcrDocument.objects.create(original_pdf_path='/data/report.pdf', **fields)
+
+
+@override_settings(PROCESSING_STALE_SECONDS=300, PROCESSING_MAX_ATTEMPTS=3)
+class ClaimTests(TestCase):
+    def test_pending_document_is_claimed_once(self):
+        doc = _document(status='pending')
+        self.assertTrue(checkpoints.claim(doc.pk, 'task-1'))
+        doc.refresh_from_db()
+        self.assertEqual((doc.status, doc.task_id), ('processing', 'task-1'))
+        self.assertIsNotNone(doc.heartbeat_at)
+        # 另一个任务遇到心跳新鲜的文档：拒绝
+        self.assertFalse(checkpoints.claim(doc.pk, 'task-2'))
+        self.assertFalse(checkpoints.claim(doc.pk, ''))
+        # 同一条消息被重新投递：允许
+        self.assertTrue(checkpoints.claim(doc.pk, 'task-1'))
+
+    def test_stale_heartbeat_can_be_claimed(self):
+        doc = _document(status='processing', task_id='task-1', heartbeat_at=timezone.now() - STALE)
+        self.assertTrue(checkpoints.claim(doc.pk, 'task-2'))
+        self.assertEqual(OcrDocument.objects.get(pk=doc.pk).task_id, 'task-2')
+
+    def test_finished_or_cancelled_documents_are_not_claimed(self):
+        for status in ('processed', 'cancelling', 'cancelled', 'failed'):
+            doc = _document(status=status, heartbeat_at=timezone.now() - STALE)
+            self.assertFalse(checkpoints.claim(doc.pk, 'task-1'))
+
+
+@override_settings(PROCESSING_STALE_SECONDS=300, PROCESSING_MAX_ATTEMPTS=3)
+class RequeueStaleTests(QuietMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        task = mock.patch('api.tasks.process_pdf_with_mineru')
+        self.task = task.start()
+        self.addCleanup(task.stop)
+
+    def test_only_stale_documents_are_handled(self):
+        old = timezone.now() - STALE
+        fresh = _document(status='processing', heartbeat_at=timezone.now(), checkpoint={'attempts': 1})
+        stale = _document(status='processing', heartbeat_at=old, page_count=3, checkpoint={'attempts': 1})
+        legacy = _document(status='processing', started_at=old, checkpoint={'attempts': 2})
+        exhausted = _document(status='processing', heartbeat_at=old, checkpoint={'attempts': 3})
+        cancelling = _document(status='cancelling', heartbeat_at=old)
+        pending = _document(status='pending', heartbeat_at=old)
+
+        self.assertEqual({(doc.pk, action) for doc, action in janitor.requeue_stale(dry_run=True)},
+                         {(stale.pk, 'requeued'), (legacy.pk, 'requeued'), (exhausted.pk, 'failed'),
+                          (cancelling.pk, 'cancelled')})
+        self.task.apply_async.assert_not_called()
+
+        with self.assertLogs('api.janitor', 'WARNING'):
+            results = janitor.requeue_stale()
+        self.assertEqual(len(results), 4)
+        statuses = dict(OcrDocument.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[doc.pk] for doc in (fresh, stale, legacy, exhausted, cancelling, pending)],
+                         ['processing', 'pending', 'pending', 'failed', 'cancelled', 'pending'])
+        self.assertEqual(sorted(call.kwargs['args'][0] for call in self.task.apply_async.call_args_list),
+                         [stale.pk, legacy.pk])
+        # 断点保留，重新入队的任务从断点继续
+        self.assertEqual(OcrDocument.objects.get(pk=stale.pk).checkpoint, {'attempts': 1})
+
+    def test_heartbeat_resumed_after_listing_is_left_alone(self):
+        doc = _document(status='processing', heartbeat_at=timezone.now() - STALE)
+        requeue = janitor.requeue
+
+        def heartbeat_then_requeue(stale_doc, **expected):
+            # 模拟判定超时之后、重新入队之前 worker 恢复了心跳
+            OcrDocument.objects.filter(pk=stale_doc.pk).update(heartbeat_at=timezone.now())
+            return requeue(stale_doc, **expected)
+
+        with mock.patch.object(janitor, 'requeue', side_effect=heartbeat_then_requeue):
+            self.assertEqual(janitor.requeue_stale(), [])
+        self.assertEqual(OcrDocument.objects.get(pk=doc.pk).status, 'processing')
+        self.task.apply_async.assert_not_called()
+
+
+class HeartbeatTests(TransactionTestCase):
+    def test_refreshes_only_documents_still_processing(self):
+        old = timezone.now() - STALE
+        processing = _document(status='processing', heartbeat_at=old)
+        processed = _document(status='processed', heartbeat_at=old)
+        heartbeats = [checkpoints.Heartbeat(doc.pk, interval=0.01) for doc in (processing, processed)]
+        deadline = time.monotonic() + 5
+        while OcrDocument.objects.get(pk=processing.pk).heartbeat_at == old and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for heartbeat in heartbeats:
+            heartbeat.stop()
+        self.assertGreater(OcrDocument.objects.get(pk=processing.pk).heartbeat_at, old)
+        self.assertEqual(OcrDocument.objects.get(pk=processed.pk).heartbeat_at, old)
+
+
+class ReapOrphansTests(TestCase):
+    def setUp(self):
+        self.base = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.base, ignore_errors=True)
+        patcher = mock.patch.object(janitor, 'BASE_OUTPUT_DIR', self.base)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_dir(self, name, age=timedelta(days=2)):
+        path = self.base / name
+        (path / 'pages').mkdir(parents=True)
+        (path / 'pages' / 'page-0001.jpg').write_bytes(b'x' * 10)
+        mtime = time.time() - age.total_seconds()
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_only_old_unreferenced_directories_are_removed(self):
+        cached = self.make_dir('cached')
+        OcrCacheEntry.objects.create(cache_key='k', content_hash='h', mineru_version='1', raster_profile='high',
+                                     output_dir=str(cached), json_path=str(cached / 'a' / 'auto' / 'a_middle.json'))
+        processed = self.make_dir('processed')
+        _document(mineru_json_path=str(processed / 'report' / 'auto' / 'report_middle.json'))
+        resuming = self.make_dir('resuming')
+        _document(checkpoint={'work_dir': str(resuming), 'stage': 'ocr'})
+        young = self.make_dir('young', age=timedelta(minutes=5))
+        orphan = self.make_dir('orphan')
+
+        self.assertEqual(janitor.reap_orphans(min_age=timedelta(hours=1), dry_run=True), [(orphan, 10)])
+        self.assertTrue(orphan.is_dir())
+        self.assertEqual(janitor.reap_orphans(min_age=timedelta(hours=1)), [(orphan, 10)])
+        self.assertEqual(sorted(path.name for path in self.base.iterdir()),
+                         ['cached', 'processed', 'resuming', 'young'])
+        self.assertTrue(young.is_dir())
+
+
+@override_settings(PROCESSING_STALE_SECONDS=300)
+class ResumeTests(QuietMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.base = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.base, ignore_errors=True)
+        blob_override = override_settings(BLOB_STORAGE_ROOT=self.base / 'blobs')
+        blob_override.enable()
+        self.addCleanup(blob_override.disable)
+        self.work_dir = self.base / 'output' / 'abc123'
+        self.json_path = self.work_dir / 'report' / 'auto' / 'report_middle.json'
+        self.json_path.parent.mkdir(parents=True)
+        self.json_path.write_text('{"pdf_info": []}')
+        for target, kwargs in (('api.tasks.BASE_OUTPUT_DIR', {'new': self.base / 'output'}),
+                               ('api.tasks._build_ls_tasks', {}), ('api.tasks._index_text', {})):
+            patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.mineru = self.patch('api.tasks.run_mineru_sharded')
+        self.text_layer = self.patch('api.tasks.text_layer.prepare')
+        self.rasterize = self.patch('api.tasks.rasterize_pdf', return_value={
+            'pages': 3, 'bytes': 30, 'encode_seconds': 0.1})
+
+    def patch(self, target, **kwargs):
+        patcher = mock.patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def run_task(self, doc):
+        result = process_pdf_with_mineru.apply(args=[doc.pk], task_id='task-1')
+        self.assertTrue(result.successful(), result.traceback)
+        return OcrDocument.objects.get(pk=doc.pk)
+
+    def test_resumes_rasterize_after_recorded_pages(self):
+        doc = _document(status='pending', page_count=5)
+        doc.raw_ocr_json = {'pdf_info': []}
+        doc.checkpoint = {'work_dir': str(self.work_dir), 'attempts': 1, 'stage': 'persist_json',
+                          'json_path': str(self.json_path), 'pages_done': 2}
+        doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS + ['checkpoint'])
+
+        doc = self.run_task(doc)
+        self.mineru.assert_not_called()
+        self.text_layer.assert_not_called()
+        self.rasterize.assert_called_once()
+        self.assertEqual(self.rasterize.call_args.kwargs['start_page'], 3)
+        self.assertEqual((doc.status, doc.checkpoint, doc.mineru_json_path), ('processed', {}, str(self.json_path)))
+
+    def test_completed_rasterize_is_skipped(self):
+        doc = _document(status='processing', task_id='task-1', heartbeat_at=timezone.now(), page_count=5)
+        doc.raw_ocr_json = {'pdf_info': []}
+        doc.checkpoint = {'work_dir': str(self.work_dir), 'attempts': 2, 'stage': 'rasterize',
+                          'json_path': str(self.json_path), 'pages_done': 5}
+        doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS + ['checkpoint'])
+
+        self.assertEqual(self.run_task(doc).status, 'processed')
+        self.mineru.assert_not_called()
+        self.rasterize.assert_not_called()
+
+    def test_missing_work_dir_starts_over(self):
+        doc = _document(status='pending', page_count=5)
+        doc.checkpoint = {'work_dir': str(self.base / 'gone'), 'attempts': 1, 'stage': 'rasterize',
+                          'json_path': str(self.base / 'gone' / 'x_middle.json'), 'pages_done': 5}
+        doc.save(update_fields=['checkpoint'])
+        self.text_layer.return_value = {'pages': [], 'ocr_pages': [0, 1, 2, 3, 4], 'stats': {}}
+        self.mineru.return_value = self.json_path
+
+        with self.assertLogs('api.checkpoints', 'WARNING'):
+            doc = self.run_task(doc)
+        self.mineru.assert_called_once()
+        self.assertEqual(self.rasterize.call_args.kwargs['start_page'], 1)
+        self.assertEqual(doc.status, 'processed')
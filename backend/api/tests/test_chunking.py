@@ -0,0 +1,58 @@
+"""section 模式分块：目标与上限 token 数、表格不拆分、标题的归属。"""
+from django.test import SimpleTestCase
+
+from api import chunking
+
+
+def _config(**overrides):
+    return {**chunking.DEFAULT_CONFIG, 'overlap_tokens': 0, 'include_metadata': True, **overrides}
+
+
+def _contents(chunks):
+    return [chunk['content_ltxt'] for chunk in chunks]
+
+
+def _page(page_num, *elements):
+    return page_num, True, list(elements)
+
+
+class ChunkSectionsTests(SimpleTestCase):
+    def test_text_is_split_at_target_and_section_title_repeated(self):
+        pages = [_page(1, ('Title', 'Scope'), ('Text', 'a b c'), ('Text', 'd e'), ('Text', 'f g h'))]
+        chunks = chunking._chunk_sections(pages, _config(target_tokens=5))
+        self.assertEqual(_contents(chunks), ['Scope\na b c', 'Scope\nd e\nf g h'])
+        self.assertEqual(chunks[1]['metadata'], {'pages': [1, 1], 'section': 'Scope', 'tokens': 6})
+
+    def test_overlap_carries_whole_trailing_elements(self):
+        pages = [_page(1, ('Title', 'Scope'), ('Text', 'a b c'), ('Text', 'd e'), ('Text', 'f g h'))]
+        chunks = chunking._chunk_sections(pages, _config(target_tokens=5, overlap_tokens=3))
+        self.assertEqual(_contents(chunks), ['Scope\na b c', 'Scope\na b c\nd e', 'Scope\nd e\nf g h'])
+
+    def test_table_exceeding_max_tokens_starts_its_own_chunk(self):
+        pages = [_page(1, ('Title', 'Results'), ('Text', 'a b c d e f g h'), ('Table', 't1 t2 t3 t4 t5'))]
+        chunks = chunking._chunk_sections(pages, _config(target_tokens=10, max_tokens=12))
+        self.assertEqual(_contents(chunks), ['Results\na b c d e f g h', 'Results\nt1 t2 t3 t4 t5'])
+
+    def test_table_larger_than_max_tokens_is_not_split(self):
+        table = ' '.join(f"c{n}" for n in range(30))
+        pages = [_page(1, ('Text', 'intro'), ('Table', table), ('Equation', 'E = mc'), ('Text', 'outro'))]
+        chunks = chunking._chunk_sections(pages, _config(target_tokens=8, max_tokens=10))
+        self.assertEqual(_contents(chunks), ['intro', table, 'E = mc\noutro'])
+
+    def test_consecutive_titles_merge_into_one_heading(self):
+        pages = [_page(1, ('Title', 'Chapter 1'), ('Title', '1.1 Scope'), ('Text', 'body'), ('Header', 'Running head'))]
+        chunks = chunking._chunk_sections(pages, _config())
+        self.assertEqual(_contents(chunks), ['Chapter 1\n1.1 Scope\nbody'])
+        self.assertEqual(chunks[0]['metadata']['section'], 'Chapter 1\n1.1 Scope')
+
+    def test_title_at_page_end_moves_to_next_page_without_cross_page(self):
+        pages = [_page(1, ('Text', 'one'), ('Title', 'Two')), _page(2, ('Text', 'two body'))]
+        chunks = chunking._chunk_sections(pages, _config(cross_page=False))
+        self.assertEqual(_contents(chunks), ['one', 'Two\ntwo body'])
+        self.assertEqual(chunks[1]['metadata']['pages'], [1, 2])
+
+    def test_trailing_title_is_kept(self):
+        pages = [_page(1, ('Text', 'body')), _page(2, ('Title', 'Appendix'), ('Text', '  '))]
+        chunks = chunking._chunk_sections(pages, _config())
+        self.assertEqual(_contents(chunks), ['body', 'Appendix'])
+        self.assertEqual(chunks[1]['metadata'], {'pages': [2, 2], 'section': 'Appendix', 'tokens': 1})
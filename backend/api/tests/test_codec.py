@@ -0,0 +1,66 @@
+"""codec.iter_pages：文件对象每次只返回很少的字节时（多字节字符、数字被截断）仍逐页解析正确。"""
+import io
+import json
+
+from django.test import SimpleTestCase
+
+from api import codec
+
+DOCUMENT = {
+    '_backend': 'pipeline',
+    'pdf_info': [
+        {'page_idx': 0, 'page_size': [595.276, 841.89], 'para_blocks': [
+            {'type': 'text', 'bbox': [72.125, 120, 540, 132.5], 'lines': [
+                {'spans': [{'content': '中文段落 – ünïcödé 😀 "quoted" \\ back'}]}]}],
+         'images': ['a.jpg']},
+        {'page_idx': 1, 'page_size': [612, 792], 'para_blocks': [], 'preproc_blocks': [{'type': 'table'}]},
+        {'page_idx': 12345678901234, 'page_size': [1e-3, -2.5e10], 'para_blocks': [{'content': '表'}]},
+    ],
+    '_version_name': '2.1.0',
+}
+
+
+class TrickleReader(io.RawIOBase):
+    """每次 read 至多返回 chunk 个字节，不管请求多少。"""
+    def __init__(self, data, chunk):
+        self.data = data
+        self.chunk = chunk
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self.data[self.offset:self.offset + self.chunk]
+        self.offset += len(data)
+        return data
+
+
+def _expected(fields=('page_idx', 'page_size', 'para_blocks', 'preproc_blocks')):
+    return [{name: page[name] for name in fields if name in page} for page in DOCUMENT['pdf_info']]
+
+
+class IterPagesTests(SimpleTestCase):
+    def test_reads_that_split_characters_and_numbers(self):
+        for indent in (None, 2):
+            data = json.dumps(DOCUMENT, ensure_ascii=False, indent=indent).encode('utf-8')
+            for chunk in (1, 2, 3, 7):
+                with self.subTest(indent=indent, chunk=chunk):
+                    self.assertEqual(list(codec.iter_pages(TrickleReader(data, chunk))), _expected())
+
+    def test_all_fields_and_text_files(self):
+        text = json.dumps(DOCUMENT, ensure_ascii=False)
+        self.assertEqual(list(codec.iter_pages(io.StringIO(text), fields=None)), DOCUMENT['pdf_info'])
+        self.assertEqual(list(codec.iter_pages(io.BytesIO(codec.dumps(DOCUMENT)), fields=('page_idx',))),
+                         [{'page_idx': page['page_idx']} for page in DOCUMENT['pdf_info']])
+
+    def test_empty_documents(self):
+        for data in (b'{}', b' { "pdf_info" : [ ] } ', b'{"_backend": "x"}'):
+            with self.subTest(data=data):
+                self.assertEqual(list(codec.iter_pages(TrickleReader(data, 1))), [])
+
+    def test_invalid_documents(self):
+        with self.assertRaises(ValueError):
+            list(codec.iter_pages(io.BytesIO(b'{"pdf_info": [1]}')))
+        with self.assertRaises(ValueError):
+            list(codec.iter_pages(io.BytesIO(b'{"pdf_info": [{"page_idx": 0}')))
@@ -0,0 +1,157 @@
+"""按页校对增量：同页的版本冲突、基线变化后的来源标识、合成导出，以及接口的 1 起始页码。"""
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import corrections
+from api.models import OcrDocument, OcrPage, PageCorrection
+
+
+def _result(text):
+    return [{'type': 'textarea', 'value': {'text': [text]}}]
+
+
+def _task(page_idx, text, **data):
+    return {'data': {'image': f'/media/out/pages/page-{page_idx + 1:04d}.jpg', **data},
+            'annotations': [{'result': _result(text)}]}
+
+
+class BlobRootMixin:
+    def setUp(self):
+        super().setUp()
+        blob_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, blob_root, ignore_errors=True)
+        settings_override = override_settings(BLOB_STORAGE_ROOT=blob_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def document(self, base=None, **fields):
+        doc = OcrDocument.objects.create(original_pdf_path='/data/report.pdf', status='processed', **fields)
+        if base is not None:
+            doc.corrected_label_studio_json = base
+            doc.save(update_fields=OcrDocument.CORRECTED_LS_FIELDS)
+        return doc
+
+
+class ApplyPageTests(BlobRootMixin, TestCase):
+    def test_versions_and_unchanged_content(self):
+        doc = self.document()
+        page, changed = corrections.apply_page(doc, 0, _result('a'))
+        self.assertEqual((page.version, changed), (1, True))
+        page, changed = corrections.apply_page(doc, 0, _result('a'), expected_version=1)
+        self.assertEqual((page.version, changed), (1, False))
+        page, changed = corrections.apply_page(doc, 0, _result('b'), expected_version=1)
+        self.assertEqual((page.version, changed), (2, True))
+
+    def test_if_match_version_conflict(self):
+        doc = self.document()
+        corrections.apply_page(doc, 0, _result('a'))
+        corrections.apply_page(doc, 0, _result('b'), expected_version=1)
+        # 基于第 1 版的修改：第 2 版已经覆盖了它读到的内容
+        with self.assertRaises(corrections.VersionConflict) as raised:
+            corrections.apply_page(doc, 0, _result('c'), expected_version=1)
+        self.assertEqual(raised.exception.current_version, 2)
+        # 以为这一页还没有校对过
+        with self.assertRaises(corrections.VersionConflict):
+            corrections.apply_page(doc, 0, _result('c'), expected_version=0)
+        self.assertEqual(PageCorrection.objects.get(document=doc, page_index=0).result, _result('b'))
+        # 其它页互不影响
+        self.assertTrue(corrections.apply_page(doc, 1, _result('c'), expected_version=0)[1])
+
+
+class MaterializeTests(BlobRootMixin, TestCase):
+    def test_deltas_are_merged_by_page_idx(self):
+        # 第 2 页没有区域，基线中没有任务；任务序号与页码不一致
+        doc = self.document(base=[_task(0, 'p1'), _task(2, 'p3'), {'data': {'page_idx': 3},
+                                                                    'annotations': [{'result': _result('p4')}]}])
+        corrections.apply_page(doc, 2, _result('p3 fixed'))
+        corrections.apply_page(doc, 1, _result('p2 added'))
+
+        tasks = corrections.materialize(doc)
+        self.assertEqual([corrections.task_page_idx(task, n) for n, task in enumerate(tasks)], [0, 1, 2, 3])
+        self.assertEqual([task['annotations'][0]['result'] for task in tasks],
+                         [_result('p1'), _result('p2 added'), _result('p3 fixed'), _result('p4')])
+        self.assertEqual(tasks[2]['data']['image'], '/media/out/pages/page-0003.jpg')
+        # 补出的任务没有页面图片时只带页码
+        self.assertEqual(tasks[1]['data'], {'page_idx': 1})
+        # 合成结果不回写到文档行
+        self.assertEqual(len(OcrDocument.objects.get(pk=doc.pk).corrected_label_studio_json), 3)
+
+    def test_delta_against_stale_base(self):
+        doc = self.document(base=[_task(0, 'old p1'), _task(1, 'old p2')])
+        corrections.apply_page(doc, 1, _result('p2 fixed'))
+        before = corrections.source_key(doc)
+
+        # 之后整体上传了新的导出：来源标识随之变化，缓存的导出不会被复用
+        doc.corrected_label_studio_json = [_task(0, 'new p1'), _task(1, 'new p2')]
+        doc.save(update_fields=OcrDocument.CORRECTED_LS_FIELDS)
+        self.assertNotEqual(corrections.source_key(doc), before)
+        # 尚未清除的旧增量仍只覆盖自己那一页
+        self.assertEqual([task['annotations'][0]['result'] for task in corrections.materialize(doc)],
+                         [_result('new p1'), _result('p2 fixed')])
+        # 整体上传会清除旧增量，导出回到新的基线
+        corrections.clear_pages(doc)
+        self.assertEqual([task['annotations'][0]['result'] for task in corrections.materialize(doc)],
+                         [_result('new p1'), _result('new p2')])
+
+    def test_source_key_follows_deltas(self):
+        doc = self.document(base=[_task(0, 'p1')])
+        keys = {corrections.source_key(doc)}
+        corrections.apply_page(doc, 0, _result('a'))
+        keys.add(corrections.source_key(doc))
+        corrections.apply_page(doc, 0, _result('a'))
+        keys.add(corrections.source_key(doc))
+        corrections.apply_page(doc, 0, _result('b'))
+        keys.add(corrections.source_key(doc))
+        self.assertEqual(len(keys), 3)
+
+
+class PageCorrectionViewTests(BlobRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.doc = self.document()
+        OcrPage.objects.bulk_create(OcrPage(document=self.doc, page_idx=n, width=595, height=842) for n in range(3))
+        for target in ('api.views.events.publish_status', 'api.views.search.index_page'):
+            patcher = mock.patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def url(self, page):
+        return f'/api/documents/{self.doc.pk}/corrections/{page}/'
+
+    def test_page_in_url_is_one_based(self):
+        response = self.client.patch(self.url(1), {'result': _result('p1')}, format='json')
+        self.assertEqual((response.status_code, response.data['page'], response['ETag']), (200, 1, '"1"'))
+        response = self.client.patch(self.url(3), {'annotations': [{'result': _result('p3')}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(PageCorrection.objects.values_list('page_index', 'result')),
+                         {0: _result('p1'), 2: _result('p3')})
+        self.assertEqual(self.client.patch(self.url(4), {'result': []}, format='json').status_code, 404)
+
+        response = self.client.get(self.url(3))
+        self.assertEqual((response.status_code, response.data['page'], response.data['result']),
+                         (200, 3, _result('p3')))
+        self.assertEqual(self.client.get(self.url(2)).status_code, 404)
+        # 合成导出中对应 0 起始的 page_idx
+        self.assertEqual([corrections.task_page_idx(task, n)
+                          for n, task in enumerate(corrections.materialize(self.doc))], [0, 2])
+        self.assertEqual(OcrDocument.objects.get(pk=self.doc.pk).status, 'corrected')
+
+    def test_if_match(self):
+        self.client.patch(self.url(2), {'result': _result('a')}, format='json')
+        response = self.client.patch(self.url(2), {'result': _result('b')}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual((response.status_code, response.data['version']), (200, 2))
+        response = self.client.patch(self.url(2), {'result': _result('c')}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual((response.status_code, response.data['version']), (409, 2))
+        response = self.client.patch(self.url(2), {'result': _result('c')}, format='json', HTTP_IF_MATCH='v1')
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_processed_documents_are_editable(self):
+        OcrDocument.objects.filter(pk=self.doc.pk).update(status='processing')
+        self.assertEqual(self.client.patch(self.url(1), {'result': []}, format='json').status_code, 409)
+        self.assertEqual(self.client.patch('/api/documents/0/corrections/1/', {'result': []},
+                                           format='json').status_code, 404)
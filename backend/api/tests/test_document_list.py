@@ -0,0 +1,73 @@
+"""文档列表：默认返回摘要列与游标分页，按状态过滤，从不加载 OCR JSON 的 blob。"""
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.models import OcrDocument
+from api.serializers import OcrDocumentSummarySerializer
+
+LIST_URL = '/api/documents/'
+
+
+class DocumentListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.docs = [OcrDocument.objects.create(original_pdf_path=f'/data/{n}.pdf',
+                                               status='processed' if n % 2 else 'pending')
+                    for n in range(5)]
+
+    def setUp(self):
+        blob_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, blob_root, ignore_errors=True)
+        settings_override = override_settings(BLOB_STORAGE_ROOT=blob_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(doc['id'] for doc in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_summary_shape_without_loading_blobs(self):
+        doc = OcrDocument.objects.get(pk=self.docs[1].pk)
+        doc.raw_ocr_json = {'pdf_info': [{'page_idx': 0}]}
+        doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        with mock.patch('api.blob_storage.read_json', side_effect=AssertionError('blob read')):
+            response = self.client.get(LIST_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'next', 'previous', 'results'})
+        self.assertEqual(len(response.data['results']), 5)
+        for item in response.data['results']:
+            self.assertEqual(tuple(item), OcrDocumentSummarySerializer.Meta.fields)
+
+    def test_cursor_pages_cover_every_document_once(self):
+        ids = self.collect(f'{LIST_URL}?page_size=2')
+        self.assertEqual(ids, [doc.pk for doc in reversed(self.docs)])
+
+    def test_new_uploads_do_not_shift_later_pages(self):
+        first = self.client.get(f'{LIST_URL}?page_size=2').data
+        OcrDocument.objects.create(original_pdf_path='/data/new.pdf')
+        ids = [doc['id'] for doc in first['results']] + self.collect(first['next'])
+        self.assertEqual(ids, [doc.pk for doc in reversed(self.docs)])
+
+    def test_status_filter(self):
+        ids = self.collect(f'{LIST_URL}?status=processed&page_size=1')
+        self.assertEqual(ids, [self.docs[3].pk, self.docs[1].pk])
+        ids = self.collect(f'{LIST_URL}?status=processed,%20pending,')
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(self.collect(f'{LIST_URL}?status=failed'), [])
+
+    def test_detail_still_returns_json(self):
+        doc = OcrDocument.objects.get(pk=self.docs[0].pk)
+        doc.raw_ocr_json = {'pdf_info': []}
+        doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        response = self.client.get(f'{LIST_URL}{doc.pk}/')
+        self.assertEqual(response.data['raw_ocr_json'], {'pdf_info': []})
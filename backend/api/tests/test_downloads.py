@@ -0,0 +1,185 @@
+"""下载接口的 ETag / 304 与批量导出归档的 manifest。"""
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import blob_storage, batches, corrections, responses
+from api.models import OcrDocument
+
+RAW_OCR = {'pdf_info': [{'page_idx': 0, 'page_size': [595, 842], 'para_blocks': []}]}
+
+
+def _task(text):
+    return {'data': {}, 'annotations': [{'result': [
+        {'id': 'r1', 'type': 'rectanglelabels', 'value': {'rectanglelabels': ['Text']}},
+        {'id': 'r1', 'type': 'textarea', 'value': {'text': [text]}},
+    ]}]}
+
+
+def _body(response):
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+class BlobRootMixin:
+    def setUp(self):
+        super().setUp()
+        blob_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, blob_root, ignore_errors=True)
+        settings_override = override_settings(BLOB_STORAGE_ROOT=blob_root, BLOB_STORAGE_CODEC='gzip')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def document(self, raw_ocr=None, corrected=None, name='report'):
+        doc = OcrDocument.objects.create(original_pdf_path=f'/data/{name}.pdf', status='processed')
+        if raw_ocr is not None:
+            doc.raw_ocr_json = raw_ocr
+            doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+        if corrected is not None:
+            doc.corrected_label_studio_json = corrected
+            doc.status = 'corrected'
+            doc.save(update_fields=OcrDocument.CORRECTED_LS_FIELDS + ['status'])
+        return doc
+
+
+class NotModifiedTests(BlobRootMixin, TestCase):
+    def test_blob_etag_and_if_none_match(self):
+        self.assertIsNone(responses.blob_etag(1, 'raw_ocr_json'))
+        blob_storage.write_json(1, 'raw_ocr_json', RAW_OCR, versioned=True)
+        etag = responses.blob_etag(1, 'raw_ocr_json')
+        self.assertTrue(etag.startswith('"1-'))
+        self.assertNotEqual(responses.blob_etag(1, 'raw_ocr_json', variant='gz-'), etag)
+
+        factory = RequestFactory()
+        self.assertIsNone(responses.not_modified(factory.get('/'), etag))
+        self.assertIsNone(responses.not_modified(factory.get('/', HTTP_IF_NONE_MATCH='"other"'), etag))
+        self.assertIsNone(responses.not_modified(factory.get('/', HTTP_IF_NONE_MATCH='*'), None))
+        for header in (etag, f'"other", {etag}', '*'):
+            response = responses.not_modified(factory.get('/', HTTP_IF_NONE_MATCH=header), etag)
+            self.assertEqual((response.status_code, response['ETag']), (304, etag))
+
+
+class LabelStudioTaskViewTests(BlobRootMixin, TestCase):
+    def test_304_without_database_or_blob_access(self):
+        doc = self.document(raw_ocr=RAW_OCR)
+        url = f'/api/documents/{doc.pk}/to-label-studio/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(_body(response)), RAW_OCR)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0), \
+                mock.patch.object(blob_storage, 'open_decompressed') as open_blob, \
+                mock.patch('builtins.open') as open_file:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        open_blob.assert_not_called()
+        open_file.assert_not_called()
+
+    def test_new_blob_version_changes_etag(self):
+        doc = self.document(raw_ocr=RAW_OCR)
+        url = f'/api/documents/{doc.pk}/to-label-studio/'
+        etag = self.client.get(url)['ETag']
+        doc.raw_ocr_json = {'pdf_info': []}
+        with self.captureOnCommitCallbacks(execute=True):
+            doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(json.loads(_body(response)), {'pdf_info': []})
+
+    def test_gzip_blob_is_sent_as_is(self):
+        doc = self.document(raw_ocr=RAW_OCR)
+        response = self.client.get(f'/api/documents/{doc.pk}/to-label-studio/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(_body(response), (blob_storage.absolute_path(doc.raw_ocr_blob)).read_bytes())
+
+
+@override_settings(RAGFLOW_CHUNKING={'mode': 'page'})
+class GenerateRAGFlowPayloadViewTests(BlobRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.doc = self.document(corrected=[_task('Page 1 text'), _task('Page 2 text')])
+        self.url = f'/api/documents/{self.doc.pk}/to-ragflow/'
+
+    def test_304_without_building_or_reading_the_payload(self):
+        response = self.client.get(self.url)
+        self.assertEqual((response.status_code, response['X-Payload-Version']), (200, '1'))
+        self.assertEqual([chunk['content_ltxt'] for chunk in json.loads(_body(response))['chunks']],
+                         ['Page 1 text', 'Page 2 text'])
+        etag = response['ETag']
+
+        # 只读取文档行与各页增量的校验和
+        with self.assertNumQueries(2), \
+                mock.patch('api.views.ragflow.get_or_build_payload') as build, \
+                mock.patch.object(blob_storage, 'read_json') as read_json, \
+                mock.patch.object(blob_storage, 'open_decompressed') as open_blob:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        build.assert_not_called()
+        read_json.assert_not_called()
+        open_blob.assert_not_called()
+
+    def test_corrections_and_chunking_config_change_etag(self):
+        etags = {self.client.get(self.url)['ETag']}
+        corrections.apply_page(self.doc, 1, _task('Page 2 fixed')['annotations'][0]['result'])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=','.join(etags))
+        self.assertEqual((response.status_code, response['X-Payload-Version']), (200, '2'))
+        self.assertIn('Page 2 fixed', _body(response).decode('utf-8'))
+        etags.add(response['ETag'])
+
+        with override_settings(RAGFLOW_CHUNKING={'mode': 'page', 'include_metadata': True}):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=','.join(etags))
+            self.assertEqual((response.status_code, response['X-Payload-Version']), (200, '3'))
+            etags.add(response['ETag'])
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(len(etags), 3)
+
+
+@override_settings(RAGFLOW_CHUNKING={'mode': 'page'})
+class RAGFlowArchiveTests(BlobRootMixin, TestCase):
+    def read_archive(self, chunks):
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        return archive, json.loads(archive.read('manifest.json'))
+
+    def test_manifest_lists_documents_and_skipped(self):
+        corrected = self.document(corrected=[_task('Hello')], name='corrected')
+        uncorrected = self.document(raw_ocr=RAW_OCR, name='uncorrected')
+        broken = self.document(corrected=[_task('Broken')], name='broken')
+        build = batches.ragflow.get_or_build_payload
+
+        def fail_for_broken(doc):
+            if doc.pk == broken.pk:
+                raise RuntimeError('tokenizer missing')
+            return build(doc)
+
+        with mock.patch.object(batches.ragflow, 'get_or_build_payload', side_effect=fail_for_broken), \
+                self.assertLogs('api.batches', 'ERROR'):
+            archive, manifest = self.read_archive(
+                batches.iter_ragflow_archive([corrected.pk, uncorrected.pk, 999999, broken.pk]))
+
+        arcname = f'{corrected.pk}_corrected_ragflow_payload.json'
+        self.assertEqual(manifest['documents'], [{'id': corrected.pk, 'file': arcname, 'version': 1}])
+        self.assertEqual(manifest['skipped'], [
+            {'id': uncorrected.pk, 'reason': 'no corrections'},
+            {'id': 999999, 'reason': 'not found'},
+            {'id': broken.pk, 'reason': 'payload generation failed: tokenizer missing'},
+        ])
+        self.assertEqual(sorted(archive.namelist()), sorted([arcname, 'manifest.json']))
+        self.assertEqual(json.loads(archive.read(arcname))['chunks'], [{'content_ltxt': 'Hello'}])
+
+    def test_export_view_streams_the_archive(self):
+        doc = self.document(corrected=[_task('Hello')])
+        response = self.client.get('/api/ragflow-export/', {'ids': f'{doc.pk},0'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        _, manifest = self.read_archive(response.streaming_content)
+        self.assertEqual(([d['id'] for d in manifest['documents']], manifest['skipped']),
+                         ([doc.pk], [{'id': 0, 'reason': 'not found'}]))
+        self.assertEqual(self.client.get('/api/ragflow-export/', {'ids': '1,x'}).status_code, 400)
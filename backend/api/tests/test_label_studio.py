@@ -0,0 +1,101 @@
+"""generate_ls_tasks：批量生成的区域与原逐区域实现一致，任务记录 PDF 页码。"""
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from api import label_studio
+from api.management.commands.benchmark_ls_tasks import _legacy_page_results, _strip_ids
+from api.rasterize import page_filename
+
+FOLDER = 'report_abc123'
+
+
+def _line(bbox, *contents):
+    return {'bbox': bbox, 'spans': [{'content': content} for content in contents]}
+
+
+PDF_INFO = [
+    {'page_idx': 0, 'page_size': [612, 792], 'para_blocks': [
+        {'type': 'title', 'bbox': [72, 72, 540, 100], 'lines': [_line([72, 72, 540, 100], 'Annual ', 'Report')]},
+        {'type': 'text', 'bbox': [72, 120, 540, 160], 'lines': [
+            _line([72, 120, 540, 132], '第一段，', 'mixed text.'),
+            _line([72, 134, 300, 146], '   '),
+            {'bbox': [72, 148, 200, 160]},
+        ]},
+        {'type': 'figure', 'bbox': [100, 200, 500, 400], 'lines': [_line([110, 380, 490, 395], 'Figure 1. Revenue')]},
+        {'type': 'table', 'bbox': [72.5, 420.25, 539.75, 600.125]},
+        {'type': 'interline_equation', 'bbox': [200, 610, 400, 630]},
+    ], 'preproc_blocks': [
+        {'type': 'foot', 'bbox': [72, 760, 540, 772], 'lines': [_line([72, 760, 540, 772], '1')]},
+    ]},
+    # 没有区域的页不生成任务
+    {'page_idx': 1, 'page_size': [612, 792], 'para_blocks': []},
+    # 页面尺寸无效
+    {'page_idx': 2, 'page_size': [0, 792], 'para_blocks': [
+        {'type': 'text', 'bbox': [0, 0, 1, 1], 'lines': [_line([0, 0, 1, 1], 'lost')]},
+    ]},
+    {'page_idx': 3, 'page_size': [595.276, 841.89], 'para_blocks': [
+        {'type': 'list', 'bbox': [50, 50, 300, 90], 'lines': [
+            _line([50, 50, 300, 62], '• one'), _line([50, 64, 300, 76], '• two'),
+        ]},
+        {'type': 'head', 'bbox': [50, 10, 545, 30], 'lines': [_line([50, 10, 545, 30], 'Header')]},
+    ]},
+]
+
+
+class GenerateTasksTests(SimpleTestCase):
+    def setUp(self):
+        output_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, output_dir, ignore_errors=True)
+        patcher = mock.patch.object(label_studio, 'BASE_OUTPUT_DIR', output_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        pages_dir = output_dir / FOLDER / 'pages'
+        (pages_dir / 'review').mkdir(parents=True)
+        for page_num in range(1, len(PDF_INFO) + 1):
+            (pages_dir / page_filename(page_num)).touch()
+        # 第 1 页有审阅图，其余页退回全尺寸图
+        (pages_dir / 'review' / page_filename(1)).touch()
+
+    def generate(self, pdf_info):
+        with self.assertLogs('api.label_studio', 'WARNING') as logs:
+            tasks = label_studio.generate_ls_tasks({'pdf_info': pdf_info}, FOLDER)
+        self.assertEqual(logs.output, ['WARNING:api.label_studio:Page size missing or invalid for page 2. Skipping.'])
+        return tasks
+
+    @override_settings(RASTER_FORMAT='jpeg')
+    def test_results_match_legacy_implementation(self):
+        tasks = self.generate(PDF_INFO)
+        self.assertEqual([task['data']['page_idx'] for task in tasks], [0, 3])
+        for task in tasks:
+            page = PDF_INFO[task['data']['page_idx']]
+            legacy = _legacy_page_results(page, tuple(page['page_size']))
+            self.assertEqual(_strip_ids(task['predictions'][0]['result']), _strip_ids(legacy))
+
+    @override_settings(RASTER_FORMAT='jpeg')
+    def test_image_urls_and_region_ids(self):
+        first, second = self.generate(PDF_INFO)
+        self.assertEqual(first['data']['image'],
+                         f'/data/local-files/?d=data/mineru_output/{FOLDER}/pages/review/page-0001.jpg')
+        self.assertEqual(second['data']['image'],
+                         f'/data/local-files/?d=data/mineru_output/{FOLDER}/pages/page-0004.jpg')
+        # 同一区域的框与转写共用 ID，ID 由页码和页内序号决定，重新生成时不变
+        results = first['predictions'][0]['result']
+        self.assertEqual(results[0]['id'], 'ls_0000000000')
+        self.assertEqual(results[1]['id'], results[0]['id'])
+        self.assertEqual(second['predictions'][0]['result'][0]['id'], 'ls_0003000000')
+        again = self.generate(PDF_INFO)
+        self.assertEqual(again, [first, second])
+
+    @override_settings(RASTER_FORMAT='jpeg')
+    def test_page_idx_falls_back_to_position(self):
+        pages = [{key: value for key, value in page.items() if key != 'page_idx'} for page in PDF_INFO]
+        tasks = self.generate(pages)
+        self.assertEqual([task['data']['page_idx'] for task in tasks], [0, 3])
+
+    def test_missing_pdf_info_is_rejected(self):
+        with self.assertRaises(ValueError):
+            label_studio.generate_ls_tasks({}, FOLDER)
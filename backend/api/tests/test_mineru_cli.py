@@ -0,0 +1,163 @@
+"""run_mineru_cli 的参数、进度解析、失败、超时与取消：以 fake_mineru.py 代替真实的 MinerU。"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from api import mineru
+
+FAKE_MINERU = Path(settings.BASE_DIR) / 'fake_mineru.py'
+FAKE_COMMAND = f"{sys.executable} {FAKE_MINERU}"
+
+
+def _live_group_members(pgid):
+    """进程组中尚未退出的进程（僵尸进程不算）。"""
+    members = []
+    for entry in Path('/proc').iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # /proc/<pid>/stat: pid (comm) state ppid pgrp ...，comm 中可能有空格
+            fields = (entry / 'stat').read_text().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[2]) == pgid and fields[0] != 'Z':
+            members.append(int(entry.name))
+    return members
+
+
+class BuildArgvTests(SimpleTestCase):
+    @override_settings(MINERU_COMMAND='python "/opt/mineru tools/fake_mineru.py" --backend pipeline')
+    def test_command_is_split_like_a_shell(self):
+        self.assertEqual(mineru.build_argv('/data/a b.pdf', '/out'),
+                         ['python', '/opt/mineru tools/fake_mineru.py', '--backend', 'pipeline',
+                          '-p', '/data/a b.pdf', '-o', '/out'])
+
+    @override_settings(MINERU_COMMAND='mineru')
+    def test_page_range(self):
+        self.assertEqual(mineru.build_argv('a.pdf', 'out', 0, 49)[-4:], ['-s', '0', '-e', '49'])
+        self.assertEqual(mineru.build_argv('a.pdf', 'out', start=50)[-2:], ['-s', '50'])
+        self.assertNotIn('-s', mineru.build_argv('a.pdf', 'out'))
+
+
+class ProgressLineTests(SimpleTestCase):
+    def parse(self, line):
+        match = mineru.PROGRESS_RE.match(line)
+        return (match['stage'].strip(), int(match['current']), int(match['total'])) if match else None
+
+    def test_tqdm_lines(self):
+        self.assertEqual(self.parse('Predict: 45%|████▌     | 9/20 [00:03<00:04, 2.50it/s]'), ('Predict', 9, 20))
+        self.assertEqual(self.parse('OCR-rec Predict: 100%|██████████| 3/3 [00:00<00:00]'), ('OCR-rec Predict', 3, 3))
+        self.assertEqual(self.parse('  Layout Predict:   0%|          | 0/12 [00:00<?, ?it/s]'), ('Layout Predict', 0, 12))
+
+    def test_log_lines_are_not_progress(self):
+        self.assertIsNone(self.parse('2024-05-01 10:00:00.123 | INFO | pipeline: 3 pages'))
+        self.assertIsNone(self.parse('fake-mineru: processing a.pdf pages 0-2'))
+        self.assertIsNone(self.parse(''))
+
+    def test_reporter_throttles_within_a_stage(self):
+        calls = []
+        report = mineru.ProgressReporter(lambda *args: calls.append(args))
+        for current in range(1, 11):
+            report('Predict', current, 10)
+        report('OCR', 1, 5)
+        # 阶段开始、阶段完成与阶段切换立即回调，中间的进度被节流
+        self.assertEqual(calls, [('Predict', 1, 10), ('Predict', 10, 10), ('OCR', 1, 5)])
+
+
+@override_settings(MINERU_COMMAND=FAKE_COMMAND, MINERU_TIMEOUT=60)
+class RunMineruCliTests(SimpleTestCase):
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+        self.pdf_path = self.work_dir / 'report.pdf'
+        self.pdf_path.write_bytes(b'%PDF-1.4\n')
+        self.output_dir = self.work_dir / 'out'
+        env = mock.patch.dict(os.environ, {'FAKE_MINERU_PAGES': '4', 'FAKE_MINERU_PAGE_SECONDS': '0'})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def run_cli(self, **kwargs):
+        return mineru.run_mineru_cli(self.pdf_path, self.output_dir, **kwargs)
+
+    def test_writes_middle_json_and_reports_progress(self):
+        progress = []
+        json_path = self.run_cli(start=1, end=2, on_progress=lambda *args: progress.append(args))
+        self.assertEqual(json_path, mineru.middle_json_path(self.output_dir, self.pdf_path))
+        self.assertEqual(len(mineru.codec.load_path(json_path)['pdf_info']), 2)
+        self.assertIn(('Layout Predict', 2, 2), progress)
+        self.assertEqual(progress[-1], ('OCR-rec Predict', 2, 2))
+
+    def test_nonzero_exit_raises_with_output_tail(self):
+        with mock.patch.dict(os.environ, {'FAKE_MINERU_EXIT_CODE': '3'}):
+            with self.assertRaises(RuntimeError) as raised:
+                self.run_cli()
+        message = str(raised.exception)
+        self.assertIn('return code 3', message)
+        self.assertIn('simulated failure', message)
+        self.assertIn('fake-mineru: processing report.pdf', message)
+        # 进度行不进入日志尾部
+        self.assertNotIn('Predict', message)
+
+    def track_popen(self):
+        processes = []
+        popen = subprocess.Popen
+
+        def spawn(*args, **kwargs):
+            processes.append(popen(*args, **kwargs))
+            return processes[-1]
+
+        patcher = mock.patch('api.mineru.subprocess.Popen', side_effect=spawn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return processes
+
+    def assert_group_gone(self, pgid):
+        deadline = time.monotonic() + 5
+        while _live_group_members(pgid) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(_live_group_members(pgid), [])
+
+    @override_settings(MINERU_TIMEOUT=1)
+    def test_timeout_terminates_process(self):
+        processes = self.track_popen()
+        started = time.monotonic()
+        with mock.patch.dict(os.environ, {'FAKE_MINERU_PAGE_SECONDS': '5'}):
+            with self.assertRaises(subprocess.TimeoutExpired):
+                self.run_cli()
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertIsNotNone(processes[0].returncode)
+        self.assert_group_gone(processes[0].pid)
+
+    def test_cancel_kills_whole_process_group(self):
+        processes = self.track_popen()
+
+        class Cancelled(Exception):
+            pass
+
+        def check_cancelled():
+            # 等到 fake_mineru 派生的子进程出现后再取消
+            if len(_live_group_members(processes[0].pid)) >= 2:
+                raise Cancelled()
+
+        with mock.patch.dict(os.environ, {'FAKE_MINERU_PAGE_SECONDS': '5', 'FAKE_MINERU_SPAWN_CHILD': '1'}):
+            with self.assertRaises(Cancelled):
+                self.run_cli(check_cancelled=check_cancelled)
+        self.assert_group_gone(processes[0].pid)
+
+    @mock.patch.object(mineru, 'TERMINATE_GRACE_SECONDS', 0.5)
+    def test_sigkill_when_sigterm_is_ignored(self):
+        processes = self.track_popen()
+        env = {'FAKE_MINERU_PAGE_SECONDS': '5', 'FAKE_MINERU_IGNORE_SIGTERM': '1', 'FAKE_MINERU_SPAWN_CHILD': '1'}
+        with mock.patch.dict(os.environ, env):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_cli(check_cancelled=mock.Mock(side_effect=KeyboardInterrupt))
+        self.assertEqual(processes[0].returncode, -9)
+        self.assert_group_gone(processes[0].pid)
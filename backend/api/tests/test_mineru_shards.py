@@ -0,0 +1,59 @@
+"""分片的页码区间划分与分片结果的合并。"""
+from django.test import SimpleTestCase
+
+from api.mineru import merge_middle_json, plan_shards
+
+
+def _page(page_idx, source='mineru'):
+    return {'page_idx': page_idx, 'source': source}
+
+
+class PlanShardsTests(SimpleTestCase):
+    def test_whole_document(self):
+        self.assertEqual(plan_shards(10, 0), [(0, 9)])
+        self.assertEqual(plan_shards(10, 10), [(0, 9)])
+        self.assertEqual(plan_shards(10, 4), [(0, 3), (4, 7), (8, 9)])
+
+    def test_selected_pages_form_runs(self):
+        pages = [9, 5, 4, 0, 1, 2, 2]
+        self.assertEqual(plan_shards(10, 0, pages=pages), [(0, 2), (4, 5), (9, 9)])
+        self.assertEqual(plan_shards(10, 2, pages=pages), [(0, 1), (2, 2), (4, 5), (9, 9)])
+        self.assertEqual(plan_shards(10, 0, pages=[]), [])
+
+    def test_small_gaps_are_merged(self):
+        pages = [0, 1, 2, 4, 5, 9]
+        self.assertEqual(plan_shards(10, 0, pages=pages, max_gap=1), [(0, 5), (9, 9)])
+        self.assertEqual(plan_shards(10, 4, pages=pages, max_gap=1), [(0, 3), (4, 5), (9, 9)])
+        self.assertEqual(plan_shards(10, 0, pages=pages, max_gap=3), [(0, 9)])
+
+
+class MergeMiddleJsonTests(SimpleTestCase):
+    def test_offsets_pages_by_shard_start(self):
+        merged = merge_middle_json([
+            (4, {'pdf_info': [_page(0), _page(1)], '_backend': 'second'}),
+            (0, {'pdf_info': [_page(0), _page(1)], '_backend': 'first', '_version_name': '2.1'}),
+        ])
+        self.assertEqual([page['page_idx'] for page in merged['pdf_info']], [0, 1, 4, 5])
+        self.assertEqual((merged['_backend'], merged['_version_name']), ('first', '2.1'))
+
+    def test_extra_pages_are_interleaved_and_win(self):
+        merged = merge_middle_json([(2, {'pdf_info': [_page(0), _page(1)]})],
+                                   extra_pages=[_page(3, 'text_layer'), _page(0, 'text_layer'), _page(1, 'text_layer')])
+        self.assertEqual([(page['page_idx'], page['source']) for page in merged['pdf_info']],
+                         [(0, 'text_layer'), (1, 'text_layer'), (2, 'mineru'), (3, 'text_layer')])
+
+    def test_top_level_keys_survive_superseded_shards(self):
+        # 第一个分片的页全部由文本层取代，顶层字段仍取自它；它缺少的字段由后面的分片补上
+        merged = merge_middle_json([
+            (3, {'pdf_info': [_page(0)], '_backend': 'second', '_parse_type': 'ocr'}),
+            (0, {'pdf_info': [_page(0), _page(1)], '_backend': 'first', '_version_name': '2.1'}),
+        ], extra_pages=[_page(0, 'text_layer'), _page(1, 'text_layer')])
+        self.assertEqual({key: value for key, value in merged.items() if key != 'pdf_info'},
+                         {'_backend': 'first', '_version_name': '2.1', '_parse_type': 'ocr'})
+        self.assertEqual(list(merged)[-1], 'pdf_info')
+        self.assertEqual([(page['page_idx'], page['source']) for page in merged['pdf_info']],
+                         [(0, 'text_layer'), (1, 'text_layer'), (3, 'mineru')])
+
+    def test_only_extra_pages(self):
+        self.assertEqual(merge_middle_json([]), {'pdf_info': []})
+        self.assertEqual(merge_middle_json([], extra_pages=[_page(1), _page(0)]), {'pdf_info': [_page(0), _page(1)]})
@@ -0,0 +1,121 @@
+"""内容寻址的 OCR 缓存：命中、引用归零后的清理、回收时不动仍被引用的条目、配置变化不命中。"""
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from api import ocr_cache
+from api.models import OcrCacheEntry, OcrDocument
+
+CONTENT_HASH = 'ab' * 32
+
+
+@override_settings(TEXT_LAYER_ENABLED=True, OCR_CACHE_RETAIN_UNREFERENCED=False)
+class OcrCacheTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def output(self, name='report_abc'):
+        output_dir = self.root / name
+        json_path = output_dir / 'report' / 'auto' / 'report_middle.json'
+        json_path.parent.mkdir(parents=True)
+        json_path.write_text('{"pdf_info": []}')
+        return output_dir, json_path
+
+    def document(self):
+        return OcrDocument.objects.create(original_pdf_path='/data/report.pdf', content_hash=CONTENT_HASH)
+
+    def test_register_then_lookup_hits(self):
+        first = self.document()
+        entry = ocr_cache.register(CONTENT_HASH, *self.output(), document=first)
+        self.assertEqual(entry.size_bytes, len('{"pdf_info": []}'))
+        second = self.document()
+        self.assertEqual(ocr_cache.lookup(CONTENT_HASH, document=second), entry)
+        self.assertEqual(set(entry.documents.all()), {first, second})
+        self.assertIsNone(ocr_cache.lookup('cd' * 32))
+        self.assertIsNone(ocr_cache.lookup(''))
+
+    def test_duplicate_register_keeps_private_output(self):
+        ocr_cache.register(CONTENT_HASH, *self.output('first'))
+        self.assertIsNone(ocr_cache.register(CONTENT_HASH, *self.output('second')))
+        self.assertEqual(OcrCacheEntry.objects.count(), 1)
+
+    def test_config_changes_miss(self):
+        entry = ocr_cache.register(CONTENT_HASH, *self.output())
+        self.assertEqual(ocr_cache.lookup(CONTENT_HASH), entry)
+        with override_settings(TEXT_LAYER_MIN_CHARS=10):
+            self.assertIsNone(ocr_cache.lookup(CONTENT_HASH))
+        with override_settings(TEXT_LAYER_ENABLED=False):
+            self.assertIsNone(ocr_cache.lookup(CONTENT_HASH))
+        with override_settings(RASTER_THUMBNAIL_WIDTH=128):
+            self.assertIsNone(ocr_cache.lookup(CONTENT_HASH))
+        with mock.patch.object(ocr_cache, 'mineru_version', return_value='99.0.0'):
+            self.assertIsNone(ocr_cache.lookup(CONTENT_HASH))
+
+    def test_missing_output_drops_entry(self):
+        output_dir, json_path = self.output()
+        ocr_cache.register(CONTENT_HASH, output_dir, json_path)
+        json_path.unlink()
+        with self.assertLogs('api.ocr_cache', 'WARNING'):
+            self.assertIsNone(ocr_cache.lookup(CONTENT_HASH))
+        self.assertFalse(OcrCacheEntry.objects.exists())
+
+    def test_release_deletes_only_after_last_reference(self):
+        first, second = self.document(), self.document()
+        output_dir, json_path = self.output()
+        entry = ocr_cache.register(CONTENT_HASH, output_dir, json_path, document=first)
+        ocr_cache.lookup(CONTENT_HASH, document=second)
+
+        first.delete()
+        self.assertFalse(ocr_cache.release(entry))
+        self.assertTrue(output_dir.is_dir())
+        second.delete()
+        self.assertTrue(ocr_cache.release(entry))
+        self.assertFalse(output_dir.exists())
+        self.assertFalse(OcrCacheEntry.objects.exists())
+
+    @override_settings(OCR_CACHE_RETAIN_UNREFERENCED=True)
+    def test_retained_entry_removed_when_unreferenced(self):
+        doc = self.document()
+        output_dir, json_path = self.output()
+        entry = ocr_cache.register(CONTENT_HASH, output_dir, json_path, document=doc)
+        self.assertFalse(ocr_cache.remove_if_unreferenced(entry.pk))
+        doc.delete()
+        self.assertFalse(ocr_cache.release(entry))
+        self.assertTrue(output_dir.is_dir())
+        self.assertTrue(ocr_cache.remove_if_unreferenced(entry.pk))
+        self.assertFalse(output_dir.exists())
+        self.assertFalse(ocr_cache.remove_if_unreferenced(entry.pk))
+
+    def test_evict_never_removes_referenced_entries(self):
+        referenced_dir, referenced_json = self.output('referenced')
+        referenced = ocr_cache.register(CONTENT_HASH, referenced_dir, referenced_json, document=self.document())
+        stale_dir, stale_json = self.output('stale')
+        stale = ocr_cache.register('cd' * 32, stale_dir, stale_json)
+        OcrCacheEntry.objects.update(last_used_at=ocr_cache.timezone.now() - timedelta(days=30))
+
+        self.assertEqual(ocr_cache.evict(max_bytes=0, max_age=timedelta(days=1), dry_run=True), [stale])
+        self.assertTrue(stale_dir.is_dir())
+        self.assertEqual(ocr_cache.evict(max_bytes=0, max_age=timedelta(days=1)), [stale])
+        self.assertFalse(stale_dir.exists())
+        self.assertEqual(list(OcrCacheEntry.objects.all()), [referenced])
+        self.assertTrue(referenced_dir.is_dir())
+
+    def test_evict_skips_entry_referenced_after_listing(self):
+        output_dir, json_path = self.output()
+        entry = ocr_cache.register(CONTENT_HASH, output_dir, json_path)
+        remove = ocr_cache.remove_if_unreferenced
+
+        def attach_then_remove(entry_id):
+            # 模拟候选列出之后、回收之前命中缓存的上传
+            ocr_cache.lookup(CONTENT_HASH, document=self.document())
+            return remove(entry_id)
+
+        with mock.patch.object(ocr_cache, 'remove_if_unreferenced', side_effect=attach_then_remove):
+            self.assertEqual(ocr_cache.evict(max_bytes=0), [])
+        self.assertTrue(OcrCacheEntry.objects.filter(pk=entry.pk).exists())
+        self.assertTrue(output_dir.is_dir())
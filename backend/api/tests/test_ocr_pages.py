@@ -0,0 +1,81 @@
+"""pdf_info 拆成 OcrPage/OcrBlock 行：重复写入替换旧行，按页读取与原始 pdf_info 的区域一致。"""
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from api import ocr_pages
+from api.label_studio import collect_page_regions
+from api.models import OcrBlock, OcrDocument, OcrPage
+
+
+def _line(bbox, text):
+    return {'bbox': bbox, 'spans': [{'type': 'text', 'content': text}]}
+
+
+PDF_INFO = [
+    {'page_idx': 0, 'page_size': [595.0, 842.0], 'para_blocks': [
+        {'type': 'title', 'bbox': [72, 60, 400, 90], 'lines': [_line([72, 60, 400, 90], 'Annual Report')]},
+        {'type': 'text', 'bbox': [72, 100, 520, 140], 'lines': [
+            _line([72, 100, 520, 114], 'First line'), _line([72, 116, 520, 130.5], '第二行')]},
+        {'type': 'figure', 'bbox': [72, 200, 300, 400], 'lines': [_line([80, 380, 290, 395], 'Figure 1')]},
+        {'type': 'table', 'bbox': [72, 420, 520, 600]},
+    ]},
+    # 没有区域、没有 page_size 的页也保留一行
+    {'page_idx': 1, 'para_blocks': []},
+    {'page_idx': 2, 'page_size': [612, 792], 'para_blocks': [], 'preproc_blocks': [
+        {'type': 'text', 'lines': [_line([10, 10, 100, 20], 'Preprocessed')]}]},
+]
+
+
+@override_settings(OCR_ROWS_BATCH_SIZE=2)
+class StoreTests(TestCase):
+    def setUp(self):
+        self.doc = OcrDocument.objects.create(original_pdf_path='/data/report.pdf')
+
+    def counts(self):
+        return (OcrPage.objects.filter(document=self.doc).count(), OcrBlock.objects.filter(document=self.doc).count())
+
+    def test_store_twice_replaces_rows(self):
+        self.assertEqual(ocr_pages.store(self.doc, {'pdf_info': PDF_INFO}), {'pages': 3, 'blocks': 7})
+        self.assertEqual(self.counts(), (3, 7))
+        self.assertEqual(ocr_pages.store(self.doc, {'pdf_info': PDF_INFO}), {'pages': 3, 'blocks': 7})
+        self.assertEqual(self.counts(), (3, 7))
+
+        self.assertEqual(ocr_pages.store(self.doc, {'pdf_info': PDF_INFO[1:]}), {'pages': 2, 'blocks': 1})
+        self.assertEqual(self.counts(), (2, 1))
+        self.assertEqual(ocr_pages.store(self.doc, None), {'pages': 0, 'blocks': 0})
+        self.assertFalse(ocr_pages.has_pages(self.doc.pk))
+
+    def test_iter_pages_round_trips_pdf_info(self):
+        other = OcrDocument.objects.create(original_pdf_path='/data/other.pdf')
+        ocr_pages.store(other, {'pdf_info': PDF_INFO[:1]})
+        ocr_pages.store(self.doc, {'pdf_info': PDF_INFO})
+        ocr_pages.store(self.doc, {'pdf_info': PDF_INFO})
+
+        stored = list(ocr_pages.iter_pages(self.doc.pk))
+        self.assertEqual([page.page_idx for page, _ in stored], [0, 1, 2])
+        self.assertEqual([ocr_pages.page_size(page) for page, _ in stored], [(595, 842), None, (612, 792)])
+        for (page, (bboxes, labels, texts)), page_data in zip(stored, PDF_INFO):
+            expected_bboxes, expected_labels, expected_texts = collect_page_regions(page_data)
+            self.assertEqual([list(bbox) for bbox in bboxes], expected_bboxes)
+            self.assertEqual((labels, texts), (expected_labels, expected_texts))
+            self.assertEqual(page.block_count, len(expected_bboxes))
+        self.assertEqual(ocr_pages.page_text(stored[0][1]), 'Annual Report\nFirst line\n第二行\nFigure 1')
+
+        # 只读取指定的页
+        self.assertEqual([page.page_idx for page, _ in ocr_pages.iter_pages(self.doc.pk, page_idxs=[2])], [2])
+
+    def test_split_from_archived_blob(self):
+        blob_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, blob_root, ignore_errors=True)
+        with override_settings(BLOB_STORAGE_ROOT=blob_root):
+            self.assertFalse(ocr_pages.ensure(self.doc))
+            self.doc.raw_ocr_json = {'_backend': 'pipeline', 'pdf_info': PDF_INFO}
+            self.doc.save(update_fields=OcrDocument.RAW_OCR_FIELDS)
+            with self.assertLogs('api.ocr_pages', 'INFO'):
+                self.assertTrue(ocr_pages.ensure(self.doc))
+            self.assertEqual(self.counts(), (3, 7))
+            self.assertTrue(ocr_pages.ensure(self.doc))
+            self.assertEqual(ocr_pages.store_archived(self.doc), {'pages': 3, 'blocks': 7})
+            self.assertEqual(self.counts(), (3, 7))
@@ -0,0 +1,54 @@
+"""按页数选择队列与优先级，各队列的排队指标。"""
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from api import queues
+from api.models import OcrDocument
+
+
+@override_settings(OCR_QUEUE_SMALL='small', OCR_QUEUE_LARGE='large', OCR_SMALL_MAX_PAGES=30,
+                   OCR_LARGE_PRIORITY_STEP_PAGES=50)
+class RouteTests(SimpleTestCase):
+    def test_small_documents(self):
+        self.assertEqual(queues.route(1), ('small', 0))
+        self.assertEqual(queues.route(3), ('small', 1))
+        self.assertEqual(queues.route(29), ('small', 9))
+        self.assertEqual(queues.route(30), ('small', 9))
+
+    def test_large_documents(self):
+        self.assertEqual(queues.route(31), ('large', 0))
+        self.assertEqual(queues.route(80), ('large', 1))
+        self.assertEqual(queues.route(5000), ('large', queues.MAX_PRIORITY))
+
+    def test_unknown_page_count_goes_to_large_queue_last(self):
+        self.assertEqual(queues.route(None), ('large', queues.MAX_PRIORITY))
+
+    @override_settings(OCR_SMALL_MAX_PAGES=5, OCR_LARGE_PRIORITY_STEP_PAGES=0)
+    def test_steps_never_drop_below_one_page(self):
+        self.assertEqual(queues.route(5), ('small', 5))
+        self.assertEqual(queues.route(0), ('small', 0))
+        self.assertEqual(queues.route(8), ('large', 3))
+
+
+@override_settings(OCR_QUEUE_SMALL='small', OCR_QUEUE_LARGE='large')
+class MetricsTests(TestCase):
+    def test_oldest_wait_counts_every_pending_document(self):
+        now = timezone.now()
+        # 重新入队的文档保留了上一次的 started_at
+        OcrDocument.objects.create(original_pdf_path='/data/a.pdf', queue='small', status='pending',
+                                   queued_at=now - timedelta(seconds=600), started_at=now - timedelta(seconds=900))
+        OcrDocument.objects.create(original_pdf_path='/data/b.pdf', queue='small', status='pending',
+                                   queued_at=now - timedelta(seconds=60))
+        OcrDocument.objects.create(original_pdf_path='/data/c.pdf', queue='small', status='pending')
+        OcrDocument.objects.create(original_pdf_path='/data/d.pdf', queue='small', status='processing',
+                                   queued_at=now - timedelta(seconds=3000), started_at=now - timedelta(seconds=2900))
+        with mock.patch.object(queues, 'queue_depth', return_value=2):
+            result = queues.metrics()
+        self.assertEqual(result['small']['waiting'], 3)
+        self.assertAlmostEqual(result['small']['oldest_wait_seconds'], 600, delta=5)
+        self.assertAlmostEqual(result['small']['max_wait_seconds'], 100)
+        self.assertEqual(result['large'], {'depth': 2, 'waiting': 0, 'oldest_wait_seconds': 0,
+                                           'avg_wait_seconds': None, 'max_wait_seconds': None})
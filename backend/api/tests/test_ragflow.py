@@ -0,0 +1,67 @@
+"""RAGFlow payload 的增量生成：来源不变时复用，等锁期间已被其它请求生成时不重复构建。"""
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from api import corrections, ragflow
+from api.models import OcrDocument
+
+
+def _task(text):
+    return {'data': {}, 'annotations': [{'result': [
+        {'id': 'r1', 'type': 'rectanglelabels', 'value': {'rectanglelabels': ['Text']}},
+        {'id': 'r1', 'type': 'textarea', 'value': {'text': [text]}},
+    ]}]}
+
+
+class PayloadTests(TestCase):
+    def setUp(self):
+        blob_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, blob_root, ignore_errors=True)
+        settings_override = override_settings(BLOB_STORAGE_ROOT=blob_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.doc = OcrDocument.objects.create(original_pdf_path='/data/report.pdf', status='corrected')
+        self.doc.corrected_label_studio_json = [_task('Page 1'), _task('Page 2')]
+        self.doc.save(update_fields=OcrDocument.CORRECTED_LS_FIELDS)
+
+    def test_default_mode_is_one_chunk_per_page(self):
+        doc = ragflow.get_or_build_payload(self.doc)
+        self.assertEqual(doc.ragflow_payload['chunks'], [{'content_ltxt': 'Page 1'}, {'content_ltxt': 'Page 2'}])
+
+    def test_rebuilds_only_when_source_changes(self):
+        doc = ragflow.get_or_build_payload(self.doc)
+        self.assertEqual(doc.ragflow_version, 1)
+        with mock.patch.object(ragflow, 'build_chunks') as build:
+            self.assertEqual(ragflow.get_or_build_payload(doc).ragflow_version, 1)
+        build.assert_not_called()
+
+        corrections.apply_page(doc, 1, _task('Page 2 fixed')['annotations'][0]['result'])
+        doc = ragflow.get_or_build_payload(OcrDocument.objects.get(pk=doc.pk))
+        self.assertEqual((doc.ragflow_version, [chunk['content_ltxt'] for chunk in doc.ragflow_payload['chunks']]),
+                         (2, ['Page 1', 'Page 2 fixed']))
+
+    def test_payload_built_while_waiting_for_lock_is_reused(self):
+        # 两个请求读到同一个尚未生成产物的文档行，先拿到锁的请求完成构建
+        waiting = OcrDocument.objects.get(pk=self.doc.pk)
+        first = ragflow.get_or_build_payload(self.doc)
+        first_blob = first.ragflow_blob
+        with mock.patch.object(ragflow, 'build_chunks') as build:
+            doc = ragflow.get_or_build_payload(waiting)
+        build.assert_not_called()
+        self.assertEqual((doc.ragflow_version, doc.ragflow_blob), (1, first_blob))
+        self.assertEqual(doc.ragflow_payload, first.ragflow_payload)
+
+    def test_stale_pointer_is_replaced_after_commit(self):
+        stale = OcrDocument.objects.get(pk=self.doc.pk)
+        first = ragflow.get_or_build_payload(self.doc)
+        corrections.apply_page(self.doc, 0, _task('Page 1 fixed')['annotations'][0]['result'])
+        # stale 仍以为没有产物：替换的应是锁内读到的当前文件
+        with self.captureOnCommitCallbacks(execute=True):
+            doc = ragflow.get_or_build_payload(stale)
+        self.assertEqual(doc.ragflow_version, 2)
+        self.assertFalse(ragflow.blob_storage.absolute_path(first.ragflow_blob).exists())
+        self.assertEqual(OcrDocument.objects.get(pk=doc.pk).ragflow_payload['chunks'][0],
+                         {'content_ltxt': 'Page 1 fixed'})
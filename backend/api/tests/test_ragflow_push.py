@@ -0,0 +1,163 @@
+"""ragflow_push 对 RAGFlow 兼容接口的推送：用 ragflow_stub 的桩服务脚本化各种响应。"""
+import json
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from api import ragflow_push
+from api.management.commands.ragflow_stub import make_server
+from api.models import OcrDocument
+
+PUSH_SETTINGS = {
+    'RAGFLOW_PUSH_MAX_RETRIES': 3,
+    'RAGFLOW_PUSH_BACKOFF_SECONDS': 0,
+    'RAGFLOW_PUSH_CONCURRENCY': 1,
+    'RAGFLOW_PUSH_BATCH_SIZE': 1,
+    'RAGFLOW_PUSH_TIMEOUT': 5,
+    'RAGFLOW_API_KEY': '',
+}
+
+
+class StubServerMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = make_server()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/api/v1/documents/{{doc_id}}/chunks"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.state = self.server.state
+        self.state.script.clear()
+        self.state.received.clear()
+        self.state.keys.clear()
+        sleep = mock.patch('api.ragflow_push.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+
+@override_settings(**PUSH_SETTINGS)
+class SendTests(StubServerMixin, SimpleTestCase):
+    def send(self, items=None):
+        items = items or [('key-1', {'content_ltxt': 'hello'})]
+        with ragflow_push.build_session(1) as session:
+            return ragflow_push.send(session, self.url.format(doc_id=1), items)
+
+    def test_retries_429_and_5xx_honoring_retry_after(self):
+        self.state.script.extend([(429, {'code': 429}, {'Retry-After': '7'}), (503, {'code': 503})])
+        retries, sent_bytes = self.send()
+        self.assertEqual(retries, 2)
+        self.assertGreater(sent_bytes, 0)
+        self.assertEqual(len(self.state.received), 3)
+        self.assertEqual(self.sleep.call_args_list[0], mock.call(7))
+        # 同一请求重试时幂等键不变
+        self.assertEqual({key for key, _ in self.state.received}, {'key-1'})
+
+    def test_retry_after_is_capped(self):
+        self.state.script.append((503, {'code': 503}, {'Retry-After': '3600'}))
+        self.send()
+        self.sleep.assert_called_once_with(ragflow_push.MAX_BACKOFF_SECONDS)
+
+    def test_gives_up_after_max_retries(self):
+        self.state.script.extend([(502, {'code': 502})] * 4)
+        with self.assertRaisesRegex(ragflow_push.PushError, 'giving up after 3 retries'):
+            self.send()
+        self.assertEqual(len(self.state.received), 4)
+
+    def test_other_4xx_is_permanent(self):
+        self.state.script.append((400, {'code': 400, 'message': 'bad chunk'}))
+        with self.assertRaisesRegex(ragflow_push.PushError, 'HTTP 400'):
+            self.send()
+        self.assertEqual(len(self.state.received), 1)
+        self.sleep.assert_not_called()
+
+    def test_nonzero_code_in_200_is_rejection(self):
+        self.state.script.append((200, {'code': 102, 'message': 'dataset not found'}))
+        with self.assertRaisesRegex(ragflow_push.PushError, 'rejected'):
+            self.send()
+        self.assertEqual(len(self.state.received), 1)
+
+    def test_batch_carries_per_chunk_keys(self):
+        self.send([('a', {'content_ltxt': 'one'}), ('b', {'content_ltxt': 'two'})])
+        body = json.loads(self.state.received[0][1])
+        self.assertEqual([chunk['idempotency_key'] for chunk in body['chunks']], ['a', 'b'])
+        self.assertEqual(self.state.chunks, 2)
+
+
+class ChunkKeyTests(SimpleTestCase):
+    def test_keys_are_stable_when_chunk_inserted_in_front(self):
+        chunks = [{'content_ltxt': text} for text in ('alpha', 'beta', 'gamma')]
+        keys = ragflow_push.chunk_keys(1, chunks)
+        self.assertEqual(ragflow_push.chunk_keys(1, [{'content_ltxt': 'new'}] + chunks)[1:], keys)
+
+    def test_duplicate_content_gets_distinct_keys(self):
+        keys = ragflow_push.chunk_keys(1, [{'content_ltxt': 'same'}, {'content_ltxt': 'same'}])
+        self.assertEqual(len(set(keys)), 2)
+
+    def test_keys_depend_on_document(self):
+        chunks = [{'content_ltxt': 'alpha'}]
+        self.assertNotEqual(ragflow_push.chunk_keys(1, chunks), ragflow_push.chunk_keys(2, chunks))
+
+
+def _task(text):
+    return {'data': {}, 'annotations': [{'result': [
+        {'id': 'r1', 'type': 'rectanglelabels', 'value': {'rectanglelabels': ['Text']}},
+        {'id': 'r1', 'type': 'textarea', 'value': {'text': [text]}},
+    ]}]}
+
+
+@override_settings(**PUSH_SETTINGS, RAGFLOW_CHUNKING={'mode': 'page'})
+class PushDocumentTests(StubServerMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        blob_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, blob_root, ignore_errors=True)
+        settings_override = override_settings(BLOB_STORAGE_ROOT=blob_root, RAGFLOW_PUSH_URL=self.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.doc = OcrDocument.objects.create(original_pdf_path='/data/report.pdf', status='corrected')
+        self.doc.corrected_label_studio_json = [_task(f"Page {n} text") for n in range(1, 4)]
+        self.doc.save(update_fields=OcrDocument.CORRECTED_LS_FIELDS)
+
+    def sent_contents(self):
+        return [json.loads(body)['content'] for _, body in self.state.received]
+
+    def test_pushes_every_chunk(self):
+        _, stats = ragflow_push.push_document(self.doc)
+        self.assertEqual((stats['chunks'], stats['sent'], stats['failed'], stats['skipped']), (3, 3, 0, 0))
+        self.assertEqual(self.sent_contents(), ['Page 1 text', 'Page 2 text', 'Page 3 text'])
+
+    def test_resumes_with_only_unpushed_chunks(self):
+        self.state.script.extend([(200, {'code': 0}), (400, {'code': 400})])
+        with self.assertRaisesRegex(ragflow_push.PushError, '1 of 3 chunks failed'):
+            ragflow_push.push_document(self.doc)
+        state = ragflow_push.load_state(self.doc.pk)
+        self.assertEqual(len(state['pushed_keys']), 2)
+        self.assertEqual(state['last_run']['failed'], 1)
+
+        self.state.received.clear()
+        _, stats = ragflow_push.push_document(OcrDocument.objects.get(pk=self.doc.pk))
+        self.assertEqual(self.sent_contents(), ['Page 2 text'])
+        self.assertEqual((stats['sent'], stats['skipped']), (1, 2))
+
+        self.state.received.clear()
+        _, stats = ragflow_push.push_document(OcrDocument.objects.get(pk=self.doc.pk))
+        self.assertEqual(self.state.received, [])
+        self.assertEqual(stats['skipped'], 3)
+
+    def test_changed_url_resets_push_state(self):
+        ragflow_push.push_document(self.doc)
+        self.state.received.clear()
+        with override_settings(RAGFLOW_PUSH_URL=self.url.replace('/documents/', '/datasets/other/documents/')):
+            _, stats = ragflow_push.push_document(OcrDocument.objects.get(pk=self.doc.pk))
+        self.assertEqual((stats['sent'], stats['skipped']), (3, 0))
@@ -0,0 +1,121 @@
+"""页面图片的编码、各尺寸版本的路径，以及按版本读取页面图片的接口。"""
+import io
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api import rasterize
+from api.models import OcrDocument
+
+WIDTHS = {'review': 400, 'thumb': 100}
+
+
+def _make_pages_dir(root):
+    pages_dir = Path(root) / 'pages'
+    for directory in rasterize.RENDITION_DIRS.values():
+        (pages_dir / directory).mkdir(parents=True)
+    return pages_dir
+
+
+class EncodePageTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.pages_dir = _make_pages_dir(root)
+
+    def test_writes_every_rendition(self):
+        for fmt, ext in (('jpeg', 'jpg'), ('webp', 'webp')):
+            with self.subTest(fmt=fmt):
+                image = Image.new('RGB', (1000, 500), 'white')
+                written = rasterize.encode_page(image, 3, self.pages_dir, fmt, 90, 70, WIDTHS)
+                self.assertEqual(set(written), {'full', 'review', 'thumb'})
+                expected = {'full': (1000, 500), 'review': (400, 200), 'thumb': (100, 50)}
+                for rendition, size in expected.items():
+                    path = self.pages_dir / rasterize.RENDITION_DIRS.get(rendition, '') / f'page-0003.{ext}'
+                    self.assertEqual(path.stat().st_size, written[rendition])
+                    with Image.open(path) as saved:
+                        self.assertEqual((saved.format, saved.size), (rasterize.FORMATS[fmt][0], size))
+                # encode_page 负责关闭传入的图片
+                with self.assertRaises(ValueError):
+                    image.load()
+
+    def test_small_pages_are_not_upscaled(self):
+        image = Image.new('RGB', (80, 120), 'white')
+        rasterize.encode_page(image, 1, self.pages_dir, 'jpeg', 90, 70, WIDTHS)
+        for rendition in ('review', 'thumb'):
+            with Image.open(rasterize.page_image_path(self.pages_dir, 1, rendition)) as saved:
+                self.assertEqual(saved.size, (80, 120))
+
+
+class PageImagePathTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.pages_dir = _make_pages_dir(root)
+        (self.pages_dir / 'page-0001.jpg').touch()
+        (self.pages_dir / 'thumbs' / 'page-0001.jpg').touch()
+        (self.pages_dir / 'review' / 'page-0002.webp').touch()
+
+    def test_rendition_directories(self):
+        self.assertEqual(rasterize.page_image_path(self.pages_dir, 1), self.pages_dir / 'page-0001.jpg')
+        self.assertEqual(rasterize.page_image_path(self.pages_dir, 1, 'thumb'), self.pages_dir / 'thumbs' / 'page-0001.jpg')
+        self.assertIsNone(rasterize.page_image_path(self.pages_dir, 1, 'review'))
+        self.assertIsNone(rasterize.page_image_path(self.pages_dir, 3))
+
+    def test_format_with_jpeg_fallback(self):
+        with override_settings(RASTER_FORMAT='webp'):
+            self.assertEqual(rasterize.page_image_path(self.pages_dir, 2, 'review'),
+                             self.pages_dir / 'review' / 'page-0002.webp')
+            self.assertEqual(rasterize.page_image_path(self.pages_dir, 1), self.pages_dir / 'page-0001.jpg')
+        with override_settings(RASTER_FORMAT='jpeg'):
+            self.assertIsNone(rasterize.page_image_path(self.pages_dir, 2, 'review'))
+
+
+@override_settings(RASTER_FORMAT='jpeg')
+class PageImageViewTests(TestCase):
+    def setUp(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        pages_dir = _make_pages_dir(root / 'report_abc')
+        image = Image.new('RGB', (600, 300), 'white')
+        rasterize.encode_page(image, 1, pages_dir, 'jpeg', 90, 70, {'thumb': 60})
+        json_path = root / 'report_abc' / 'report' / 'auto' / 'report_middle.json'
+        self.doc = OcrDocument.objects.create(original_pdf_path='/data/report.pdf', mineru_json_path=str(json_path))
+        self.client = APIClient()
+
+    def get(self, page, headers=None, **params):
+        response = self.client.get(f'/api/documents/{self.doc.pk}/pages/{page}/image/', params, headers=headers)
+        if response.streaming:
+            # 读完流式内容时测试客户端才会关闭文件（关闭时不断开数据库连接）
+            response.body = b''.join(response.streaming_content)
+        return response
+
+    def image_size(self, response):
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        with Image.open(io.BytesIO(response.body)) as image:
+            return image.size
+
+    def test_renditions(self):
+        self.assertEqual(self.image_size(self.get(1, rendition='thumb')), (60, 30))
+        self.assertEqual(self.image_size(self.get(1, rendition='full')), (600, 300))
+        # 没有生成审阅图时退回全尺寸
+        self.assertEqual(self.image_size(self.get(1)), (600, 300))
+
+    def test_missing_page_or_document(self):
+        self.assertEqual(self.get(2).status_code, 404)
+        self.assertEqual(self.get(2, rendition='thumb').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/documents/{self.doc.pk + 1}/pages/1/image/').status_code, 404)
+        unprocessed = OcrDocument.objects.create(original_pdf_path='/data/new.pdf')
+        self.assertEqual(self.client.get(f'/api/documents/{unprocessed.pk}/pages/1/image/').status_code, 404)
+
+    def test_unknown_rendition(self):
+        self.assertEqual(self.get(1, rendition='tile').status_code, 400)
+
+    def test_etag(self):
+        etag = self.get(1, rendition='thumb')['ETag']
+        self.assertNotEqual(etag, self.get(1, rendition='full')['ETag'])
+        self.assertEqual(self.get(1, headers={'If-None-Match': etag}, rendition='thumb').status_code, 304)
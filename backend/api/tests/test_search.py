@@ -0,0 +1,124 @@
+"""全文检索：索引与查询往返、重建索引、词表增长、模糊扩展、候选数上限与摘要标记。需要 PostgreSQL。"""
+import shutil
+import tempfile
+import unittest
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import search
+from api.models import OcrDocument, PageText, SearchTerm
+
+
+def _task(page_idx, *texts):
+    return {'data': {'page_idx': page_idx},
+            'annotations': [{'result': [{'type': 'textarea', 'value': {'text': [text]}} for text in texts]}]}
+
+
+class SearchViewValidationTests(TestCase):
+    def test_invalid_parameters(self):
+        client = APIClient()
+        for params in ({}, {'q': ' '}, {'q': 'x', 'mode': 'regex'}, {'q': 'x', 'limit': 'ten'},
+                       {'q': 'x', 'limit': 0}, {'q': 'x', 'offset': -1}, {'q': 'x', 'document': '1,a'}):
+            with self.subTest(params=params):
+                self.assertEqual(client.get('/api/search/', params).status_code, 400)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "search uses PostgreSQL full text search and pg_trgm")
+@override_settings(SEARCH_TEXT_CONFIG='simple', SEARCH_TRIGRAM_THRESHOLD=0.4, SEARCH_FUZZY_EXPANSIONS=5,
+                   SEARCH_RANK_CANDIDATES=5000)
+class SearchTests(TestCase):
+    def setUp(self):
+        blob_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, blob_root, ignore_errors=True)
+        settings_override = override_settings(BLOB_STORAGE_ROOT=blob_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def document(self, tasks, status='corrected'):
+        doc = OcrDocument.objects.create(original_pdf_path='/data/manual.pdf', status=status)
+        doc.corrected_label_studio_json = tasks
+        doc.save(update_fields=OcrDocument.CORRECTED_LS_FIELDS)
+        return doc
+
+    def test_index_then_query(self):
+        doc = self.document([_task(0, 'Installation guide'), _task(2, 'The tokenizer splits R&D text', '光学字符识别')])
+        self.assertEqual(search.index_document(doc), {'pages': 2, 'written': 2})
+        # 内容不变时不重写
+        self.assertEqual(search.index_document(doc), {'pages': 2, 'written': 0})
+
+        found = search.search('tokenizer')
+        self.assertEqual(found['mode'], 'fts')
+        self.assertEqual([(hit['document_id'], hit['page'], hit['source']) for hit in found['results']],
+                         [(doc.pk, 3, 'corrected')])
+        snippet = found['results'][0]['snippet']
+        self.assertIn('<mark>tokenizer</mark>', snippet)
+        self.assertIn('R&amp;D', snippet)
+
+        self.assertEqual(search.search('"installation guide"')['results'][0]['page'], 1)
+        self.assertEqual(search.search('tokenizer -text', mode='fts')['results'], [])
+        self.assertEqual(search.search('tokenizer', document_ids=[doc.pk + 1])['results'], [])
+        self.assertEqual(search.search('tokenizer', statuses=['processed'])['results'], [])
+
+        response = APIClient().get('/api/search/', {'q': 'tokenizer'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['results'][0]['page'], response.data['results'][0]['filename']),
+                         (3, 'manual.pdf'))
+
+    def test_reindex_replaces_stale_pages(self):
+        doc = self.document([_task(0, 'alpha draft'), _task(1, 'beta draft'), _task(2, 'gamma')])
+        search.index_document(doc)
+        doc.corrected_label_studio_json = [_task(0, 'alpha final'), _task(1, 'beta draft')]
+        doc.save(update_fields=OcrDocument.CORRECTED_LS_FIELDS)
+
+        self.assertEqual(search.index_document(doc), {'pages': 2, 'written': 1})
+        self.assertEqual(sorted(PageText.objects.filter(document=doc).values_list('page_index', 'text')),
+                         [(0, 'alpha final'), (1, 'beta draft')])
+        self.assertEqual([hit['page'] for hit in search.search('draft')['results']], [2])
+        self.assertEqual([hit['page'] for hit in search.search('final')['results']], [1])
+        self.assertEqual(search.search('gamma', mode='fts')['results'], [])
+
+        # 按页校对只重写这一页
+        self.assertEqual(search.index_page(doc, 1, _task(1, 'beta reviewed')['annotations'][0]['result']), 1)
+        self.assertEqual(search.search('draft', mode='fts')['results'], [])
+        self.assertEqual(search.search('reviewed')['results'][0]['page'], 2)
+
+    def test_vocabulary_only_grows(self):
+        doc = self.document([_task(0, 'Kubernetes deployment')])
+        search.index_document(doc)
+        self.assertTrue({'kubernetes', 'deployment'} <= set(SearchTerm.objects.values_list('word', flat=True)))
+        doc.corrected_label_studio_json = [_task(0, 'Helm chart')]
+        doc.save(update_fields=OcrDocument.CORRECTED_LS_FIELDS)
+        search.index_document(doc)
+        self.assertTrue({'kubernetes', 'deployment', 'helm', 'chart'}
+                        <= set(SearchTerm.objects.values_list('word', flat=True)))
+        SearchTerm.objects.all().delete()
+        self.assertEqual(search.rebuild_vectors(), 1)
+        self.assertEqual(set(SearchTerm.objects.values_list('word', flat=True)), {'helm', 'chart'})
+
+    def test_fuzzy_expansion(self):
+        doc = self.document([_task(0, 'The tokenizer splits text'), _task(1, '光学字符识别系统')])
+        search.index_document(doc)
+
+        found = search.search('tokenzier')
+        self.assertEqual(found['mode'], 'fuzzy')
+        self.assertEqual(found['expanded'], {'tokenzier': ['tokenizer']})
+        self.assertEqual([hit['page'] for hit in found['results']], [1])
+        self.assertIn('<mark>tokenizer</mark>', found['results'][0]['snippet'])
+        # 未分词的中文连续文本按子串匹配
+        self.assertEqual([hit['page'] for hit in search.search('字符识别')['results']], [2])
+        # 只用全文匹配时不退回
+        found = search.search('tokenzier', mode='fts')
+        self.assertEqual((found['mode'], found['results']), ('fts', []))
+        self.assertNotIn('expanded', found)
+        self.assertEqual(search.search('zzzzqqq')['expanded'], {})
+
+    @override_settings(SEARCH_RANK_CANDIDATES=2)
+    def test_rank_candidates_are_capped(self):
+        doc = self.document([_task(n, f'common word page{n}') for n in range(5)])
+        search.index_document(doc)
+        self.assertEqual(len(search.search('common', limit=10)['results']), 2)
+        with override_settings(SEARCH_RANK_CANDIDATES=0):
+            self.assertEqual(len(search.search('common', limit=10)['results']), 5)
+            self.assertEqual([hit['page'] for hit in search.search('common', limit=2, offset=2)['results']], [3, 4])
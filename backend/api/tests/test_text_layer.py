@@ -0,0 +1,176 @@
+"""文本层快速路径：解析 poppler 工具的输出样例，按页分类（no_text / images / garbled / ocr_font）。"""
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from api import text_layer
+
+A4 = (595.276, 841.89)
+BODY = 'The quick brown fox jumps over the lazy dog and keeps running through the field.'
+
+
+def _line(y, *words, height=12):
+    spans = ''.join(f'<word xMin="{72 + 40 * n}" yMin="{y}" xMax="{108 + 40 * n}" yMax="{y + height}">{word}</word>'
+                    for n, word in enumerate(words))
+    return f'<line xMin="72" yMin="{y}" xMax="520" yMax="{y + height}">{spans}</line>'
+
+
+def _page(*blocks):
+    body = ''.join(f'<flow><block xMin="72" yMin="0" xMax="520" yMax="0">{"".join(lines)}</block></flow>'
+                   for lines in blocks)
+    return f'<page width="{A4[0]}" height="{A4[1]}">{body}</page>'
+
+
+PAGES = [
+    _page([_line(70, 'Annual', 'Report', height=24)], [_line(120, *BODY.split()[:8]), _line(134, *BODY.split()[8:])]),
+    _page(),
+    _page([_line(100, *BODY.split())]),
+    _page([_line(100, 'Chapter', *(['\ufffd\ue000'] * 12))]),
+    _page([_line(100, '光学', '字符', '识别', 'OCR', '系统'), _line(114, 'form\x0cfeed', *BODY.split())]),
+]
+
+# pdftotext -bbox-layout -enc UTF-8 的输出（节选）
+BBOX_LAYOUT = f'''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head>
+<title></title>
+<meta name="Producer" content="Microsoft Word"/>
+</head>
+<body>
+<doc>
+{''.join(PAGES)}
+</doc>
+</body>
+</html>
+'''.encode('utf-8')
+
+# pdfimages -list：第 3 页是 300 ppi 的整页扫描，第 5 页是一张小插图，smask 不计面积
+IMAGE_LIST = b'''page   num  type   width height color comp bpc  enc interp  object ID x-ppi y-ppi size ratio
+--------------------------------------------------------------------------------------------
+   3     0 image    2480  3508  rgb     3   8  jpeg   no        12  0   300   300  412K 1.6%
+   3     1 smask    2480  3508  gray    1   8  image  no        12  0   300   300 2.1K 0.0%
+   5     2 image     300   200  rgb     3   8  jpeg   no        20  0   150   150 9.2K 5.1%
+'''
+
+FONTS = b'''name                                 type              encoding         emb sub uni object ID
+------------------------------------ ----------------- ---------------- --- --- --- ---------
+ABCDEF+LiberationSerif               TrueType          WinAnsi          yes yes yes     10  0
+GHIJKL+NotoSansCJKsc-Regular         CID Type 0C       Identity-H       yes yes yes     14  0
+'''
+
+OCR_FONTS = FONTS + b'GlyphLessFont                        CID TrueType      Identity-H       yes no  yes      8  0\n'
+
+
+def _tools(fonts=FONTS, images=IMAGE_LIST, layout=BBOX_LAYOUT):
+    outputs = {'pdffonts': fonts, 'pdfimages': images, 'pdftotext': layout}
+    return mock.patch.object(text_layer, '_run', side_effect=lambda tool, args, poppler_path=None: outputs[tool])
+
+
+class ParseTests(SimpleTestCase):
+    def test_bbox_layout(self):
+        pages = list(text_layer.parse_bbox_layout(BBOX_LAYOUT))
+        self.assertEqual(len(pages), 5)
+        width, height, blocks = pages[0]
+        self.assertEqual((width, height), A4)
+        self.assertEqual([[text for _, text in lines] for lines in blocks],
+                         [['Annual Report'], [' '.join(BODY.split()[:8]), ' '.join(BODY.split()[8:])]])
+        self.assertEqual(blocks[0][0][0], [72.0, 70.0, 520.0, 94.0])
+        self.assertEqual(pages[1][2], [])
+        # 全角文字之间不加空格；XML 中不合法的控制字符被去掉
+        self.assertEqual([text for _, text in pages[4][2][0]][0], '光学字符识别 OCR 系统')
+        self.assertTrue([text for _, text in pages[4][2][0]][1].startswith('formfeed The'))
+
+    def test_bbox_layout_errors(self):
+        with self.assertRaises(text_layer.TextLayerError):
+            list(text_layer.parse_bbox_layout(b'<doc><page width="1" height="1">'))
+
+    def test_image_list_uses_ppi_columns(self):
+        areas = text_layer.parse_image_list(IMAGE_LIST)
+        self.assertEqual(set(areas), {2, 4})
+        # 2480 x 3508 像素 @ 300 ppi = 595.2 x 841.92 点，即整页
+        self.assertAlmostEqual(areas[2], (2480 / 300 * 72) * (3508 / 300 * 72))
+        self.assertAlmostEqual(areas[4], 144 * 96)
+
+    def test_image_list_columns_are_per_axis(self):
+        header = IMAGE_LIST.splitlines(keepends=True)[:2]
+        rows = [b'   1     0 image     600   600  rgb     3   8  jpeg   no        12  0   300   150  10K 1.0%\n',
+                b'   1     1 stencil   100   100  -       1   1  image  no        13  0    72    72  1K 1.0%\n',
+                b'   2     2 image     600   600  rgb     3   8  jpeg   no        14  0     0     0  10K 1.0%\n',
+                b'   2     3 image     600   600  rgb     3   8  jpeg   no        15  0     -     -  10K 1.0%\n',
+                b'   x     4 image     600   600  rgb     3   8  jpeg   no        16  0   300   300  10K 1.0%\n',
+                b'   3     5 image     600   600  rgb\n']
+        areas = text_layer.parse_image_list(b''.join(header + rows))
+        self.assertEqual(dict(areas), {0: (600 / 300 * 72) * (600 / 150 * 72) + 100 * 100})
+
+    def test_font_names(self):
+        self.assertEqual(text_layer.parse_font_names(OCR_FONTS),
+                         ['ABCDEF+LiberationSerif', 'GHIJKL+NotoSansCJKsc-Regular', 'GlyphLessFont'])
+        self.assertEqual(text_layer.parse_font_names(FONTS.splitlines(keepends=True)[0]), [])
+
+
+@override_settings(TEXT_LAYER_MIN_CHARS=20, TEXT_LAYER_MAX_IMAGE_COVERAGE=0.3, TEXT_LAYER_MIN_QUALITY=0.9)
+class AnalyzeTests(SimpleTestCase):
+    def test_classifies_pages(self):
+        with _tools():
+            result = text_layer.analyze('/data/report.pdf', 6)
+        self.assertEqual([page['page_idx'] for page in result['pages']], [0, 4])
+        self.assertEqual(result['ocr_pages'], [1, 2, 3, 5])
+        # 第 6 页 pdftotext 没有输出
+        self.assertEqual(result['stats'], {'text_layer': 2, 'ocr': 4,
+                                           'ocr_reasons': {'no_text': 2, 'images': 1, 'garbled': 1}})
+
+        page = result['pages'][0]
+        self.assertEqual((page['page_size'], page['_extraction']), (list(A4), 'text_layer'))
+        self.assertEqual([block['type'] for block in page['para_blocks']], ['title', 'text'])
+        self.assertEqual(page['para_blocks'][1]['bbox'], [72.0, 120.0, 520.0, 146.0])
+        self.assertEqual(page['para_blocks'][0]['lines'][0]['spans'][0]['content'], 'Annual Report')
+
+    def test_reasons(self):
+        pages = {n: page for n, page in enumerate(text_layer.parse_bbox_layout(BBOX_LAYOUT))}
+        self.assertIsNone(text_layer.classify(*pages[0], 0))
+        self.assertEqual(text_layer.classify(*pages[1], 0), 'no_text')
+        self.assertEqual(text_layer.classify(*pages[2], A4[0] * A4[1]), 'images')
+        self.assertIsNone(text_layer.classify(*pages[2], A4[0] * A4[1] * 0.3))
+        self.assertEqual(text_layer.classify(*pages[3], 0), 'garbled')
+        self.assertEqual(text_layer.classify(0, 0, pages[0][2], 0), 'images')
+
+    def test_ocr_font_sends_every_page_to_ocr(self):
+        with _tools(fonts=OCR_FONTS) as run:
+            result = text_layer.analyze('/data/report.pdf', 3)
+        self.assertEqual((result['pages'], result['ocr_pages']), ([], [0, 1, 2]))
+        self.assertEqual(result['stats']['ocr_reasons'], {'ocr_font': 3})
+        self.assertEqual([call.args[0] for call in run.call_args_list], ['pdffonts'])
+
+
+@override_settings(TEXT_LAYER_ENABLED=True, TEXT_LAYER_MIN_CHARS=20, TEXT_LAYER_MAX_IMAGE_COVERAGE=0.3,
+                   TEXT_LAYER_MIN_QUALITY=0.9)
+class PrepareTests(SimpleTestCase):
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+
+    def test_result_is_saved_for_resumed_runs(self):
+        with _tools():
+            first = text_layer.prepare('/data/report.pdf', 5, self.work_dir)
+        self.assertTrue((self.work_dir / text_layer.RESULT_NAME).is_file())
+        with _tools(layout=b'') as run:
+            self.assertEqual(text_layer.prepare('/data/report.pdf', 5, self.work_dir), first)
+        run.assert_not_called()
+
+    def test_tool_failure_sends_all_pages_to_ocr(self):
+        with mock.patch.object(text_layer, '_run', side_effect=text_layer.TextLayerError('pdffonts failed')), \
+                self.assertLogs('api.text_layer', 'WARNING'):
+            result = text_layer.prepare('/data/report.pdf', 2, self.work_dir)
+        self.assertEqual((result['ocr_pages'], result['stats']['ocr_reasons']), ([0, 1], {'error': 2}))
+        self.assertFalse((self.work_dir / text_layer.RESULT_NAME).exists())
+
+    @override_settings(TEXT_LAYER_ENABLED=False)
+    def test_disabled(self):
+        with _tools() as run:
+            self.assertEqual(text_layer.prepare('/data/report.pdf', 2, self.work_dir)['ocr_pages'], [0, 1])
+        run.assert_not_called()
+        self.assertEqual(text_layer.fingerprint(), '')
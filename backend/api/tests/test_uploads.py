@@ -0,0 +1,150 @@
+"""可续传分块上传：偏移校验、续传、大小上限、%PDF- 文件头与最终的 SHA-256。"""
+import hashlib
+import io
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import uploads
+from api.models import OcrDocument, UploadSession
+
+PDF = b'%PDF-1.7\n' + bytes(range(256)) * 12 + b'\n%%EOF\n'
+
+
+class ShortReads(io.RawIOBase):
+    """每次 read 至多返回 chunk 个字节；limit 之后的数据像连接断开一样读不到。"""
+    def __init__(self, data, chunk, limit=None):
+        self.data = data[:limit]
+        self.chunk = chunk
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self.data[self.offset:self.offset + min(size, self.chunk)]
+        self.offset += len(data)
+        return data
+
+
+class UploadTestMixin:
+    def setUp(self):
+        super().setUp()
+        data_root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, data_root, ignore_errors=True)
+        self.upload_dir = data_root / 'data' / 'pdfs_to_process'
+        settings_override = override_settings(DATA_ROOT_PATH=data_root, UPLOAD_CHUNK_MAX_BYTES=1024,
+                                              UPLOAD_MAX_SIZE=1024 * 1024)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for target, kwargs in (('api.views.PDF_UPLOAD_DIR', {'new': self.upload_dir}),
+                               ('api.views.queues.measure_pages', {'return_value': 1}),
+                               ('api.views.events.publish_status', {})):
+            patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        process = mock.patch('api.views.process_pdf_with_mineru')
+        self.process = process.start()
+        self.addCleanup(process.stop)
+
+
+class AppendChunkTests(UploadTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = UploadSession.objects.create(filename='a.pdf', total_size=len(PDF))
+        uploads.start(self.session)
+        self.addCleanup(uploads.forget, self.session)
+
+    def append(self, offset, stream, length):
+        with uploads.locked_file(self.session) as f:
+            return uploads.append_chunk(self.session, offset, stream, length, f)
+
+    def test_short_reads_split_the_header(self):
+        self.append(0, ShortReads(PDF, 2), 1000)
+        self.assertEqual(uploads.partial_path(self.session).read_bytes(), PDF[:1000])
+
+    def test_header_checked_across_chunks(self):
+        self.append(0, io.BytesIO(PDF[:3]), 3)
+        self.append(3, io.BytesIO(PDF[3:4]), 1)
+        with self.assertRaises(uploads.UploadError) as raised:
+            self.append(4, io.BytesIO(b'X' * 10), 10)
+        self.assertEqual(raised.exception.status, 415)
+
+    def test_not_a_pdf(self):
+        with self.assertRaises(uploads.UploadError) as raised:
+            self.append(0, ShortReads(b'GIF89a' + PDF, 1), 20)
+        self.assertEqual(raised.exception.status, 415)
+
+    def test_resume_after_partial_chunk(self):
+        with self.assertRaisesRegex(uploads.UploadError, 'received 100 of 1000'):
+            self.append(0, ShortReads(PDF, 64, limit=100), 1000)
+        self.assertEqual(self.session.received_bytes, 0)
+        self.append(0, io.BytesIO(PDF[:1000]), 1000)
+        for offset in range(1000, len(PDF), 1000):
+            hasher = self.append(offset, io.BytesIO(PDF[offset:offset + 1000]), len(PDF[offset:offset + 1000]))
+        self.assertEqual(hasher.hexdigest(), hashlib.sha256(PDF).hexdigest())
+        self.assertEqual(uploads.partial_path(self.session).read_bytes(), PDF)
+
+    def test_concurrent_chunk_is_rejected(self):
+        with uploads.locked_file(self.session):
+            with self.assertRaises(uploads.UploadError) as raised:
+                self.append(0, io.BytesIO(PDF[:10]), 10)
+        self.assertEqual(raised.exception.status, 409)
+
+
+class UploadViewTests(UploadTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def create(self, total_size=len(PDF)):
+        return self.client.post('/api/uploads/', {'filename': 'report.pdf', 'total_size': total_size}, format='json')
+
+    def patch(self, upload_id, offset, data):
+        return self.client.generic('PATCH', f'/api/uploads/{upload_id}/', data,
+                                   content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_upload_in_chunks_creates_document_with_sha256(self):
+        upload_id = self.create().data['id']
+        # 首个分块短于 %PDF- 文件头
+        response = self.patch(upload_id, 0, PDF[:3])
+        self.assertEqual((response.status_code, response['Upload-Offset']), (200, '3'))
+        offset = 3
+        while offset < len(PDF):
+            response = self.patch(upload_id, offset, PDF[offset:offset + 1024])
+            offset += 1024
+        self.assertEqual(response.status_code, 201)
+        doc = OcrDocument.objects.get(pk=response.data['document'])
+        self.assertEqual(doc.content_hash, hashlib.sha256(PDF).hexdigest())
+        self.assertEqual(Path(doc.original_pdf_path).read_bytes(), PDF)
+        self.process.apply_async.assert_called_once()
+        self.assertEqual(self.patch(upload_id, len(PDF), b'x').status_code, 409)
+
+    def test_offset_mismatch(self):
+        upload_id = self.create().data['id']
+        self.patch(upload_id, 0, PDF[:100])
+        for offset in (0, 50, 200):
+            response = self.patch(upload_id, offset, PDF[offset:offset + 10])
+            self.assertEqual((response.status_code, response['Upload-Offset']), (409, '100'))
+        self.assertEqual(self.client.head(f'/api/uploads/{upload_id}/')['Upload-Offset'], '100')
+
+    def test_size_limits(self):
+        self.assertEqual(self.create(total_size=1024 * 1024 + 1).status_code, 400)
+        upload_id = self.create().data['id']
+        self.assertEqual(self.patch(upload_id, 0, PDF[:1025]).status_code, 413)
+        small_id = self.create(total_size=10).data['id']
+        self.assertEqual(self.patch(small_id, 0, PDF[:11]).status_code, 413)
+        # 超限的分块不推进偏移，会话仍可继续
+        self.assertEqual(self.patch(upload_id, 0, PDF[:1024]).status_code, 200)
+
+    def test_not_a_pdf_aborts_session(self):
+        upload_id = self.create().data['id']
+        self.assertEqual(self.patch(upload_id, 0, b'%PD').status_code, 200)
+        response = self.patch(upload_id, 3, b'X-1.7')
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(UploadSession.objects.get(pk=upload_id).status, 'aborted')
+        self.assertFalse(uploads.partial_path(UploadSession(id=upload_id)).exists())
@@ -0,0 +1,268 @@
+"""
+born-digital 页面的文本层快速路径。
+
+由 Word/LaTeX 等导出的 PDF 自带准确的文本层，不需要 OCR。process_pdf_with_mineru 在运行
+MinerU 之前先用 poppler 工具（栅格化已依赖 poppler-utils）逐页分类：
+
+    pdftotext -bbox-layout   各页文本及 block / line / word 的坐标
+    pdfimages -list          各页图片的像素尺寸与分辨率，据此估算图片覆盖的页面比例
+    pdffonts                 文档使用的字体；OCR 软件写入的不可见文本层 (GlyphLessFont) 不可信
+
+同时满足以下条件的页走文本层，其余页照常交给 MinerU（按连续页码区间分片，见
+mineru.plan_shards）：
+  - 非空白字符不少于 TEXT_LAYER_MIN_CHARS（no_text）；
+  - 图片覆盖不超过页面的 TEXT_LAYER_MAX_IMAGE_COVERAGE：扫描页是整页图片，
+    带插图的页也交给 MinerU 识别版面（images）；
+  - 可识别字符（非 U+FFFD、私用区或控制字符）的比例不低于 TEXT_LAYER_MIN_QUALITY，
+    缺少 ToUnicode 映射的字体会抽出乱码（garbled）；
+  - 文档不含 OCR 文本层字体（ocr_font）。
+
+文本层页按 MinerU pdf_info 的结构输出：para_blocks → lines → spans，坐标为 PDF 点、原点
+在左上角，与 MinerU 一致，并带有 '_extraction': 'text_layer' 标记，下游（OcrPage/OcrBlock、
+Label Studio 任务、检索、分块）无需区分来源。pdftotext 的 block 都输出为 text，行高明显
+大于正文的短 block 输出为 title；表格按文本行输出。
+"""
+import io
+import logging
+import os
+import re
+import statistics
+import subprocess
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from xml.etree import ElementTree
+
+from django.conf import settings
+
+from . import codec
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION = 'text_layer'
+RESULT_NAME = 'text_layer.json'
+# Tesseract / OCRmyPDF 写入不可见 OCR 文本时使用的字体
+OCR_FONTS = ('GlyphLessFont',)
+# 不超过 TITLE_MAX_LINES 行、平均行高达到页面行高中位数 TITLE_HEIGHT_RATIO 倍的 block 视为标题
+TITLE_MAX_LINES = 2
+TITLE_HEIGHT_RATIO = 1.3
+# pdfimages -list 中计入覆盖面积的类型（smask / mask 是其它图片的透明度，不单独占面积）
+IMAGE_TYPES = ('image', 'stencil')
+# pdftotext 会原样输出文本中的控制字符，它们在 XML 中不合法
+_XML_INVALID_RE = re.compile(rb'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class TextLayerError(Exception):
+    pass
+
+
+def fingerprint():
+    """影响输出的配置，参与 OCR 缓存键；未启用时为空。"""
+    if not settings.TEXT_LAYER_ENABLED:
+        return ''
+    return (f"text_layer:{settings.TEXT_LAYER_MIN_CHARS}:{settings.TEXT_LAYER_MAX_IMAGE_COVERAGE}"
+            f":{settings.TEXT_LAYER_MIN_QUALITY}")
+
+
+def _run(tool, args, poppler_path=None):
+    executable = os.path.join(poppler_path, tool) if poppler_path else tool
+    try:
+        return subprocess.run([executable, *args], stdin=subprocess.DEVNULL, capture_output=True, check=True,
+                              timeout=settings.TEXT_LAYER_TIMEOUT).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        raise TextLayerError(f"{tool} failed: {e}") from e
+
+
+def _floats(element, *names):
+    return [float(element.get(name, 0)) for name in names]
+
+
+def _bbox(element):
+    return _floats(element, 'xMin', 'yMin', 'xMax', 'yMax')
+
+
+def _is_wide(char):
+    return unicodedata.east_asian_width(char) in ('W', 'F')
+
+
+def join_words(words):
+    """拼接一行中的词：中日韩等全角文字之间不加空格。"""
+    text = ''
+    for word in words:
+        if text and not (_is_wide(text[-1]) and _is_wide(word[0])):
+            text += ' '
+        text += word
+    return text
+
+
+def text_quality(text):
+    """可识别字符占非空白字符的比例，没有字符时为 0。"""
+    chars = [char for char in text if not char.isspace()]
+    if not chars:
+        return 0.0
+    bad = sum(1 for char in chars if char == '\ufffd' or unicodedata.category(char) in ('Co', 'Cc', 'Cs'))
+    return 1 - bad / len(chars)
+
+
+def parse_bbox_layout(data):
+    """
+    解析 pdftotext -bbox-layout 的 XHTML，逐页产出 (width, height, blocks)，
+    blocks 为 [[(line_bbox, text), ...], ...]，block 的 bbox 由其各行合并得到。
+    """
+    try:
+        for _, element in ElementTree.iterparse(io.BytesIO(_XML_INVALID_RE.sub(b'', data)), events=('end',)):
+            if element.tag.rsplit('}', 1)[-1] != 'page':
+                continue
+            width, height = _floats(element, 'width', 'height')
+            blocks = []
+            for block in element.iter():
+                if block.tag.rsplit('}', 1)[-1] != 'block':
+                    continue
+                lines = []
+                for line in block:
+                    words = [word.text for word in line if word.text and word.text.strip()]
+                    if words:
+                        lines.append((_bbox(line), join_words(word.strip() for word in words)))
+                if lines:
+                    blocks.append(lines)
+            yield width, height, blocks
+            element.clear()
+    except ElementTree.ParseError as e:
+        raise TextLayerError(f"Cannot parse pdftotext output: {e}") from e
+
+
+def parse_image_list(data):
+    """解析 pdfimages -list，返回 {page_idx: 图片覆盖的面积（PDF 点的平方）}。"""
+    areas = Counter()
+    for line in data.decode('utf-8', 'replace').splitlines()[2:]:
+        fields = line.split()
+        if len(fields) < 14 or fields[2] not in IMAGE_TYPES:
+            continue
+        try:
+            page, width, height = int(fields[0]), int(fields[3]), int(fields[4])
+            x_ppi, y_ppi = float(fields[12]), float(fields[13])
+        except ValueError:
+            continue
+        if x_ppi > 0 and y_ppi > 0:
+            areas[page - 1] += (width / x_ppi * 72) * (height / y_ppi * 72)
+    return areas
+
+
+def parse_font_names(data):
+    """解析 pdffonts 的输出，返回字体名列表。"""
+    return [line.split()[0] for line in data.decode('utf-8', 'replace').splitlines()[2:] if line.strip()]
+
+
+def _block(lines, median_height):
+    bbox = [min(b[0] for b, _ in lines), min(b[1] for b, _ in lines),
+            max(b[2] for b, _ in lines), max(b[3] for b, _ in lines)]
+    heights = [b[3] - b[1] for b, _ in lines]
+    is_title = (len(lines) <= TITLE_MAX_LINES and median_height > 0
+                and statistics.fmean(heights) >= median_height * TITLE_HEIGHT_RATIO)
+    return {
+        'type': 'title' if is_title else 'text',
+        'bbox': bbox,
+        'lines': [{'bbox': line_bbox, 'spans': [{'type': 'text', 'bbox': line_bbox, 'content': text}]}
+                  for line_bbox, text in lines],
+    }
+
+
+def build_page(page_idx, width, height, blocks):
+    """把一页的文本层 block 转成 MinerU pdf_info 的页结构。"""
+    heights = [bbox[3] - bbox[1] for lines in blocks for bbox, _ in lines]
+    median_height = statistics.median(heights) if heights else 0
+    return {
+        'page_idx': page_idx,
+        'page_size': [width, height],
+        'para_blocks': [_block(lines, median_height) for lines in blocks],
+        'discarded_blocks': [],
+        '_extraction': EXTRACTION,
+    }
+
+
+def classify(width, height, blocks, image_area):
+    """返回页面需要 OCR 的原因，可以走文本层时返回 None。"""
+    text = '\n'.join(text for lines in blocks for _, text in lines)
+    if sum(1 for char in text if not char.isspace()) < settings.TEXT_LAYER_MIN_CHARS:
+        return 'no_text'
+    if width <= 0 or height <= 0 or image_area / (width * height) > settings.TEXT_LAYER_MAX_IMAGE_COVERAGE:
+        return 'images'
+    if text_quality(text) < settings.TEXT_LAYER_MIN_QUALITY:
+        return 'garbled'
+    return None
+
+
+def analyze(pdf_path, page_count, poppler_path=None):
+    """
+    对 PDF 的每一页分类并抽取文本层页，返回：
+        {'pages': [文本层页, ...], 'ocr_pages': [需要 OCR 的 0 起始页码, ...],
+         'stats': {'text_layer': n, 'ocr': m, 'ocr_reasons': {原因: 页数}}}
+    poppler 工具失败时抛出 TextLayerError。
+    """
+    pdf_path = str(pdf_path)
+    fonts = parse_font_names(_run('pdffonts', [pdf_path], poppler_path))
+    if any(ocr_font in name for name in fonts for ocr_font in OCR_FONTS):
+        reasons = dict.fromkeys(range(page_count), 'ocr_font')
+        pages = []
+    else:
+        image_areas = parse_image_list(_run('pdfimages', ['-list', pdf_path], poppler_path))
+        layout = _run('pdftotext', ['-bbox-layout', '-enc', 'UTF-8', pdf_path, '-'], poppler_path)
+        reasons, pages = {}, []
+        for page_idx, (width, height, blocks) in enumerate(parse_bbox_layout(layout)):
+            if page_idx >= page_count:
+                break
+            reason = classify(width, height, blocks, image_areas.get(page_idx, 0))
+            if reason is None:
+                pages.append(build_page(page_idx, width, height, blocks))
+            else:
+                reasons[page_idx] = reason
+        # pdftotext 输出的页数少于 page_count 时，缺少的页交给 OCR
+        extracted = {page['page_idx'] for page in pages}
+        for page_idx in range(page_count):
+            if page_idx not in extracted:
+                reasons.setdefault(page_idx, 'no_text')
+    return {
+        'pages': pages,
+        'ocr_pages': sorted(reasons),
+        'stats': {'text_layer': len(pages), 'ocr': len(reasons), 'ocr_reasons': dict(Counter(reasons.values()))},
+    }
+
+
+def _all_ocr(page_count, reason=None):
+    stats = {'text_layer': 0, 'ocr': page_count, 'ocr_reasons': {reason: page_count} if reason else {}}
+    return {'pages': [], 'ocr_pages': list(range(page_count)), 'stats': stats}
+
+
+def prepare(pdf_path, page_count, work_dir, poppler_path=None, label=''):
+    """
+    处理流程中的预处理：返回 analyze 的结果，并保存到 work_dir/text_layer.json，
+    续跑时直接读取，保证与上一次运行的分片划分一致。
+    未启用 TEXT_LAYER_ENABLED 或分析失败时所有页都交给 OCR（失败只记警告）。
+    """
+    if not settings.TEXT_LAYER_ENABLED:
+        return _all_ocr(page_count)
+    path = Path(work_dir) / RESULT_NAME
+    if path.is_file():
+        try:
+            return codec.load_path(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable text layer analysis {path}: {e}")
+    try:
+        result = analyze(pdf_path, page_count, poppler_path=poppler_path)
+    except TextLayerError as e:
+        logger.warning(f"Text layer analysis failed{label}; sending all pages to OCR: {e}")
+        return _all_ocr(page_count, 'error')
+    tmp_path = path.with_name(path.name + '.tmp')
+    codec.dump_path(result, tmp_path)
+    os.replace(tmp_path, path)
+    stats = result['stats']
+    logger.info(f"Text layer{label}: {stats['text_layer']} of {page_count} pages extracted directly, "
+                f"{stats['ocr']} sent to OCR {stats['ocr_reasons']}.")
+    return result
+
+
+def page_paths(ocr_data):
+    """按 _extraction 标记统计已有 OCR 结果中各路径的页数（不含送去 OCR 的原因）。"""
+    pdf_info = (ocr_data or {}).get('pdf_info', [])
+    text_layer = sum(1 for page in pdf_info if page.get('_extraction') == EXTRACTION)
+    return {'text_layer': text_layer, 'ocr': len(pdf_info) - text_layer}
@@ -0,0 +1,160 @@
+"""
+可续传的分块上传。
+
+协议（与 tus 的 offset 语义类似）：
+  POST   /api/uploads/                {"filename", "total_size"}  → 创建会话，返回 id 与 offset
+  HEAD   /api/uploads/<id>/           → Upload-Offset 头告知已接收字节数（断线后据此续传）
+  PATCH  /api/uploads/<id>/           Upload-Offset: N，请求体为原始字节 → 追加分块
+  DELETE /api/uploads/<id>/           → 放弃上传
+
+分块直接追加写入 PDF_UPLOAD_DIR/.partial/<id>.part，不经过 multipart 解析，
+也不在内存中缓冲整个文件。前 5 个字节（可能分几个分块到达）必须是 %PDF- 文件头；
+最后一个分块写入后才创建 OcrDocument 并投递处理任务。
+
+同一会话的分块由分块文件上的独占 flock 串行化（见 locked_file），读取请求体期间
+不持有数据库行锁；行锁只在确认偏移、提交 received_bytes 时短暂持有。
+"""
+import fcntl
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+PDF_HEADER = b'%PDF-'
+READ_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """客户端可见的上传错误，status 为对应的 HTTP 状态码。"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# 同一进程内连续到达的分块沿用同一个 hasher，实现增量哈希；
+# 分块落到其它 worker 或进程重启时，从磁盘上的已接收部分重建。
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def partial_dir():
+    return Path(settings.DATA_ROOT_PATH) / 'data' / 'pdfs_to_process' / '.partial'
+
+
+def partial_path(session):
+    return partial_dir() / f"{session.id}.part"
+
+
+def _hasher_for(session):
+    """返回与 session.received_bytes 对齐的 SHA-256 对象。"""
+    with _hashers_lock:
+        entry = _hashers.get(session.id)
+    if entry is not None and entry[0] == session.received_bytes:
+        return entry[1].copy()
+
+    hasher = hashlib.sha256()
+    remaining = session.received_bytes
+    if remaining:
+        with open(partial_path(session), 'rb') as f:
+            while remaining > 0:
+                data = f.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                hasher.update(data)
+                remaining -= len(data)
+    return hasher
+
+
+def _remember_hasher(session, hasher):
+    with _hashers_lock:
+        _hashers[session.id] = (session.received_bytes, hasher)
+
+
+def forget(session):
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+
+
+def start(session):
+    """为新会话创建空的分块文件。"""
+    partial_dir().mkdir(parents=True, exist_ok=True)
+    partial_path(session).touch()
+
+
+@contextmanager
+def locked_file(session):
+    """
+    打开会话的分块文件并加独占锁，产出可读写的文件对象；锁在文件关闭时释放。
+    同一会话的另一个分块正在写入，或会话已被放弃（文件已删除）时抛出 409。
+    """
+    try:
+        f = open(partial_path(session), 'r+b')
+    except FileNotFoundError:
+        raise UploadError("Upload session has no data file.", status=409)
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another chunk is being written to this upload.", status=409)
+        yield f
+
+
+def append_chunk(session, offset, stream, length, f):
+    """
+    将 stream 中的 length 字节追加到会话文件。f 为 locked_file 产出的文件对象，
+    调用方在提交 received_bytes 之前一直持有它。
+    返回写入后的 sha256 对象（上传完成时即为整个文件的哈希）。
+    """
+    if offset != session.received_bytes:
+        raise UploadError(f"Upload-Offset mismatch: expected {session.received_bytes}, got {offset}.", status=409)
+    if length <= 0:
+        raise UploadError("Empty chunk.")
+    if length > settings.UPLOAD_CHUNK_MAX_BYTES:
+        raise UploadError(f"Chunk exceeds {settings.UPLOAD_CHUNK_MAX_BYTES} bytes.", status=413)
+    if session.received_bytes + length > session.total_size:
+        raise UploadError("Chunk exceeds declared upload size.", status=413)
+    if session.total_size < len(PDF_HEADER):
+        raise UploadError("File is not a PDF (missing %PDF- header).", status=415)
+
+    hasher = _hasher_for(session)
+    # 文件头可能分几个分块、几次读取到达，凑够 len(PDF_HEADER) 字节之前只校验已有的前缀
+    head = PDF_HEADER
+    if session.received_bytes < len(PDF_HEADER):
+        f.seek(0)
+        head = f.read(session.received_bytes)
+    written = 0
+    # 截断到已确认的偏移，丢弃上次中断时写了一半的数据
+    f.truncate(session.received_bytes)
+    f.seek(session.received_bytes)
+    while written < length:
+        data = stream.read(min(READ_SIZE, length - written))
+        if not data:
+            break
+        if len(head) < len(PDF_HEADER):
+            head += data[:len(PDF_HEADER) - len(head)]
+            if not PDF_HEADER.startswith(head):
+                raise UploadError("File is not a PDF (missing %PDF- header).", status=415)
+        f.write(data)
+        hasher.update(data)
+        written += len(data)
+    f.flush()
+
+    if written != length:
+        # 连接中途断开：不推进偏移，客户端从原 offset 重试
+        forget(session)
+        raise UploadError(f"Incomplete chunk: received {written} of {length} bytes.")
+
+    session.received_bytes += written
+    _remember_hasher(session, hasher)
+    return hasher
+
+
+def discard(session):
+    forget(session)
+    try:
+        os.remove(partial_path(session))
+    except FileNotFoundError:
+        pass
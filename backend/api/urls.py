@@ -3,20 +3,77 @@ from .views import (
     DocumentListView, 
     DocumentDetailView, 
     DocumentUploadView, 
+    UploadSessionCreateView,
+    UploadSessionView,
+    CancelProcessingView,
+    RetryProcessingView,
+    BatchUploadView,
+    BatchDetailView,
+    RAGFlowExportView,
+    LabelStudioExportView,
     LabelStudioTaskView,
+    LabelStudioTasksView,
     SubmitCorrectionView,
-    GenerateRAGFlowPayloadView # 1. 导入新视图
+    PageCorrectionView,
+    CorrectionExportView,
+    GenerateRAGFlowPayloadView, # 1. 导入新视图
+    QueueMetricsView,
+    MarkIngestedView,
+    PushToRAGFlowView,
+    DocumentRunsView,
+    PageImageView,
+    DocumentPagesView,
+    OcrPageView,
+    PageTaskView,
+    SearchView,
 )
+from .events import document_events
 
 urlpatterns = [
     path('documents/', DocumentListView.as_view(), name='document_list'),
     path('documents/upload/', DocumentUploadView.as_view(), name='document_upload'),
     path('documents/<int:pk>/', DocumentDetailView.as_view(), name='document_detail'),
+    path('documents/<int:pk>/cancel/', CancelProcessingView.as_view(), name='cancel_processing'),
+    path('documents/<int:pk>/retry/', RetryProcessingView.as_view(), name='retry_processing'),
+    # 分阶段计时记录
+    path('documents/<int:pk>/runs/', DocumentRunsView.as_view(), name='document_runs'),
+    # 页面图片（缩略图 / 审阅图 / 全尺寸），页码从 1 开始
+    path('documents/<int:pk>/pages/<int:page>/image/', PageImageView.as_view(), name='page_image'),
+    # 按页读取 OCR 区域与单页 Label Studio 任务（只查询该页的行）
+    path('documents/<int:pk>/pages/', DocumentPagesView.as_view(), name='document_pages'),
+    path('documents/<int:pk>/pages/<int:page>/', OcrPageView.as_view(), name='ocr_page'),
+    path('documents/<int:pk>/pages/<int:page>/task/', PageTaskView.as_view(), name='page_task'),
+
+    # 可续传的分块上传
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload_session_create'),
+    path('uploads/<uuid:upload_id>/', UploadSessionView.as_view(), name='upload_session'),
+    
+    # 批量上传（多文件或 zip/tar 归档）、批次进度与 RAGFlow payload 批量导出
+    path('batches/', BatchUploadView.as_view(), name='batch_upload'),
+    path('batches/<uuid:batch_id>/', BatchDetailView.as_view(), name='batch_detail'),
+    path('ragflow-export/', RAGFlowExportView.as_view(), name='ragflow_export'),
+    path('label-studio-export/', LabelStudioExportView.as_view(), name='label_studio_export'),
     
     path('documents/<int:pk>/to-label-studio/', LabelStudioTaskView.as_view(), name='download_raw_ocr'),
+    # 处理时预先生成的 Label Studio 任务
+    path('documents/<int:pk>/label-studio-tasks/', LabelStudioTasksView.as_view(), name='label_studio_tasks'),
     
     path('documents/<int:pk>/submit-correction/', SubmitCorrectionView.as_view(), name='submit_correction'),
+    # 按页增量校对与合成后的完整导出
+    path('documents/<int:pk>/corrections/', CorrectionExportView.as_view(), name='correction_export'),
+    path('documents/<int:pk>/corrections/<int:page>/', PageCorrectionView.as_view(), name='page_correction'),
 
     # 2. 新增 RAGFlow 转换和下载的端点
     path('documents/<int:pk>/to-ragflow/', GenerateRAGFlowPayloadView.as_view(), name='generate_ragflow_payload'),
+    path('documents/<int:pk>/mark-ingested/', MarkIngestedView.as_view(), name='mark_ingested'),
+    path('documents/<int:pk>/push-to-ragflow/', PushToRAGFlowView.as_view(), name='push_to_ragflow'),
+
+    # 处理队列的积压与排队时间
+    path('queues/metrics/', QueueMetricsView.as_view(), name='queue_metrics'),
+
+    # 全文检索
+    path('search/', SearchView.as_view(), name='search'),
+
+    # 文档状态/进度的 Server-Sent Events 推送（需 ASGI 运行）
+    path('events/', document_events, name='document_events'),
 ]
@@ -1,26 +1,29 @@
-import subprocess
 import os
-import json
 import logging
 from pathlib import Path
-import requests
-import uuid
 import shutil
 
 from django.utils.text import get_valid_filename
 import unidecode
 
-from django.http import JsonResponse, HttpResponse
+from django.http import StreamingHttpResponse
 from django.core.files.storage import FileSystemStorage
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.conf import settings
-from pdf2image import convert_from_path
 
-from .models import OcrDocument
-from .serializers import OcrDocumentSerializer
-from .tasks import process_pdf_with_mineru
+from .models import DocumentBatch, OcrBlock, OcrDocument, PageCorrection, ProcessingRun, UploadSession
+from .serializers import (DocumentBatchSerializer, OcrDocumentSerializer, OcrDocumentSummarySerializer,
+                          ProcessingRunSerializer, UploadSessionSerializer)
+from .pagination import DocumentCursorPagination
+from .tasks import index_document_text, process_pdf_with_mineru, push_document_to_ragflow, requeue
+from .rasterize import page_image_path
+from . import (batches, blob_storage, cancellation, checkpoints, codec, corrections, events, instrumentation, label_studio_tasks,
+               ocr_cache, ocr_pages, queues, ragflow, ragflow_push, responses, search, uploads)
 
 logger = logging.getLogger(__name__)
 
@@ -29,61 +32,53 @@ PDF_UPLOAD_DIR = DATA_ROOT / 'data' / 'pdfs_to_process'
 BASE_OUTPUT_DIR = DATA_ROOT / 'data' / 'mineru_output'
 POPPLER_PATH = os.getenv('POPPLER_PATH', None)
 
-# The helper functions _create_ls_region and _generate_ls_tasks remain unchanged.
-# ... (您的 _create_ls_region 和 _generate_ls_tasks 函数放在这里)
-def _create_ls_region(bbox, page_dims, label, text_content=None):
-    page_width, page_height = page_dims
-    x1, y1, x2, y2 = bbox
-    if page_width == 0 or page_height == 0: return []
-    x = (x1 / page_width) * 100; y = (y1 / page_height) * 100
-    width = ((x2 - x1) / page_width) * 100; height = ((y2 - y1) / page_height) * 100
-    region_id = f"ls_{uuid.uuid4().hex[:10]}"
-    results = [{"id": region_id, "from_name": "bbox", "to_name": "image", "type": "rectanglelabels", "value": {"x": x, "y": y, "width": width, "height": height, "rotation": 0, "rectanglelabels": [label]}}]
-    if text_content and text_content.strip():
-        results.append({"id": region_id, "from_name": "transcription", "to_name": "image", "type": "textarea", "value": {"text": [text_content.strip()]}})
-    return results
-
-def _generate_ls_tasks(mineru_data, doc: OcrDocument, unique_folder_name: str):
-    ls_tasks = []
-    task_output_dir = BASE_OUTPUT_DIR / unique_folder_name
-    pdf_info = mineru_data.get('pdf_info', [])
-    if not pdf_info: raise ValueError("Invalid MinerU JSON format: 'pdf_info' key missing.")
-    type_mapping = {'text': 'Text', 'title': 'Title', 'list': 'List', 'figure': 'Figure', 'foot': 'Footer', 'head': 'Header', 'equation': 'Equation', 'table': 'Table'}
-    for page_data in pdf_info:
-        page_index = page_data.get('page_idx', 0)
-        page_size = page_data.get('page_size')
-        if not page_size or len(page_size) != 2 or page_size[0] == 0 or page_size[1] == 0:
-            logger.warning(f"Page size missing or invalid for page {page_index}. Skipping."); continue
-        page_dims = (page_size[0], page_size[1])
-        page_filename = f"page-{str(page_index + 1).zfill(4)}.jpg"
-        image_path = task_output_dir / "pages" / page_filename
-        if not image_path.exists():
-            logger.warning(f"Could not find image for page {page_index + 1} at expected path: {image_path}"); continue
-        relative_image_path = Path('data') / 'mineru_output' / unique_folder_name / 'pages' / page_filename
-        image_url = f"/data/local-files/?d={relative_image_path.as_posix()}"
-        task = {"data": {"image": image_url}, "predictions": [{"result": []}]}
-        all_blocks = page_data.get('para_blocks', []) + page_data.get('preproc_blocks', [])
-        for block in all_blocks:
-            block_type = block.get('type')
-            label = type_mapping.get(block_type, 'Unknown')
-            if block_type == 'figure':
-                if 'bbox' in block: task["predictions"][0]["result"].extend(_create_ls_region(block['bbox'], page_dims, 'Figure'))
-                for line in block.get('lines', []):
-                    if 'bbox' in line: task["predictions"][0]["result"].extend(_create_ls_region(line['bbox'], page_dims, 'Text', ''.join(s.get('content', '') for s in line.get('spans', []))))
-            elif block_type in ['text', 'title', 'list', 'foot', 'head']:
-                for line in block.get('lines', []):
-                    if 'bbox' in line: task["predictions"][0]["result"].extend(_create_ls_region(line['bbox'], page_dims, label, ''.join(s.get('content', '') for s in line.get('spans', []))))
-            elif 'bbox' in block:
-                task["predictions"][0]["result"].extend(_create_ls_region(block['bbox'], page_dims, label))
-        if task["predictions"][0]["result"]: ls_tasks.append(task)
-    return ls_tasks
+def _create_document(pdf_path, content_hash):
+    """
+    为已落盘的 PDF 创建文档记录，并按页数投递到 small/large 队列。
+    """
+    page_count = queues.measure_pages(pdf_path, poppler_path=POPPLER_PATH)
+    queue, priority = queues.route(page_count)
+    doc = OcrDocument.objects.create(
+        original_pdf_path=pdf_path,
+        content_hash=content_hash,
+        page_count=page_count,
+        queue=queue,
+        queued_at=timezone.now(),
+        status='pending'
+    )
+    events.publish_status(doc)
+    process_pdf_with_mineru.apply_async(args=[doc.id], queue=queue, priority=priority)
+    return doc
+
+
+def _queue_text_index(doc):
+    """整体校对后在 worker 中重建检索索引；投递失败时可用 rebuild_search_index 补建。"""
+    try:
+        index_document_text.delay(doc.id)
+    except Exception as e:
+        logger.warning(f"Failed to queue text indexing for Doc ID {doc.id}: {e}")
 
 
 class DocumentListView(APIView):
+    """
+    文档列表：只查询摘要列（不加载 raw/corrected JSON 的 blob），
+    使用按 created_at 的游标分页（见 DocumentCursorPagination），
+    响应为 {next, previous, results}，客户端沿 next 继续加载。
+    ?status=a,b     按状态过滤。
+    大体积的 JSON 只通过单文档接口获取。此前的 ?view=summary 参数仍被接受，不再有区别。
+    """
     def get(self, request, *args, **kwargs):
-        documents = OcrDocument.objects.all().order_by('-created_at')
-        serializer = OcrDocumentSerializer(documents, many=True)
-        return Response(serializer.data)
+        documents = OcrDocument.objects.only(*OcrDocumentSummarySerializer.Meta.fields)
+
+        status_param = request.query_params.get('status')
+        if status_param:
+            statuses = [s.strip() for s in status_param.split(',') if s.strip()]
+            documents = documents.filter(status__in=statuses)
+
+        paginator = DocumentCursorPagination()
+        page = paginator.paginate_queryset(documents, request, view=self)
+        serializer = OcrDocumentSummarySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 class DocumentDetailView(APIView):
     def get_object(self, pk):
@@ -104,17 +99,28 @@ class DocumentDetailView(APIView):
         if doc is None:
             return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
         
+        cache_entry = doc.cache_entry
         try:
             if doc.original_pdf_path and os.path.exists(doc.original_pdf_path):
                 os.remove(doc.original_pdf_path)
-            if doc.mineru_json_path:
+            # 共享的缓存输出由 ocr_cache 按引用计数处理，这里只删除私有输出
+            if doc.mineru_json_path and cache_entry is None:
                 output_dir_parent = Path(doc.mineru_json_path).parents[2] 
                 if os.path.isdir(output_dir_parent) and output_dir_parent.name != 'mineru_output':
                     shutil.rmtree(output_dir_parent)
+            # 未完成处理留下的断点输出
+            checkpoints.discard(doc)
         except Exception as e:
             logger.error(f"Error deleting associated files for doc ID {pk}: {e}")
         
+        blob_storage.delete_document_blobs(pk)
         doc.delete()
+        events.publish('deleted', pk)
+        if cache_entry is not None:
+            try:
+                ocr_cache.release(cache_entry)
+            except Exception as e:
+                logger.error(f"Error releasing OCR cache entry {cache_entry.pk} for doc ID {pk}: {e}")
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -130,17 +136,260 @@ class DocumentUploadView(APIView):
         os.makedirs(PDF_UPLOAD_DIR, exist_ok=True)
         fs = FileSystemStorage(location=str(PDF_UPLOAD_DIR))
         
-        filename = fs.save(safe_filename, file_obj)
+        # 写盘的同时计算 SHA-256，用于命中 OCR 结果缓存
+        hashing_file = ocr_cache.HashingFile(file_obj)
+        filename = fs.save(safe_filename, hashing_file)
         uploaded_file_path = fs.path(filename)
         
-        doc = OcrDocument.objects.create(
-            original_pdf_path=uploaded_file_path,
-            status='pending'
-        )
-        process_pdf_with_mineru.delay(doc.id)
+        doc = _create_document(uploaded_file_path, hashing_file.hexdigest)
         serializer = OcrDocumentSerializer(doc)
         return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
+
+class UploadSessionCreateView(APIView):
+    """
+    创建一个可续传的分块上传会话。请求体: {"filename": "...", "total_size": 123}
+    """
+    def post(self, request, *args, **kwargs):
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        total_size = serializer.validated_data['total_size']
+        if total_size <= 0 or total_size > settings.UPLOAD_MAX_SIZE:
+            return Response({"error": f"Upload size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        session = serializer.save()
+        uploads.start(session)
+        response = Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+        response['Upload-Offset'] = str(session.received_bytes)
+        return response
+
+
+class UploadSessionView(APIView):
+    """
+    HEAD/GET 查询已接收的偏移量，PATCH 追加分块，DELETE 放弃上传。
+    最后一个分块写入后创建 OcrDocument 并投递处理任务。
+    """
+    def get_object(self, upload_id):
+        try:
+            return UploadSession.objects.get(pk=upload_id)
+        except UploadSession.DoesNotExist:
+            return None
+
+    def get(self, request, upload_id, *args, **kwargs):
+        session = self.get_object(upload_id)
+        if session is None:
+            return Response({"error": "Upload session not found"}, status=status.HTTP_404_NOT_FOUND)
+        response = Response(UploadSessionSerializer(session).data)
+        response['Upload-Offset'] = str(session.received_bytes)
+        response['Upload-Length'] = str(session.total_size)
+        return response
+
+    def head(self, request, upload_id, *args, **kwargs):
+        return self.get(request, upload_id, *args, **kwargs)
+
+    def patch(self, request, upload_id, *args, **kwargs):
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length', ''))
+        except ValueError:
+            return Response({"error": "Upload-Offset and Content-Length headers are required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        session = self.get_object(upload_id)
+        if session is None:
+            return Response({"error": "Upload session not found"}, status=status.HTTP_404_NOT_FOUND)
+        if session.status != 'uploading':
+            return Response({"error": f"Upload session is {session.status}."}, status=status.HTTP_409_CONFLICT)
+        try:
+            # 分块文件上的独占锁让同一会话的分块串行追加；读取请求体期间不持有数据库行锁
+            with uploads.locked_file(session) as part_file:
+                session.refresh_from_db()
+                if session.status != 'uploading':
+                    raise uploads.UploadError(f"Upload session is {session.status}.", status=409)
+                hasher = uploads.append_chunk(session, offset, request.stream, length, part_file)
+                self._commit_chunk(session, hasher)
+        except uploads.UploadError as e:
+            if e.status == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE:
+                UploadSession.objects.filter(pk=session.pk, status='uploading').update(
+                    status='aborted', updated_at=timezone.now())
+                uploads.discard(session)
+            session.refresh_from_db(fields=['received_bytes'])
+            response = Response({"error": str(e), "offset": session.received_bytes}, status=e.status)
+            response['Upload-Offset'] = str(session.received_bytes)
+            return response
+
+        response_status = status.HTTP_201_CREATED if session.status == 'completed' else status.HTTP_200_OK
+        response = Response(UploadSessionSerializer(session).data, status=response_status)
+        response['Upload-Offset'] = str(session.received_bytes)
+        return response
+
+    def delete(self, request, upload_id, *args, **kwargs):
+        session = self.get_object(upload_id)
+        if session is None:
+            return Response({"error": "Upload session not found"}, status=status.HTTP_404_NOT_FOUND)
+        if session.status == 'uploading':
+            uploads.discard(session)
+            session.status = 'aborted'
+            session.save(update_fields=['status', 'updated_at'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def _commit_chunk(self, session, hasher):
+        """在行锁下确认会话仍在上传中并提交 received_bytes；最后一个分块写入后完成上传。"""
+        with transaction.atomic():
+            current = UploadSession.objects.select_for_update().only('status').get(pk=session.pk)
+            if current.status != 'uploading':
+                raise uploads.UploadError(f"Upload session is {current.status}.", status=409)
+            update_fields = ['received_bytes', 'updated_at']
+            if session.received_bytes == session.total_size:
+                session.document = self._finalize(session, hasher.hexdigest())
+                session.status = 'completed'
+                update_fields += ['document', 'status']
+            session.save(update_fields=update_fields)
+
+    def _finalize(self, session, content_hash):
+        """把完整的分块文件移入 PDF_UPLOAD_DIR，创建文档并投递任务。"""
+        safe_filename = get_valid_filename(unidecode.unidecode(session.filename))
+        os.makedirs(PDF_UPLOAD_DIR, exist_ok=True)
+        fs = FileSystemStorage(location=str(PDF_UPLOAD_DIR))
+        final_path = fs.path(fs.get_available_name(safe_filename))
+        os.replace(uploads.partial_path(session), final_path)
+        uploads.forget(session)
+        return _create_document(final_path, content_hash)
+
+class BatchUploadView(APIView):
+    """
+    批量上传。multipart 的 'files' 字段可重复，每个文件可以是 PDF 或
+    zip/tar 归档（归档中的 PDF 逐个展开）；可选 'name' 作为批次名称。
+    返回批次信息、创建的文档 ID 与被拒绝的条目。
+    """
+    def post(self, request, *args, **kwargs):
+        files = request.FILES.getlist('files')
+        if not files:
+            return Response({"error": "No files provided in 'files' field"}, status=status.HTTP_400_BAD_REQUEST)
+
+        batch, documents = batches.ingest(files, PDF_UPLOAD_DIR, name=request.data.get('name', ''),
+                                          poppler_path=POPPLER_PATH)
+        data = DocumentBatchSerializer(batch).data
+        data['documents'] = [doc.id for doc in documents]
+        response_status = status.HTTP_202_ACCEPTED if documents else status.HTTP_400_BAD_REQUEST
+        return Response(data, status=response_status)
+
+
+class BatchDetailView(APIView):
+    """批次的聚合进度（按状态统计文档数与页数）。"""
+    def get(self, request, batch_id, *args, **kwargs):
+        batch = DocumentBatch.objects.filter(pk=batch_id).first()
+        if batch is None:
+            return Response({"error": "Batch not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(DocumentBatchSerializer(batch).data)
+
+
+class ArchiveExportView(APIView):
+    """
+    把多个文档的导出文件打包为一个 zip 流式下载。
+    ?batch=<批次ID> 导出整个批次，或 ?ids=1,2,3 指定文档。
+    """
+    archive_suffix = None
+    iter_archive = None
+
+    def get(self, request, *args, **kwargs):
+        batch_id = request.query_params.get('batch')
+        ids_param = request.query_params.get('ids')
+        if batch_id:
+            try:
+                batch = DocumentBatch.objects.filter(pk=batch_id).first()
+            except ValidationError:
+                batch = None
+            if batch is None:
+                return Response({"error": "Batch not found"}, status=status.HTTP_404_NOT_FOUND)
+            doc_ids = list(batch.documents.order_by('id').values_list('id', flat=True))
+            download_filename = f"batch_{batch.id}_{self.archive_suffix}.zip"
+        elif ids_param:
+            try:
+                doc_ids = [int(i) for i in ids_param.split(',') if i.strip()]
+            except ValueError:
+                return Response({"error": "ids must be a comma-separated list of integers"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            download_filename = f"{self.archive_suffix}.zip"
+        else:
+            return Response({"error": "Specify ?batch=<id> or ?ids=1,2,3"}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            responses.streaming_content(request, self.iter_archive(doc_ids)),
+            content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{download_filename}"'
+        return response
+
+
+class RAGFlowExportView(ArchiveExportView):
+    """多个文档的 RAGFlow payload（按需生成或复用已有产物）。"""
+    archive_suffix = 'ragflow_payloads'
+    iter_archive = staticmethod(batches.iter_ragflow_archive)
+
+
+class LabelStudioExportView(ArchiveExportView):
+    """多个文档预先生成的 Label Studio 任务，每个文档一个可直接导入的任务文件。"""
+    archive_suffix = 'label_studio_tasks'
+    iter_archive = staticmethod(batches.iter_label_studio_archive)
+
+
+class CancelProcessingView(APIView):
+    """
+    取消文档的 OCR 处理。
+    pending：直接标记为 cancelled，任务启动时会跳过；
+    processing：标记为 cancelling 并发出取消请求，worker 终止 MinerU 进程组后
+    将状态置为 cancelled（通过事件推送）。
+    """
+    def post(self, request, pk, *args, **kwargs):
+        if OcrDocument.objects.filter(pk=pk, status='pending').update(status='cancelled'):
+            events.publish('status', pk, status='cancelled')
+            return Response({"id": pk, "status": "cancelled"})
+
+        if OcrDocument.objects.filter(pk=pk, status='processing').update(status='cancelling'):
+            try:
+                cancellation.request(pk)
+            except Exception as e:
+                logger.error(f"Failed to request cancellation for Doc ID {pk}: {e}")
+                OcrDocument.objects.filter(pk=pk, status='cancelling').update(status='processing')
+                return Response({"error": "Cancellation could not be delivered to the worker."},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            events.publish('status', pk, status='cancelling')
+            return Response({"id": pk, "status": "cancelling"}, status=status.HTTP_202_ACCEPTED)
+
+        doc = OcrDocument.objects.only('id', 'status').filter(pk=pk).first()
+        if doc is None:
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"error": f"Document is {doc.status}; only pending or processing documents can be cancelled.",
+                         "status": doc.status}, status=status.HTTP_409_CONFLICT)
+
+
+class RetryProcessingView(APIView):
+    """
+    重新处理 failed / cancelled 的文档。失败的文档保留了断点，新任务沿用原输出目录，
+    从最后完成的阶段（栅格化为最后完成的页）继续；?fresh=1 丢弃断点从头处理。
+    """
+    RETRYABLE_STATUSES = ('failed', 'cancelled')
+
+    def post(self, request, pk, *args, **kwargs):
+        doc = OcrDocument.objects.filter(pk=pk).first()
+        if doc is None:
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+        if doc.status not in self.RETRYABLE_STATUSES:
+            return Response({"error": f"Document is {doc.status}; only failed or cancelled documents can be retried.",
+                             "status": doc.status}, status=status.HTTP_409_CONFLICT)
+        if request.query_params.get('fresh', '').lower() in ('1', 'true', 'yes'):
+            checkpoints.discard(doc)
+        resume_from = doc.checkpoint.get('stage')
+        if not requeue(doc, status=doc.status):
+            doc.refresh_from_db(fields=['status'])
+            return Response({"error": f"Document is {doc.status}; only failed or cancelled documents can be retried.",
+                             "status": doc.status}, status=status.HTTP_409_CONFLICT)
+        return Response({"id": doc.id, "status": doc.status, "queue": doc.queue, "resume_after": resume_from},
+                        status=status.HTTP_202_ACCEPTED)
+
+
 class LabelStudioTaskView(APIView):
     """
     处理对原始OCR JSON数据的请求。
@@ -149,29 +398,28 @@ class LabelStudioTaskView(APIView):
     """
     def get(self, request, pk, *args, **kwargs):
         logger.info(f"--- [GET] 开始为文档ID为 {pk} 的文件提供原始OCR JSON下载 ---")
+        # 重复下载：仅凭 blob 文件的 stat 即可判断未变化，不访问数据库
+        etag = responses.blob_etag(pk, 'raw_ocr_json')
+        cached = responses.not_modified(request, etag)
+        if cached is not None:
+            return cached
+
         try:
-            doc = OcrDocument.objects.get(pk=pk)
+            doc = OcrDocument.objects.only('original_pdf_path', 'raw_ocr_blob').get(pk=pk)
 
             # 现在的失败条件更简单：只检查原始JSON是否存在
-            if not doc.raw_ocr_json:
+            if not doc.raw_ocr_blob:
                 return Response(
                     {"error": "未找到此文档的原始OCR JSON。可能在处理过程中失败。"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # 将JSON数据（Python字典/列表）转换回字符串
-            json_string = json.dumps(doc.raw_ocr_json, indent=4, ensure_ascii=False)
-
             # 为下载的文件创建一个名称
             original_filename = Path(doc.original_pdf_path).stem
             download_filename = f"{original_filename}_raw_ocr.json"
 
-            # 创建一个HttpResponse对象，设置内容类型和Content-Disposition头
-            # 以便浏览器触发下载操作
-            response = HttpResponse(json_string, content_type='application/json; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="{download_filename}"'
-            
-            return response
+            # 直接流式返回压缩的 blob，不在内存中构造整个 JSON 字符串
+            return responses.blob_download_response(request, doc.raw_ocr_blob, download_filename, etag=etag)
 
         except OcrDocument.DoesNotExist:
             return Response({"error": "文档未找到"}, status=status.HTTP_404_NOT_FOUND)
@@ -180,6 +428,33 @@ class LabelStudioTaskView(APIView):
             return Response({"error": f"发生意外的服务器错误: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class LabelStudioTasksView(APIView):
+    """
+    下载处理时预先生成的 Label Studio 任务（OCR 预测，区域 ID 稳定），可直接导入 Label Studio。
+    产物缺失（升级前处理的文档）或 OCR 结果、映射配置变化后在本次请求中重新生成。
+    """
+    def get(self, request, pk, *args, **kwargs):
+        doc = OcrDocument.objects.only('id', 'original_pdf_path', 'mineru_json_path', 'raw_ocr_blob',
+                                       'raw_ocr_sha256').filter(pk=pk).first()
+        if doc is None:
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            path = label_studio_tasks.get_or_build(doc)
+        except Exception as e:
+            logger.error(f"Failed to build Label Studio tasks for Doc ID {pk}: {e}", exc_info=True)
+            return Response({"error": f"Failed to build Label Studio tasks: {e}"},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if path is None:
+            return Response({"error": "Document has no OCR result yet."}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = responses.file_etag(path, variant=f'ls-{pk}-')
+        cached = responses.not_modified(request, etag)
+        if cached is not None:
+            return cached
+        download_filename = f"{Path(doc.original_pdf_path).stem}_label_studio_tasks.json"
+        return responses.file_download_response(request, path, download_filename, etag=etag)
+
+
 # --- REPLACED RAGFLOW VIEW WITH THIS ---
 class SubmitCorrectionView(APIView):
     """
@@ -198,7 +473,7 @@ class SubmitCorrectionView(APIView):
 
         try:
             # 2. 从上传的文件对象中读取并解析JSON
-            corrected_data = json.load(file_obj)
+            corrected_data = codec.load(file_obj)
             
             # 简单的验证，确保它是一个列表 (Label Studio 导出的是任务列表)
             if not isinstance(corrected_data, list):
@@ -207,75 +482,147 @@ class SubmitCorrectionView(APIView):
             # 3. 保存数据并更新状态
             doc.corrected_label_studio_json = corrected_data
             doc.status = 'corrected'
-            doc.save()
+            doc.save(update_fields=OcrDocument.CORRECTED_LS_FIELDS + ['status'])
+            corrections.clear_pages(doc)
+            events.publish_status(doc)
+            _queue_text_index(doc)
             
             serializer = OcrDocumentSerializer(doc)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
-        except json.JSONDecodeError:
+        except codec.DecodeError:
             return Response({"error": "Uploaded file is not a valid JSON."}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error in SubmitCorrectionView for doc ID {pk}: {e}", exc_info=True)
             return Response({"error": f"An unexpected server error occurred: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class PageCorrectionView(APIView):
+    """
+    按页提交校对结果，只写入发生变化的这一页。页码从 1 开始，与 pages/<page>/ 一致。
+
+    PATCH /api/documents/<pk>/corrections/<page>/
+      请求体: {"result": [...]} 或单个 Label Studio 任务（含 annotations）
+      可选请求头 If-Match: <version>，版本不一致时返回 409，避免同页覆盖。
+      文档不存在或没有这一页时返回 404；只有 processed / corrected 状态的文档可以校对，
+      否则返回 409。
+    """
+    EDITABLE_STATUSES = ('processed', 'corrected')
+
+    def get(self, request, pk, page, *args, **kwargs):
+        correction = PageCorrection.objects.filter(document_id=pk, page_index=page - 1).first()
+        if correction is None:
+            return Response({"error": "No correction for this page"}, status=status.HTTP_404_NOT_FOUND)
+        response = Response({"page": page, "version": correction.version,
+                             "updated_at": correction.updated_at, "result": correction.result})
+        response['ETag'] = f'"{correction.version}"'
+        return response
+
+    def patch(self, request, pk, page, *args, **kwargs):
+        doc = OcrDocument.objects.only('id', 'status', 'raw_ocr_blob').filter(pk=pk).first()
+        if doc is None:
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+        if doc.status not in self.EDITABLE_STATUSES:
+            return Response({"error": f"Document is {doc.status}; only processed or corrected documents can be corrected."},
+                            status=status.HTTP_409_CONFLICT)
+        page_idx = page - 1
+        if not ocr_pages.ensure(doc) or not doc.ocr_pages.filter(page_idx=page_idx).exists():
+            return Response({"error": f"Document has no page {page}."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            result = corrections.extract_result(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        expected_version = None
+        if_match = request.headers.get('If-Match')
+        if if_match:
+            try:
+                expected_version = int(if_match.strip('"'))
+            except ValueError:
+                return Response({"error": "If-Match must be a page version number"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            correction, changed = corrections.apply_page(doc, page_idx, result, expected_version=expected_version)
+        except corrections.VersionConflict as e:
+            return Response({"error": str(e), "version": e.current_version}, status=status.HTTP_409_CONFLICT)
+
+        # 条件更新：检查状态之后文档可能已被重新处理，不覆盖那之后的状态
+        if changed and doc.status != 'corrected' and \
+                OcrDocument.objects.filter(pk=doc.pk, status='processed').update(status='corrected'):
+            doc.status = 'corrected'
+            events.publish_status(doc)
+        if changed:
+            try:
+                search.index_page(doc, page_idx, result)
+            except Exception as e:
+                logger.warning(f"Failed to index corrected page {page} of Doc ID {pk}: {e}")
+
+        response = Response({"page": page, "version": correction.version,
+                             "updated_at": correction.updated_at, "changed": changed})
+        response['ETag'] = f'"{correction.version}"'
+        return response
+
+
+class CorrectionExportView(APIView):
+    """
+    下载合成后的完整校对导出（基线 + 按页增量），按需生成、流式返回。
+    ETag 为 corrections.source_key：基线（整体导出或 OCR 预测及任务映射配置）与各页增量的校验和，
+    不需要加载 JSON 就能判断导出是否变化。导出是任务列表，不经过分块，与分块配置无关。
+    """
+    def get(self, request, pk, *args, **kwargs):
+        doc = OcrDocument.objects.filter(pk=pk).first()
+        if doc is None:
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+        etag = f'"export-{pk}-{corrections.source_key(doc)[:32]}"'
+        cached = responses.not_modified(request, etag)
+        if cached is not None:
+            return cached
+
+        run = instrumentation.Recorder('label_studio', doc)
+        with run.stage('materialize') as stage:
+            tasks = corrections.materialize(doc)
+            stage.pages = len(tasks)
+        if not tasks:
+            return Response({"error": "No corrections or OCR predictions available."}, status=status.HTTP_400_BAD_REQUEST)
+        run.finish('exported')
+        download_filename = f"{Path(doc.original_pdf_path).stem}_corrected.json"
+        return responses.json_download_response(request, tasks, download_filename, etag=etag)
+
+
 class GenerateRAGFlowPayloadView(APIView):
     """
     将校对后的 Label Studio JSON 转换为 RAGFlow 兼容的
     add_chunk payload，并提供为可下载的文件。
+    payload 按页增量生成并保存为版本化产物；GET 不再修改文档状态，
+    入库请使用 MarkIngestedView。
     """
     def get(self, request, pk, *args, **kwargs):
         logger.info(f"--- [GET] 开始为文档ID {pk} 生成RAGFlow入库文件 ---")
         try:
             doc = OcrDocument.objects.get(pk=pk)
 
+            # payload 由校对数据（基线 + 按页增量）和分块配置决定，两者的来源标识都未变化时直接返回 304
+            etag = f'"ragflow-{pk}-{ragflow.source_key(doc)[:32]}"'
+            cached = responses.not_modified(request, etag)
+            if cached is not None:
+                return cached
+
             # 1. 检查是否存在校对后的数据
-            if not doc.corrected_label_studio_json:
+            if not corrections.has_corrections(doc):
                 return Response(
                     {"error": "未找到校对后的数据(Corrected JSON)。请先上传校对文件。"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            # 2. 转换逻辑
-            pages = {}
-            all_tasks_data = doc.corrected_label_studio_json
-            
-            for i, task_data in enumerate(all_tasks_data):
-                annotations = task_data.get('completions') or task_data.get('annotations')
-                if not annotations: continue
-
-                result = annotations[0].get('result', [])
-                page_num = i + 1
-
-                for item in result:
-                    if item.get('type') == 'textarea':
-                        if page_num not in pages:
-                            pages[page_num] = []
-                        text_list = item.get('value', {}).get('text', [])
-                        if text_list:
-                            pages[page_num].append(text_list[0])
-            
-            chunks = []
-            for page_num in sorted(pages.keys()):
-                page_text = "\n".join(pages[page_num])
-                chunks.append({"content_ltxt": page_text})
-            
-            ragflow_payload = {
-                "doc_id": Path(doc.original_pdf_path).name,
-                "kb_name": "test_kb", # 您可以稍后将其更改为动态值
-                "chunks": chunks
-            }
-            
-            # 3. 更新状态为 'ingested'
-            doc.status = 'ingested'
-            doc.save(update_fields=['status'])
 
-            # 4. 将结果作为可下载文件提供
-            json_string = json.dumps(ragflow_payload, indent=4, ensure_ascii=False)
+            # 2. 来源未变化时直接复用已保存的产物，否则只重算变化的页面
+            doc = ragflow.get_or_build_payload(doc)
+
+            # 3. 将产物作为可下载文件提供
             original_filename = Path(doc.original_pdf_path).stem
             download_filename = f"{original_filename}_ragflow_payload.json"
-
-            response = HttpResponse(json_string, content_type='application/json; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="{download_filename}"'
-            
+            response = responses.blob_download_response(request, doc.ragflow_blob, download_filename, etag=etag)
+            response['X-Payload-Version'] = str(doc.ragflow_version)
             return response
 
         except OcrDocument.DoesNotExist:
@@ -283,3 +630,229 @@ class GenerateRAGFlowPayloadView(APIView):
         except Exception as e:
             logger.error(f"在为文档ID {pk} 生成RAGFlow文件时发生意外错误: {e}", exc_info=True)
             return Response({"error": f"发生意外的服务器错误: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class MarkIngestedView(APIView):
+    """
+    显式地将文档标记为已入库，并记录入库的 payload 版本。
+    请求体可选 {"version": n}：与当前产物版本不一致时返回 409，
+    避免把旧版本的入库结果记到新版本上。
+    """
+    def post(self, request, pk, *args, **kwargs):
+        doc = OcrDocument.objects.only('id', 'status', 'ragflow_blob', 'ragflow_version', 'ingested_version') \
+            .filter(pk=pk).first()
+        if doc is None:
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not doc.ragflow_blob:
+            return Response({"error": "No RAGFlow payload has been generated for this document."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            version = request.data.get('version')
+            version = int(version) if version is not None else None
+        except (TypeError, ValueError):
+            return Response({"error": "version must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if version is not None and version != doc.ragflow_version:
+            return Response({"error": "Payload version mismatch", "version": doc.ragflow_version},
+                            status=status.HTTP_409_CONFLICT)
+
+        doc.status = 'ingested'
+        doc.ingested_version = doc.ragflow_version
+        doc.save(update_fields=['status', 'ingested_version'])
+        events.publish_status(doc)
+        return Response({"id": doc.id, "status": doc.status, "ingested_version": doc.ingested_version})
+
+
+class PushToRAGFlowView(APIView):
+    """
+    POST 投递后台任务，把当前版本的 payload 推送到配置的 RAGFlow 接口；
+    GET 返回推送进度（已确认写入的 chunk 数）与最近一次推送的统计信息。
+    """
+    def get(self, request, pk, *args, **kwargs):
+        if not OcrDocument.objects.filter(pk=pk).exists():
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+        state = ragflow_push.load_state(pk)
+        return Response({"configured": ragflow_push.is_configured(),
+                         "pushed_chunks": len(state.get('pushed_keys', [])),
+                         "last_run": state.get('last_run')})
+
+    def post(self, request, pk, *args, **kwargs):
+        doc = OcrDocument.objects.filter(pk=pk).first()
+        if doc is None:
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not ragflow_push.is_configured():
+            return Response({"error": "RAGFLOW_PUSH_URL is not configured."}, status=status.HTTP_400_BAD_REQUEST)
+        if not corrections.has_corrections(doc):
+            return Response({"error": "No corrected data to push."}, status=status.HTTP_400_BAD_REQUEST)
+        result = push_document_to_ragflow.delay(doc.id)
+        return Response({"id": doc.id, "task_id": result.id}, status=status.HTTP_202_ACCEPTED)
+
+
+class QueueMetricsView(APIView):
+    """
+    各处理队列的积压深度与排队时间，用于按通道规划 worker 数量。
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            window = int(request.query_params.get('window', 3600))
+        except ValueError:
+            return Response({"error": "window must be an integer number of seconds"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(queues.metrics(window_seconds=window))
+
+
+
+class DocumentRunsView(APIView):
+    """
+    文档的处理记录（ProcessingRun），最新的在前，包含每个阶段的耗时、页数、字节数与峰值 RSS。
+    ?kind=process / label_studio / ragflow 过滤类型。
+    """
+    def get(self, request, pk, *args, **kwargs):
+        if not OcrDocument.objects.filter(pk=pk).exists():
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+        runs = ProcessingRun.objects.filter(document_id=pk).order_by('-started_at')
+        if request.query_params.get('kind'):
+            runs = runs.filter(kind=request.query_params['kind'])
+        return Response(ProcessingRunSerializer(runs[:100], many=True).data)
+
+
+class PageImageView(APIView):
+    """
+    页面图片：?rendition=thumb（缩略图）/ review（审阅图，默认）/ full（全尺寸）。
+    请求的缩小版本不存在（旧的输出或已关闭生成）时退回全尺寸图片。
+    输出目录按处理结果唯一，图片生成后不再变化，ETag 由文件 stat 得出。
+    """
+    CONTENT_TYPES = {'.jpg': 'image/jpeg', '.webp': 'image/webp'}
+
+    def get(self, request, pk, page, *args, **kwargs):
+        rendition = request.query_params.get('rendition', 'review')
+        if rendition not in ('thumb', 'review', 'full'):
+            return Response({"error": "rendition must be one of thumb, review, full."}, status=status.HTTP_400_BAD_REQUEST)
+        doc = OcrDocument.objects.only('mineru_json_path').filter(pk=pk).first()
+        if doc is None or not doc.mineru_json_path:
+            return Response({"error": "Document not found or not processed yet."}, status=status.HTTP_404_NOT_FOUND)
+
+        pages_dir = Path(doc.mineru_json_path).parents[2] / 'pages'
+        path = page_image_path(pages_dir, page, rendition) or page_image_path(pages_dir, page)
+        if path is None:
+            return Response({"error": f"No image for page {page}."}, status=status.HTTP_404_NOT_FOUND)
+        stat = path.stat()
+        etag = f'"{pk}-{page}-{path.parent.name}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        cached = responses.not_modified(request, etag)
+        if cached is not None:
+            return cached
+        response = responses.file_response(request, open(path, 'rb'),
+                                           content_type=self.CONTENT_TYPES.get(path.suffix, 'application/octet-stream'))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+
+def _ocr_pages_document(pk):
+    """按页接口的文档：返回 (doc, 错误响应)。升级前处理的文档在首次访问时拆分归档 JSON。"""
+    doc = OcrDocument.objects.only('id', 'raw_ocr_blob', 'mineru_json_path').filter(pk=pk).first()
+    if doc is None:
+        return None, Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+    if not ocr_pages.ensure(doc):
+        return None, Response({"error": "Document has no OCR result yet."}, status=status.HTTP_404_NOT_FOUND)
+    return doc, None
+
+
+class DocumentPagesView(APIView):
+    """
+    文档各页的尺寸与区域数，只读取 OcrPage 行。页码从 1 开始，与页面图片接口一致。
+    """
+    def get(self, request, pk, *args, **kwargs):
+        doc, error = _ocr_pages_document(pk)
+        if error:
+            return error
+        pages = [{"page": page.page_idx + 1, "width": page.width, "height": page.height, "blocks": page.block_count}
+                 for page in doc.ocr_pages.order_by('page_idx')]
+        return Response({"document_id": doc.id, "pages": pages})
+
+
+class OcrPageView(APIView):
+    """
+    单页的区域（bbox 为 PDF 坐标 [x0, y0, x1, y1]），只读取这一页的 OcrPage/OcrBlock 行。
+      ?label=Text,Title  按区域标签过滤
+      ?x=&y=             只返回包含该点的区域（PDF 坐标），用于按位置查找文字
+    """
+    def get(self, request, pk, page, *args, **kwargs):
+        doc, error = _ocr_pages_document(pk)
+        if error:
+            return error
+        ocr_page = doc.ocr_pages.filter(page_idx=page - 1).first()
+        if ocr_page is None:
+            return Response({"error": f"No OCR data for page {page}."}, status=status.HTTP_404_NOT_FOUND)
+
+        blocks = OcrBlock.objects.filter(document_id=doc.id, page_idx=ocr_page.page_idx).order_by('seq')
+        labels = [label for label in request.query_params.get('label', '').split(',') if label.strip()]
+        if labels:
+            blocks = blocks.filter(label__in=labels)
+        if 'x' in request.query_params or 'y' in request.query_params:
+            try:
+                x, y = float(request.query_params['x']), float(request.query_params['y'])
+            except (KeyError, ValueError):
+                return Response({"error": "x and y must both be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+            blocks = blocks.filter(x0__lte=x, x1__gte=x, y0__lte=y, y1__gte=y)
+        return Response({
+            "document_id": doc.id, "page": page, "width": ocr_page.width, "height": ocr_page.height,
+            "blocks": [{"seq": block.seq, "type": block.block_type, "label": block.label, "bbox": block.bbox,
+                        "text": block.text} for block in blocks],
+        })
+
+
+class PageTaskView(APIView):
+    """
+    单页的 Label Studio 任务（OCR 预测），只由这一页的行生成。
+    页面尺寸无效或没有图片、区域时返回 404，与整份导出中跳过该页一致。
+    """
+    def get(self, request, pk, page, *args, **kwargs):
+        doc, error = _ocr_pages_document(pk)
+        if error:
+            return error
+        if not doc.mineru_json_path:
+            return Response({"error": "Document not processed yet."}, status=status.HTTP_404_NOT_FOUND)
+        unique_folder_name = Path(doc.mineru_json_path).parents[2].name
+        tasks = ocr_pages.ls_tasks(doc.id, unique_folder_name, page_idxs=[page - 1])
+        if not tasks:
+            return Response({"error": f"No Label Studio task for page {page}."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(tasks[0])
+
+
+class SearchView(APIView):
+    """
+    全文检索 OCR 与校对文本，返回按相关度排序的页级命中与摘要。
+    命中的 page 从 1 开始，可直接用于 pages/<page>/ 与 corrections/<page>/。
+
+    GET /api/search/?q=<查询>
+      mode=auto|fts|fuzzy  auto（默认）先全文匹配，无命中时退回模糊匹配；
+                           响应中的 mode 为实际使用的方式，翻页时应原样传回；
+                           fuzzy 时 expanded 列出每个查询词实际匹配的词
+      document=1,2         限定文档；status=processed,corrected 限定文档状态
+      limit / offset       分页，limit 不超过 SEARCH_MAX_RESULTS
+    """
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        mode = request.query_params.get('mode', 'auto')
+        if mode not in search.MODES:
+            return Response({"error": f"mode must be one of {', '.join(search.MODES)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), settings.SEARCH_MAX_RESULTS)
+            offset = int(request.query_params.get('offset', 0))
+            document_ids = [int(i) for i in request.query_params.get('document', '').split(',') if i.strip()]
+        except ValueError:
+            return Response({"error": "limit, offset and document must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or offset < 0:
+            return Response({"error": "limit must be positive and offset non-negative"}, status=status.HTTP_400_BAD_REQUEST)
+        statuses = [s for s in request.query_params.get('status', '').split(',') if s.strip()]
+
+        found = search.search(query, mode=mode, limit=limit, offset=offset,
+                              document_ids=document_ids, statuses=statuses)
+        names = dict(OcrDocument.objects.filter(id__in={hit['document_id'] for hit in found['results']})
+                     .values_list('id', 'original_pdf_path'))
+        for hit in found['results']:
+            hit['filename'] = os.path.basename(names.get(hit['document_id'], ''))
+        return Response({"query": query, "limit": limit, "offset": offset, **found})
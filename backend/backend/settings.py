@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'api',
@@ -91,15 +92,170 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# --- API 的 JSON 编解码 ---
+# 安装了 orjson 时使用 api.codec 的快速实现，否则与 DRF 默认的 JSONRenderer/JSONParser 相同
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
 # --- 核心改动：从环境变量读取Redis主机 ---
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 CELERY_BROKER_URL = f'redis://{REDIS_HOST}:6379/0'
 CELERY_RESULT_BACKEND = f'redis://{REDIS_HOST}:6379/0'
+# 文档状态事件 (Redis pub/sub → SSE)
+EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL', f'redis://{REDIS_HOST}:6379/1')
+EVENTS_HEARTBEAT_SECONDS = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
 # --- 结束改动 ---
 
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# --- 按文档大小分道的队列 ---
+# small/large 两条队列分别由独立的 worker 消费（见 docker-compose.yml），各自限定并发
+OCR_QUEUE_SMALL = os.getenv('OCR_QUEUE_SMALL', 'ocr_small')
+OCR_QUEUE_LARGE = os.getenv('OCR_QUEUE_LARGE', 'ocr_large')
+OCR_SMALL_MAX_PAGES = int(os.getenv('OCR_SMALL_MAX_PAGES', 30))
+OCR_LARGE_PRIORITY_STEP_PAGES = int(os.getenv('OCR_LARGE_PRIORITY_STEP_PAGES', 50))
+
+# 长任务：每次只预取一个任务，任务完成后才确认，worker 崩溃时任务重新投递
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+# 优先级子队列的键名沿用 kombu 默认的分隔符 (sep)：修改后 Redis 中按旧键名排队的消息不会再被消费
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'queue_order_strategy': 'priority',
+    # 必须大于最长任务耗时，否则 acks_late 的任务会被重复投递
+    'visibility_timeout': int(os.getenv('CELERY_VISIBILITY_TIMEOUT', 6 * 3600)),
+}
+
+# --- 断点续跑与清理 (janitor) ---
+# 处理中的文档每 HEARTBEAT 秒更新一次心跳，超过 STALE 秒没有心跳视为 worker 已退出，
+# 由 janitor 重新入队并从断点继续；同一文档最多尝试 MAX_ATTEMPTS 次。
+# 不被任何文档或缓存条目引用、且超过 ORPHAN_MIN_AGE_HOURS 小时未修改的输出目录会被删除
+PROCESSING_HEARTBEAT_SECONDS = int(os.getenv('PROCESSING_HEARTBEAT_SECONDS', 30))
+PROCESSING_STALE_SECONDS = int(os.getenv('PROCESSING_STALE_SECONDS', 300))
+PROCESSING_MAX_ATTEMPTS = int(os.getenv('PROCESSING_MAX_ATTEMPTS', 3))
+JANITOR_INTERVAL_SECONDS = int(os.getenv('JANITOR_INTERVAL_SECONDS', 300))
+ORPHAN_OUTPUT_MIN_AGE_HOURS = int(os.getenv('ORPHAN_OUTPUT_MIN_AGE_HOURS', 24))
+
 DATA_ROOT_PATH = Path(os.getenv('LOCAL_DATA_PATH')) if os.getenv('LOCAL_DATA_PATH') else BASE_DIR.parent
 DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024
+# 分块上传：单个分块与整个文件的大小上限
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv('UPLOAD_CHUNK_MAX_BYTES', 16 * 1024 * 1024))
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 4 * 1024 * 1024 * 1024))
+# 批量上传：multipart 中的文件数上限（Django 默认 100），单个批次（含归档展开后）的 PDF 数上限，
+# 以及并行读取页数的线程数
+DATA_UPLOAD_MAX_NUMBER_FILES = int(os.getenv('DATA_UPLOAD_MAX_NUMBER_FILES', 1000))
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', 10000))
+BATCH_MEASURE_CONCURRENCY = int(os.getenv('BATCH_MEASURE_CONCURRENCY', 8))
+
+
+# --- MinerU 执行配置 ---
+# 超过 MINERU_SHARD_PAGES 页的 PDF 会按页码区间切分，并行运行多个 MinerU 进程
+# MinerU 可执行文件（可带参数，例如 "python /app/fake_mineru.py" 用于开发与测试）
+MINERU_COMMAND = os.getenv('MINERU_COMMAND', 'mineru')
+MINERU_TIMEOUT = int(os.getenv('MINERU_TIMEOUT', 3600))
+MINERU_SHARD_PAGES = int(os.getenv('MINERU_SHARD_PAGES', 50))
+MINERU_SHARD_CONCURRENCY = int(os.getenv('MINERU_SHARD_CONCURRENCY', 2))
+# 只有部分页需要 MinerU 时（见下方文本层快速路径），相隔不超过该页数的区间合并为一次运行，减少模型加载次数
+MINERU_SHARD_MAX_GAP = int(os.getenv('MINERU_SHARD_MAX_GAP', 5))
+
+# --- 文本层快速路径 (born-digital PDF) ---
+# 自带可靠文本层的页直接用 pdftotext 抽取文本与坐标，不经 OCR（见 api/text_layer.py）。
+# 条件：非空白字符数下限、图片覆盖页面比例上限、可识别字符比例下限；poppler 工具的超时（秒）
+TEXT_LAYER_ENABLED = os.getenv('TEXT_LAYER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+TEXT_LAYER_MIN_CHARS = int(os.getenv('TEXT_LAYER_MIN_CHARS', 50))
+TEXT_LAYER_MAX_IMAGE_COVERAGE = float(os.getenv('TEXT_LAYER_MAX_IMAGE_COVERAGE', 0.1))
+TEXT_LAYER_MIN_QUALITY = float(os.getenv('TEXT_LAYER_MIN_QUALITY', 0.95))
+TEXT_LAYER_TIMEOUT = int(os.getenv('TEXT_LAYER_TIMEOUT', 300))
+
+# --- MinerU 常驻 worker 池 ---
+# 形如 unix:///data/run/mineru.sock 或 tcp://mineru_pool:8765；为空时每次都运行 CLI。
+# 池不可达时自动回退到 CLI。worker 处理 MAX_JOBS 个任务或内存超过 MAX_RSS_MB（0 为不限）后重启
+MINERU_POOL_ADDRESS = os.getenv('MINERU_POOL_ADDRESS', '')
+MINERU_POOL_WORKERS = int(os.getenv('MINERU_POOL_WORKERS', 1))
+MINERU_POOL_ENGINE = os.getenv('MINERU_POOL_ENGINE', 'api.mineru_pool.MineruEngine')
+MINERU_POOL_MAX_JOBS = int(os.getenv('MINERU_POOL_MAX_JOBS', 50))
+MINERU_POOL_MAX_RSS_MB = int(os.getenv('MINERU_POOL_MAX_RSS_MB', 0))
+MINERU_POOL_WARMUP = os.getenv('MINERU_POOL_WARMUP', 'true').lower() in ('1', 'true', 'yes')
+MINERU_POOL_CONNECT_TIMEOUT = float(os.getenv('MINERU_POOL_CONNECT_TIMEOUT', 2))
+
+# --- PDF 页面栅格化配置 ---
+# 档位决定 DPI 与 JPEG 质量；页面按批渲染，批大小受内存上限约束
+RASTER_PROFILES = {
+    'draft': {'dpi': 100, 'quality': 60},
+    'standard': {'dpi': 150, 'quality': 80},
+    'high': {'dpi': 200, 'quality': 90},
+}
+RASTER_PROFILE = os.getenv('RASTER_PROFILE', 'high')
+RASTER_BATCH_PAGES = int(os.getenv('RASTER_BATCH_PAGES', 10))
+RASTER_MEMORY_LIMIT_MB = int(os.getenv('RASTER_MEMORY_LIMIT_MB', 1024))
+RASTER_THREAD_COUNT = int(os.getenv('RASTER_THREAD_COUNT', 4))
+# 页面编码：并行线程数、输出格式 (jpeg / webp)，以及审阅图与缩略图的宽度（0 为不生成）和质量
+RASTER_ENCODE_WORKERS = int(os.getenv('RASTER_ENCODE_WORKERS', 4))
+RASTER_FORMAT = os.getenv('RASTER_FORMAT', 'jpeg')
+RASTER_REVIEW_WIDTH = int(os.getenv('RASTER_REVIEW_WIDTH', 1280))
+RASTER_THUMBNAIL_WIDTH = int(os.getenv('RASTER_THUMBNAIL_WIDTH', 256))
+RASTER_PREVIEW_QUALITY = int(os.getenv('RASTER_PREVIEW_QUALITY', 75))
+
+# --- OCR 结果缓存 ---
+# 最后一个引用者删除后是否保留共享输出（由 evict_ocr_cache 按 LRU/容量回收）
+OCR_CACHE_RETAIN_UNREFERENCED = os.getenv('OCR_CACHE_RETAIN_UNREFERENCED', 'true').lower() in ('1', 'true', 'yes')
+OCR_CACHE_MAX_SIZE_MB = int(os.getenv('OCR_CACHE_MAX_SIZE_MB', 20 * 1024))
+
+# --- 规范化的 OCR 页/块表 ---
+# 入库时 pdf_info 拆成 OcrPage/OcrBlock 行，每批 bulk_create 的行数
+OCR_ROWS_BATCH_SIZE = int(os.getenv('OCR_ROWS_BATCH_SIZE', 2000))
+
+# --- 全文检索 (/api/search/) ---
+# tsvector 使用的文本检索配置（'simple' 不做词干化，适合多语种；纯英文语料可用 'english'），
+# 修改后需运行 manage.py rebuild_search_index --vectors-only。
+# 模糊匹配时每个查询词在词表中按 pg_trgm word_similarity（不低于阈值）扩展为最多 N 个相近的词
+SEARCH_TEXT_CONFIG = os.getenv('SEARCH_TEXT_CONFIG', 'simple')
+SEARCH_TRIGRAM_THRESHOLD = float(os.getenv('SEARCH_TRIGRAM_THRESHOLD', 0.4))
+SEARCH_FUZZY_EXPANSIONS = int(os.getenv('SEARCH_FUZZY_EXPANSIONS', 5))
+# 每次查询最多参与相关度排序的命中页数（0 表示不限）；超出时排序只在其中进行
+SEARCH_RANK_CANDIDATES = int(os.getenv('SEARCH_RANK_CANDIDATES', 5000))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 100))
+
+# --- OCR JSON 旁路存储 ---
+# 原始/校对 JSON 以压缩文件存放；codec 可选 'zstd'（需安装 zstandard）或 'gzip'
+BLOB_STORAGE_ROOT = Path(os.getenv('BLOB_STORAGE_ROOT', DATA_ROOT_PATH / 'data' / 'blobs'))
+BLOB_STORAGE_CODEC = os.getenv('BLOB_STORAGE_CODEC', 'zstd')
+BLOB_STORAGE_LEVEL = int(os.getenv('BLOB_STORAGE_LEVEL', 6))
+
+# --- RAGFlow 分块配置 ---
+# mode: 'page'（默认，与分块功能加入前的输出相同）每页一个 chunk；
+# 'section' 按标题分节、按 token 数切分并保留 overlap，需显式开启（改变 mode 会使已有 payload 重建）
+RAGFLOW_CHUNKING = {
+    'mode': os.getenv('RAGFLOW_CHUNK_MODE', 'page'),
+    'target_tokens': int(os.getenv('RAGFLOW_CHUNK_TARGET_TOKENS', 512)),
+    'max_tokens': int(os.getenv('RAGFLOW_CHUNK_MAX_TOKENS', 1024)),
+    'overlap_tokens': int(os.getenv('RAGFLOW_CHUNK_OVERLAP_TOKENS', 64)),
+    'cross_page': os.getenv('RAGFLOW_CHUNK_CROSS_PAGE', 'true').lower() in ('1', 'true', 'yes'),
+    'skip_labels': ['Header', 'Footer'],
+    'tokenizer': os.getenv('RAGFLOW_CHUNK_TOKENIZER', 'simple'),
+    'include_metadata': os.getenv('RAGFLOW_CHUNK_METADATA', 'false').lower() in ('1', 'true', 'yes'),
+}
 
+# --- 推送 chunk 到 RAGFlow 兼容接口 ---
+# URL 模板可使用 {doc_id}（本系统文档 ID）、{doc_name}（PDF 文件名）、{kb_name}，例如
+# http://ragflow:9380/api/v1/datasets/<dataset_id>/documents/{doc_name}/chunks
+# BATCH_SIZE 为 1 时每个请求发送一个 chunk（RAGFlow 原生接口的格式），
+# 大于 1 时请求体为 {"chunks": [...]}，用于支持批量写入的兼容接口。
+RAGFLOW_PUSH_URL = os.getenv('RAGFLOW_PUSH_URL', '')
+RAGFLOW_API_KEY = os.getenv('RAGFLOW_API_KEY', '')
+RAGFLOW_PUSH_CONCURRENCY = int(os.getenv('RAGFLOW_PUSH_CONCURRENCY', 8))
+RAGFLOW_PUSH_BATCH_SIZE = int(os.getenv('RAGFLOW_PUSH_BATCH_SIZE', 1))
+RAGFLOW_PUSH_MAX_RETRIES = int(os.getenv('RAGFLOW_PUSH_MAX_RETRIES', 5))
+RAGFLOW_PUSH_BACKOFF_SECONDS = float(os.getenv('RAGFLOW_PUSH_BACKOFF_SECONDS', 0.5))
+RAGFLOW_PUSH_TIMEOUT = int(os.getenv('RAGFLOW_PUSH_TIMEOUT', 30))
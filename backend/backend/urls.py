@@ -2,7 +2,10 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from api.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')), # 包含我们app的URLs
+    path('metrics', metrics_view, name='metrics'),  # Prometheus 抓取端点
 ]
\ No newline at end of file
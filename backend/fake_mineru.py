@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+模拟 MinerU CLI 的可执行文件，用于在没有 GPU/模型的环境中开发和测试处理流程：
+
+    MINERU_COMMAND="python /app/fake_mineru.py"
+
+接受与 mineru 相同的 -p/-o/-s/-e 参数，输出 tqdm 风格的进度（stderr，\r 刷新）
+和普通日志行（stdout），并在约定位置写出结构正确的 <stem>_middle.json。
+
+同时提供 MinerU worker 池使用的进程内引擎：
+
+    MINERU_POOL_ENGINE=fake_mineru.Engine
+
+环境变量：
+  FAKE_MINERU_PAGES           页数；默认从 PDF 中统计 /Type /Page
+  FAKE_MINERU_LOAD_SECONDS    模拟启动时的模型加载耗时，默认 0
+  FAKE_MINERU_PAGE_SECONDS    每页耗时，默认 0.05
+  FAKE_MINERU_EXIT_CODE       非 0 时在处理完后以该返回码退出且不写输出
+  FAKE_MINERU_IGNORE_SIGTERM  为 1 时忽略 SIGTERM（验证 SIGKILL 兜底）
+  FAKE_MINERU_SPAWN_CHILD     为 1 时派生一个长时间运行的子进程（验证按进程组终止）
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+def count_pages(pdf_path):
+    if os.getenv('FAKE_MINERU_PAGES'):
+        return int(os.environ['FAKE_MINERU_PAGES'])
+    data = Path(pdf_path).read_bytes()
+    return max(1, len(re.findall(rb'/Type\s*/Page(?!s)', data)))
+
+
+def fake_page(page_idx):
+    lines = [{"bbox": [72, 120 + 14 * i, 540, 132 + 14 * i],
+              "spans": [{"content": f"Page {page_idx + 1} line {i + 1} of recognised text."}]} for i in range(5)]
+    return {
+        "page_idx": page_idx,
+        "page_size": [612, 792],
+        "para_blocks": [
+            {"type": "title", "bbox": [72, 72, 540, 100],
+             "lines": [{"bbox": [72, 72, 540, 100], "spans": [{"content": f"Section {page_idx + 1}"}]}]},
+            {"type": "text", "bbox": [72, 120, 540, 200], "lines": lines},
+        ],
+    }
+
+
+def progress(stage, current, total):
+    percent = int(current * 100 / total) if total else 100
+    bar = '█' * (percent // 10)
+    sys.stderr.write(f"\r{stage}: {percent:3d}%|{bar:<10}| {current}/{total} [00:00<00:00]")
+    sys.stderr.flush()
+
+
+class SimulatedFailure(Exception):
+    def __init__(self, exit_code):
+        super().__init__(f"simulated failure (exit code {exit_code})")
+        self.exit_code = exit_code
+
+
+def load_models():
+    time.sleep(float(os.getenv('FAKE_MINERU_LOAD_SECONDS', '0')))
+
+
+def parse(pdf_path, output, start=None, end=None):
+    """处理 [start, end] 页并写出 _middle.json，返回其路径。"""
+    pdf_path = Path(pdf_path)
+    total_pages = count_pages(pdf_path)
+    start = start or 0
+    end = min(end if end is not None else total_pages - 1, total_pages - 1)
+    pages = list(range(start, end + 1))
+    delay = float(os.getenv('FAKE_MINERU_PAGE_SECONDS', '0.05'))
+
+    print(f"fake-mineru: processing {pdf_path.name} pages {start}-{end}", flush=True)
+    for stage in ('Layout Predict', 'OCR-rec Predict'):
+        for i, _ in enumerate(pages, start=1):
+            time.sleep(delay / 2)
+            progress(stage, i, len(pages))
+        sys.stderr.write('\n')
+
+    exit_code = int(os.getenv('FAKE_MINERU_EXIT_CODE', '0'))
+    if exit_code:
+        raise SimulatedFailure(exit_code)
+
+    out_dir = Path(output) / pdf_path.stem / 'auto'
+    out_dir.mkdir(parents=True, exist_ok=True)
+    middle = {"pdf_info": [fake_page(i) for i in range(len(pages))], "_backend": "fake", "_version_name": "0.0.0"}
+    tmp_path = out_dir / f".{pdf_path.stem}_middle.json.tmp"
+    tmp_path.write_text(json.dumps(middle, ensure_ascii=False), encoding='utf-8')
+    json_path = out_dir / f"{pdf_path.stem}_middle.json"
+    os.replace(tmp_path, json_path)
+    print(f"fake-mineru: wrote {len(pages)} pages to {out_dir}", flush=True)
+    return json_path
+
+
+class Engine:
+    """MinerU worker 池的进程内引擎：load 模拟一次性的模型加载，之后每次 parse 只付每页的耗时。"""
+    def load(self):
+        load_models()
+
+    def parse(self, pdf_path, output_dir, start=None, end=None):
+        return parse(pdf_path, output_dir, start, end)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='fake_mineru')
+    parser.add_argument('-p', '--path', required=True)
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('-s', '--start', type=int)
+    parser.add_argument('-e', '--end', type=int)
+    args, _ = parser.parse_known_args()
+
+    if os.getenv('FAKE_MINERU_IGNORE_SIGTERM') == '1':
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    if os.getenv('FAKE_MINERU_SPAWN_CHILD') == '1':
+        subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(3600)'])
+
+    load_models()
+    try:
+        parse(args.path, args.output, args.start, args.end)
+    except SimulatedFailure as e:
+        print(f"fake-mineru: {e}", file=sys.stderr, flush=True)
+        return e.exit_code
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
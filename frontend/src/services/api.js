@@ -8,8 +8,13 @@ const apiClient = axios.create({
 });
 
 export default {
-    getDocuments() {
-        return apiClient.get('/documents/');
+    getDocuments(params = {}) {
+        // 列表只返回摘要列（不含 raw/corrected JSON），结果为 { next, previous, results }
+        return apiClient.get('/documents/', { params });
+    },
+    getDocumentsPage(url) {
+        // 沿游标分页响应中的 next（完整 URL）加载下一页
+        return apiClient.get(url);
     },
     uploadDocument(file) {
         const formData = new FormData();
@@ -20,8 +25,27 @@ export default {
             }
         });
     },
+    subscribeDocumentEvents(onEvent) {
+        // Server-Sent Events：服务端推送状态变化与处理进度，替代轮询
+        const source = new EventSource('/api/events/');
+        ['status', 'progress', 'deleted'].forEach(type => {
+            source.addEventListener(type, e => onEvent(JSON.parse(e.data)));
+        });
+        return source;
+    },
+    cancelProcessing(docId) {
+        return apiClient.post(`/documents/${docId}/cancel/`);
+    },
+    retryProcessing(docId) {
+        return apiClient.post(`/documents/${docId}/retry/`);
+    },
+    pageImageUrl(docId, page, rendition = 'review') {
+        // 页码从 1 开始；rendition 为 thumb / review / full，列表与预览用缩小后的版本
+        return `/api/documents/${docId}/pages/${page}/image/?rendition=${rendition}`;
+    },
     getLabelStudioTasks(docId) {
-        return apiClient.get(`/documents/${docId}/to-label-studio/`);
+        // 处理时预先生成的任务（OCR 预测），可直接导入 Label Studio
+        return apiClient.get(`/documents/${docId}/label-studio-tasks/`);
     },
     ingestToRagflow(docId, correctedData) {
         return apiClient.post(`/documents/${docId}/ingest-to-ragflow/`, correctedData);